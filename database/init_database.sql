@@ -80,9 +80,16 @@ CREATE TABLE IF NOT EXISTS event_appearances (
     -- 这样以后搜"红衣服"，才能搜到这一条记录
     body_embedding vector(2048),    
     
+    -- 本次出场的 Keyframe 裁剪图路径（第一阶段在帧还在内存中时保存，按内容寻址）
+    -- Phase 6 生成证据时直接读取，不再重新解码视频
+    keyframe_path TEXT,
+    
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 已有数据库升级：补充 keyframe_path 列
+ALTER TABLE event_appearances ADD COLUMN IF NOT EXISTS keyframe_path TEXT;
+
 -- 索引: 加快衣着向量搜索 (支持以图搜人)
 -- 注意: 对于 2048 维向量，使用 ivfflat 而不是 hnsw（hnsw 最多支持 2000 维）
 -- 注意: ivfflat 索引需要在有数据后创建，这里先注释掉，稍后手动创建
@@ -0,0 +1,14 @@
+"""
+公共模块
+各阶段共享的数据结构（不依赖任何阶段，各阶段都可以导入）
+"""
+
+from .clip_index import CLIP_INDEX_KEY, ClipIndex, detection_score, get_clip_index, invalidate_clip_index
+
+__all__ = [
+    'CLIP_INDEX_KEY',
+    'ClipIndex',
+    'detection_score',
+    'get_clip_index',
+    'invalidate_clip_index',
+]
@@ -0,0 +1,203 @@
+"""
+Clip 人物索引 (Clip Index)
+职责：一次遍历 Clip 的所有帧 / 所有人物，预先汇总第二阶段各模块需要的人物信息
+
+索引由第一阶段建立、第二阶段读取，因此放在不依赖任何阶段的公共模块中。
+
+融合策略、会话管理、事件聚合、身份优化和上下文构建都直接读取索引，不再各自重复扫描 people_detected。
+索引在 ResultBuffer 创建 Clip_Obj 时建立；其他来源的 Clip 在第一次访问时懒加载。
+修改了 people_detected 中的身份信息之后（如 IdentityRefiner），必须调用 invalidate_clip_index。
+"""
+
+from typing import Dict, Any, List, Set, Tuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 索引在 Clip_Obj 中的键
+CLIP_INDEX_KEY = '_index'
+
+
+def detection_score(person: Dict[str, Any]) -> float:
+    """
+    计算检测的评分（用于选择最佳 Keyframe）
+    
+    评分规则：
+    - 有正脸（method='face'）：+100，身体特征（method='body'）：+50
+    - 置信度：* 10
+    - bbox 面积：* 0.01（鼓励选择画面大的）
+    
+    Args:
+        person: 人物检测信息
+    
+    Returns:
+        评分（越高越好）
+    """
+    score = 0.0
+    
+    # 方法加分
+    method = person.get('method', 'unknown')
+    if method == 'face':
+        score += 100
+    elif method == 'body':
+        score += 50
+    
+    # 置信度加分
+    confidence = person.get('confidence', 0.0)
+    score += confidence * 10
+    
+    # bbox 面积加分
+    bbox = person.get('bbox')
+    if bbox:
+        x1, y1, x2, y2 = bbox
+        area = (x2 - x1) * (y2 - y1)
+        score += area * 0.01
+    
+    return score
+
+
+class ClipIndex:
+    """单个 Clip 的人物汇总（只读，一次遍历建立）"""
+    
+    def __init__(self, people_detected: List[List[Dict[str, Any]]]):
+        """
+        遍历所有帧的所有人物，建立索引
+        
+        Args:
+            people_detected: 每帧检测到的人物列表
+        
+        属性：
+            frame_count: 帧数
+            detection_count: 检测总次数
+            person_ids: 所有 person_id 的集合
+            has_family / has_stranger: 是否出现家人 / 陌生人（role='family' / 'stranger'）
+            persons: {person_id: {
+                'role': str,             # 第一次出现时的角色
+                'method': str,           # 第一次出现时的识别方式
+                'roles': Set[str],       # 出现过的所有角色
+                'detections': int,       # 检测次数
+                'best_score': float,     # 最佳检测的评分
+                'best_detection': Dict,  # 最佳检测（bbox, confidence, method, frame_idx, keyframe_path）
+            }}
+            anonymous_count: 没有 person_id 的检测次数
+            anonymous_roles: 没有 person_id 的检测出现过的角色
+            anonymous_stranger_count: 没有 person_id 且 role='stranger' 的检测次数
+            tracks: {(person_id, role): {
+                'detection_count': int,
+                'first_frame': int,
+                'last_frame': int,
+                'bboxes': List[Tuple],   # 按帧顺序，用于分析移动
+                'frame_indices': List[int]
+            }}
+        """
+        self.frame_count = len(people_detected)
+        self.detection_count = 0
+        self.person_ids: Set[int] = set()
+        self.has_family = False
+        self.has_stranger = False
+        self.persons: Dict[int, Dict[str, Any]] = {}
+        self.anonymous_count = 0
+        self.anonymous_roles: Set[str] = set()
+        self.anonymous_stranger_count = 0
+        self.tracks: Dict[Tuple[Optional[int], str], Dict[str, Any]] = {}
+        
+        for frame_idx, frame_people in enumerate(people_detected):
+            for person in frame_people:
+                self._add(frame_idx, person)
+    
+    def _add(self, frame_idx: int, person: Dict[str, Any]):
+        """登记一次检测"""
+        person_id = person.get('person_id')
+        role = person.get('role', 'stranger')
+        bbox = person.get('bbox')
+        
+        self.detection_count += 1
+        
+        if role == 'family':
+            self.has_family = True
+        elif role == 'stranger':
+            self.has_stranger = True
+        
+        if person_id:
+            self.person_ids.add(person_id)
+            
+            score = detection_score(person)
+            summary = self.persons.get(person_id)
+            if summary is None:
+                summary = {
+                    'role': role,
+                    'method': person.get('method', 'unknown'),
+                    'roles': set(),
+                    'detections': 0,
+                    'best_score': -1,
+                    'best_detection': None
+                }
+                self.persons[person_id] = summary
+            
+            summary['roles'].add(role)
+            summary['detections'] += 1
+            if score > summary['best_score']:
+                summary['best_score'] = score
+                summary['best_detection'] = {
+                    'bbox': bbox,
+                    'confidence': person.get('confidence', 0.0),
+                    'method': person.get('method', 'unknown'),
+                    'frame_idx': frame_idx,
+                    'keyframe_path': person.get('keyframe_path')
+                }
+        else:
+            self.anonymous_count += 1
+            self.anonymous_roles.add(role)
+            if role == 'stranger':
+                self.anonymous_stranger_count += 1
+        
+        key = (person_id, role)
+        track = self.tracks.get(key)
+        if track is None:
+            track = {
+                'detection_count': 0,
+                'first_frame': frame_idx,
+                'last_frame': frame_idx,
+                'bboxes': [],
+                'frame_indices': []
+            }
+            self.tracks[key] = track
+        
+        track['detection_count'] += 1
+        track['last_frame'] = frame_idx
+        if bbox:
+            track['bboxes'].append(bbox)
+        track['frame_indices'].append(frame_idx)
+    
+    @property
+    def all_strangers(self) -> bool:
+        """是否全是陌生人（有陌生人且没有家人）"""
+        return self.has_stranger and not self.has_family
+
+
+def get_clip_index(clip: Dict[str, Any]) -> ClipIndex:
+    """
+    获取 Clip 的人物索引（不存在时建立并缓存到 Clip_Obj 中）
+    
+    Args:
+        clip: Clip_Obj
+    
+    Returns:
+        ClipIndex 实例
+    """
+    index = clip.get(CLIP_INDEX_KEY)
+    if index is None:
+        index = ClipIndex(clip.get('people_detected', []))
+        clip[CLIP_INDEX_KEY] = index
+    return index
+
+
+def invalidate_clip_index(clip: Dict[str, Any]):
+    """
+    丢弃 Clip 的人物索引（修改 people_detected 之后调用，下次访问时重建）
+    
+    Args:
+        clip: Clip_Obj
+    """
+    clip.pop(CLIP_INDEX_KEY, None)
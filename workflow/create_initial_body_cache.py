@@ -6,11 +6,9 @@
 """
 
 import sys
-import os
 import logging
 from pathlib import Path
 from datetime import datetime
-import psycopg2
 import numpy as np
 from dotenv import load_dotenv
 
@@ -26,6 +24,7 @@ from workflow.phase1_cv_scanning import (
     PersonCrop,
     IdentityArbiter
 )
+from workflow.db import encode_vector, get_db_config, get_pool
 
 # 加载环境变量
 load_dotenv()
@@ -38,17 +37,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_db_config():
-    """获取数据库配置"""
-    return {
-        'host': os.getenv('POSTGRES_HOST', 'localhost'),
-        'port': os.getenv('POSTGRES_PORT', '5432'),
-        'database': os.getenv('POSTGRES_DB', 'neweufy'),
-        'user': os.getenv('POSTGRES_USER', 'postgres'),
-        'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
-    }
-
-
 def find_faces_in_videos(max_videos=10):
     """
     从多个视频中寻找有正脸的帧，通过人脸匹配确认身份
@@ -88,12 +76,9 @@ def find_faces_in_videos(max_videos=10):
     # 获取所有家人ID
     db_config = get_db_config()
     try:
-        conn = psycopg2.connect(**db_config)
-        cur = conn.cursor()
-        cur.execute("SELECT id FROM persons WHERE role = 'owner' ORDER BY id")
-        all_family_ids = [row[0] for row in cur.fetchall()]
-        cur.close()
-        conn.close()
+        with get_pool(db_config).cursor() as cur:
+            cur.execute("SELECT id FROM persons WHERE role = 'owner' ORDER BY id")
+            all_family_ids = [row[0] for row in cur.fetchall()]
         logger.info(f"📋 需要为 {len(all_family_ids)} 个家人找到身体特征")
     except Exception as e:
         logger.error(f"❌ 无法获取家人列表: {e}")
@@ -178,6 +163,9 @@ def find_faces_in_videos(max_videos=10):
         if found_in_this_video:
             logger.info(f"   ✅ 在此视频中找到 {sum(1 for p in matched_persons.values() if p.get('video_path') == video_path)} 个匹配")
     
+    # 将仲裁过程中累积的身体缓存更新写回数据库
+    arbiter.flush_body_cache()
+    
     logger.info(f"\n✅ 通过人脸匹配找到 {len(matched_persons)} 个家人的身体特征")
     
     return matched_persons
@@ -197,12 +185,9 @@ def extract_backs_for_missing(matched_persons, max_videos=5):
     # 获取所有家人ID
     db_config = get_db_config()
     try:
-        conn = psycopg2.connect(**db_config)
-        cur = conn.cursor()
-        cur.execute("SELECT id FROM persons WHERE role = 'owner' ORDER BY id")
-        all_family_ids = [row[0] for row in cur.fetchall()]
-        cur.close()
-        conn.close()
+        with get_pool(db_config).cursor() as cur:
+            cur.execute("SELECT id FROM persons WHERE role = 'owner' ORDER BY id")
+            all_family_ids = [row[0] for row in cur.fetchall()]
     except Exception as e:
         logger.error(f"❌ 无法获取家人列表: {e}")
         return matched_persons
@@ -313,11 +298,11 @@ def save_to_database(matched_persons):
         logger.warning("⚠️  没有身体特征可保存")
         return
     
-    db_config = get_db_config()
+    pool = get_pool(get_db_config())
     
+    conn = None
     try:
-        conn = psycopg2.connect(**db_config)
-        conn.autocommit = False
+        conn = pool.getconn()
         cur = conn.cursor()
         
         logger.info("\n" + "=" * 60)
@@ -341,7 +326,7 @@ def save_to_database(matched_persons):
                 continue
             
             # 转换为字符串格式
-            body_vec_str = '[' + ','.join(map(str, body_vec)) + ']'
+            body_vec_str = encode_vector(body_vec)
             
             # 更新 current_body_embedding
             cur.execute("""
@@ -367,7 +352,6 @@ def save_to_database(matched_persons):
         
         conn.commit()
         cur.close()
-        conn.close()
         
         logger.info(f"\n✅ 成功保存 {saved_count} 个身体特征缓存")
         logger.info(f"   - 人脸匹配确认: {face_matched_count} 个")
@@ -381,7 +365,9 @@ def save_to_database(matched_persons):
         traceback.print_exc()
         if conn:
             conn.rollback()
-            conn.close()
+    finally:
+        if conn:
+            pool.putconn(conn)
 
 
 def main():
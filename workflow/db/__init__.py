@@ -0,0 +1,23 @@
+"""
+数据库公共模块
+各阶段共享的数据库基础设施（连接池、异步访问层、预编译语句、向量编解码等）
+"""
+
+from .connection_pool import ConnectionPool, get_db_config, get_session_settings, get_pool, close_all_pools
+from .async_pool import AsyncConnectionPool, get_async_pool
+from .prepared import PooledConnection, PreparedStatement
+from .vector_codec import encode_vector, decode_vector
+
+__all__ = [
+    'ConnectionPool',
+    'get_db_config',
+    'get_session_settings',
+    'get_pool',
+    'close_all_pools',
+    'AsyncConnectionPool',
+    'get_async_pool',
+    'PooledConnection',
+    'PreparedStatement',
+    'encode_vector',
+    'decode_vector',
+]
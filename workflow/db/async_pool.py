@@ -0,0 +1,79 @@
+"""
+异步数据库访问层 (Async Connection Pool)
+职责：为 asyncio 调用方提供协程接口，阻塞的 psycopg2 调用在与连接池等大的专用线程池中执行
+
+psycopg2 没有原生 asyncio 支持，这里复用同一个线程安全连接池：
+事件循环只负责调度，每个在途查询占用一个数据库线程和一个池化连接，
+因此同一进程可以同时服务多个用户查询，而不再需要一个查询一个进程。
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import logging
+
+from .connection_pool import ConnectionPool, get_db_config, get_pool
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncConnectionPool:
+    """ConnectionPool 的 asyncio 门面"""
+    
+    def __init__(self, pool: ConnectionPool, max_workers: Optional[int] = None):
+        """
+        Args:
+            pool: 共享的同步连接池
+            max_workers: 数据库线程数（默认等于连接池上限，线程不会因等待连接而空转）
+        """
+        self.pool = pool
+        self.max_workers = max_workers or pool.max_connections
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='db-async'
+        )
+        logger.debug(f"✅ 异步连接池初始化完成 (workers={self.max_workers})")
+    
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在数据库线程池中执行一个阻塞函数
+        
+        Args:
+            func: 阻塞函数（通常是同步 DAO / 引擎的方法）
+            *args, **kwargs: 传给 func 的参数
+        
+        Returns:
+            func 的返回值
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    def close(self):
+        """关闭数据库线程池（不关闭底层连接池）"""
+        self._executor.shutdown(wait=False)
+
+
+_async_pools: Dict[ConnectionPool, AsyncConnectionPool] = {}
+_async_pools_lock = threading.Lock()
+
+
+def get_async_pool(db_config: Optional[Dict[str, str]] = None) -> AsyncConnectionPool:
+    """
+    获取共享异步连接池（与 get_pool 返回的同步连接池一一对应）
+    
+    Args:
+        db_config: 数据库配置（如果为None，从环境变量读取）
+    
+    Returns:
+        AsyncConnectionPool 实例
+    """
+    pool = get_pool(db_config or get_db_config())
+    
+    with _async_pools_lock:
+        async_pool = _async_pools.get(pool)
+        if async_pool is None:
+            async_pool = AsyncConnectionPool(pool)
+            _async_pools[pool] = async_pool
+        return async_pool
@@ -0,0 +1,259 @@
+"""
+数据库连接池 (Connection Pool)
+职责：统一数据库配置，提供各阶段共享的线程安全连接池（上限控制、健康检查、语句超时）
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from dotenv import load_dotenv
+import logging
+
+from .prepared import PooledConnection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def get_session_settings() -> Dict[str, str]:
+    """
+    从环境变量获取会话级规划器参数（建立连接时通过 options 下发，对池中所有连接生效）
+    
+    - hnsw.ef_search: HNSW 索引（person_faces.embedding）的候选集大小
+    - ivfflat.probes: IVFFlat 索引（event_appearances.body_embedding）的探测列表数
+    - jit: 向量距离的代价估计很高，容易触发 JIT 编译，而热点查询都是毫秒级，关闭 JIT
+    """
+    return {
+        'hnsw.ef_search': os.getenv('POSTGRES_HNSW_EF_SEARCH', '40'),
+        'ivfflat.probes': os.getenv('POSTGRES_IVFFLAT_PROBES', '10'),
+        'jit': os.getenv('POSTGRES_JIT', 'off'),
+    }
+
+
+def get_db_config() -> Dict[str, str]:
+    """从环境变量获取数据库配置"""
+    return {
+        'host': os.getenv('POSTGRES_HOST', 'localhost'),
+        'port': os.getenv('POSTGRES_PORT', '5432'),
+        'database': os.getenv('POSTGRES_DB', 'neweufy'),
+        'user': os.getenv('POSTGRES_USER', 'postgres'),
+        'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
+    }
+
+
+class ConnectionPool:
+    """线程安全的 PostgreSQL 连接池"""
+    
+    def __init__(self,
+                 db_config: Optional[Dict[str, str]] = None,
+                 min_connections: Optional[int] = None,
+                 max_connections: Optional[int] = None,
+                 statement_timeout_ms: Optional[int] = None,
+                 health_check_interval: Optional[float] = None,
+                 session_settings: Optional[Dict[str, str]] = None,
+                 connection_factory=PooledConnection):
+        """
+        初始化连接池（连接按需建立，不在构造时连接数据库）
+        
+        Args:
+            db_config: 数据库配置（如果为None，从环境变量读取）
+            min_connections: 池中保留的最小空闲连接数（POSTGRES_POOL_MIN，默认1）
+            max_connections: 最大连接数，超过时调用方阻塞等待（POSTGRES_POOL_MAX，默认10）
+            statement_timeout_ms: 单条语句超时（毫秒），0 表示不限（POSTGRES_STATEMENT_TIMEOUT_MS，默认30000）
+            health_check_interval: 连接空闲超过该秒数后，借出前先执行 SELECT 1 检查（POSTGRES_POOL_HEALTH_CHECK，默认30）
+            session_settings: 会话级参数（如果为None，使用 get_session_settings()）
+            connection_factory: psycopg2 connection 子类，默认 PooledConnection（支持预编译语句）
+        """
+        self.db_config = db_config or get_db_config()
+        self.min_connections = min_connections if min_connections is not None else int(os.getenv('POSTGRES_POOL_MIN', '1'))
+        self.max_connections = max_connections if max_connections is not None else int(os.getenv('POSTGRES_POOL_MAX', '10'))
+        self.statement_timeout_ms = (statement_timeout_ms if statement_timeout_ms is not None
+                                     else int(os.getenv('POSTGRES_STATEMENT_TIMEOUT_MS', '30000')))
+        self.health_check_interval = (health_check_interval if health_check_interval is not None
+                                      else float(os.getenv('POSTGRES_POOL_HEALTH_CHECK', '30')))
+        self.session_settings = session_settings if session_settings is not None else get_session_settings()
+        self.connection_factory = connection_factory
+        
+        self._pool: Optional[pg_pool.ThreadedConnectionPool] = None
+        self._init_lock = threading.Lock()
+        # ThreadedConnectionPool 在连接耗尽时直接抛错，这里用信号量让调用方排队等待
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._last_used: Dict[int, float] = {}
+        
+        logger.debug(f"✅ 连接池配置完成: {self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']} "
+                     f"(min={self.min_connections}, max={self.max_connections}, "
+                     f"statement_timeout={self.statement_timeout_ms}ms)")
+    
+    def _get_pool(self) -> pg_pool.ThreadedConnectionPool:
+        """懒加载底层连接池"""
+        if self._pool is None:
+            with self._init_lock:
+                if self._pool is None:
+                    connect_kwargs = dict(self.db_config)
+                    settings = dict(self.session_settings)
+                    if self.statement_timeout_ms:
+                        settings['statement_timeout'] = str(self.statement_timeout_ms)
+                    if settings:
+                        connect_kwargs['options'] = ' '.join(f"-c {k}={v}" for k, v in settings.items())
+                    if self.connection_factory is not None:
+                        connect_kwargs['connection_factory'] = self.connection_factory
+                    self._pool = pg_pool.ThreadedConnectionPool(
+                        self.min_connections, self.max_connections, **connect_kwargs
+                    )
+                    logger.info(f"✅ 数据库连接池已创建 (min={self.min_connections}, max={self.max_connections})")
+        return self._pool
+    
+    def _is_healthy(self, conn) -> bool:
+        """检查连接是否可用（仅对空闲较久的连接执行 SELECT 1）"""
+        if conn.closed:
+            return False
+        
+        last_used = self._last_used.get(id(conn), 0.0)
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def getconn(self):
+        """
+        借出一个健康的连接（连接池耗尽时阻塞等待）
+        
+        Returns:
+            psycopg2 连接对象，使用完毕必须调用 putconn 归还
+        """
+        self._slots.acquire()
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                logger.warning("⚠️  检测到失效的数据库连接，重新建立")
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def putconn(self, conn, close: bool = False):
+        """
+        归还连接（未结束的事务会被回滚，避免把脏状态留给下一个使用者）
+        
+        Args:
+            conn: 借出的连接
+            close: 是否直接关闭该连接而不放回池中
+        """
+        try:
+            if not close and not conn.closed:
+                try:
+                    if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    if conn.autocommit:
+                        conn.autocommit = False
+                except psycopg2.Error:
+                    close = True
+            
+            if close or conn.closed:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            
+            self._get_pool().putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+    
+    @contextmanager
+    def connection(self):
+        """
+        借出连接的上下文管理器（不自动提交，调用方自行 commit）
+        
+        用法：
+            with pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute(...)
+                conn.commit()
+        """
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+    
+    @contextmanager
+    def cursor(self, commit: bool = False):
+        """
+        借出游标的上下文管理器
+        
+        Args:
+            commit: 为 True 时，正常退出后自动提交；异常时回滚
+        """
+        with self.connection() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+                if commit:
+                    conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                cur.close()
+    
+    def closeall(self):
+        """关闭池中所有连接"""
+        with self._init_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._last_used.clear()
+                logger.info("🔵 数据库连接池已关闭")
+
+
+_pools: Dict[Tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_config: Optional[Dict[str, str]] = None) -> ConnectionPool:
+    """
+    获取共享连接池（相同数据库配置的所有模块共用同一个池）
+    
+    Args:
+        db_config: 数据库配置（如果为None，从环境变量读取）
+    
+    Returns:
+        ConnectionPool 实例
+    """
+    config = db_config or get_db_config()
+    key = tuple(sorted((k, str(v)) for k, v in config.items()))
+    
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(config)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """关闭所有共享连接池（进程退出前调用）"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
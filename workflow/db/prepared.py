@@ -0,0 +1,93 @@
+"""
+服务端预编译语句 (Prepared Statements)
+职责：热点 SQL 在每个池化连接上只 PREPARE 一次，之后通过 EXECUTE 复用执行计划
+"""
+
+import re
+from typing import Any, Iterable, Sequence
+import psycopg2.extensions
+from psycopg2.extras import execute_batch
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """连接池使用的连接类型，记录本会话中已 PREPARE 的语句名"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+class PreparedStatement:
+    """
+    服务端预编译语句
+    
+    SQL 中使用 $1, $2 ... 作为参数占位符，param_types 给出每个参数的 PostgreSQL 类型。
+    同一连接上首次执行时发送 PREPARE，之后只发送 EXECUTE；PREPARE 是会话级的，
+    不受事务回滚影响，连接被关闭重建后会自动重新 PREPARE。
+    """
+    
+    def __init__(self, name: str, sql: str, param_types: Sequence[str]):
+        """
+        Args:
+            name: 语句名（同一连接内唯一）
+            sql: 使用 $n 占位符的 SQL
+            param_types: 参数类型列表，如 ['vector', 'double precision']
+        """
+        self.name = name
+        self.sql = sql
+        self.param_types = tuple(param_types)
+        
+        type_list = f" ({', '.join(self.param_types)})" if self.param_types else ""
+        self._prepare_sql = f"PREPARE {name}{type_list} AS {sql}"
+        placeholders = ', '.join(['%s'] * len(self.param_types))
+        self._execute_sql = f"EXECUTE {name} ({placeholders})" if self.param_types else f"EXECUTE {name}"
+        
+        # 非池化连接（没有 prepared_statements 属性）时退回普通参数化查询
+        self._fallback_sql = re.sub(
+            r'\$(\d+)',
+            lambda m: f"%({m.group(1)})s::{self.param_types[int(m.group(1)) - 1]}",
+            sql.replace('%', '%%')
+        )
+    
+    def _ensure_prepared(self, cursor) -> bool:
+        """确保语句已在当前连接上 PREPARE，返回是否可以使用 EXECUTE"""
+        prepared = getattr(cursor.connection, 'prepared_statements', None)
+        if prepared is None:
+            return False
+        if self.name not in prepared:
+            cursor.execute(self._prepare_sql)
+            prepared.add(self.name)
+            logger.debug(f"📦 PREPARE {self.name}")
+        return True
+    
+    def execute(self, cursor, params: Sequence[Any] = ()):
+        """
+        执行语句（结果通过 cursor.fetchone / fetchall 读取）
+        
+        Args:
+            cursor: 数据库游标
+            params: 按 $1, $2 ... 顺序排列的参数
+        """
+        if self._ensure_prepared(cursor):
+            cursor.execute(self._execute_sql, tuple(params))
+        else:
+            cursor.execute(self._fallback_sql, {str(i + 1): v for i, v in enumerate(params)})
+    
+    def execute_batch(self, cursor, params_list: Iterable[Sequence[Any]], page_size: int = 100):
+        """
+        批量执行语句（多条 EXECUTE 合并为一次网络往返）
+        
+        Args:
+            cursor: 数据库游标
+            params_list: 参数序列的列表
+            page_size: 每次往返合并的语句数
+        """
+        if self._ensure_prepared(cursor):
+            execute_batch(cursor, self._execute_sql, [tuple(p) for p in params_list], page_size=page_size)
+        else:
+            execute_batch(cursor, self._fallback_sql,
+                          [{str(i + 1): v for i, v in enumerate(p)} for p in params_list],
+                          page_size=page_size)
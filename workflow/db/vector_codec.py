@@ -0,0 +1,66 @@
+"""
+向量编解码器 (Vector Codec)
+职责：NumPy 向量与 pgvector 文本格式之间的快速互转，所有跨数据库边界的向量都经过这里
+"""
+
+from functools import lru_cache
+from typing import Union, List, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 9 位有效数字可以无损还原任意 float32（7 位会丢失末位），更多位数只会增加传输字节数
+DEFAULT_PRECISION = 9
+
+
+@lru_cache(maxsize=16)
+def _format_template(dim: int, precision: int) -> str:
+    """按维度缓存格式模板，例如 '[%.9g,%.9g,...]'"""
+    return '[' + ','.join([f'%.{precision}g'] * dim) + ']'
+
+
+def encode_vector(vector: Union[np.ndarray, List[float]],
+                  expected_dim: Optional[int] = None,
+                  precision: int = DEFAULT_PRECISION) -> str:
+    """
+    将向量编码为 pgvector 文本格式 '[0.12,-0.5,0.8,...]'
+    
+    使用按维度缓存的格式模板一次性格式化（C 层完成），
+    避免逐元素 str() 转换，并按 float32 无损往返所需的位数输出以减少传输字节数。
+    
+    Args:
+        vector: NumPy 数组或 Python 列表
+        expected_dim: 期望的维度（用于验证）
+        precision: 有效数字位数
+    
+    Returns:
+        pgvector 格式的字符串
+    
+    Raises:
+        ValueError: 如果向量维度不匹配
+    """
+    values = np.asarray(vector, dtype=np.float32).ravel()
+    
+    dim = values.shape[0]
+    if expected_dim is not None and dim != expected_dim:
+        raise ValueError(f"向量维度不匹配: 期望 {expected_dim}, 实际 {dim}")
+    
+    return _format_template(dim, precision) % tuple(values.tolist())
+
+
+def decode_vector(text: Optional[str]) -> Optional[np.ndarray]:
+    """
+    将 pgvector 文本格式解码为 float32 NumPy 数组
+    
+    Args:
+        text: pgvector 返回的字符串，例如 '[0.12,-0.5,0.8]'
+    
+    Returns:
+        NumPy 数组，如果输入为 None 则返回 None
+    """
+    if text is None:
+        return None
+    if isinstance(text, np.ndarray):
+        return text.astype(np.float32, copy=False)
+    return np.fromstring(text.strip()[1:-1], sep=',', dtype=np.float32)
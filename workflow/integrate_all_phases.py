@@ -4,6 +4,7 @@ Phase 1 + Phase 2 + Phase 3 + Phase 4 + Phase 5 + Phase 6 完整集成测试
 展示完整的处理流程：视频处理 → 事件融合 → LLM 生成日志 → 数据库持久化 → 每日总结生成 → 用户检索
 """
 
+import os
 import sys
 import logging
 from pathlib import Path
@@ -20,6 +21,7 @@ from workflow import (
     Daily_Summary_Pipeline,
     User_Retrieval_Pipeline
 )
+from workflow.phase3_agent_interaction import default_telemetry
 
 # 配置日志
 logging.basicConfig(
@@ -155,6 +157,30 @@ def main():
     logger.info("   Phase 6: 用户问题 → 数据库检索 → RAG 回答")
 
 
+def report_llm_telemetry():
+    """
+    输出本次运行各阶段的 LLM 调用报告（token、延迟、重试、缓存命中、费用估算）
+    
+    设置环境变量 LLM_TELEMETRY_PATH 时，同时导出 JSON（含单次调用记录）和同名 .prom 的 Prometheus 文本
+    """
+    logger.info("\n" + "=" * 60)
+    default_telemetry.log_report()
+    
+    json_path = os.getenv('LLM_TELEMETRY_PATH')
+    if json_path:
+        prom_path = os.path.splitext(json_path)[0] + '.prom'
+        try:
+            default_telemetry.to_json(json_path, include_calls=True)
+            default_telemetry.to_prometheus(prom_path)
+            logger.info(f"📊 LLM 遥测已导出: {json_path}, {prom_path}")
+        except OSError as e:
+            logger.error(f"❌ LLM 遥测导出失败: {e}")
+
+
 if __name__ == '__main__':
-    main()
+    try:
+        main()
+    finally:
+        # 中途失败时也输出已发生的 LLM 调用
+        report_llm_telemetry()
 
@@ -3,16 +3,16 @@ Phase 0: 系统初始化 (Initialization)
 职责：建立"认知基准"，加载家人底库并注册到数据库
 """
 
-import os
 import cv2
 import numpy as np
-import psycopg2
 from pathlib import Path
 from typing import Dict, Optional
 from dotenv import load_dotenv
 from insightface.app import FaceAnalysis
 import logging
 
+from .db import encode_vector, get_db_config, get_pool
+
 logger = logging.getLogger(__name__)
 
 # 加载环境变量
@@ -134,13 +134,8 @@ class RegistryManager:
     
     def __init__(self):
         """初始化注册管理器"""
-        self.db_config = {
-            'host': os.getenv('POSTGRES_HOST', 'localhost'),
-            'port': os.getenv('POSTGRES_PORT', '5432'),
-            'database': os.getenv('POSTGRES_DB', 'neweufy'),
-            'user': os.getenv('POSTGRES_USER', 'postgres'),
-            'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
-        }
+        self.db_config = get_db_config()
+        self.pool = get_pool(self.db_config)
         logger.info("✅ 注册管理器初始化完成")
     
     def register_family(self, lib_dict: Dict[str, np.ndarray], lib_path: str):
@@ -158,62 +153,56 @@ class RegistryManager:
         logger.info(f"📝 开始注册 {len(lib_dict)} 个家人到底库...")
         
         try:
-            conn = psycopg2.connect(**self.db_config)
-            conn.autocommit = False  # 使用事务
-            
-            cur = conn.cursor()
-            
-            registered_count = 0
-            skipped_count = 0
-            
-            for img_id, face_emb in lib_dict.items():
-                # 1. 检查 persons 表中是否已存在
-                cur.execute("""
-                    SELECT id FROM persons 
-                    WHERE name = %s AND role = 'owner'
-                """, (f"Family_{img_id}",))
-                
-                existing = cur.fetchone()
+            # 使用事务：全部写入成功后统一提交，失败自动回滚
+            with self.pool.cursor(commit=True) as cur:
+                registered_count = 0
+                skipped_count = 0
                 
-                if existing:
-                    person_id = existing[0]
-                    logger.info(f"  ℹ️  家人已存在: Family_{img_id} (ID: {person_id})")
-                else:
-                    # 2. 在 persons 表中创建记录：role='owner'
+                for img_id, face_emb in lib_dict.items():
+                    # 1. 检查 persons 表中是否已存在
                     cur.execute("""
-                        INSERT INTO persons (name, role, first_seen, last_seen)
-                        VALUES (%s, 'owner', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                        RETURNING id
+                        SELECT id FROM persons 
+                        WHERE name = %s AND role = 'owner'
                     """, (f"Family_{img_id}",))
                     
-                    person_id = cur.fetchone()[0]
-                    logger.info(f"  ✅ 创建家人记录: Family_{img_id} (ID: {person_id})")
-                    registered_count += 1
-                
-                # 3. 检查 person_faces 表中是否已存在
-                source_image = f"lib/{img_id}.jpeg"  # 假设是 .jpeg 格式
-                cur.execute("""
-                    SELECT id FROM person_faces 
-                    WHERE person_id = %s AND source_image = %s
-                """, (person_id, source_image))
-                
-                if cur.fetchone():
-                    logger.debug(f"  ℹ️  人脸特征已存在: {source_image}")
-                    skipped_count += 1
-                else:
-                    # 4. 在 person_faces 表中存入向量
-                    face_emb_str = '[' + ','.join(map(str, face_emb)) + ']'
+                    existing = cur.fetchone()
+                    
+                    if existing:
+                        person_id = existing[0]
+                        logger.info(f"  ℹ️  家人已存在: Family_{img_id} (ID: {person_id})")
+                    else:
+                        # 2. 在 persons 表中创建记录：role='owner'
+                        cur.execute("""
+                            INSERT INTO persons (name, role, first_seen, last_seen)
+                            VALUES (%s, 'owner', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                            RETURNING id
+                        """, (f"Family_{img_id}",))
+                        
+                        person_id = cur.fetchone()[0]
+                        logger.info(f"  ✅ 创建家人记录: Family_{img_id} (ID: {person_id})")
+                        registered_count += 1
                     
+                    # 3. 检查 person_faces 表中是否已存在
+                    source_image = f"lib/{img_id}.jpeg"  # 假设是 .jpeg 格式
                     cur.execute("""
-                        INSERT INTO person_faces (person_id, embedding, source_image)
-                        VALUES (%s, %s::vector, %s)
-                    """, (person_id, face_emb_str, source_image))
+                        SELECT id FROM person_faces 
+                        WHERE person_id = %s AND source_image = %s
+                    """, (person_id, source_image))
                     
-                    logger.info(f"  ✅ 存入人脸特征: {source_image} (Person ID: {person_id})")
-            
-            conn.commit()
-            cur.close()
-            conn.close()
+                    if cur.fetchone():
+                        logger.debug(f"  ℹ️  人脸特征已存在: {source_image}")
+                        skipped_count += 1
+                    else:
+                        # 4. 在 person_faces 表中存入向量
+                        face_emb_str = encode_vector(face_emb)
+                        
+                        cur.execute("""
+                            INSERT INTO person_faces (person_id, embedding, source_image)
+                            VALUES (%s, %s::vector, %s)
+                        """, (person_id, face_emb_str, source_image))
+                        
+                        logger.info(f"  ✅ 存入人脸特征: {source_image} (Person ID: {person_id})")
+                
             
             logger.info(f"\n✅ 注册完成:")
             logger.info(f"   - 新建家人记录: {registered_count}")
@@ -222,9 +211,6 @@ class RegistryManager:
             
         except Exception as e:
             logger.error(f"❌ 注册失败: {e}")
-            if conn:
-                conn.rollback()
-                conn.close()
             raise
 
 
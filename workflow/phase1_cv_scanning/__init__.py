@@ -8,7 +8,9 @@ from .frame_sampler import FrameSampler
 from .yolo_detector import YoloDetector, PersonCrop
 from .feature_encoder import FeatureEncoder
 from .identity_arbiter import IdentityArbiter
+from .body_cache_writer import BodyCacheWriter
 from .result_buffer import ResultBuffer
+from .keyframe_store import KeyframeStore
 from .simple_tracker import SimpleTracker, TrackedPerson
 from .cv_pipeline import CV_Pipeline
 
@@ -19,7 +21,9 @@ __all__ = [
     'PersonCrop',
     'FeatureEncoder',
     'IdentityArbiter',
+    'BodyCacheWriter',
     'ResultBuffer',
+    'KeyframeStore',
     'SimpleTracker',
     'TrackedPerson',
     'CV_Pipeline',
@@ -0,0 +1,166 @@
+"""
+模块 5.1: 身体特征缓存回写器 (Body Cache Write-Behind Buffer)
+职责：合并每个人物的 current_body_embedding 更新，批量写回数据库
+"""
+
+import threading
+import time
+import numpy as np
+from typing import Dict, Optional, Tuple
+from datetime import datetime
+import logging
+
+from ..db import ConnectionPool, PreparedStatement, encode_vector
+
+logger = logging.getLogger(__name__)
+
+
+# 每个池化连接只 PREPARE 一次；一次 flush 的多条 EXECUTE 合并为一次网络往返
+BODY_UPDATE_STMT = PreparedStatement('arbiter_body_update', """
+    UPDATE persons
+    SET current_body_embedding = $2,
+        body_update_time = $3,
+        last_seen = $3
+    WHERE id = $1
+""", ['integer', 'vector', 'timestamp'])
+
+
+class BodyCacheWriter:
+    """身体特征缓存回写器（Write-Behind）"""
+    
+    def __init__(self,
+                 pool: ConnectionPool,
+                 flush_every: int = 50,
+                 flush_interval: float = 5.0):
+        """
+        初始化回写器
+        
+        Args:
+            pool: 共享数据库连接池
+            flush_every: 每累计 N 次更新请求触发一次批量写入
+            flush_interval: 距离上次写入超过 T 秒时触发批量写入
+        """
+        self.pool = pool
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        
+        # {person_id: (body_vec, timestamp, name, role)}，同一人物只保留时间戳最新的一条；
+        # name / role 来自 persons 表，缓存命中时返回与数据库查询相同的身份
+        self.pending: Dict[int, Tuple[np.ndarray, datetime, Optional[str], Optional[str]]] = {}
+        self.pending_requests = 0
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.stats = {
+            'requests': 0,
+            'flushes': 0,
+            'rows_written': 0
+        }
+        
+        logger.debug(f"初始化身体缓存回写器: flush_every={flush_every}, flush_interval={flush_interval}s")
+    
+    def add(self, person_id: int, body_vec: np.ndarray, timestamp: datetime,
+            name: Optional[str] = None, role: Optional[str] = None):
+        """
+        登记一次缓存更新（不立即写库）
+        
+        Args:
+            person_id: 人物ID
+            body_vec: 身体特征向量
+            timestamp: 检测时间戳
+            name: 人物名称（persons.name）
+            role: 人物角色（persons.role）
+        """
+        with self._lock:
+            existing = self.pending.get(person_id)
+            if existing is None or timestamp >= existing[1]:
+                self.pending[person_id] = (body_vec, timestamp, name, role)
+            
+            self.pending_requests += 1
+            self.stats['requests'] += 1
+            
+            should_flush = (self.pending_requests >= self.flush_every or
+                            time.monotonic() - self.last_flush >= self.flush_interval)
+        
+        if should_flush:
+            self.flush()
+    
+    def best_match(self, body_vec: np.ndarray, min_similarity: float,
+                   max_similarity: Optional[float] = None,
+                   role: Optional[str] = None) -> Optional[Tuple[int, str, str, float]]:
+        """
+        在尚未写库的缓存中查找最相似的人物（保证同一 Clip 内读到最新的缓存）
+        
+        Args:
+            body_vec: 身体特征向量
+            min_similarity: 相似度下限（不含）
+            max_similarity: 相似度上限（含），None 表示不限
+            role: 只匹配该角色的人物（与数据库查询的 role 条件一致），None 表示不限
+        
+        Returns:
+            (person_id, name, role, similarity)（与数据库查询结果的列顺序一致）或 None
+        """
+        with self._lock:
+            entries = [(pid, entry) for pid, entry in self.pending.items()
+                       if role is None or entry[3] == role]
+            if not entries:
+                return None
+            matrix = np.stack([entry[0] for _, entry in entries]).astype(np.float32)
+        
+        query = np.asarray(body_vec, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) + 1e-8) + 1e-8
+        similarities = matrix @ query / norms
+        
+        mask = similarities > min_similarity
+        if max_similarity is not None:
+            mask &= similarities <= max_similarity
+        if not mask.any():
+            return None
+        
+        candidates = np.where(mask)[0]
+        best = candidates[np.argmax(similarities[candidates])]
+        person_id, (_, _, name, person_role) = entries[best]
+        return person_id, name or f"Person_{person_id}", person_role, float(similarities[best])
+    
+    def flush(self) -> int:
+        """
+        将缓冲区中的所有更新通过预编译的 UPDATE 语句批量写回数据库
+        
+        Returns:
+            写入的行数（失败时返回 0，未写入的更新保留到下次）
+        """
+        with self._lock:
+            if not self.pending:
+                self.pending_requests = 0
+                self.last_flush = time.monotonic()
+                return 0
+            batch = self.pending
+            self.pending = {}
+            self.pending_requests = 0
+            self.last_flush = time.monotonic()
+        
+        rows = [
+            (person_id, encode_vector(entry[0]), entry[1])
+            for person_id, entry in batch.items()
+        ]
+        
+        try:
+            with self.pool.cursor(commit=True) as cur:
+                BODY_UPDATE_STMT.execute_batch(cur, rows, page_size=self.flush_every)
+            
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += len(rows)
+            logger.debug(f"✅ 批量更新身体缓存: {len(rows)} 个人物")
+            
+            return len(rows)
+        
+        except Exception as e:
+            logger.error(f"❌ 批量更新身体缓存失败: {e}")
+            # 放回缓冲区（保留更新的那一条），等待下次写入
+            with self._lock:
+                for person_id, entry in batch.items():
+                    existing = self.pending.get(person_id)
+                    if existing is None or entry[1] > existing[1]:
+                        self.pending[person_id] = entry
+            return 0
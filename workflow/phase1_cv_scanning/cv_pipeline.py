@@ -13,6 +13,7 @@ from .yolo_detector import YoloDetector
 from .feature_encoder import FeatureEncoder
 from .identity_arbiter import IdentityArbiter
 from .result_buffer import ResultBuffer
+from .keyframe_store import KeyframeStore
 from .simple_tracker import SimpleTracker
 
 logger = logging.getLogger(__name__)
@@ -30,7 +31,8 @@ class CV_Pipeline:
                  enable_tracking: bool = True,
                  iou_threshold: float = 0.7,
                  revalidate_interval: int = 5,
-                 max_age: int = 3):
+                 max_age: int = 3,
+                 keyframe_dir: Optional[str] = '/tmp/eufy_keyframes'):
         """
         初始化 CV Pipeline
         
@@ -44,6 +46,7 @@ class CV_Pipeline:
             iou_threshold: IoU 阈值，用于判断是否是同一个人
             revalidate_interval: 重新验证间隔（帧数），每 N 帧重新检测一次
             max_age: 跟踪最大年龄（帧数），超过此值未匹配则清除
+            keyframe_dir: Keyframe 裁剪图存储目录，None 表示不保存（后续阶段需要图片时只能重新解码视频）
         """
         logger.info("=" * 60)
         logger.info("初始化 CV Pipeline (第一阶段)")
@@ -56,6 +59,7 @@ class CV_Pipeline:
         self.encoder = FeatureEncoder(face_model_name, reid_model_name)  # 模块 4
         self.arbiter = IdentityArbiter()                                  # 模块 5
         self.buffer = ResultBuffer()                                       # 模块 6
+        self.keyframe_store = KeyframeStore(keyframe_dir) if keyframe_dir else None  # 模块 6.5
         
         # 初始化跟踪器（用于优化：跳过重复检测）
         self.enable_tracking = enable_tracking
@@ -172,7 +176,7 @@ class CV_Pipeline:
                     vectors = self.encoder.extract(crop)
                     
                     # 5. Arbitrate (Crucial Logic): 识别身份
-                    # 注意：这里面包含了 update_db_cache 的副作用
+                    # 注意：这里面包含了 update_db_cache 的副作用（写入回写缓冲区，Clip 结束时批量落库）
                     identity = self.arbiter.identify(vectors, timestamp)
                     
                     # 更新或创建跟踪
@@ -214,6 +218,9 @@ class CV_Pipeline:
             if self.tracker:
                 self.tracker.cleanup(frame_idx)
         
+        # Clip 结束：将本 Clip 累积的身体缓存更新批量写回数据库
+        self.arbiter.flush_body_cache()
+        
         # 6. Buffer: 创建 Clip_Obj（包含视频时长和路径）
         clip_obj = self.buffer.create_clip_obj(
             timestamp, 
@@ -223,6 +230,11 @@ class CV_Pipeline:
             video_path=video_path
         )
         
+        # 6.5. Keyframe: 趁帧还在内存中，保存每个人物最佳检测的裁剪图
+        if self.keyframe_store:
+            saved = self.keyframe_store.save_clip_keyframes(frames, clip_obj)
+            logger.debug(f"   🖼️  保存 Keyframe 裁剪图: {saved} 张")
+        
         # 输出统计信息
         skip_ratio = (stats['skipped_detections'] / stats['total_detections'] * 100 
                      if stats['total_detections'] > 0 else 0)
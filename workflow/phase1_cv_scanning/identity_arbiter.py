@@ -3,18 +3,59 @@
 职责：决定这个人是谁（最复杂的逻辑部分）
 """
 
-import os
-import psycopg2
 import numpy as np
 from typing import Dict, Optional, Tuple
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 import logging
 
+from .body_cache_writer import BodyCacheWriter
+from ..db import PreparedStatement, encode_vector, get_db_config, get_pool
+
 logger = logging.getLogger(__name__)
 
-# 加载环境变量
-load_dotenv()
+
+# 热点匹配查询：每个池化连接只 PREPARE 一次，之后每帧只发送 EXECUTE
+# 查询向量只绑定一次；先按距离取最近邻（人脸可走 HNSW 索引），再在外层做阈值过滤
+FACE_MATCH_STMT = PreparedStatement('arbiter_face_match', """
+    SELECT person_id, name, role, 1 - distance AS similarity
+    FROM (
+        SELECT pf.person_id, p.name, p.role, pf.embedding <=> $1 AS distance
+        FROM person_faces pf
+        JOIN persons p ON pf.person_id = p.id
+        ORDER BY pf.embedding <=> $1
+        LIMIT 1
+    ) nearest
+    WHERE distance < 1 - $2
+""", ['vector', 'double precision'])
+
+BODY_MATCH_STMT = PreparedStatement('arbiter_body_match', """
+    SELECT id, name, role, 1 - distance AS similarity
+    FROM (
+        SELECT id, name, role, current_body_embedding <=> $1 AS distance
+        FROM persons
+        WHERE role = 'owner'
+          AND current_body_embedding IS NOT NULL
+          AND body_update_time >= $2
+        ORDER BY distance
+        LIMIT 1
+    ) nearest
+    WHERE distance < 1 - $3
+""", ['vector', 'timestamp', 'double precision'])
+
+SOFT_MATCH_STMT = PreparedStatement('arbiter_soft_match', """
+    SELECT id, name, role, 1 - distance AS similarity
+    FROM (
+        SELECT id, name, role, current_body_embedding <=> $1 AS distance
+        FROM persons
+        WHERE role = 'owner'
+          AND current_body_embedding IS NOT NULL
+          AND body_update_time >= $2
+    ) candidates
+    WHERE distance < 1 - $3
+      AND distance >= 1 - $4
+    ORDER BY distance
+    LIMIT 1
+""", ['vector', 'timestamp', 'double precision', 'double precision'])
 
 
 class IdentityArbiter:
@@ -23,7 +64,9 @@ class IdentityArbiter:
     def __init__(self, 
                  face_threshold: float = 0.65,  # 提高阈值以减少误判（快递员等陌生人不应被误判为家人）
                  body_threshold: float = 0.60,  # 提高阈值以减少误判，但仍允许侧脸/背影匹配
-                 soft_match_threshold: float = 0.55):  # 软匹配阈值（用于标记疑似家人）
+                 soft_match_threshold: float = 0.55,  # 软匹配阈值（用于标记疑似家人）
+                 cache_flush_every: int = 50,
+                 cache_flush_interval: float = 5.0):
         """
         初始化身份仲裁器
         
@@ -31,20 +74,24 @@ class IdentityArbiter:
             face_threshold: 人脸匹配阈值（余弦相似度），默认0.65（提高以减少误判）
             body_threshold: 身体匹配阈值（余弦相似度），默认0.60（提高以减少误判，但仍允许侧脸/背影匹配）
             soft_match_threshold: 软匹配阈值，默认0.55（用于标记疑似家人）
+            cache_flush_every: 身体缓存每累计 N 次更新批量写库一次
+            cache_flush_interval: 身体缓存距上次写库超过 T 秒时批量写库
         """
-        self.db_config = {
-            'host': os.getenv('POSTGRES_HOST', 'localhost'),
-            'port': os.getenv('POSTGRES_PORT', '5432'),
-            'database': os.getenv('POSTGRES_DB', 'neweufy'),
-            'user': os.getenv('POSTGRES_USER', 'postgres'),
-            'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
-        }
+        self.db_config = get_db_config()
+        self.pool = get_pool(self.db_config)
         
         # 相似度阈值
         self.face_threshold = face_threshold
         self.body_threshold = body_threshold
         self.soft_match_threshold = soft_match_threshold  # 软匹配阈值
         
+        # 身体缓存回写器：合并同一人物的更新，批量写库（替代每次检测一次事务）
+        self.body_cache = BodyCacheWriter(
+            self.pool,
+            flush_every=cache_flush_every,
+            flush_interval=cache_flush_interval
+        )
+        
         logger.info(f"✅ 身份仲裁器初始化完成 (face_threshold={face_threshold}, body_threshold={body_threshold}, soft_match_threshold={soft_match_threshold})")
     
     def identify(self, vectors: Dict, timestamp: datetime) -> Dict:
@@ -113,41 +160,24 @@ class IdentityArbiter:
             身份信息或 None
         """
         try:
-            conn = psycopg2.connect(**self.db_config)
-            cur = conn.cursor()
-            
             # 在 person_faces 表中搜索最相似的人脸
             # 使用余弦相似度搜索
-            face_vec_str = '[' + ','.join(map(str, face_vec)) + ']'
-            
-            cur.execute("""
-                SELECT 
-                    pf.person_id,
-                    p.name,
-                    p.role,
-                    1 - (pf.embedding <=> %s::vector) as similarity
-                FROM person_faces pf
-                JOIN persons p ON pf.person_id = p.id
-                WHERE 1 - (pf.embedding <=> %s::vector) > %s
-                ORDER BY pf.embedding <=> %s::vector
-                LIMIT 1
-            """, (face_vec_str, face_vec_str, self.face_threshold, face_vec_str))
+            face_vec_str = encode_vector(face_vec)
             
-            result = cur.fetchone()
+            with self.pool.cursor() as cur:
+                FACE_MATCH_STMT.execute(cur, (face_vec_str, self.face_threshold))
+                
+                result = cur.fetchone()
             
             if result:
                 person_id, name, role, similarity = result
                 
-                # 【关键】立即更新该 ID 在 DB 中的 current_body_embedding
+                # 【关键】更新该 ID 的 current_body_embedding（写入回写缓冲区，批量落库）
                 if body_vec is not None:
-                    self._update_body_cache(person_id, body_vec, timestamp, cur)
-                    conn.commit()
+                    self._update_body_cache(person_id, body_vec, timestamp, name, role)
                 
                 logger.info(f"✅ 人脸匹配成功: {name} (ID: {person_id}, 相似度: {similarity:.3f})")
                 
-                cur.close()
-                conn.close()
-                
                 result = {
                     'person_id': person_id,
                     'role': 'family' if role == 'owner' else role,
@@ -161,9 +191,6 @@ class IdentityArbiter:
                 
                 return result
             
-            cur.close()
-            conn.close()
-            
         except Exception as e:
             logger.error(f"❌ 人脸匹配失败: {e}")
         
@@ -181,44 +208,30 @@ class IdentityArbiter:
             身份信息或 None
         """
         try:
-            conn = psycopg2.connect(**self.db_config)
-            cur = conn.cursor()
-            
             # 搜索48小时内的 Owner 的 current_body_embedding（延长时间窗口）
             time_limit = timestamp - timedelta(hours=48)
             
-            body_vec_str = '[' + ','.join(map(str, body_vec)) + ']'
+            body_vec_str = encode_vector(body_vec)
             
             # 首先尝试匹配有缓存的（最近48小时内的）
-            cur.execute("""
-                SELECT 
-                    id,
-                    name,
-                    role,
-                    1 - (current_body_embedding <=> %s::vector) as similarity
-                FROM persons
-                WHERE role = 'owner'
-                  AND current_body_embedding IS NOT NULL
-                  AND body_update_time >= %s
-                  AND 1 - (current_body_embedding <=> %s::vector) > %s
-                ORDER BY current_body_embedding <=> %s::vector
-                LIMIT 1
-            """, (body_vec_str, time_limit, body_vec_str, self.body_threshold, body_vec_str))
+            with self.pool.cursor() as cur:
+                BODY_MATCH_STMT.execute(cur, (body_vec_str, time_limit, self.body_threshold))
+                
+                result = cur.fetchone()
             
-            result = cur.fetchone()
+            # 尚未落库的缓存更新可能比数据库中的更新，优先使用更相似的一方
+            pending = self.body_cache.best_match(body_vec, self.body_threshold, role='owner')
+            if pending and (not result or pending[3] > result[3]):
+                result = pending
             
             if result:
                 person_id, name, role, similarity = result
                 
                 # 更新缓存时间（即使匹配成功也更新，保持活跃）
-                self._update_body_cache(person_id, body_vec, timestamp, cur)
-                conn.commit()
+                self._update_body_cache(person_id, body_vec, timestamp, name, role)
                 
                 logger.info(f"✅ 身体匹配成功: {name} (ID: {person_id}, 相似度: {similarity:.3f})")
                 
-                cur.close()
-                conn.close()
-                
                 return {
                     'person_id': person_id,
                     'role': 'family',
@@ -227,9 +240,6 @@ class IdentityArbiter:
                     'body_embedding': body_vec
                 }
             
-            cur.close()
-            conn.close()
-            
         except Exception as e:
             logger.error(f"❌ 身体匹配失败: {e}")
         
@@ -248,42 +258,29 @@ class IdentityArbiter:
             身份信息或 None（如果找到软匹配）
         """
         try:
-            conn = psycopg2.connect(**self.db_config)
-            cur = conn.cursor()
-            
             # 搜索48小时内的 Owner 的 current_body_embedding
             time_limit = timestamp - timedelta(hours=48)
             
-            body_vec_str = '[' + ','.join(map(str, body_vec)) + ']'
+            body_vec_str = encode_vector(body_vec)
             
             # 使用软匹配阈值（更宽松）
-            cur.execute("""
-                SELECT 
-                    id,
-                    name,
-                    role,
-                    1 - (current_body_embedding <=> %s::vector) as similarity
-                FROM persons
-                WHERE role = 'owner'
-                  AND current_body_embedding IS NOT NULL
-                  AND body_update_time >= %s
-                  AND 1 - (current_body_embedding <=> %s::vector) > %s
-                  AND 1 - (current_body_embedding <=> %s::vector) <= %s
-                ORDER BY current_body_embedding <=> %s::vector
-                LIMIT 1
-            """, (body_vec_str, time_limit, body_vec_str, self.soft_match_threshold, 
-                  body_vec_str, self.body_threshold, body_vec_str))
+            with self.pool.cursor() as cur:
+                SOFT_MATCH_STMT.execute(cur, (body_vec_str, time_limit,
+                                              self.soft_match_threshold, self.body_threshold))
+                
+                result = cur.fetchone()
             
-            result = cur.fetchone()
+            pending = self.body_cache.best_match(
+                body_vec, self.soft_match_threshold, self.body_threshold, role='owner'
+            )
+            if pending and (not result or pending[3] > result[3]):
+                result = pending
             
             if result:
                 person_id, name, role, similarity = result
                 
                 logger.info(f"⚠️  软匹配（疑似家人）: {name} (ID: {person_id}, 相似度: {similarity:.3f})")
                 
-                cur.close()
-                conn.close()
-                
                 return {
                     'person_id': person_id,
                     'role': 'suspected_family',  # 标记为疑似家人
@@ -292,38 +289,32 @@ class IdentityArbiter:
                     'body_embedding': body_vec
                 }
             
-            cur.close()
-            conn.close()
-            
         except Exception as e:
             logger.debug(f"软匹配失败: {e}")
         
         return None
     
     def _update_body_cache(self, person_id: int, body_vec: np.ndarray, 
-                           timestamp: datetime, cursor):
+                           timestamp: datetime, name: Optional[str] = None,
+                           role: Optional[str] = None):
         """
-        更新数据库中人物的 current_body_embedding 缓存
+        更新人物的 current_body_embedding 缓存（写入回写缓冲区，由 flush_body_cache 批量落库）
         
         Args:
             person_id: 人物ID
             body_vec: 身体特征向量
             timestamp: 当前时间戳
-            cursor: 数据库游标
+            name: 人物名称（缓存命中时返回，与数据库查询一致）
+            role: 人物角色（persons.role）
         """
-        try:
-            body_vec_str = '[' + ','.join(map(str, body_vec)) + ']'
-            
-            cursor.execute("""
-                UPDATE persons
-                SET current_body_embedding = %s::vector,
-                    body_update_time = %s,
-                    last_seen = %s
-                WHERE id = %s
-            """, (body_vec_str, timestamp, timestamp, person_id))
-            
-            logger.debug(f"✅ 更新身体缓存: Person ID {person_id}")
-            
-        except Exception as e:
-            logger.error(f"❌ 更新身体缓存失败: {e}")
-            raise
+        self.body_cache.add(person_id, body_vec, timestamp, name, role)
+        logger.debug(f"✅ 登记身体缓存更新: Person ID {person_id}")
+    
+    def flush_body_cache(self) -> int:
+        """
+        将缓冲区中的身体缓存更新批量写回数据库（在每个 Clip 结束时调用）
+        
+        Returns:
+            写入的人物数量
+        """
+        return self.body_cache.flush()
@@ -0,0 +1,197 @@
+"""
+模块 6.5: Keyframe 存储 (Keyframe Store)
+职责：在帧还在内存中时，把每个人物最佳检测的裁剪图保存下来，供后续阶段直接使用
+
+裁剪图先缩放到最长边不超过 max_side，再编码为 JPEG / WebP（超过 max_bytes 时逐步降低质量），
+按内容的 SHA-256 寻址保存：<root_dir>/<前两位>/<sha256>.<ext>。相同内容只写一次。
+路径随 Clip_Obj → Global_Event['keyframes'] → event_appearances.keyframe_path 传递，
+Phase 6 生成证据时直接读取，不再重新打开和解码视频。
+"""
+
+import os
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import cv2
+import numpy as np
+import logging
+
+from ..common.clip_index import get_clip_index
+
+logger = logging.getLogger(__name__)
+
+
+# 支持的编码格式: {格式: (扩展名, 质量参数)}
+IMAGE_FORMATS = {
+    'jpg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+class KeyframeStore:
+    """按内容寻址的 Keyframe 裁剪图存储"""
+    
+    def __init__(self,
+                 root_dir: str = '/tmp/eufy_keyframes',
+                 image_format: str = 'jpg',
+                 max_side: int = 256,
+                 max_bytes: int = 32 * 1024,
+                 quality: int = 85,
+                 min_quality: int = 40):
+        """
+        初始化 Keyframe 存储
+        
+        Args:
+            root_dir: 存储根目录
+            image_format: 编码格式（'jpg' 或 'webp'）
+            max_side: 裁剪图最长边的像素上限（超过时等比缩小）
+            max_bytes: 单张图片的字节上限（超过时逐步降低编码质量，直到 min_quality）
+            quality: 初始编码质量
+            min_quality: 最低编码质量
+        
+        Raises:
+            ValueError: 不支持的编码格式
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的 Keyframe 格式: {image_format}（可选 {list(IMAGE_FORMATS)}）")
+        
+        self.root_dir = Path(root_dir)
+        self.image_format = image_format
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.min_quality = min_quality
+        
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 统计信息
+        self.stats = {
+            'stored': 0,
+            'deduplicated': 0,
+            'failed': 0,
+            'bytes_written': 0
+        }
+        
+        logger.debug(f"初始化 Keyframe 存储: {self.root_dir} ({image_format}, "
+                    f"max_side={max_side}, max_bytes={max_bytes})")
+    
+    def save_clip_keyframes(self, frames: List[np.ndarray], clip_obj: Dict[str, Any]) -> int:
+        """
+        为 Clip 中每个人物的最佳检测保存裁剪图（在 ResultBuffer 创建 Clip_Obj 之后、帧被释放之前调用）
+        
+        保存后的路径写入对应检测的 'keyframe_path' 字段以及 Clip 人物索引的 best_detection 中，
+        EventAggregator 选择 Keyframe 时会一并带出。
+        
+        Args:
+            frames: 本 Clip 的采样帧（与 people_detected 一一对应）
+            clip_obj: Clip_Obj
+        
+        Returns:
+            保存的裁剪图数量
+        """
+        index = get_clip_index(clip_obj)
+        people_detected = clip_obj['people_detected']
+        saved = 0
+        
+        for person_id, summary in index.persons.items():
+            best = summary['best_detection']
+            frame_idx = best['frame_idx']
+            if not best.get('bbox') or frame_idx >= len(frames):
+                continue
+            
+            path = self.put_crop(frames[frame_idx], best['bbox'])
+            if path is None:
+                continue
+            
+            best['keyframe_path'] = path
+            for person in people_detected[frame_idx]:
+                if person.get('person_id') == person_id and person.get('bbox') == best['bbox']:
+                    person['keyframe_path'] = path
+                    break
+            saved += 1
+        
+        return saved
+    
+    def put_crop(self, frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> Optional[str]:
+        """
+        裁剪并保存 bbox 区域
+        
+        Args:
+            frame: 原始帧（BGR）
+            bbox: 边界框 (x1, y1, x2, y2)
+        
+        Returns:
+            存储路径，裁剪区域为空或编码失败时返回 None
+        """
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in bbox)
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(width, x2), min(height, y2)
+        if x2 <= x1 or y2 <= y1:
+            self.stats['failed'] += 1
+            return None
+        
+        return self.put(frame[y1:y2, x1:x2])
+    
+    def put(self, image: np.ndarray) -> Optional[str]:
+        """
+        编码并保存一张图片（内容相同的图片只保存一次）
+        
+        Args:
+            image: 图片（BGR）
+        
+        Returns:
+            存储路径，编码失败时返回 None
+        """
+        data = self._encode(self._resize(image))
+        if data is None:
+            self.stats['failed'] += 1
+            logger.warning("⚠️  Keyframe 编码失败")
+            return None
+        
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        
+        if path.exists():
+            self.stats['deduplicated'] += 1
+            return str(path)
+        
+        # 先写临时文件再原子替换，并发写入同一内容时不会读到半个文件
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        self.stats['stored'] += 1
+        self.stats['bytes_written'] += len(data)
+        return str(path)
+    
+    def path_for(self, digest: str) -> Path:
+        """内容摘要对应的存储路径"""
+        extension = IMAGE_FORMATS[self.image_format][0]
+        return self.root_dir / digest[:2] / f"{digest}{extension}"
+    
+    def _resize(self, image: np.ndarray) -> np.ndarray:
+        """等比缩小到最长边不超过 max_side"""
+        height, width = image.shape[:2]
+        longest = max(height, width)
+        if longest <= self.max_side:
+            return image
+        
+        scale = self.max_side / longest
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    
+    def _encode(self, image: np.ndarray) -> Optional[bytes]:
+        """编码图片，超过字节上限时逐步降低质量"""
+        extension, quality_flag = IMAGE_FORMATS[self.image_format]
+        quality = self.quality
+        
+        while True:
+            success, buffer = cv2.imencode(extension, image, [quality_flag, quality])
+            if not success:
+                return None
+            if len(buffer) <= self.max_bytes or quality <= self.min_quality:
+                return buffer.tobytes()
+            quality = max(self.min_quality, quality - 10)
@@ -7,6 +7,8 @@ from typing import List, Dict, Any
 from datetime import datetime
 import logging
 
+from ..common.clip_index import ClipIndex, CLIP_INDEX_KEY
+
 logger = logging.getLogger(__name__)
 
 
@@ -47,7 +49,8 @@ class ResultBuffer:
                 'cam': str,
                 'people_detected': List[List[Dict]],
                 'video_duration': float,  # 视频时长（秒）
-                'video_path': str  # 视频路径
+                'video_path': str,  # 视频路径
+                '_index': ClipIndex  # 人物索引（第二阶段各模块直接读取）
             }
         """
         clip_obj = {
@@ -62,17 +65,13 @@ class ResultBuffer:
         if video_path is not None:
             clip_obj['video_path'] = video_path
         
-        # 统计信息
-        total_detections = sum(len(frame_people) for frame_people in people_detected)
-        unique_people = set()
-        for frame_people in people_detected:
-            for person in frame_people:
-                if person.get('person_id'):
-                    unique_people.add(person['person_id'])
+        # 一次遍历建立人物索引（同时用于统计信息）
+        index = ClipIndex(people_detected)
+        clip_obj[CLIP_INDEX_KEY] = index
         
         logger.info(f"📦 创建 Clip_Obj: {camera} @ {timestamp}, "
-                   f"{len(people_detected)} 帧, {total_detections} 次检测, "
-                   f"{len(unique_people)} 个不同人物")
+                   f"{index.frame_count} 帧, {index.detection_count} 次检测, "
+                   f"{len(index.person_ids)} 个不同人物")
         
         return clip_obj
     
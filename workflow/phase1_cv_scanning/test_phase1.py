@@ -6,13 +6,22 @@
 import sys
 import os
 import logging
+import tempfile
+from datetime import datetime
 from pathlib import Path
+from unittest import mock
 
 # 添加项目根目录到路径（从 workflow/phase1_cv_scanning/ 向上两级到项目根）
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
+import cv2
+import numpy as np
+
 from workflow import CV_Pipeline
+from workflow.phase1_cv_scanning import keyframe_store
+from workflow.phase1_cv_scanning.keyframe_store import KeyframeStore
+from workflow.phase2_event_fusion.event_aggregator import EventAggregator
 
 # 配置日志
 logging.basicConfig(
@@ -23,12 +32,80 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def test_keyframe_store():
+    """测试 Keyframe 存储（去重、bbox 裁剪、空区域、质量降级、路径传递）"""
+    logger.info("=" * 60)
+    logger.info("Keyframe 存储测试")
+    logger.info("=" * 60)
+    
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)
+    
+    with tempfile.TemporaryDirectory() as root_dir:
+        store = KeyframeStore(root_dir=root_dir)
+        
+        # 相同内容第二次写入时去重，返回同一路径
+        path = store.put_crop(frame, (10, 10, 60, 90))
+        assert path is not None and Path(path).exists()
+        assert store.put_crop(frame, (10, 10, 60, 90)) == path
+        assert store.stats['stored'] == 1 and store.stats['deduplicated'] == 1
+        
+        # 部分超出画面的 bbox 被裁剪到画面内
+        clamped = store.put_crop(frame, (-20, -10, 40, 200))
+        assert clamped == store.put(frame[0:120, 0:40])
+        assert cv2.imread(clamped).shape == (120, 40, 3)
+        
+        # 面积为 0 的区域返回 None
+        failed = store.stats['failed']
+        assert store.put_crop(frame, (50, 50, 50, 80)) is None
+        assert store.put_crop(frame, (200, 10, 300, 60)) is None
+        assert store.stats['failed'] == failed + 2
+        
+        # 超过 max_bytes 时逐步降低质量
+        crop = frame[0:100, 0:100]
+        full_size = len(cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, 85])[1])
+        small_store = KeyframeStore(root_dir=root_dir, max_bytes=full_size - 1)
+        with mock.patch.object(keyframe_store.cv2, 'imencode', wraps=cv2.imencode) as imencode:
+            small_path = small_store.put(crop)
+        qualities = [call.args[2][1] for call in imencode.call_args_list]
+        assert qualities[:2] == [85, 75]
+        assert os.path.getsize(small_path) <= small_store.max_bytes
+        
+        # save_clip_keyframes 把路径写入检测和 Global_Event['keyframes']
+        frames = [frame, frame.copy()]
+        clip_obj = {
+            'cam': 'Front Door',
+            'time': datetime(2025, 9, 1, 8, 0, 0),
+            'people_detected': [
+                [{'person_id': 1, 'role': 'family', 'method': 'body', 'confidence': 0.5, 'bbox': [0, 0, 20, 20]}],
+                [{'person_id': 1, 'role': 'family', 'method': 'face', 'confidence': 0.9, 'bbox': [20, 20, 80, 100]},
+                 {'person_id': 2, 'role': 'stranger', 'method': 'body', 'confidence': 0.8, 'bbox': [90, 10, 150, 110]}],
+            ]
+        }
+        assert store.save_clip_keyframes(frames, clip_obj) == 2
+        
+        best_1 = clip_obj['people_detected'][1][0]
+        best_2 = clip_obj['people_detected'][1][1]
+        assert best_1['keyframe_path'] == store.put_crop(frame, (20, 20, 80, 100))
+        assert best_2['keyframe_path'] == store.put_crop(frame, (90, 10, 150, 110))
+        assert 'keyframe_path' not in clip_obj['people_detected'][0][0]
+        
+        global_event = EventAggregator().pack([clip_obj])
+        assert global_event['keyframes'][1]['keyframe_path'] == best_1['keyframe_path']
+        assert global_event['keyframes'][2]['keyframe_path'] == best_2['keyframe_path']
+    
+    logger.info("✅ Keyframe 存储测试通过")
+
+
 def main():
     """主测试函数"""
     logger.info("=" * 60)
     logger.info("第一阶段 Pipeline 测试")
     logger.info("=" * 60)
     
+    # Keyframe 存储（不依赖数据集）
+    test_keyframe_store()
+    
     # 检查数据文件是否存在
     dataset_json = project_root / 'memories_ai_benchmark' / 'long_mem_dataset.json'
     videos_dir = project_root / 'memories_ai_benchmark' / 'videos'
@@ -3,7 +3,10 @@ Phase 2: 时空事件合并 (Event Fusion)
 将第一阶段的 Clip_Obj 合并为全局事件
 """
 
+from ..common.clip_index import ClipIndex, get_clip_index, invalidate_clip_index
+from .clip_spool import ClipSpool
 from .stream_sorter import StreamSorter
+from .fusion_rules import DEFAULT_FUSION_RULES, FusionRuleSet, load_fusion_rules
 from .fusion_policy import FusionPolicy
 from .session_manager import SessionManager
 from .event_aggregator import EventAggregator
@@ -12,7 +15,14 @@ from .identity_refiner import IdentityRefiner
 from .event_fusion_pipeline import Event_Fusion_Pipeline
 
 __all__ = [
+    'ClipIndex',
+    'get_clip_index',
+    'invalidate_clip_index',
+    'ClipSpool',
     'StreamSorter',
+    'DEFAULT_FUSION_RULES',
+    'FusionRuleSet',
+    'load_fusion_rules',
     'FusionPolicy',
     'SessionManager',
     'EventAggregator',
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+微基准：IdentityRefiner 在大事件上的耗时
+
+构造包含数千次检测的合成事件（多摄像头、家人 / 疑似家人 / 匿名陌生人混合），
+测量 refine_event_identities 的耗时。检测数翻倍时耗时也应大致翻倍（每次检测的耗时基本不变）。
+
+用法：
+    python workflow/phase2_event_fusion/benchmark_identity_refiner.py [--repeat N]
+"""
+
+import sys
+import time
+import random
+import argparse
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from workflow.phase2_event_fusion import EventAggregator, IdentityRefiner
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def create_synthetic_event(detection_count: int, seed: int = 0):
+    """
+    创建合成的 Global_Event
+    
+    Args:
+        detection_count: 检测总次数
+        seed: 随机种子
+    
+    Returns:
+        Global_Event 对象（已经过 EventAggregator 打包）
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2025, 9, 1, 9, 0, 0)
+    cameras = ['doorbell', 'outdoor_high', 'indoor_living']
+    roles = ['family', 'suspected_family', 'stranger']
+    
+    clips = []
+    remaining = detection_count
+    clip_idx = 0
+    while remaining > 0:
+        frames = []
+        for _ in range(10):
+            frame = []
+            for _ in range(min(remaining, rng.randint(1, 4))):
+                person_id = rng.choice([None, None, 1, 2, 3, 4, 5, 6, 7, 8])
+                frame.append({
+                    'person_id': person_id,
+                    'role': 'stranger' if person_id is None else rng.choice(roles),
+                    'method': rng.choice(['face', 'body', 'new']),
+                    'confidence': rng.random(),
+                    'bbox': (rng.randint(0, 100), rng.randint(0, 100),
+                             rng.randint(150, 400), rng.randint(150, 400))
+                })
+                remaining -= 1
+            frames.append(frame)
+            if remaining <= 0:
+                break
+        
+        clips.append({
+            'time': base_time + timedelta(seconds=5 * clip_idx),
+            'cam': cameras[clip_idx % len(cameras)],
+            'people_detected': frames
+        })
+        clip_idx += 1
+    
+    return EventAggregator().pack(clips)
+
+
+def benchmark(sizes, repeat: int):
+    """
+    对不同规模的事件运行 IdentityRefiner
+    
+    Args:
+        sizes: 检测次数列表
+        repeat: 每个规模重复次数（取最短耗时）
+    """
+    refiner = IdentityRefiner()
+    
+    print(f"{'检测次数':>10} {'Clip 数':>8} {'耗时(ms)':>10} {'每次检测(µs)':>14}")
+    for size in sizes:
+        best = float('inf')
+        clip_count = 0
+        for i in range(repeat):
+            # 每次重新生成事件（refine 会原地修改身份）
+            event = create_synthetic_event(size, seed=i)
+            clip_count = len(event['clips'])
+            
+            start = time.perf_counter()
+            refiner.refine_event_identities(event)
+            best = min(best, time.perf_counter() - start)
+        
+        print(f"{size:>10} {clip_count:>8} {best * 1000:>10.2f} {best * 1e6 / size:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IdentityRefiner 微基准')
+    parser.add_argument('--repeat', type=int, default=5, help='每个规模的重复次数')
+    args = parser.parse_args()
+    
+    benchmark([1000, 2000, 4000, 8000, 16000], args.repeat)
+
+
+if __name__ == '__main__':
+    main()
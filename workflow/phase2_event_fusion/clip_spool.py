@@ -0,0 +1,72 @@
+"""
+Clip 磁盘暂存 (Clip Spool)
+职责：把 Clip_Obj（含人物特征向量等大对象）序列化到临时文件，内存中只保留轻量的引用（文件偏移量）
+
+用于外部排序：排序时内存中只有 (time, seq, offset) 键，Clip 本身在按序读取时才反序列化，
+内存占用与数据总量无关。临时文件在 close() 时删除。
+"""
+
+import pickle
+import tempfile
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ClipSpool:
+    """Clip 磁盘暂存文件"""
+    
+    def __init__(self, spool_dir: Optional[str] = None):
+        """
+        创建暂存文件
+        
+        Args:
+            spool_dir: 临时文件目录，None 表示使用系统临时目录
+        """
+        self._file = tempfile.TemporaryFile(prefix='clip_spool_', dir=spool_dir)
+        self.count = 0
+        self.bytes_written = 0
+    
+    def append(self, clip: Dict[str, Any]) -> int:
+        """
+        写入一个 Clip
+        
+        Args:
+            clip: Clip_Obj
+        
+        Returns:
+            Clip 引用（文件偏移量），用于 load
+        """
+        self._file.seek(0, 2)
+        offset = self._file.tell()
+        data = pickle.dumps(clip, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(data)
+        self.count += 1
+        self.bytes_written += len(data)
+        return offset
+    
+    def load(self, offset: int) -> Dict[str, Any]:
+        """
+        读取一个 Clip
+        
+        Args:
+            offset: append 返回的引用
+        
+        Returns:
+            Clip_Obj
+        """
+        self._file.seek(offset)
+        return pickle.load(self._file)
+    
+    def close(self):
+        """关闭并删除暂存文件"""
+        if not self._file.closed:
+            self._file.close()
+            logger.debug(f"删除 Clip 暂存文件: {self.count} 个 Clip, {self.bytes_written / 1024 / 1024:.1f} MB")
+    
+    def __enter__(self) -> 'ClipSpool':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
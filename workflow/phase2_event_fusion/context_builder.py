@@ -1,26 +1,111 @@
 """
 模块 5: 多视角上下文构建器 (Multi-View Context Builder)
 职责：将聚合后的数据转化为 LLM 能看懂的自然语言 Prompt 片段
+
+- 固定文本（时间线标题、提示、任务说明）和摄像头映射在模块加载时预先生成，每个事件只做格式化
+- 事件特征（是否有陌生人、涉及哪些位置、持续时间等）一次提取，供所有事件类型检测共用
+- 时间线超过 Token 预算时逐级压缩：合并连续重复的行 → 合并相同内容的行 → 保留首尾、省略中间
 """
 
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import logging
 
+from ..common.clip_index import get_clip_index
+
 logger = logging.getLogger(__name__)
 
 
+# 摄像头位置映射
+CAMERA_POSITIONS = {
+    'doorbell': '门口',
+    'outdoor_high': '庭院',
+    'outdoor_side': '侧院',
+    'indoor_living': '客厅',
+    'indoor_hall': '门厅',
+    'indoor_kitchen': '厨房',
+    'indoor_bedroom': '卧室',
+}
+
+INDOOR_CAMERAS = frozenset(['indoor_living', 'indoor_hall', 'indoor_kitchen', 'indoor_bedroom'])
+OUTDOOR_CAMERAS = frozenset(['doorbell', 'outdoor_high', 'outdoor_side'])
+SENSITIVE_CAMERAS = frozenset(['doorbell']) | INDOOR_CAMERAS
+
+# 空间移动检测的摄像头名称关键词
+OUTDOOR_KEYWORDS = ('outdoor', 'doorbell', 'gate', 'yard')
+INDOOR_KEYWORDS = ('indoor', 'living', 'room', 'hall')
+
+# 预编译模板
+TIMELINE_HEADER = "Plaintext时间线："
+TIMELINE_LINE = "- {time} [{cam}]: {summary}".format
+TIMELINE_RANGE_LINE = "- {start}~{end} [{cam}]: {summary}（{count} 次）".format
+TIMELINE_OMITTED_LINE = "- ……（省略 {count} 条时间线）".format
+HINT_LINE = "提示: {}".format
+TASK_FOOTER = "\n".join([
+    "任务：根据以上时间线信息，生成一条详细的中文日志，描述这个事件的完整过程。",
+    "要求：",
+    "- 描述人物的具体行为（出现、移动、停留等）",
+    "- 说明位置变化（如果涉及多个摄像头）",
+    "- 体现时间顺序（先做什么，后做什么）",
+    "- 不要使用\"详情见视频\"等通用描述，必须基于时间线生成具体描述",
+    "- 根据观察到的人物动作、特征和活动模式，自然地判断和描述事件类型（如：快递配送、服务维修、访客等）",
+])
+
+EVENT_TYPE_DESCRIPTIONS = {
+    'delivery': '快递/配送事件（人物在门口短暂停留，可能拿着包裹）',
+    'service': '服务事件（维修、清洁等，人物长时间停留）',
+    'dangerous': '危险事件（持枪、可疑行为等，需要特别注意）',
+    'visitor': '访客事件（陌生人进入室内）',
+    'normal': '正常活动事件'
+}
+
+# 事件类型的温和提示（仅作为参考信息，不强制），只对非正常事件提供
+EVENT_TYPE_HINTS = {
+    event_type: f"根据观察到的人物动作和活动模式，{hint}，自然地判断事件类型"
+    for event_type, hint in {
+        'delivery': '注意观察人物是否拿着物品、在门口短暂停留等特征',
+        'service': '注意观察人物是否携带工具、长时间停留等特征',
+        'dangerous': '注意观察人物行为是否异常、是否有可疑动作等特征',
+        'visitor': '注意观察人物是否从门口进入室内等特征',
+    }.items()
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数量（中文字符和全角标点按 1 个 token，其他字符按 4 个字符 1 个 token）
+    
+    中文字符的 UTF-8 编码为 3 字节、ASCII 为 1 字节，用编码长度与字符数之差估算中文字符数，避免逐字符遍历。
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        估算的 token 数量
+    """
+    wide = (len(text.encode('utf-8')) - len(text)) // 2
+    return wide + (len(text) - wide + 3) // 4
+
+
 class ContextBuilder:
     """多视角上下文构建器"""
     
-    def __init__(self):
-        """初始化上下文构建器"""
-        pass
+    def __init__(self, max_prompt_tokens: Optional[int] = 1024):
+        """
+        初始化上下文构建器
+        
+        Args:
+            max_prompt_tokens: Prompt 的 token 预算（估算值），超出时压缩时间线；None 表示不限制
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self._footer_tokens = estimate_tokens(TIMELINE_HEADER) + estimate_tokens(TASK_FOOTER) + 2
     
     def build(self, global_event: Dict[str, Any]) -> str:
         """
         构建 LLM Prompt 上下文
         
+        同时在 global_event['timeline_compressed'] 中记录时间线是否因超出 token 预算被压缩。
+        
         Args:
             global_event: Global_Event 对象
         
@@ -30,59 +115,144 @@ class ContextBuilder:
         if not global_event:
             return ""
         
-        logger.debug(f"构建 Prompt 上下文: {len(global_event.get('clips', []))} 个 Clip")
-        
-        # 1. 构建时间线
-        timeline_lines = []
+        clips = global_event.get('clips', [])
+        logger.debug(f"构建 Prompt 上下文: {len(clips)} 个 Clip")
         
-        for clip in global_event.get('clips', []):
-            clip_time = clip['time']
-            camera = clip['cam']
-            
-            # 提取该 Clip 中的人物信息
+        # 1. 时间线条目 (时间文本, 摄像头, 人物描述)
+        entries = []
+        for clip in clips:
             people_summary = self._summarize_clip_people(clip)
-            
             if people_summary:
-                timeline_lines.append(
-                    f"- {clip_time.strftime('%H:%M:%S')} [{camera}]: {people_summary}"
-                )
+                entries.append((clip['time'].strftime('%H:%M:%S'), clip['cam'], people_summary))
         
-        # 2. 构建 Prompt
-        prompt_parts = []
-        
-        # 时间线部分
-        if timeline_lines:
-            prompt_parts.append("Plaintext时间线：")
-            prompt_parts.extend(timeline_lines)
+        # 2. 提示（事件特征一次提取，供空间检测和事件类型检测共用）
+        features = self.extract_features(global_event)
+        hint_lines = []
         
         # 空间逻辑提示（可选）
-        spatial_hint = self._detect_spatial_movement(global_event)
+        spatial_hint = self._detect_spatial_movement(features)
         if spatial_hint:
-            prompt_parts.append(f"提示: {spatial_hint}")
+            hint_lines.append(HINT_LINE(spatial_hint))
         
         # 事件类型提示（温和提示，不强制）
-        event_type = self._detect_event_type(global_event)
-        if event_type and event_type != 'normal':
-            # 只作为参考信息，不强制要求
-            event_hint = self._get_event_type_hint(event_type)
-            if event_hint:
-                prompt_parts.append(f"提示: {event_hint}")
-        
-        # 任务说明（更详细的要求）
-        prompt_parts.append("任务：根据以上时间线信息，生成一条详细的中文日志，描述这个事件的完整过程。")
-        prompt_parts.append("要求：")
-        prompt_parts.append("- 描述人物的具体行为（出现、移动、停留等）")
-        prompt_parts.append("- 说明位置变化（如果涉及多个摄像头）")
-        prompt_parts.append("- 体现时间顺序（先做什么，后做什么）")
-        prompt_parts.append("- 不要使用\"详情见视频\"等通用描述，必须基于时间线生成具体描述")
-        prompt_parts.append("- 根据观察到的人物动作、特征和活动模式，自然地判断和描述事件类型（如：快递配送、服务维修、访客等）")
+        event_type = self.classify_event_type(features)
+        event_hint = self._get_event_type_hint(event_type)
+        if event_hint:
+            hint_lines.append(HINT_LINE(event_hint))
+        
+        # 3. 在 token 预算内生成时间线
+        timeline_budget = None
+        if self.max_prompt_tokens is not None:
+            fixed_tokens = self._footer_tokens + sum(estimate_tokens(line) + 1 for line in hint_lines)
+            timeline_budget = max(0, self.max_prompt_tokens - fixed_tokens)
+        timeline_lines, compressed = self._render_timeline(entries, timeline_budget)
+        global_event['timeline_compressed'] = compressed
+        
+        # 4. 构建 Prompt
+        prompt_parts = []
+        if timeline_lines:
+            prompt_parts.append(TIMELINE_HEADER)
+            prompt_parts.extend(timeline_lines)
+        prompt_parts.extend(hint_lines)
+        prompt_parts.append(TASK_FOOTER)
         
         prompt_text = "\n".join(prompt_parts)
         
-        logger.debug(f"✅ Prompt 构建完成: {len(prompt_text)} 字符")
+        logger.debug(f"✅ Prompt 构建完成: {len(prompt_text)} 字符, 约 {estimate_tokens(prompt_text)} tokens")
         
         return prompt_text
     
+    def _render_timeline(self, entries: List[Tuple[str, str, str]],
+                         budget: Optional[int]) -> Tuple[List[str], bool]:
+        """
+        生成时间线文本行，超出 token 预算时逐级压缩
+        
+        1. 合并连续的、摄像头和人物描述都相同的行（显示时间范围和次数）
+        2. 合并所有摄像头和人物描述相同的行（保留在第一次出现的位置）
+        3. 保留首尾的行，中间的行替换为一条省略说明
+        
+        Args:
+            entries: [(时间文本 HH:MM:SS, 摄像头, 人物描述), ...]，按时间排序
+            budget: 时间线可用的 token 数，None 表示不限制
+        
+        Returns:
+            (时间线文本行列表, 是否压缩过)
+        """
+        lines = [TIMELINE_LINE(time=time, cam=cam, summary=summary) for time, cam, summary in entries]
+        if budget is None or self._lines_tokens(lines) <= budget:
+            return lines, False
+        
+        # 第 1 级：合并连续重复的行
+        groups = []  # [开始时间, 结束时间, 摄像头, 描述, 次数]
+        for time, cam, summary in entries:
+            if groups and groups[-1][2] == cam and groups[-1][3] == summary:
+                groups[-1][1] = time
+                groups[-1][4] += 1
+            else:
+                groups.append([time, time, cam, summary, 1])
+        lines = self._render_groups(groups)
+        
+        # 第 2 级：合并所有相同内容的行
+        if self._lines_tokens(lines) > budget:
+            merged: Dict[Tuple[str, str], list] = {}
+            for group in groups:
+                key = (group[2], group[3])
+                if key in merged:
+                    merged[key][1] = group[1]
+                    merged[key][4] += group[4]
+                else:
+                    merged[key] = list(group)
+            groups = list(merged.values())
+            lines = self._render_groups(groups)
+        
+        # 第 3 级：保留首尾，省略中间
+        if self._lines_tokens(lines) > budget:
+            lines = self._truncate_middle(lines, budget)
+        
+        logger.debug(f"时间线压缩: {len(entries)} 条 → {len(lines)} 行 (预算 {budget} tokens)")
+        return lines, True
+    
+    def _render_groups(self, groups: List[list]) -> List[str]:
+        """把合并后的时间线分组渲染为文本行"""
+        lines = []
+        for start, end, cam, summary, count in groups:
+            if count == 1:
+                lines.append(TIMELINE_LINE(time=start, cam=cam, summary=summary))
+            else:
+                lines.append(TIMELINE_RANGE_LINE(start=start, end=end, cam=cam,
+                                                 summary=summary, count=count))
+        return lines
+    
+    def _truncate_middle(self, lines: List[str], budget: int) -> List[str]:
+        """从首尾交替保留行，直到用完预算（为省略说明预留空间）"""
+        budget -= estimate_tokens(TIMELINE_OMITTED_LINE(count=len(lines))) + 1
+        head, tail = [], []
+        i, j = 0, len(lines) - 1
+        used = 0
+        take_head = True
+        while i <= j:
+            line = lines[i] if take_head else lines[j]
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            used += cost
+            if take_head:
+                head.append(line)
+                i += 1
+            else:
+                tail.append(line)
+                j -= 1
+            take_head = not take_head
+        
+        omitted = j - i + 1
+        if omitted <= 0:
+            return lines
+        return head + [TIMELINE_OMITTED_LINE(count=omitted)] + tail[::-1]
+    
+    @staticmethod
+    def _lines_tokens(lines: List[str]) -> int:
+        return estimate_tokens("\n".join(lines)) + 1
+    
     def _summarize_clip_people(self, clip: Dict[str, Any]) -> str:
         """
         总结 Clip 中的人物信息（更详细的描述，包含活动信息）
@@ -95,8 +265,8 @@ class ContextBuilder:
         """
         people_summary = []
         
-        # 统计该 Clip 中的人物（去重）
-        seen_people = {}
+        # 该 Clip 中的人物（去重），直接读取 Clip 人物索引中的轨迹
+        seen_people = get_clip_index(clip).tracks
         # key: (person_id, role) -> {
         #   'detection_count': int,
         #   'first_frame': int,
@@ -105,31 +275,6 @@ class ContextBuilder:
         #   'frame_indices': List[int]
         # }
         
-        for frame_idx, frame_people in enumerate(clip.get('people_detected', [])):
-            for person in frame_people:
-                person_id = person.get('person_id')
-                role = person.get('role', 'stranger')
-                bbox = person.get('bbox')
-                
-                # 避免重复
-                key = (person_id, role)
-                if key not in seen_people:
-                    seen_people[key] = {
-                        'detection_count': 0,
-                        'first_frame': frame_idx,
-                        'last_frame': frame_idx,
-                        'bboxes': [],
-                        'frame_indices': []
-                    }
-                
-                info = seen_people[key]
-                info['detection_count'] += 1
-                info['last_frame'] = max(info['last_frame'], frame_idx)
-                info['first_frame'] = min(info['first_frame'], frame_idx)
-                if bbox:
-                    info['bboxes'].append(bbox)
-                info['frame_indices'].append(frame_idx)
-        
         if not seen_people:
             return ""
         
@@ -198,8 +343,8 @@ class ContextBuilder:
             
             people_summary.append(desc)
         
-        # 去重并格式化
-        unique_summary = list(set(people_summary))
+        # 去重（保持出现顺序）并格式化
+        unique_summary = list(dict.fromkeys(people_summary))
         
         if len(unique_summary) == 1:
             return unique_summary[0]
@@ -292,18 +437,7 @@ class ContextBuilder:
         if not bboxes:
             return None
         
-        # 摄像头位置映射
-        camera_positions = {
-            'doorbell': '门口',
-            'outdoor_high': '庭院',
-            'outdoor_side': '侧院',
-            'indoor_living': '客厅',
-            'indoor_hall': '门厅',
-            'indoor_kitchen': '厨房',
-            'indoor_bedroom': '卧室',
-        }
-        
-        position = camera_positions.get(camera, camera)
+        position = CAMERA_POSITIONS.get(camera, camera)
         
         # 分析 bbox 位置（如果有多帧数据）
         if len(bboxes) > 0:
@@ -329,33 +463,68 @@ class ContextBuilder:
             return f"Person_{person_id}"
         return "Unknown"
     
-    def _detect_spatial_movement(self, global_event: Dict[str, Any]) -> Optional[str]:
+    def extract_features(self, global_event: Dict[str, Any]) -> Dict[str, Any]:
         """
-        检测空间移动逻辑（如从室外到室内）
+        一次遍历提取事件特征（供空间检测和所有事件类型检测共用）
         
         Args:
             global_event: Global_Event 对象
         
         Returns:
-            空间提示字符串，如果没有则返回 None
+            特征字典：
+            {
+                'has_stranger': bool,     # 是否有陌生人 / 未知人物
+                'camera_count': int,
+                'has_doorbell': bool,
+                'has_indoor': bool,       # 涉及室内摄像头
+                'has_outdoor': bool,      # 涉及室外摄像头
+                'has_sensitive': bool,    # 涉及敏感位置（门口、室内）
+                'outdoor_keyword': bool,  # 摄像头名称含室外关键词（空间移动检测）
+                'indoor_keyword': bool,   # 摄像头名称含室内关键词（空间移动检测）
+                'duration': float,
+                'clip_count': int
+            }
         """
         cameras = global_event.get('cameras', [])
+        people_info = global_event.get('people_info', {})
         
-        if len(cameras) < 2:
-            return None
+        features = {
+            'has_stranger': any(person_id == -1 or info.get('role') in ('stranger', 'unknown')
+                                for person_id, info in people_info.items()),
+            'camera_count': len(cameras),
+            'has_doorbell': False,
+            'has_indoor': False,
+            'has_outdoor': False,
+            'has_sensitive': False,
+            'outdoor_keyword': False,
+            'indoor_keyword': False,
+            'duration': global_event.get('duration', 0),
+            'clip_count': len(global_event.get('clips', []))
+        }
         
-        # 简单的空间逻辑检测
-        # 假设摄像头名称包含 "outdoor"、"indoor"、"doorbell" 等关键词
+        for cam in cameras:
+            features['has_doorbell'] |= cam == 'doorbell'
+            features['has_indoor'] |= cam in INDOOR_CAMERAS
+            features['has_outdoor'] |= cam in OUTDOOR_CAMERAS
+            features['has_sensitive'] |= cam in SENSITIVE_CAMERAS
+            name = cam.lower()
+            features['outdoor_keyword'] |= any(kw in name for kw in OUTDOOR_KEYWORDS)
+            features['indoor_keyword'] |= any(kw in name for kw in INDOOR_KEYWORDS)
         
-        outdoor_keywords = ['outdoor', 'doorbell', 'gate', 'yard']
-        indoor_keywords = ['indoor', 'living', 'room', 'hall']
+        return features
+    
+    def _detect_spatial_movement(self, features: Dict[str, Any]) -> Optional[str]:
+        """
+        检测空间移动逻辑（如从室外到室内）
         
-        has_outdoor = any(any(kw in cam.lower() for kw in outdoor_keywords) 
-                         for cam in cameras)
-        has_indoor = any(any(kw in cam.lower() for kw in indoor_keywords) 
-                        for cam in cameras)
+        Args:
+            features: 事件特征（extract_features 的返回值）
         
-        if has_outdoor and has_indoor:
+        Returns:
+            空间提示字符串，如果没有则返回 None
+        """
+        # 假设摄像头名称包含 "outdoor"、"indoor"、"doorbell" 等关键词
+        if features['camera_count'] >= 2 and features['outdoor_keyword'] and features['indoor_keyword']:
             return "人物从室外移动到室内"
         
         return None
@@ -370,32 +539,38 @@ class ContextBuilder:
         Returns:
             事件类型：'delivery', 'service', 'dangerous', 'visitor', 'normal' 或 None
         """
-        cameras = global_event.get('cameras', [])
-        people_info = global_event.get('people_info', {})
-        clips = global_event.get('clips', [])
-        duration = global_event.get('duration', 0)
+        return self.classify_event_type(self.extract_features(global_event))
+    
+    def classify_event_type(self, features: Dict[str, Any]) -> str:
+        """
+        按优先级依次检测事件类型
+        
+        Args:
+            features: 事件特征（extract_features 的返回值）
         
+        Returns:
+            事件类型：'delivery', 'service', 'dangerous', 'visitor' 或 'normal'
+        """
         # 1. 检测危险行为（持枪、可疑行为等）
-        # 基于位置、活动模式、持续时间等特征
-        if self._is_dangerous_event(clips, people_info, cameras):
+        if self._is_dangerous_event(features):
             return 'dangerous'
         
         # 2. 检测快递/配送事件
-        if self._is_delivery_event(clips, people_info, cameras, duration):
+        if self._is_delivery_event(features):
             return 'delivery'
         
         # 3. 检测服务事件（维修、清洁等）
-        if self._is_service_event(clips, people_info, cameras, duration):
+        if self._is_service_event(features):
             return 'service'
         
         # 4. 检测访客事件
-        if self._is_visitor_event(clips, people_info, cameras):
+        if self._is_visitor_event(features):
             return 'visitor'
         
         # 5. 默认：正常活动
         return 'normal'
     
-    def _is_dangerous_event(self, clips: List[Dict], people_info: Dict, cameras: List[str]) -> bool:
+    def _is_dangerous_event(self, features: Dict[str, Any]) -> bool:
         """
         检测是否为危险事件（持枪、可疑行为等）
         
@@ -404,131 +579,50 @@ class ContextBuilder:
         - 活动模式异常（快速移动、长时间停留、反复出现）
         - 可能有武器特征（需要进一步分析，这里先基于行为模式）
         """
-        # 检查是否有陌生人在敏感位置
-        has_stranger = False
-        for person_id, info in people_info.items():
-            if person_id == -1 or info.get('role') in ['stranger', 'unknown']:
-                has_stranger = True
-                break
-        
-        if not has_stranger:
-            return False
-        
-        # 检查是否在敏感位置（门口、室内）
-        sensitive_cameras = ['doorbell', 'indoor_living', 'indoor_hall', 'indoor_kitchen', 'indoor_bedroom']
-        has_sensitive_location = any(cam in sensitive_cameras for cam in cameras)
-        
-        if not has_sensitive_location:
+        if not features['has_stranger'] or not features['has_sensitive']:
             return False
         
         # 检查活动模式（快速移动、异常停留等）
-        # 这里可以进一步分析，目前先基于位置和陌生人判断
         # TODO: 可以添加更复杂的模式检测（如：快速移动、反复出现等）
         
         return False  # 暂时不启用，需要更多数据支持
     
-    def _is_delivery_event(self, clips: List[Dict], people_info: Dict, 
-                          cameras: List[str], duration: float) -> bool:
+    def _is_delivery_event(self, features: Dict[str, Any]) -> bool:
         """
         检测是否为快递/配送事件
         
         特征：
         - 陌生人出现在门口（doorbell 摄像头）
-        - 短暂停留（通常 < 2 分钟）
-        - 活动模式：出现 → 停留 → 离开
-        - 可能拿着物品（需要从描述中推断，这里先基于模式）
+        - 短暂停留（通常 < 2 分钟，或只有少数几个 Clip）
         """
-        # 检查是否在门口
-        has_doorbell = 'doorbell' in cameras
-        
-        if not has_doorbell:
-            return False
-        
-        # 检查是否有陌生人
-        has_stranger = False
-        for person_id, info in people_info.items():
-            if person_id == -1 or info.get('role') in ['stranger', 'unknown']:
-                has_stranger = True
-                break
-        
-        if not has_stranger:
+        if not features['has_doorbell'] or not features['has_stranger']:
             return False
         
-        # 检查持续时间（快递通常是短暂的）
-        if duration > 0 and duration < 120:  # 小于 2 分钟
-            return True
-        
-        # 检查活动模式：短暂停留
-        if len(clips) <= 3:  # 只有少数几个 clip，可能是短暂停留
-            return True
-        
-        return False
+        duration = features['duration']
+        return 0 < duration < 120 or features['clip_count'] <= 3
     
-    def _is_service_event(self, clips: List[Dict], people_info: Dict, 
-                         cameras: List[str], duration: float) -> bool:
+    def _is_service_event(self, features: Dict[str, Any]) -> bool:
         """
         检测是否为服务事件（维修、清洁等）
         
         特征：
         - 陌生人出现
-        - 持续时间较长（> 5 分钟）
-        - 可能涉及多个位置（室内、室外）
-        - 活动模式：进入 → 长时间停留 → 离开
-        """
-        # 检查是否有陌生人
-        has_stranger = False
-        for person_id, info in people_info.items():
-            if person_id == -1 or info.get('role') in ['stranger', 'unknown']:
-                has_stranger = True
-                break
-        
-        if not has_stranger:
+        - 持续时间较长（> 5 分钟），或涉及室内和室外多个位置
+        """
+        if not features['has_stranger']:
             return False
         
-        # 检查持续时间（服务通常是较长的）
-        if duration > 300:  # 大于 5 分钟
-            return True
-        
-        # 检查是否涉及多个位置（室内 + 室外）
-        indoor_cams = ['indoor_living', 'indoor_hall', 'indoor_kitchen', 'indoor_bedroom']
-        outdoor_cams = ['doorbell', 'outdoor_high', 'outdoor_side']
-        
-        has_indoor = any(cam in indoor_cams for cam in cameras)
-        has_outdoor = any(cam in outdoor_cams for cam in cameras)
-        
-        if has_indoor and has_outdoor:
-            return True
-        
-        return False
+        return features['duration'] > 300 or (features['has_indoor'] and features['has_outdoor'])
     
-    def _is_visitor_event(self, clips: List[Dict], people_info: Dict, cameras: List[str]) -> bool:
+    def _is_visitor_event(self, features: Dict[str, Any]) -> bool:
         """
         检测是否为访客事件
         
         特征：
         - 陌生人出现
-        - 在门口停留并进入
-        - 持续时间中等（2-10 分钟）
-        """
-        # 检查是否有陌生人
-        has_stranger = False
-        for person_id, info in people_info.items():
-            if person_id == -1 or info.get('role') in ['stranger', 'unknown']:
-                has_stranger = True
-                break
-        
-        if not has_stranger:
-            return False
-        
-        # 检查是否从门口进入室内
-        indoor_cams = ['indoor_living', 'indoor_hall', 'indoor_kitchen', 'indoor_bedroom']
-        has_doorbell = 'doorbell' in cameras
-        has_indoor = any(cam in indoor_cams for cam in cameras)
-        
-        if has_doorbell and has_indoor:
-            return True
-        
-        return False
+        - 从门口进入室内
+        """
+        return features['has_stranger'] and features['has_doorbell'] and features['has_indoor']
     
     def _get_event_type_description(self, event_type: str) -> str:
         """
@@ -540,17 +634,9 @@ class ContextBuilder:
         Returns:
             事件类型描述
         """
-        descriptions = {
-            'delivery': '快递/配送事件（人物在门口短暂停留，可能拿着包裹）',
-            'service': '服务事件（维修、清洁等，人物长时间停留）',
-            'dangerous': '危险事件（持枪、可疑行为等，需要特别注意）',
-            'visitor': '访客事件（陌生人进入室内）',
-            'normal': '正常活动事件'
-        }
-        
-        return descriptions.get(event_type, '未知事件类型')
+        return EVENT_TYPE_DESCRIPTIONS.get(event_type, '未知事件类型')
     
-    def _get_event_type_hint(self, event_type: str) -> Optional[str]:
+    def _get_event_type_hint(self, event_type: Optional[str]) -> Optional[str]:
         """
         获取事件类型的温和提示（仅作为参考信息，不强制）
         
@@ -558,20 +644,6 @@ class ContextBuilder:
             event_type: 事件类型
         
         Returns:
-            温和的提示信息，如果不需要提示则返回 None
-        """
-        # 只对非正常事件提供提示，且提示要温和
-        hints = {
-            'delivery': '注意观察人物是否拿着物品、在门口短暂停留等特征',
-            'service': '注意观察人物是否携带工具、长时间停留等特征',
-            'dangerous': '注意观察人物行为是否异常、是否有可疑动作等特征',
-            'visitor': '注意观察人物是否从门口进入室内等特征',
-        }
-        
-        # 返回温和的提示，不强制要求
-        hint = hints.get(event_type)
-        if hint:
-            return f"根据观察到的人物动作和活动模式，{hint}，自然地判断事件类型"
-        
-        return None
-
+            温和的提示信息，如果不需要提示（如正常事件）则返回 None
+        """
+        return EVENT_TYPE_HINTS.get(event_type)
@@ -7,6 +7,8 @@ from typing import List, Dict, Any, Set, Optional, Tuple
 from datetime import datetime
 import logging
 
+from ..common.clip_index import get_clip_index, detection_score
+
 logger = logging.getLogger(__name__)
 
 
@@ -112,37 +114,34 @@ class EventAggregator:
         stranger_count = 0
         
         for clip in clips:
-            for frame_people in clip.get('people_detected', []):
-                for person in frame_people:
-                    person_id = person.get('person_id')
-                    role = person.get('role', 'stranger')
-                    method = person.get('method', 'unknown')
-                    
-                    if person_id:
-                        people_ids.add(person_id)
-                        
-                        # 更新人物信息（保留最新的信息）
-                        if person_id not in people_info:
-                            people_info[person_id] = {
-                                'person_id': person_id,
-                                'role': role,
-                                'method': method,
-                                'first_seen': clip['time'],
-                                'last_seen': clip['time'],
-                                'cameras': set([clip['cam']])
-                            }
-                        else:
-                            # 更新最后出现时间和摄像头
-                            people_info[person_id]['last_seen'] = clip['time']
-                            people_info[person_id]['cameras'].add(clip['cam'])
-                        
-                        # 如果这个 person_id 对应的是陌生人（role='stranger' 或 'unknown'），也标记
-                        if role in ['stranger', 'unknown']:
-                            has_strangers = True
-                    elif role == 'stranger':
-                        # 统计陌生人（即使没有 person_id）
-                        has_strangers = True
-                        stranger_count += 1
+            index = get_clip_index(clip)
+            
+            for person_id, summary in index.persons.items():
+                people_ids.add(person_id)
+                
+                # 更新人物信息（保留最新的信息）
+                if person_id not in people_info:
+                    people_info[person_id] = {
+                        'person_id': person_id,
+                        'role': summary['role'],
+                        'method': summary['method'],
+                        'first_seen': clip['time'],
+                        'last_seen': clip['time'],
+                        'cameras': set([clip['cam']])
+                    }
+                else:
+                    # 更新最后出现时间和摄像头
+                    people_info[person_id]['last_seen'] = clip['time']
+                    people_info[person_id]['cameras'].add(clip['cam'])
+                
+                # 如果这个 person_id 对应的是陌生人（role='stranger' 或 'unknown'），也标记
+                if 'stranger' in summary['roles'] or 'unknown' in summary['roles']:
+                    has_strangers = True
+            
+            # 统计陌生人（即使没有 person_id）
+            if index.anonymous_stranger_count:
+                has_strangers = True
+                stranger_count += index.anonymous_stranger_count
         
         # 将摄像头集合转换为列表
         for person_id in people_info:
@@ -200,40 +199,27 @@ class EventAggregator:
                     'confidence': float,
                     'method': str,
                     'frame_idx': int,
+                    'keyframe_path': Optional[str],  # 第一阶段保存的裁剪图（未保存时为 None）
                     'clip_time': datetime,
                     'cam': str
                 }
             }
         """
         keyframes: Dict[int, Dict] = {}
+        best_scores: Dict[int, float] = {}
         
-        for person_id in people_ids:
-            best_detection = None
-            best_score = -1
-            
-            # 遍历所有 Clip 的所有帧，寻找最佳检测
-            for clip in clips:
-                for frame_idx, frame_people in enumerate(clip.get('people_detected', [])):
-                    for person in frame_people:
-                        if person.get('person_id') != person_id:
-                            continue
-                        
-                        # 计算评分
-                        score = self._calculate_detection_score(person)
-                        
-                        if score > best_score:
-                            best_score = score
-                            best_detection = {
-                                'bbox': person.get('bbox'),
-                                'confidence': person.get('confidence', 0.0),
-                                'method': person.get('method', 'unknown'),
-                                'frame_idx': frame_idx,
-                                'clip_time': clip['time'],
-                                'cam': clip['cam']
-                            }
-            
-            if best_detection:
-                keyframes[person_id] = best_detection
+        # 每个 Clip 的索引已记录了各人物的最佳检测，这里只需在 Clip 之间比较
+        for clip in clips:
+            for person_id, summary in get_clip_index(clip).persons.items():
+                if person_id not in people_ids:
+                    continue
+                if summary['best_score'] > best_scores.get(person_id, -1):
+                    best_scores[person_id] = summary['best_score']
+                    keyframes[person_id] = {
+                        **summary['best_detection'],
+                        'clip_time': clip['time'],
+                        'cam': clip['cam']
+                    }
         
         return keyframes
     
@@ -252,25 +238,4 @@ class EventAggregator:
         Returns:
             评分（越高越好）
         """
-        score = 0.0
-        
-        # 方法加分
-        method = person.get('method', 'unknown')
-        if method == 'face':
-            score += 100
-        elif method == 'body':
-            score += 50
-        
-        # 置信度加分
-        confidence = person.get('confidence', 0.0)
-        score += confidence * 10
-        
-        # bbox 面积加分
-        bbox = person.get('bbox')
-        if bbox:
-            x1, y1, x2, y2 = bbox
-            area = (x2 - x1) * (y2 - y1)
-            score += area * 0.01
-        
-        return score
-
+        return detection_score(person)
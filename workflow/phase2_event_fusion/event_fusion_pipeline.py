@@ -4,7 +4,9 @@
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union, Iterable, Iterator
+from datetime import datetime
 
 from .stream_sorter import StreamSorter
 from .fusion_policy import FusionPolicy
@@ -16,29 +18,111 @@ from .identity_refiner import IdentityRefiner
 logger = logging.getLogger(__name__)
 
 
+def _build_event_chunk(components: Tuple[EventAggregator, IdentityRefiner, ContextBuilder],
+                       chunk: List[Tuple[int, List[Dict[str, Any]]]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    在工作线程 / 子进程中加工一批事件（模块级函数，便于进程池序列化）
+    
+    Args:
+        components: (aggregator, identity_refiner, context_builder)
+        chunk: [(事件序号, 事件 Clip 列表), ...]
+    
+    Returns:
+        与 chunk 顺序一致的 Global_Event 列表（打包失败的位置为 None）
+    """
+    aggregator, identity_refiner, context_builder = components
+    return [
+        build_global_event(aggregator, identity_refiner, context_builder, event_clips, idx)
+        for idx, event_clips in chunk
+    ]
+
+
+def build_global_event(aggregator: EventAggregator,
+                       identity_refiner: IdentityRefiner,
+                       context_builder: ContextBuilder,
+                       event_clips: List[Dict[str, Any]], idx: int) -> Optional[Dict[str, Any]]:
+    """
+    把一个事件的 Clip 列表加工成 Global_Event（打包 → 身份一致性检查 → 构建 Prompt）
+    
+    Args:
+        aggregator: 事件聚合器
+        identity_refiner: 身份一致性检查器
+        context_builder: 上下文构建器
+        event_clips: 属于同一事件的 Clip 列表（按时间排序）
+        idx: 事件序号（用于日志）
+    
+    Returns:
+        Global_Event，打包失败时返回 None
+    """
+    logger.info(f"\n处理事件 #{idx}: {len(event_clips)} 个 Clip")
+    
+    # 打包事件
+    global_event = aggregator.pack(event_clips)
+    
+    if not global_event:
+        logger.warning(f"⚠️  事件 #{idx} 打包失败")
+        return None
+    
+    # 4.5. 身份一致性检查（新增模块）
+    logger.info(f"[模块 4.5] 身份一致性检查...")
+    global_event = identity_refiner.refine_event_identities(global_event)
+    
+    # 4. 模块 5: 构建 Prompt 上下文
+    logger.info(f"[模块 5] 构建 Prompt 上下文...")
+    prompt_text = context_builder.build(global_event)
+    global_event['prompt_text'] = prompt_text
+    
+    return global_event
+
+
 class Event_Fusion_Pipeline:
     """第二阶段：时空事件合并 Pipeline"""
     
-    def __init__(self, time_threshold: int = 60):
+    def __init__(self, time_threshold: int = 60, max_lateness: float = 120.0,
+                 max_buffered_clips: int = 1000, workers: int = 1,
+                 parallel_backend: str = 'process', chunk_size: int = 16,
+                 fusion_rules: Union[str, Dict[str, Any], None] = None,
+                 max_prompt_tokens: Optional[int] = 1024):
         """
         初始化 Event Fusion Pipeline
         
         Args:
             time_threshold: 时间阈值（秒），超过此值认为不属于同一事件
+            max_lateness: 流式模式（feed/flush）下允许 Clip 迟到的最长时间（秒）
+            max_buffered_clips: 流式模式下重排缓冲区的 Clip 上限
+            workers: 并行加工完成事件（打包 → 身份检查 → 构建 Prompt）的工作数，1 表示顺序执行
+            parallel_backend: 'process'（进程池，绕过 GIL，适合大批量回填）或 'thread'（线程池）
+            chunk_size: 每个任务包含的事件数（减少任务调度和进程间传输次数）
+            fusion_rules: 融合规则（规则字典或 JSON 文件路径，见 fusion_rules.DEFAULT_FUSION_RULES），
+                None 表示读取环境变量 FUSION_RULES_PATH，未设置则使用默认规则
+            max_prompt_tokens: 每个事件 Prompt 的 token 预算（估算值），超出时压缩时间线；None 表示不限制
         """
+        if parallel_backend not in ('process', 'thread'):
+            raise ValueError(f"不支持的并行方式: {parallel_backend}（可选 'process' / 'thread'）")
+        
         logger.info("=" * 60)
         logger.info("初始化 Event Fusion Pipeline (第二阶段)")
         logger.info("=" * 60)
         
         # 初始化各个模块
-        self.sorter = StreamSorter()                    # 模块 1
-        self.policy = FusionPolicy(time_threshold)      # 模块 2
+        self.sorter = StreamSorter(max_lateness, max_buffered_clips)  # 模块 1
+        self.policy = FusionPolicy(time_threshold, fusion_rules)  # 模块 2
         self.session_manager = SessionManager(self.policy)  # 模块 3
         self.aggregator = EventAggregator()             # 模块 4
         self.identity_refiner = IdentityRefiner()       # 模块 4.5: 身份一致性检查
-        self.context_builder = ContextBuilder()        # 模块 5
+        self.context_builder = ContextBuilder(max_prompt_tokens)  # 模块 5
         
-        logger.info(f"✅ Event Fusion Pipeline 初始化完成 (时间阈值: {time_threshold}秒)")
+        # 流式模式已输出的事件数（用于日志编号）
+        self._streamed_events = 0
+        
+        # 事件加工的并行配置（执行器在第一次需要时创建，跨调用复用）
+        self.workers = max(1, workers)
+        self.parallel_backend = parallel_backend
+        self.chunk_size = max(1, chunk_size)
+        self._executor: Optional[Executor] = None
+        
+        logger.info(f"✅ Event Fusion Pipeline 初始化完成 (时间阈值: {self.policy.time_threshold:g}秒"
+                   f"{f', {self.workers} 个{parallel_backend}工作单元' if self.workers > 1 else ''})")
     
     def run(self, raw_clips: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -67,7 +151,8 @@ class Event_Fusion_Pipeline:
                     'people_info': Dict[int, Dict],
                     'clips': List[Dict],
                     'keyframes': Dict[int, Dict],
-                    'prompt_text': str
+                    'prompt_text': str,
+                    'timeline_compressed': bool  # 时间线是否因超出 token 预算被压缩
                 },
                 ...
             ]
@@ -88,48 +173,32 @@ class Event_Fusion_Pipeline:
             logger.warning("⚠️  排序后没有有效 Clip")
             return []
         
-        # 2. 模块 3: 滑动窗口会话管理（遍历并分组）
+        # 2. 模块 2-3: 先按时间间隔切段（段与段之间一定不相连），再在段内做会话管理
         logger.info("\n[模块 2-3] 事件分组...")
         self.session_manager.reset()
         
-        event_clips_list = []  # List[List[Clip_Obj]]
+        segments = self.policy.segment(sorted_clips)
+        logger.info(f"   时间切分: {len(segments)} 段")
         
-        for clip in sorted_clips:
-            completed_events = self.session_manager.process_clip(clip)
-            if completed_events:
-                event_clips_list.extend(completed_events)
+        event_clips_list = []  # List[List[Clip_Obj]]
         
-        # 处理最后一个事件
-        final_event = self.session_manager.finalize()
-        if final_event:
-            event_clips_list.extend(final_event)
+        for segment in segments:
+            if len(segment) == 1:
+                # 孤立的 Clip 自成一个事件，无需检查身份规则
+                event_clips_list.append(segment)
+                continue
+            
+            for clip in segment:
+                event_clips_list.extend(self.session_manager.process_clip(clip))
+            
+            # 段结束：剩余会话不可能再与后面的 Clip 连接
+            event_clips_list.extend(self.session_manager.finalize())
         
         logger.info(f"✅ 事件分组完成: {len(event_clips_list)} 个事件")
         
         # 3. 模块 4: 全局事件聚合（打包每个事件）
         logger.info("\n[模块 4] 事件聚合...")
-        global_events = []
-        
-        for idx, event_clips in enumerate(event_clips_list, 1):
-            logger.info(f"\n处理事件 #{idx}: {len(event_clips)} 个 Clip")
-            
-            # 打包事件
-            global_event = self.aggregator.pack(event_clips)
-            
-            if not global_event:
-                logger.warning(f"⚠️  事件 #{idx} 打包失败")
-                continue
-            
-            # 4.5. 身份一致性检查（新增模块）
-            logger.info(f"[模块 4.5] 身份一致性检查...")
-            global_event = self.identity_refiner.refine_event_identities(global_event)
-            
-            # 4. 模块 5: 构建 Prompt 上下文
-            logger.info(f"[模块 5] 构建 Prompt 上下文...")
-            prompt_text = self.context_builder.build(global_event)
-            global_event['prompt_text'] = prompt_text
-            
-            global_events.append(global_event)
+        global_events = self._build_global_events(list(enumerate(event_clips_list, 1)))
         
         logger.info("\n" + "=" * 60)
         logger.info(f"✅ 事件融合完成: {len(global_events)} 个全局事件")
@@ -149,6 +218,170 @@ class Event_Fusion_Pipeline:
         
         return global_events
     
+    def run_backfill(self, source: Union[Iterable[Dict[str, Any]], Iterable[Iterable[Dict[str, Any]]]],
+                     presorted_streams: bool = False,
+                     spool_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        大批量回填：惰性读取 Clip，事件一旦完成就产出，内存占用与数据总量无关
+        
+        与 run 分组结果相同，但不把 Clip 列表和全部事件放在内存中：
+        - presorted_streams=False：source 是 Clip_Obj 可迭代对象（可能无序），先做外部排序（Clip 暂存到磁盘）
+        - presorted_streams=True：source 是各自有序的 Clip 流（如每个摄像头一路），直接 k 路归并
+        
+        workers > 1 时攒够 workers * chunk_size 个完成的事件再并行加工。
+        
+        Args:
+            source: Clip_Obj 可迭代对象，或各自有序的 Clip 流列表
+            presorted_streams: source 是否为各自有序的 Clip 流列表
+            spool_dir: 外部排序的暂存文件目录，None 表示使用系统临时目录
+        
+        Yields:
+            Global_Event（格式同 run 的返回值）
+        """
+        logger.info("=" * 60)
+        logger.info(f"开始事件融合回填 ({'k 路归并' if presorted_streams else '外部排序'})")
+        logger.info("=" * 60)
+        
+        if presorted_streams:
+            ordered_clips = self.sorter.merge_streams(source)
+        else:
+            ordered_clips = self.sorter.sort_external(source, spool_dir)
+        
+        self.session_manager.reset()
+        batch_size = self.workers * self.chunk_size if self.workers > 1 else 1
+        pending = []  # 已完成、尚未加工的事件 Clip 列表
+        event_count = 0
+        
+        for clip in ordered_clips:
+            pending.extend(self.session_manager.process_clip(clip))
+            if len(pending) >= batch_size:
+                yield from self._build_global_events(list(enumerate(pending, event_count + 1)))
+                event_count += len(pending)
+                pending = []
+        
+        pending.extend(self.session_manager.finalize())
+        yield from self._build_global_events(list(enumerate(pending, event_count + 1)))
+        event_count += len(pending)
+        
+        logger.info(f"✅ 事件融合回填完成: {event_count} 个事件")
+    
+    def feed(self, clip: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        流式模式：推入一个 Clip，返回此时已经确定完成的 Global_Event
+        
+        Clip 可以乱序到达，只要迟到不超过 max_lateness；内存中只保留重排缓冲区和当前事件。
+        
+        Args:
+            clip: 第一阶段输出的单个 Clip_Obj
+        
+        Returns:
+            已完成的 Global_Event 列表（格式同 run 的返回值），通常为空
+        """
+        ready_clips = self.sorter.push(clip)
+        return self._advance(ready_clips, self.sorter.watermark)
+    
+    def flush(self, watermark: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        流式模式：推进水位线并输出已完成的 Global_Event
+        
+        Args:
+            watermark: 调用方保证此后不会再有早于该时间的 Clip（如摄像头当前时间）。
+                为 None 表示数据流结束：放出所有缓冲的 Clip 并封存最后一个事件，之后可以开始新的数据流。
+        
+        Returns:
+            已完成的 Global_Event 列表
+        """
+        if watermark is not None:
+            return self._advance(self.sorter.release(watermark), watermark)
+        
+        global_events = self._advance(self.sorter.drain(), None)
+        global_events.extend(self._emit(self.session_manager.finalize()))
+        
+        self.session_manager.reset()
+        self.sorter.reset()
+        self._streamed_events = 0
+        
+        return global_events
+    
+    def _advance(self, ready_clips: List[Dict[str, Any]],
+                 watermark: Optional[datetime]) -> List[Dict[str, Any]]:
+        """把按序放出的 Clip 交给会话管理器，并封存水位线之前已超时的事件"""
+        event_clips_list = []
+        for clip in ready_clips:
+            event_clips_list.extend(self.session_manager.process_clip(clip))
+        
+        if watermark is not None:
+            event_clips_list.extend(self.session_manager.close_expired(watermark))
+        
+        return self._emit(event_clips_list)
+    
+    def _emit(self, event_clips_list: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """流式模式：编号并构建一批完成的事件"""
+        numbered = list(enumerate(event_clips_list, self._streamed_events + 1))
+        self._streamed_events += len(numbered)
+        return self._build_global_events(numbered)
+    
+    def _build_global_events(self, numbered_events: List[Tuple[int, List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """
+        加工一批完成的事件，输出顺序与输入一致（打包失败的事件被丢弃）
+        
+        事件之间相互独立：workers > 1 且事件数超过一个 chunk 时，按 chunk 分发到线程池 / 进程池并行加工。
+        进程池模式下返回的是子进程加工后的副本，输入的 Clip 对象不会被修改。
+        
+        Args:
+            numbered_events: [(事件序号, 事件 Clip 列表), ...]
+        
+        Returns:
+            Global_Event 列表
+        """
+        if self.workers <= 1 or len(numbered_events) <= self.chunk_size:
+            results = [self._build_global_event(event_clips, idx) for idx, event_clips in numbered_events]
+        else:
+            chunks = [numbered_events[i:i + self.chunk_size]
+                      for i in range(0, len(numbered_events), self.chunk_size)]
+            components = (self.aggregator, self.identity_refiner, self.context_builder)
+            executor = self._get_executor()
+            logger.info(f"   并行加工 {len(numbered_events)} 个事件: {len(chunks)} 个任务, "
+                       f"{self.workers} 个{self.parallel_backend}工作单元")
+            # Executor.map 按提交顺序返回结果
+            results = [
+                global_event
+                for chunk_result in executor.map(_build_event_chunk, [components] * len(chunks), chunks)
+                for global_event in chunk_result
+            ]
+        
+        return [global_event for global_event in results if global_event]
+    
+    def _get_executor(self) -> Executor:
+        """懒加载事件加工执行器"""
+        if self._executor is None:
+            if self.parallel_backend == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='event-fusion')
+        return self._executor
+    
+    def close(self):
+        """关闭事件加工执行器（workers > 1 时，处理结束后调用）"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+    
+    def _build_global_event(self, event_clips: List[Dict[str, Any]], idx: int) -> Optional[Dict[str, Any]]:
+        """
+        把一个事件的 Clip 列表加工成 Global_Event（打包 → 身份一致性检查 → 构建 Prompt）
+        
+        Args:
+            event_clips: 属于同一事件的 Clip 列表（按时间排序）
+            idx: 事件序号（用于日志）
+        
+        Returns:
+            Global_Event，打包失败时返回 None
+        """
+        return build_global_event(self.aggregator, self.identity_refiner, self.context_builder,
+                                  event_clips, idx)
+    
     def get_event_summary(self, global_event: Dict[str, Any]) -> str:
         """
         获取事件的简要摘要（用于日志输出）
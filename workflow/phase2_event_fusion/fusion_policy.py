@@ -1,27 +1,81 @@
 """
 模块 2: 融合策略引擎 (Fusion Policy Engine)
 职责：判断两个 Clip 是否属于同一个事件
+
+规则来自声明式的融合规则集（见 fusion_rules.py），可以按家庭配置时间阈值、按摄像头的阈值、摄像头邻接关系和身份规则。
+批量处理时先用 segment 对整条 Clip 序列做一次向量化的时间间隔切分：间隔达到最大时间阈值的位置一定是事件边界，
+身份规则只需要在各段内部检查。
 """
 
-from typing import Dict, Any, Set
+from typing import Dict, Any, List, Set, Union
 from datetime import datetime, timedelta
+import numpy as np
 import logging
 
+from ..common.clip_index import get_clip_index
+from .fusion_rules import FusionRuleSet
+
 logger = logging.getLogger(__name__)
 
 
 class FusionPolicy:
     """融合策略引擎"""
     
-    def __init__(self, time_threshold: int = 60):
+    def __init__(self, time_threshold: int = 60,
+                 rules: Union[FusionRuleSet, str, Dict[str, Any], None] = None):
         """
         初始化融合策略
         
         Args:
-            time_threshold: 时间阈值（秒），超过此值认为不属于同一事件
+            time_threshold: 时间阈值（秒），超过此值认为不属于同一事件（规则中配置了 time_threshold 时以规则为准）
+            rules: 融合规则（FusionRuleSet、规则字典或 JSON 文件路径），None 表示读取环境变量
+                FUSION_RULES_PATH，未设置则使用默认规则
+        """
+        if isinstance(rules, FusionRuleSet):
+            self.rules = rules
+        else:
+            self.rules = FusionRuleSet(rules, time_threshold)
+        
+        self.time_threshold = self.rules.time_threshold
+        logger.debug(f"初始化融合策略: 时间阈值={self.time_threshold}秒, "
+                    f"最大时间阈值={self.max_time_threshold}秒")
+    
+    @property
+    def max_time_threshold(self) -> float:
+        """任意两个 Clip 能够连接的最大时间间隔（秒），达到该间隔的会话可以关闭"""
+        return self.rules.max_time_threshold
+    
+    @property
+    def max_identity_gap(self) -> float:
+        """不依赖共同人物的身份规则允许的最大时间间隔（秒）"""
+        return self.rules.max_role_gap
+    
+    def segment(self, clips: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        按时间间隔把已排序的 Clip 序列切分成互不相连的段
+        
+        相邻 Clip 的间隔达到最大时间阈值时，后面的 Clip 与前面任何 Clip 都不可能连接，
+        因此这些位置一定是事件边界。间隔用 NumPy 一次计算，不需要逐对调用 is_connected。
+        
+        Args:
+            clips: 按时间排序的 Clip 列表
+        
+        Returns:
+            Clip 段列表（每段内部再由会话管理器按身份规则分组）
         """
-        self.time_threshold = time_threshold
-        logger.debug(f"初始化融合策略: 时间阈值={time_threshold}秒")
+        if len(clips) < 2:
+            return [clips] if clips else []
+        
+        base_time = clips[0]['time']
+        offsets = np.fromiter(((clip['time'] - base_time).total_seconds() for clip in clips),
+                              dtype=np.float64, count=len(clips))
+        cuts = np.flatnonzero(np.diff(offsets) >= self.max_time_threshold) + 1
+        
+        bounds = [0, *cuts.tolist(), len(clips)]
+        segments = [clips[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        
+        logger.debug(f"时间切分: {len(clips)} 个 Clip → {len(segments)} 段")
+        return segments
     
     def is_connected(self, last_clip: Dict[str, Any], current_clip: Dict[str, Any]) -> bool:
         """
@@ -34,20 +88,23 @@ class FusionPolicy:
         Returns:
             True 如果应该合并，False 如果应该断开
         """
-        # 1. 时间规则：检查时间间隔
-        time_connected = self._check_time_rule(last_clip, current_clip)
-        
-        # 2. 身份规则：检查人物交集
-        identity_connected = self._check_identity_rule(last_clip, current_clip)
+        # 依次检查时间规则、空间规则（摄像头邻接关系）和身份规则，全部满足才合并（前面的规则不满足时不再检查后面的）
+        if not self._check_time_rule(last_clip, current_clip):
+            failed_rule = '时间'
+        elif not self._check_camera_rule(last_clip, current_clip):
+            failed_rule = '空间'
+        elif not self._check_identity_rule(last_clip, current_clip):
+            failed_rule = '身份'
+        else:
+            failed_rule = None
         
-        # 两个规则都满足才合并
-        is_connected = time_connected and identity_connected
+        is_connected = failed_rule is None
         
         if is_connected:
             logger.debug(f"✅ Clip 连接: {last_clip['time']} -> {current_clip['time']}")
         else:
             logger.debug(f"❌ Clip 断开: {last_clip['time']} -> {current_clip['time']} "
-                        f"(时间: {time_connected}, 身份: {identity_connected})")
+                        f"({failed_rule}规则不满足)")
         
         return is_connected
     
@@ -61,7 +118,7 @@ class FusionPolicy:
             current_clip: 当前 Clip
         
         Returns:
-            True 如果时间间隔 < 阈值
+            True 如果时间间隔 < 阈值（两个摄像头中较大的阈值）
         """
         last_time = last_clip['time']
         current_time = current_clip['time']
@@ -74,17 +131,31 @@ class FusionPolicy:
             logger.warning(f"⚠️  时间顺序异常: {last_time} > {current_time}")
             return False
         
-        return time_diff < self.time_threshold
+        return time_diff < self.rules.pair_threshold(last_clip['cam'], current_clip['cam'])
+    
+    def _check_camera_rule(self, last_clip: Dict[str, Any],
+                          current_clip: Dict[str, Any]) -> bool:
+        """
+        空间规则：检查两个摄像头是否相同或相邻（未配置邻接关系的摄像头不受限制）
+        
+        Args:
+            last_clip: 上一个 Clip
+            current_clip: 当前 Clip
+        
+        Returns:
+            True 如果两个摄像头可以连接
+        """
+        return self.rules.cameras_compatible(last_clip['cam'], current_clip['cam'])
     
     def _check_identity_rule(self, last_clip: Dict[str, Any], 
                             current_clip: Dict[str, Any]) -> bool:
         """
-        身份规则：检查人物交集
+        身份规则：按顺序检查规则集中的身份规则，任意一条满足即可
         
-        规则：
+        默认规则：
         1. 如果有共同的人物（person_id 相同），返回 True
-        2. 如果都是陌生人且时间极短，返回 True（视为连续入侵）
-        3. 如果一个是家人一个是陌生人，且时间重叠，返回 True（视为交互）
+        2. 如果都是陌生人且时间极短（< 10秒），返回 True（视为连续入侵）
+        3. 如果一个是家人一个是陌生人，且时间重叠（< 5秒），返回 True（视为交互）
         
         Args:
             last_clip: 上一个 Clip
@@ -93,27 +164,12 @@ class FusionPolicy:
         Returns:
             True 如果满足身份规则
         """
-        # 提取两个 Clip 中的人物集合
-        last_people = self._extract_people_set(last_clip)
-        current_people = self._extract_people_set(current_clip)
-        
-        # 规则1：有共同的人物
-        if last_people['person_ids'] & current_people['person_ids']:
-            return True
-        
-        # 规则2：都是陌生人且时间极短（< 10秒）
         time_diff = (current_clip['time'] - last_clip['time']).total_seconds()
-        if (last_people['all_strangers'] and current_people['all_strangers'] 
-            and time_diff < 10):
-            return True
-        
-        # 规则3：一个是家人一个是陌生人，且时间重叠（同一时间或时间差 < 5秒）
-        if (time_diff < 5 and 
-            ((last_people['has_family'] and current_people['has_stranger']) or
-             (last_people['has_stranger'] and current_people['has_family']))):
-            return True
-        
-        return False
+        matched = self.rules.match_identity(get_clip_index(last_clip), get_clip_index(current_clip),
+                                            time_diff)
+        if matched:
+            logger.debug(f"身份规则命中: {matched}")
+        return matched is not None
     
     def _extract_people_set(self, clip: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -131,30 +187,13 @@ class FusionPolicy:
                 'has_stranger': bool      # 是否有陌生人
             }
         """
-        person_ids = set()
-        has_family = False
-        has_stranger = False
-        
-        # 遍历所有帧的所有人物
-        for frame_people in clip.get('people_detected', []):
-            for person in frame_people:
-                person_id = person.get('person_id')
-                role = person.get('role', 'stranger')
-                
-                if person_id:
-                    person_ids.add(person_id)
-                
-                if role == 'family':
-                    has_family = True
-                elif role == 'stranger':
-                    has_stranger = True
-        
-        all_strangers = has_stranger and not has_family
+        # 直接读取 Clip 的人物索引（一次遍历建立），不再逐帧扫描
+        index = get_clip_index(clip)
         
         return {
-            'person_ids': person_ids,
-            'all_strangers': all_strangers,
-            'has_family': has_family,
-            'has_stranger': has_stranger
+            'person_ids': index.person_ids,
+            'all_strangers': index.all_strangers,
+            'has_family': index.has_family,
+            'has_stranger': index.has_stranger
         }
 
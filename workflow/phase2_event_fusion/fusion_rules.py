@@ -0,0 +1,194 @@
+"""
+融合规则集 (Fusion Rule Set)
+职责：把声明式的融合规则（时间阈值、按摄像头的阈值、摄像头邻接关系、身份/角色组合规则）编译成融合策略引擎可以直接执行的形式
+
+规则可以来自字典或 JSON 文件（环境变量 FUSION_RULES_PATH），每个家庭可以单独调整，无需修改代码。
+未配置的字段使用 DEFAULT_FUSION_RULES 中的默认值，默认值与原先硬编码的规则完全一致。
+"""
+
+import os
+import json
+from operator import attrgetter
+from typing import Dict, Any, Optional, Set, Tuple, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 默认规则（与原 FusionPolicy 硬编码的行为一致）
+DEFAULT_FUSION_RULES: Dict[str, Any] = {
+    # 相邻两个 Clip 的最大时间间隔（秒），不小于该值则断开
+    'time_threshold': 60,
+    # 按摄像头覆盖时间阈值，如 {"doorbell": 90}；两个 Clip 取两者中较大的阈值
+    'camera_thresholds': {},
+    # 摄像头邻接关系（无向），如 {"doorbell": ["indoor_hall"]}；
+    # 两个摄像头都出现在邻接表中时，只有相同或相邻的摄像头才能连接，未列出的摄像头不受限制
+    'camera_adjacency': {},
+    # 身份规则（按顺序检查，任意一条满足即可）
+    'identity_rules': [
+        # 有共同的人物（person_id 相同）
+        {'name': 'shared_person', 'type': 'shared_person'},
+        # 都是陌生人且时间极短，视为连续入侵
+        {'name': 'stranger_burst', 'type': 'roles',
+         'last': 'all_strangers', 'current': 'all_strangers', 'max_gap': 10},
+        # 一个是家人一个是陌生人，且时间重叠，视为交互
+        {'name': 'family_stranger_interaction', 'type': 'roles',
+         'last': 'has_family', 'current': 'has_stranger', 'max_gap': 5, 'symmetric': True},
+    ],
+}
+
+# 角色规则可用的 Clip 条件（对应 ClipIndex 的属性）
+ROLE_PREDICATES = ('has_family', 'has_stranger', 'all_strangers', 'any')
+
+
+def load_fusion_rules(source: Union[str, Dict[str, Any], None] = None) -> Tuple[Dict[str, Any], Set[str]]:
+    """
+    加载融合规则并与默认规则合并
+    
+    Args:
+        source: 规则字典、JSON 文件路径，或 None（读取环境变量 FUSION_RULES_PATH，未设置则使用默认规则）
+    
+    Returns:
+        (完整的规则字典, 规则来源中显式配置的字段集合)
+    """
+    if source is None:
+        source = os.getenv('FUSION_RULES_PATH') or None
+    
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        logger.info(f"📦 加载融合规则: {source}")
+    else:
+        overrides = source or {}
+    
+    unknown = set(overrides) - set(DEFAULT_FUSION_RULES)
+    if unknown:
+        raise ValueError(f"未知的融合规则字段: {sorted(unknown)}")
+    
+    rules = dict(DEFAULT_FUSION_RULES)
+    rules.update(overrides)
+    return rules, set(overrides)
+
+
+class FusionRuleSet:
+    """编译后的融合规则集"""
+    
+    def __init__(self, rules: Union[str, Dict[str, Any], None] = None,
+                 time_threshold: Optional[float] = None):
+        """
+        编译融合规则
+        
+        Args:
+            rules: 规则字典或 JSON 文件路径（见 DEFAULT_FUSION_RULES），None 表示使用默认规则
+            time_threshold: 默认时间阈值（秒）；规则（字典、JSON 文件或 FUSION_RULES_PATH）中
+                显式配置了 time_threshold 时以规则为准
+        
+        Raises:
+            ValueError: 规则格式不正确
+        """
+        config, overridden = load_fusion_rules(rules)
+        if time_threshold is not None and 'time_threshold' not in overridden:
+            config['time_threshold'] = time_threshold
+        
+        self.time_threshold = float(config['time_threshold'])
+        self.camera_thresholds: Dict[str, float] = {
+            cam: float(threshold) for cam, threshold in config['camera_thresholds'].items()
+        }
+        # 任意两个 Clip 能够连接的最大时间间隔（用于分段和会话超时）
+        self.max_time_threshold = max([self.time_threshold, *self.camera_thresholds.values()])
+        
+        self.adjacency: Dict[str, Set[str]] = {}
+        for cam, neighbors in config['camera_adjacency'].items():
+            for neighbor in neighbors:
+                self.adjacency.setdefault(cam, set()).add(neighbor)
+                self.adjacency.setdefault(neighbor, set()).add(cam)
+        
+        self.identity_rules = [self._compile_identity_rule(rule) for rule in config['identity_rules']]
+        # 不依赖共同人物的规则允许的最大时间间隔（会话管理器据此决定"最近活跃"窗口）
+        self.max_role_gap = max(
+            [rule[4] for rule in self.identity_rules if rule[1] == 'roles'] or [0.0]
+        )
+        
+        logger.debug(f"融合规则: 时间阈值={self.time_threshold}秒, "
+                     f"摄像头阈值={self.camera_thresholds}, "
+                     f"身份规则={[rule[0] for rule in self.identity_rules]}")
+    
+    def _compile_identity_rule(self, rule: Dict[str, Any]) -> Tuple[str, str, Any, Any, float, bool]:
+        """
+        编译一条身份规则
+        
+        Returns:
+            (name, type, last_predicate, current_predicate, max_gap, symmetric)，
+            角色规则的条件编译为 ClipIndex -> bool 的函数（'any' 编译为 None）
+        """
+        rule_type = rule.get('type')
+        name = rule.get('name', rule_type)
+        max_gap = float(rule['max_gap']) if rule.get('max_gap') is not None else float('inf')
+        
+        if rule_type == 'shared_person':
+            return (name, rule_type, None, None, max_gap, True)
+        
+        if rule_type == 'roles':
+            last = rule.get('last', 'any')
+            current = rule.get('current', 'any')
+            for predicate in (last, current):
+                if predicate not in ROLE_PREDICATES:
+                    raise ValueError(f"身份规则 {name} 的条件无效: {predicate}（可选 {ROLE_PREDICATES}）")
+            if max_gap == float('inf'):
+                raise ValueError(f"角色规则 {name} 必须配置 max_gap")
+            return (name, rule_type, self._compile_predicate(last), self._compile_predicate(current),
+                    max_gap, bool(rule.get('symmetric', False)))
+        
+        raise ValueError(f"未知的身份规则类型: {rule_type}（可选 'shared_person' / 'roles'）")
+    
+    def pair_threshold(self, last_cam: str, current_cam: str) -> float:
+        """两个摄像头之间的时间阈值（取两者中较大的）"""
+        if not self.camera_thresholds:
+            return self.time_threshold
+        return max(self.camera_thresholds.get(last_cam, self.time_threshold),
+                   self.camera_thresholds.get(current_cam, self.time_threshold))
+    
+    def cameras_compatible(self, last_cam: str, current_cam: str) -> bool:
+        """两个摄像头在空间上是否可以连接"""
+        if last_cam == current_cam or not self.adjacency:
+            return True
+        if last_cam not in self.adjacency or current_cam not in self.adjacency:
+            return True
+        return current_cam in self.adjacency[last_cam]
+    
+    def match_identity(self, last_index, current_index, time_diff: float) -> Optional[str]:
+        """
+        按顺序检查身份规则
+        
+        Args:
+            last_index: 上一个 Clip 的 ClipIndex
+            current_index: 当前 Clip 的 ClipIndex
+            time_diff: 时间间隔（秒）
+        
+        Returns:
+            第一条满足的规则名，都不满足时返回 None
+        """
+        for name, rule_type, last, current, max_gap, symmetric in self.identity_rules:
+            if time_diff >= max_gap:
+                continue
+            
+            if rule_type == 'shared_person':
+                if last_index.person_ids & current_index.person_ids:
+                    return name
+                continue
+            
+            if self._check(last_index, last) and self._check(current_index, current):
+                return name
+            if symmetric and self._check(last_index, current) and self._check(current_index, last):
+                return name
+        
+        return None
+    
+    @staticmethod
+    def _compile_predicate(predicate: str):
+        """把 Clip 条件编译为读取 ClipIndex 属性的函数（'any' 返回 None）"""
+        return None if predicate == 'any' else attrgetter(predicate)
+    
+    @staticmethod
+    def _check(index, predicate) -> bool:
+        return predicate is None or predicate(index)
@@ -7,6 +7,8 @@ from typing import Dict, Any, List, Set
 from datetime import datetime, timedelta
 import logging
 
+from ..common.clip_index import get_clip_index, invalidate_clip_index
+
 logger = logging.getLogger(__name__)
 
 
@@ -47,17 +49,19 @@ class IdentityRefiner:
         if not clips:
             return global_event
         
-        # 统计事件中的人物出现情况
+        # 统计事件中的人物出现情况，并预先计算事件级的判断条件（整个事件只算一次）
         person_stats = self._analyze_person_appearances(clips)
+        event_flags = self._compute_event_flags(person_stats)
         
-        # 应用优化规则
-        refined_clips = []
+        # 应用优化规则（每个检测只访问一次）
+        promotions = {'refined_from_suspected': 0, 'refined_from_stranger': 0, 'refined_from_context': 0}
         for clip in clips:
-            refined_clip = self._refine_clip_identities(clip, person_stats)
-            refined_clips.append(refined_clip)
+            self._refine_clip_identities(clip, event_flags, promotions)
         
-        # 更新 global_event
-        global_event['clips'] = refined_clips
+        if any(promotions.values()):
+            logger.info(f"🔄 身份优化: 疑似家人→家人 {promotions['refined_from_suspected']} 次, "
+                       f"陌生人→疑似家人 {promotions['refined_from_stranger']} 次, "
+                       f"同帧家人→家人 {promotions['refined_from_context']} 次")
         
         # 重新聚合人物信息
         self._reaggregate_people_info(global_event)
@@ -85,109 +89,163 @@ class IdentityRefiner:
         
         for clip_idx, clip in enumerate(clips):
             clip_time = clip.get('time')
+            index = get_clip_index(clip)
+            
+            # 陌生人没有 person_id，使用特殊标记
+            entries = [
+                (person_id, summary['detections'], summary['roles'])
+                for person_id, summary in index.persons.items()
+            ]
+            if index.anonymous_count:
+                entries.append(('stranger_unknown', index.anonymous_count, index.anonymous_roles))
             
-            for frame_people in clip.get('people_detected', []):
-                for person in frame_people:
-                    person_id = person.get('person_id')
-                    role = person.get('role', 'stranger')
-                    
-                    if person_id is None:
-                        # 陌生人没有 person_id，使用特殊标记
-                        person_id = 'stranger_unknown'
-                    
-                    if person_id not in person_stats:
-                        person_stats[person_id] = {
-                            'appearances': 0,
-                            'roles': set(),
-                            'first_seen': clip_time,
-                            'last_seen': clip_time,
-                            'clips': []
-                        }
-                    
-                    stats = person_stats[person_id]
-                    stats['appearances'] += 1
-                    stats['roles'].add(role)
-                    stats['last_seen'] = clip_time
-                    if clip_idx not in stats['clips']:
-                        stats['clips'].append(clip_idx)
+            for person_id, detections, roles in entries:
+                if person_id not in person_stats:
+                    person_stats[person_id] = {
+                        'appearances': 0,
+                        'roles': set(),
+                        'first_seen': clip_time,
+                        'last_seen': clip_time,
+                        'clips': []
+                    }
+                
+                stats = person_stats[person_id]
+                stats['appearances'] += detections
+                stats['roles'] |= roles
+                stats['last_seen'] = clip_time
+                stats['clips'].append(clip_idx)
         
         return person_stats
     
-    def _refine_clip_identities(self, clip: Dict[str, Any], 
-                                person_stats: Dict[str, Dict]) -> Dict[str, Any]:
+    def _compute_event_flags(self, person_stats: Dict[str, Dict]) -> Dict[str, Any]:
+        """
+        预先计算事件级的判断条件（规则1、规则2只依赖事件级统计，与具体检测无关）
+        
+        Args:
+            person_stats: 人物统计信息
+        
+        Returns:
+            {
+                'frequent_ids': Set[int],     # 在事件中多次出现（>=3次）的 person_id
+                'promote_strangers': bool,    # 事件中有家人且匿名陌生人总共出现 >=3 次
+                'stranger_total_count': int   # 事件中匿名陌生人的总出现次数
+            }
+        """
+        frequent_ids = set()
+        has_family = False
+        
+        for person_id, stats in person_stats.items():
+            if person_id == 'stranger_unknown':
+                continue
+            if stats['appearances'] >= 3:
+                frequent_ids.add(person_id)
+            if 'family' in stats['roles'] or 'suspected_family' in stats['roles']:
+                has_family = True
+        
+        stranger_total_count = person_stats.get('stranger_unknown', {}).get('appearances', 0)
+        
+        return {
+            'frequent_ids': frequent_ids,
+            'promote_strangers': has_family and stranger_total_count >= 3,
+            'stranger_total_count': stranger_total_count
+        }
+    
+    def _needs_refinement(self, clip: Dict[str, Any], event_flags: Dict[str, Any]) -> bool:
+        """
+        根据 Clip 人物索引判断是否可能有规则生效（不可能时整个 Clip 跳过，不逐帧扫描）
+        
+        Args:
+            clip: Clip_Obj
+            event_flags: 事件级判断条件
+        
+        Returns:
+            True 如果需要逐帧检查
+        """
+        index = get_clip_index(clip)
+        
+        # 规则2: 匿名陌生人
+        if event_flags['promote_strangers'] and index.anonymous_stranger_count:
+            return True
+        
+        # 规则1: 多次出现的疑似家人
+        has_frequent_suspected = any(
+            'suspected_family' in index.persons[person_id]['roles']
+            for person_id in index.person_ids & event_flags['frequent_ids']
+        )
+        if has_frequent_suspected:
+            return True
+        
+        # 规则3: 有 person_id 的疑似家人/陌生人，且 Clip 中有家人
+        if index.has_family:
+            return any(
+                'suspected_family' in summary['roles'] or 'stranger' in summary['roles']
+                for summary in index.persons.values()
+            )
+        
+        return False
+    
+    def _refine_clip_identities(self, clip: Dict[str, Any],
+                                event_flags: Dict[str, Any],
+                                promotions: Dict[str, int]) -> Dict[str, Any]:
         """
         优化单个 Clip 中的身份识别
         
         Args:
             clip: Clip_Obj
-            person_stats: 人物统计信息
+            event_flags: 事件级判断条件（_compute_event_flags 的返回值）
+            promotions: 各规则的生效次数（原地累加）
         
         Returns:
             优化后的 Clip_Obj
         """
-        refined_frame_people = []
+        if not self._needs_refinement(clip, event_flags):
+            return clip
+        
+        frequent_ids = event_flags['frequent_ids']
+        promote_strangers = event_flags['promote_strangers']
+        changed = False
         
         for frame_people in clip.get('people_detected', []):
-            refined_frame = []
+            # 当前帧中的家人数（本帧中被提升为家人的人物也计入，对同一帧中后面的人物生效）
+            family_in_frame = sum(1 for p in frame_people if p.get('role') == 'family')
             
             for person in frame_people:
                 person_id = person.get('person_id')
                 role = person.get('role', 'stranger')
-                confidence = person.get('confidence', 0.0)
                 
                 # 规则1: 如果疑似家人在事件中多次出现（>=3次），提升为家人
-                if role == 'suspected_family' and person_id:
-                    if person_id in person_stats:
-                        stats = person_stats[person_id]
-                        if stats['appearances'] >= 3:
-                            logger.info(f"🔄 提升疑似家人为家人: Person ID {person_id} (出现 {stats['appearances']} 次)")
-                            person['role'] = 'family'
-                            person['method'] = 'refined_from_suspected'
-                            role = 'family'
+                if role == 'suspected_family' and person_id and person_id in frequent_ids:
+                    logger.debug(f"🔄 提升疑似家人为家人: Person ID {person_id}")
+                    person['role'] = 'family'
+                    person['method'] = 'refined_from_suspected'
+                    promotions['refined_from_suspected'] += 1
+                    changed = True
+                    role = 'family'
+                    family_in_frame += 1
                 
                 # 规则2: 如果陌生人在事件中多次出现（>=3次），且事件中有家人，标记为疑似家人
-                if role == 'stranger' and person_id is None:
-                    # 检查事件中是否有家人
-                    has_family = any(
-                        'family' in stats['roles'] or 'suspected_family' in stats['roles']
-                        for pid, stats in person_stats.items()
-                        if pid != 'stranger_unknown'
-                    )
-                    
-                    # 统计当前陌生人的出现次数（在当前 Clip 中）
-                    stranger_in_clip_count = sum(
-                        1 for p in frame_people 
-                        if p.get('role') == 'stranger' and p.get('person_id') is None
-                    )
-                    
-                    # 统计事件中所有陌生人的总出现次数
-                    stranger_total_count = person_stats.get('stranger_unknown', {}).get('appearances', 0)
-                    
-                    if has_family and stranger_total_count >= 3:
-                        logger.info(f"🔄 将多次出现的陌生人标记为疑似家人 (事件中总共出现 {stranger_total_count} 次)")
-                        person['role'] = 'suspected_family'
-                        person['method'] = 'refined_from_stranger'
-                        role = 'suspected_family'
+                if role == 'stranger' and person_id is None and promote_strangers:
+                    logger.debug(f"🔄 将多次出现的陌生人标记为疑似家人 "
+                                f"(事件中总共出现 {event_flags['stranger_total_count']} 次)")
+                    person['role'] = 'suspected_family'
+                    person['method'] = 'refined_from_stranger'
+                    promotions['refined_from_stranger'] += 1
+                    changed = True
+                    role = 'suspected_family'
                 
-                # 规则3: 如果疑似家人/陌生人与家人在同一 Clip 中出现，提升为家人
-                if role in ['suspected_family', 'stranger']:
-                    # 检查同一 Clip 中是否有家人
-                    has_family_in_clip = any(
-                        p.get('role') == 'family'
-                        for p in frame_people
-                    )
-                    
-                    if has_family_in_clip and person_id:
-                        logger.info(f"🔄 提升为家人（与家人在同一 Clip）: Person ID {person_id}")
-                        person['role'] = 'family'
-                        person['method'] = 'refined_from_context'
-                        role = 'family'
-                
-                refined_frame.append(person)
-            
-            refined_frame_people.append(refined_frame)
+                # 规则3: 如果疑似家人/陌生人与家人在同一帧中出现，提升为家人
+                if role in ('suspected_family', 'stranger') and person_id and family_in_frame:
+                    logger.debug(f"🔄 提升为家人（与家人在同一 Clip）: Person ID {person_id}")
+                    person['role'] = 'family'
+                    person['method'] = 'refined_from_context'
+                    promotions['refined_from_context'] += 1
+                    changed = True
+                    role = 'family'
+                    family_in_frame += 1
         
-        clip['people_detected'] = refined_frame_people
+        if changed:
+            # 身份已改变，Clip 的人物索引需要重建
+            invalidate_clip_index(clip)
         return clip
     
     def _reaggregate_people_info(self, global_event: Dict[str, Any]):
@@ -201,37 +259,34 @@ class IdentityRefiner:
         stranger_count = 0
         
         for clip in global_event.get('clips', []):
-            for frame_people in clip.get('people_detected', []):
-                for person in frame_people:
-                    person_id = person.get('person_id')
-                    role = person.get('role', 'stranger')
-                    method = person.get('method', 'unknown')
-                    
-                    # 统计所有人物（包括家人、疑似家人和陌生人）
-                    if person_id:
-                        people_ids.add(person_id)
-                        
-                        if person_id not in people_info:
-                            people_info[person_id] = {
-                                'person_id': person_id,
-                                'role': role,
-                                'method': method,
-                                'first_seen': clip.get('time'),
-                                'last_seen': clip.get('time'),
-                                'cameras': set([clip.get('cam')])
-                            }
-                        else:
-                            # 更新最后出现时间和摄像头
-                            people_info[person_id]['last_seen'] = clip.get('time')
-                            people_info[person_id]['cameras'].add(clip.get('cam'))
-                        
-                        # 如果这个 person_id 对应的是陌生人，标记
-                        if role in ['stranger', 'unknown']:
-                            has_strangers = True
-                    elif role == 'stranger':
-                        # 统计陌生人（即使没有 person_id）
-                        has_strangers = True
-                        stranger_count += 1
+            index = get_clip_index(clip)
+            
+            # 统计所有人物（包括家人、疑似家人和陌生人）
+            for person_id, summary in index.persons.items():
+                people_ids.add(person_id)
+                
+                if person_id not in people_info:
+                    people_info[person_id] = {
+                        'person_id': person_id,
+                        'role': summary['role'],
+                        'method': summary['method'],
+                        'first_seen': clip.get('time'),
+                        'last_seen': clip.get('time'),
+                        'cameras': set([clip.get('cam')])
+                    }
+                else:
+                    # 更新最后出现时间和摄像头
+                    people_info[person_id]['last_seen'] = clip.get('time')
+                    people_info[person_id]['cameras'].add(clip.get('cam'))
+                
+                # 如果这个 person_id 对应的是陌生人，标记
+                if 'stranger' in summary['roles'] or 'unknown' in summary['roles']:
+                    has_strangers = True
+            
+            # 统计陌生人（即使没有 person_id）
+            if index.anonymous_stranger_count:
+                has_strangers = True
+                stranger_count += index.anonymous_stranger_count
         
         # 将摄像头集合转换为列表
         for person_id in people_info:
@@ -1,82 +1,222 @@
 """
 模块 3: 滑动窗口会话管理器 (Session Window Manager)
 职责：维护当前的"上下文状态"，管理事件缓冲
+
+同时保持多个打开的会话（按人物 / 摄像头亲和性区分），每个 Clip 通过 person_id、摄像头和
+最近活跃时间三个索引找到候选会话，只与候选会话比较；会话在超时后关闭。
+多个摄像头交替出现不同人物时，不会再因为"只和全局上一个 Clip 比较"而反复切分事件。
 """
 
-from typing import List, Dict, Any
-from datetime import datetime
+from collections import OrderedDict, defaultdict
+from typing import List, Dict, Any, Set, Optional
+from datetime import datetime, timedelta
 import logging
 
+from ..common.clip_index import get_clip_index
+
 logger = logging.getLogger(__name__)
 
 
 class SessionManager:
-    """滑动窗口会话管理器"""
+    """滑动窗口会话管理器（多会话）"""
     
-    def __init__(self, fusion_policy):
+    def __init__(self, fusion_policy, recent_window: Optional[float] = None):
         """
         初始化会话管理器
         
         Args:
             fusion_policy: FusionPolicy 实例，用于判断 Clip 是否连接
+            recent_window: 不依赖 person_id 的身份规则（陌生人连续入侵、家人与陌生人交互）
+                允许的最大时间差（秒），在此窗口内活跃的会话都会作为候选；None 表示取融合规则中的最大值
         """
         self.fusion_policy = fusion_policy
-        self.current_buffer: List[Dict[str, Any]] = []
+        if recent_window is None:
+            recent_window = fusion_policy.max_identity_gap
+        self.recent_window = timedelta(seconds=recent_window)
+        
+        # {session_id: [Clip_Obj, ...]}
+        self.sessions: Dict[int, List[Dict[str, Any]]] = {}
+        # 按最后更新时间排序的 {session_id: last_time}（Clip 按时间顺序到达，最早超时的会话总在最前面）
+        self._last_time: "OrderedDict[int, datetime]" = OrderedDict()
+        # 倒排索引：person_id / 摄像头 → 打开的会话
+        self._person_index: Dict[int, Set[int]] = defaultdict(set)
+        self._camera_index: Dict[str, Set[int]] = defaultdict(set)
+        self._session_people: Dict[int, Set[int]] = {}
+        self._session_cams: Dict[int, Set[str]] = {}
+        self._next_id = 0
+        
         logger.debug("初始化会话管理器")
     
+    @property
+    def current_buffer(self) -> List[Dict[str, Any]]:
+        """最近更新的会话（兼容单会话接口）"""
+        if not self._last_time:
+            return []
+        return self.sessions[next(reversed(self._last_time))]
+    
     def process_clip(self, clip: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         处理一个 Clip，返回完成的事件列表（如果有）
         
         Args:
-            clip: Clip_Obj
+            clip: Clip_Obj（按时间顺序到达）
         
         Returns:
-            完成的事件列表（List[Clip_Obj]），如果没有完成的事件则返回空列表
+            完成的事件列表（List[Clip_Obj]），按开始时间排序，如果没有完成的事件则返回空列表
         """
-        completed_events = []
+        # 1. 关闭已超时的会话（之后到达的 Clip 不可能再与它们连接）
+        completed_events = self.close_expired(clip['time'])
         
-        if not self.current_buffer:
-            # 第一个 Clip，直接加入 Buffer
-            self.current_buffer.append(clip)
-            logger.debug(f"开始新事件: {clip['time']} @ {clip['cam']}")
-            return completed_events
+        # 2. 通过索引找到候选会话，逐个调用策略引擎判断是否连接
+        person_ids = self._clip_person_ids(clip)
+        connected = [
+            session_id for session_id in self._candidate_sessions(clip, person_ids)
+            if self.fusion_policy.is_connected(self.sessions[session_id][-1], clip)
+        ]
         
-        # 获取 Buffer 中的最后一个 Clip
-        last_clip = self.current_buffer[-1]
-        
-        # 调用策略引擎判断是否连接
-        if self.fusion_policy.is_connected(last_clip, clip):
-            # Hit: 连接 → 加入 Buffer
-            self.current_buffer.append(clip)
-            logger.debug(f"事件延续: {clip['time']} @ {clip['cam']} "
-                        f"(当前事件包含 {len(self.current_buffer)} 个 Clip)")
+        if not connected:
+            # Miss: 开启新会话
+            session_id = self._open_session()
+            logger.debug(f"开始新事件: {clip['time']} @ {clip['cam']} (会话 #{session_id}, "
+                        f"打开会话数 {len(self.sessions)})")
         else:
-            # Miss: 断开 → 封存当前 Buffer，开始新事件
-            completed_events.append(self.current_buffer.copy())
-            logger.info(f"事件完成: {len(self.current_buffer)} 个 Clip, "
-                       f"时间跨度 {self._get_time_span(self.current_buffer)}秒")
-            
-            # 创建新 Buffer
-            self.current_buffer = [clip]
-            logger.debug(f"开始新事件: {clip['time']} @ {clip['cam']}")
+            # Hit: 加入会话；同一个 Clip 连接了多个会话时，把它们合并为一个事件
+            session_id = connected[0]
+            for other_id in connected[1:]:
+                self._merge_into(session_id, other_id)
+            logger.debug(f"事件延续: {clip['time']} @ {clip['cam']} "
+                        f"(会话 #{session_id} 包含 {len(self.sessions[session_id]) + 1} 个 Clip)")
+        
+        self._append(session_id, clip, person_ids)
         
         return completed_events
     
+    def close_expired(self, watermark: datetime) -> List[Dict[str, Any]]:
+        """
+        关闭最后一个 Clip 距水位线已达到最大时间阈值的会话
+        
+        之后到达的 Clip 时间都不早于水位线，按时间规则不可能再与这些会话连接。
+        
+        Args:
+            watermark: 水位线（此后不会再有更早的 Clip）
+        
+        Returns:
+            完成的事件列表（List[Clip_Obj]），按开始时间排序
+        """
+        threshold = self.fusion_policy.max_time_threshold
+        expired = []
+        
+        while self._last_time:
+            session_id, last_time = next(iter(self._last_time.items()))
+            if (watermark - last_time).total_seconds() < threshold:
+                break
+            expired.append(self._close_session(session_id))
+        
+        for event_clips in expired:
+            logger.info(f"事件完成: {len(event_clips)} 个 Clip, "
+                       f"时间跨度 {self._get_time_span(event_clips)}秒")
+        
+        return sorted(expired, key=lambda clips: clips[0]['time'])
+    
     def finalize(self) -> List[Dict[str, Any]]:
         """
-        完成处理，返回最后一个事件（如果有）
+        完成处理，关闭并返回所有打开的会话
         
         Returns:
-            最后一个事件（List[Clip_Obj]），如果没有则返回空列表
+            剩余事件列表（List[Clip_Obj]），按开始时间排序；如果没有则返回空列表
         """
-        if not self.current_buffer:
-            return []
+        remaining = [self._close_session(session_id) for session_id in list(self._last_time)]
         
-        logger.info(f"最终事件: {len(self.current_buffer)} 个 Clip, "
-                   f"时间跨度 {self._get_time_span(self.current_buffer)}秒")
+        for event_clips in remaining:
+            logger.info(f"最终事件: {len(event_clips)} 个 Clip, "
+                       f"时间跨度 {self._get_time_span(event_clips)}秒")
         
-        return [self.current_buffer.copy()]
+        return sorted(remaining, key=lambda clips: clips[0]['time'])
+    
+    def _candidate_sessions(self, clip: Dict[str, Any], person_ids: Set[int]) -> List[int]:
+        """
+        通过索引收集候选会话：共享 person_id 的、同一摄像头的、以及最近仍活跃的会话
+        
+        Returns:
+            候选会话ID列表（按最后更新时间从新到旧）
+        """
+        candidates = set()
+        for person_id in person_ids:
+            candidates |= self._person_index.get(person_id, set())
+        candidates |= self._camera_index.get(clip['cam'], set())
+        
+        recent_cutoff = clip['time'] - self.recent_window
+        for session_id, last_time in reversed(self._last_time.items()):
+            if last_time < recent_cutoff:
+                break
+            candidates.add(session_id)
+        
+        return sorted(candidates, key=lambda sid: self._last_time[sid], reverse=True)
+    
+    def _open_session(self) -> int:
+        """创建一个空会话"""
+        session_id = self._next_id
+        self._next_id += 1
+        self.sessions[session_id] = []
+        self._session_people[session_id] = set()
+        self._session_cams[session_id] = set()
+        return session_id
+    
+    def _append(self, session_id: int, clip: Dict[str, Any], person_ids: Set[int]):
+        """把 Clip 加入会话并更新索引"""
+        self.sessions[session_id].append(clip)
+        self._last_time[session_id] = clip['time']
+        self._last_time.move_to_end(session_id)
+        
+        for person_id in person_ids - self._session_people[session_id]:
+            self._person_index[person_id].add(session_id)
+        self._session_people[session_id] |= person_ids
+        
+        if clip['cam'] not in self._session_cams[session_id]:
+            self._camera_index[clip['cam']].add(session_id)
+            self._session_cams[session_id].add(clip['cam'])
+    
+    def _merge_into(self, target_id: int, source_id: int):
+        """把 source 会话合并进 target 会话（保持 Clip 的时间顺序）"""
+        source_clips = self._close_session(source_id)
+        target_clips = self.sessions[target_id]
+        merged = sorted(target_clips + source_clips, key=lambda c: c['time'])
+        self.sessions[target_id] = merged
+        
+        # 索引中补上 source 的人物和摄像头
+        for clip in source_clips:
+            person_ids = self._clip_person_ids(clip)
+            for person_id in person_ids - self._session_people[target_id]:
+                self._person_index[person_id].add(target_id)
+            self._session_people[target_id] |= person_ids
+            if clip['cam'] not in self._session_cams[target_id]:
+                self._camera_index[clip['cam']].add(target_id)
+                self._session_cams[target_id].add(clip['cam'])
+        
+        logger.debug(f"合并会话 #{source_id} → #{target_id} ({len(merged)} 个 Clip)")
+    
+    def _close_session(self, session_id: int) -> List[Dict[str, Any]]:
+        """从所有索引中移除会话，返回其 Clip 列表"""
+        clips = self.sessions.pop(session_id)
+        self._last_time.pop(session_id, None)
+        
+        for person_id in self._session_people.pop(session_id):
+            sessions = self._person_index[person_id]
+            sessions.discard(session_id)
+            if not sessions:
+                del self._person_index[person_id]
+        
+        for cam in self._session_cams.pop(session_id):
+            sessions = self._camera_index[cam]
+            sessions.discard(session_id)
+            if not sessions:
+                del self._camera_index[cam]
+        
+        return clips
+    
+    def _clip_person_ids(self, clip: Dict[str, Any]) -> Set[int]:
+        """提取 Clip 中出现的所有 person_id（读取 Clip 的人物索引）"""
+        return get_clip_index(clip).person_ids
     
     def _get_time_span(self, clips: List[Dict[str, Any]]) -> float:
         """
@@ -98,6 +238,11 @@ class SessionManager:
     
     def reset(self):
         """重置管理器（用于处理新的数据流）"""
-        self.current_buffer.clear()
+        self.sessions.clear()
+        self._last_time.clear()
+        self._person_index.clear()
+        self._camera_index.clear()
+        self._session_people.clear()
+        self._session_cams.clear()
+        self._next_id = 0
         logger.debug("会话管理器已重置")
-
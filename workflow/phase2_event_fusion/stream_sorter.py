@@ -1,21 +1,49 @@
 """
 模块 1: 时间流预处理模块 (Stream Sorter & Validator)
 职责：确保输入的数据流是严格按时间顺序排列的
+
+大批量回填（数周、多摄像头）时不需要把全部 Clip 放在内存中：
+- sort_external：Clip 逐个写入磁盘暂存文件，内存中只排序 (time, seq, offset) 轻量键，按序读回
+- merge_streams：各摄像头的 Clip 流已经各自有序时，直接做 k 路归并，内存中只保留每路的当前 Clip
 """
 
-from typing import List, Dict, Any
-from datetime import datetime
+import heapq
+import itertools
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+from datetime import datetime, timedelta
 import logging
 
+from .clip_spool import ClipSpool
+
 logger = logging.getLogger(__name__)
 
 
 class StreamSorter:
     """时间流预处理模块"""
     
-    def __init__(self):
-        """初始化排序器"""
-        pass
+    def __init__(self, max_lateness: float = 120.0, max_buffered: int = 1000):
+        """
+        初始化排序器
+        
+        Args:
+            max_lateness: 流式模式下允许 Clip 迟到的最长时间（秒），即水位线落后于已见最大时间的距离
+            max_buffered: 流式模式下重排缓冲区最多保留的 Clip 数，超出时提前放出最早的 Clip
+        """
+        self.max_lateness = timedelta(seconds=max_lateness)
+        self.max_buffered = max(1, max_buffered)
+        
+        # 流式重排缓冲区：(time, seq, clip) 小根堆
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._max_seen: Optional[datetime] = None
+        self._released_until: Optional[datetime] = None
+        self.stats = {
+            'pushed': 0,
+            'released': 0,
+            'invalid': 0,
+            'late_dropped': 0
+        }
     
     def sort_and_validate(self, clip_objs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -72,6 +100,173 @@ class StreamSorter:
         
         return sorted_clips
     
+    def sort_external(self, clips: Iterable[Dict[str, Any]],
+                      spool_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        外部排序：Clip 写入磁盘暂存，内存中只对 (time, seq, offset) 键排序，再按时间顺序逐个读回
+        
+        与 sort_and_validate 的结果顺序一致（时间相同的 Clip 保持输入顺序），但常驻内存的只有排序键，
+        与 Clip 及其特征向量的总量无关。clips 应为生成器等惰性数据源，传入列表时列表本身仍在内存中。
+        
+        Args:
+            clips: Clip_Obj 可迭代对象（可能无序）
+            spool_dir: 暂存文件目录，None 表示使用系统临时目录
+        
+        Yields:
+            按时间升序排列的有效 Clip_Obj
+        """
+        with ClipSpool(spool_dir) as spool:
+            keys = []
+            invalid_count = 0
+            
+            for seq, clip in enumerate(clips):
+                if not self._is_valid_clip(clip):
+                    invalid_count += 1
+                    continue
+                keys.append((clip['time'], seq, spool.append(clip)))
+            
+            if invalid_count > 0:
+                logger.warning(f"⚠️  清洗完成: 移除了 {invalid_count} 个无效 Clip")
+            
+            keys.sort()
+            logger.info(f"✅ 外部排序完成: {len(keys)} 个有效 Clip "
+                        f"(暂存 {spool.bytes_written / 1024 / 1024:.1f} MB)")
+            
+            for _, _, offset in keys:
+                yield spool.load(offset)
+    
+    def merge_streams(self, streams: Iterable[Iterable[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """
+        k 路归并：各数据流（如每个摄像头一路）已经各自按时间排序时，合并成一条有序的 Clip 流
+        
+        惰性执行，内存中只保留每路的当前 Clip。单路数据流中出现时间倒退的 Clip 时无法归并，
+        丢弃并计入 stats['late_dropped']；无效 Clip 计入 stats['invalid']。
+        
+        Args:
+            streams: 各自有序的 Clip_Obj 可迭代对象
+        
+        Yields:
+            按时间升序排列的有效 Clip_Obj（时间相同时按数据流顺序）
+        """
+        valid_streams = [self._validated(stream) for stream in streams]
+        last_time = None
+        merged = 0
+        
+        for clip in heapq.merge(*valid_streams, key=itemgetter('time')):
+            if last_time is not None and clip['time'] < last_time:
+                self.stats['late_dropped'] += 1
+                logger.warning(f"⚠️  丢弃乱序 Clip: {clip['time']} @ {clip['cam']} (已归并至 {last_time})")
+                continue
+            
+            last_time = clip['time']
+            merged += 1
+            yield clip
+        
+        logger.info(f"✅ 归并完成: {len(valid_streams)} 路数据流, {merged} 个有效 Clip")
+    
+    def _validated(self, stream: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """过滤数据流中的无效 Clip"""
+        for clip in stream:
+            if self._is_valid_clip(clip):
+                yield clip
+            else:
+                self.stats['invalid'] += 1
+                logger.warning("⚠️  跳过无效 Clip: 缺少必要字段")
+    
+    def push(self, clip: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        流式模式：放入一个 Clip，返回水位线之前已可按序放出的 Clip
+        
+        水位线 = 已见最大时间 - max_lateness。早于已放出位置的迟到 Clip 无法再排序，丢弃并计数。
+        
+        Args:
+            clip: Clip_Obj（到达顺序可能乱序）
+        
+        Returns:
+            按时间升序排列、可以交给下游的 Clip 列表
+        """
+        self.stats['pushed'] += 1
+        
+        if not self._is_valid_clip(clip):
+            self.stats['invalid'] += 1
+            logger.warning("⚠️  跳过无效 Clip: 缺少必要字段")
+            return []
+        
+        clip_time = clip['time']
+        if self._released_until is not None and clip_time < self._released_until:
+            self.stats['late_dropped'] += 1
+            logger.warning(f"⚠️  丢弃迟到 Clip: {clip_time} @ {clip['cam']} "
+                           f"(已放出至 {self._released_until}，超过最大迟到 {self.max_lateness.total_seconds():.0f}秒)")
+            return []
+        
+        heapq.heappush(self._heap, (clip_time, next(self._seq), clip))
+        if self._max_seen is None or clip_time > self._max_seen:
+            self._max_seen = clip_time
+        
+        ready = self.release(self._max_seen - self.max_lateness)
+        
+        # 缓冲区有界：超出上限时提前放出最早的 Clip
+        while len(self._heap) > self.max_buffered:
+            ready.append(self._pop())
+        
+        return ready
+    
+    def release(self, watermark: datetime) -> List[Dict[str, Any]]:
+        """
+        流式模式：放出时间不晚于水位线的所有 Clip
+        
+        Args:
+            watermark: 水位线（调用方保证此后不会再有更早的 Clip）
+        
+        Returns:
+            按时间升序排列的 Clip 列表
+        """
+        ready = []
+        while self._heap and self._heap[0][0] <= watermark:
+            ready.append(self._pop())
+        
+        if self._released_until is None or watermark > self._released_until:
+            self._released_until = watermark
+        
+        return ready
+    
+    def drain(self) -> List[Dict[str, Any]]:
+        """
+        流式模式：放出缓冲区中的所有 Clip（数据流结束时调用）
+        
+        Returns:
+            按时间升序排列的 Clip 列表
+        """
+        ready = []
+        while self._heap:
+            ready.append(self._pop())
+        return ready
+    
+    def _pop(self) -> Dict[str, Any]:
+        """弹出最早的 Clip 并推进已放出位置"""
+        clip_time, _, clip = heapq.heappop(self._heap)
+        if self._released_until is None or clip_time > self._released_until:
+            self._released_until = clip_time
+        self.stats['released'] += 1
+        return clip
+    
+    @property
+    def watermark(self) -> Optional[datetime]:
+        """流式模式：当前水位线（此后不会再放出更早的 Clip），尚未放出任何 Clip 时为 None"""
+        return self._released_until
+    
+    def pending_count(self) -> int:
+        """流式模式：重排缓冲区中尚未放出的 Clip 数"""
+        return len(self._heap)
+    
+    def reset(self):
+        """重置流式状态（用于处理新的数据流）"""
+        self._heap.clear()
+        self._max_seen = None
+        self._released_until = None
+        for key in self.stats:
+            self.stats[key] = 0
+    
     def _is_valid_clip(self, clip: Dict[str, Any]) -> bool:
         """
         验证 Clip_Obj 是否有效
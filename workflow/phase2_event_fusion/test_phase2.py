@@ -3,8 +3,11 @@
 测试脚本：验证第二阶段 Pipeline 的功能
 """
 
+import os
 import sys
+import json
 import logging
+import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
 
@@ -12,7 +15,8 @@ from datetime import datetime, timedelta
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from workflow.phase2_event_fusion import Event_Fusion_Pipeline
+from workflow.phase2_event_fusion import Event_Fusion_Pipeline, FusionPolicy, FusionRuleSet
+from workflow.phase2_event_fusion.context_builder import estimate_tokens
 
 # 配置日志
 logging.basicConfig(
@@ -107,6 +111,226 @@ def create_mock_clips():
     return clips
 
 
+def test_streaming():
+    """测试流式模式：乱序 feed + flush 的结果应与批量 run 一致"""
+    logger.info("\n" + "=" * 60)
+    logger.info("流式模式测试 (feed / flush)")
+    logger.info("=" * 60)
+    
+    batch_events = Event_Fusion_Pipeline(time_threshold=60).run(create_mock_clips())
+    
+    # 轻微乱序：相邻 Clip 两两交换
+    clips = create_mock_clips()
+    for i in range(0, len(clips) - 1, 2):
+        clips[i], clips[i + 1] = clips[i + 1], clips[i]
+    
+    pipeline = Event_Fusion_Pipeline(time_threshold=60, max_lateness=60)
+    streamed_events = []
+    for clip in clips:
+        emitted = pipeline.feed(clip)
+        if emitted:
+            logger.info(f"📤 收到 {clip['time']} 后输出 {len(emitted)} 个事件")
+        streamed_events.extend(emitted)
+    streamed_events.extend(pipeline.flush())
+    
+    batch_shape = [(e['start_time'], e['clip_count']) for e in batch_events]
+    streamed_shape = [(e['start_time'], e['clip_count']) for e in streamed_events]
+    
+    if batch_shape == streamed_shape:
+        logger.info(f"✅ 流式结果与批量结果一致: {len(streamed_events)} 个全局事件")
+    else:
+        logger.error(f"❌ 流式结果不一致: 批量 {batch_shape}, 流式 {streamed_shape}")
+
+
+def test_interleaved_cameras():
+    """测试多会话：两个摄像头交替拍到不同家人，应合并为两个事件而不是反复切分"""
+    logger.info("\n" + "=" * 60)
+    logger.info("多会话测试 (摄像头交替)")
+    logger.info("=" * 60)
+    
+    base_time = datetime(2025, 9, 1, 18, 0, 0)
+    clips = []
+    for i in range(10):
+        person_id = 1 if i % 2 == 0 else 2
+        clips.append({
+            'time': base_time + timedelta(seconds=15 * i),
+            'cam': 'outdoor_high' if person_id == 1 else 'indoor_living',
+            'people_detected': [
+                [
+                    {'person_id': person_id, 'role': 'family', 'method': 'face',
+                     'bbox': (100, 100, 200, 300), 'confidence': 0.9}
+                ]
+            ]
+        })
+    
+    global_events = Event_Fusion_Pipeline(time_threshold=60).run(clips)
+    shape = [(sorted(e['people']), e['clip_count']) for e in global_events]
+    
+    if shape == [([1], 5), ([2], 5)]:
+        logger.info(f"✅ 交替场景合并正确: {shape}")
+    else:
+        logger.error(f"❌ 交替场景合并异常: {shape}")
+
+
+def test_fusion_rules():
+    """测试可配置融合规则：按摄像头的时间阈值放宽门铃的连接间隔，邻接关系禁止车库与门铃直接连接"""
+    logger.info("\n" + "=" * 60)
+    logger.info("融合规则测试 (摄像头阈值 + 邻接关系)")
+    logger.info("=" * 60)
+    
+    base_time = datetime(2025, 9, 1, 20, 0, 0)
+    
+    def create_rule_clips():
+        return [
+            {
+                'time': base_time + timedelta(seconds=offset),
+                'cam': cam,
+                'people_detected': [
+                    [
+                        {'person_id': 1, 'role': 'family', 'method': 'face',
+                         'bbox': (100, 100, 200, 300), 'confidence': 0.9}
+                    ]
+                ]
+            }
+            for offset, cam in [(0, 'doorbell'), (80, 'doorbell'), (100, 'garage')]
+        ]
+    
+    rules = {
+        'camera_thresholds': {'doorbell': 90},
+        'camera_adjacency': {'doorbell': ['indoor_living'], 'garage': ['indoor_living']}
+    }
+    
+    default_shape = [e['clip_count'] for e in Event_Fusion_Pipeline(time_threshold=60).run(create_rule_clips())]
+    custom_shape = [e['clip_count'] for e in
+                    Event_Fusion_Pipeline(time_threshold=60, fusion_rules=rules).run(create_rule_clips())]
+    
+    if default_shape == [1, 2] and custom_shape == [2, 1]:
+        logger.info(f"✅ 融合规则生效: 默认 {default_shape}, 自定义 {custom_shape}")
+    else:
+        logger.error(f"❌ 融合规则异常: 默认 {default_shape}, 自定义 {custom_shape}")
+    
+    # 规则文件（FUSION_RULES_PATH）中的 time_threshold 优先于构造参数，未配置时使用构造参数
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rules_path = os.path.join(tmp_dir, 'fusion_rules.json')
+        with open(rules_path, 'w', encoding='utf-8') as f:
+            json.dump({'time_threshold': 300}, f)
+        previous = os.environ.get('FUSION_RULES_PATH')
+        os.environ['FUSION_RULES_PATH'] = rules_path
+        try:
+            env_threshold = FusionPolicy(time_threshold=60).time_threshold
+        finally:
+            if previous is None:
+                os.environ.pop('FUSION_RULES_PATH')
+            else:
+                os.environ['FUSION_RULES_PATH'] = previous
+        
+        with open(rules_path, 'w', encoding='utf-8') as f:
+            json.dump({'camera_thresholds': {'doorbell': 90}}, f)
+        file_threshold = FusionRuleSet(rules_path, 30).time_threshold
+    
+    if env_threshold == 300 and file_threshold == 30:
+        logger.info(f"✅ 规则文件时间阈值优先级正确: 环境变量文件 {env_threshold:g}秒, 未配置时用参数 {file_threshold:g}秒")
+    else:
+        logger.error(f"❌ 规则文件时间阈值优先级异常: 环境变量文件 {env_threshold:g}秒 (期望 300), "
+                     f"未配置时 {file_threshold:g}秒 (期望 30)")
+
+
+def test_prompt_budget():
+    """测试 Prompt token 预算：长事件的时间线被压缩到预算以内，短事件不受影响"""
+    logger.info("\n" + "=" * 60)
+    logger.info("Prompt 预算测试 (max_prompt_tokens=512)")
+    logger.info("=" * 60)
+    
+    # 同一个家人在门口和客厅之间来回出现 300 次，形成一个很长的事件
+    base_time = datetime(2025, 9, 1, 21, 0, 0)
+    clips = [
+        {
+            'time': base_time + timedelta(seconds=5 * i),
+            'cam': 'doorbell' if (i // 10) % 2 == 0 else 'indoor_living',
+            'people_detected': [
+                [
+                    {'person_id': 1, 'role': 'family', 'method': 'face',
+                     'bbox': (100, 100, 200, 300), 'confidence': 0.9}
+                ]
+            ]
+        }
+        for i in range(300)
+    ]
+    
+    long_event = Event_Fusion_Pipeline(time_threshold=60, max_prompt_tokens=512).run(clips)[0]
+    long_tokens = estimate_tokens(long_event['prompt_text'])
+    
+    short_budgeted = Event_Fusion_Pipeline(time_threshold=60, max_prompt_tokens=512).run(create_mock_clips())
+    short_unlimited = Event_Fusion_Pipeline(time_threshold=60, max_prompt_tokens=None).run(create_mock_clips())
+    short_same = [e['prompt_text'] for e in short_budgeted] == [e['prompt_text'] for e in short_unlimited]
+    
+    if long_tokens <= 512 and short_same:
+        logger.info(f"✅ Prompt 预算生效: 长事件 {long_event['clip_count']} 个 Clip → 约 {long_tokens} tokens")
+    else:
+        logger.error(f"❌ Prompt 预算异常: 长事件约 {long_tokens} tokens, 短事件不变: {short_same}")
+
+
+def test_parallel():
+    """测试并行加工：多个事件用进程池 / 线程池加工，结果与顺序加工一致且顺序不变"""
+    logger.info("\n" + "=" * 60)
+    logger.info("并行加工测试 (workers=2)")
+    logger.info("=" * 60)
+    
+    # 把模拟数据复制到 20 天，得到足够多的独立事件
+    def create_backfill_clips():
+        clips = []
+        for day in range(20):
+            for clip in create_mock_clips():
+                clip['time'] += timedelta(days=day)
+                clips.append(clip)
+        return clips
+    
+    sequential = Event_Fusion_Pipeline(time_threshold=60).run(create_backfill_clips())
+    expected = [(e['start_time'], e['prompt_text']) for e in sequential]
+    
+    for backend in ('thread', 'process'):
+        pipeline = Event_Fusion_Pipeline(time_threshold=60, workers=2,
+                                         parallel_backend=backend, chunk_size=4)
+        try:
+            parallel = pipeline.run(create_backfill_clips())
+        finally:
+            pipeline.close()
+        
+        actual = [(e['start_time'], e['prompt_text']) for e in parallel]
+        if actual == expected:
+            logger.info(f"✅ {backend} 并行结果与顺序结果一致: {len(parallel)} 个全局事件")
+        else:
+            logger.error(f"❌ {backend} 并行结果不一致: 顺序 {len(expected)} 个, 并行 {len(actual)} 个")
+
+
+def test_backfill():
+    """测试大批量回填：外部排序（乱序输入）和按摄像头 k 路归并的分组结果应与批量 run 一致"""
+    logger.info("\n" + "=" * 60)
+    logger.info("回填测试 (外部排序 / k 路归并)")
+    logger.info("=" * 60)
+    
+    def shape(events):
+        return sorted((e['start_time'], e['clip_count'], tuple(e['cameras'])) for e in events)
+    
+    expected = shape(Event_Fusion_Pipeline(time_threshold=60).run(create_mock_clips()))
+    
+    # 外部排序：倒序的生成器输入
+    external = Event_Fusion_Pipeline(time_threshold=60).run_backfill(reversed(create_mock_clips()))
+    external_shape = shape(external)
+    
+    # k 路归并：每个摄像头一路，各自有序
+    streams = {}
+    for clip in create_mock_clips():
+        streams.setdefault(clip['cam'], []).append(clip)
+    merged = Event_Fusion_Pipeline(time_threshold=60).run_backfill(streams.values(), presorted_streams=True)
+    merged_shape = shape(merged)
+    
+    if external_shape == expected and merged_shape == expected:
+        logger.info(f"✅ 回填结果与批量结果一致: {len(expected)} 个全局事件")
+    else:
+        logger.error(f"❌ 回填结果不一致: 批量 {expected}, 外部排序 {external_shape}, 归并 {merged_shape}")
+
+
 def main():
     """主测试函数"""
     logger.info("=" * 60)
@@ -162,6 +386,13 @@ def main():
         logger.error(f"❌ 处理失败: {e}")
         import traceback
         traceback.print_exc()
+    
+    test_streaming()
+    test_interleaved_cameras()
+    test_fusion_rules()
+    test_prompt_budget()
+    test_parallel()
+    test_backfill()
 
 
 if __name__ == '__main__':
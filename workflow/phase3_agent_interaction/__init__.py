@@ -1,19 +1,40 @@
 """
 Phase 3: 宏观语义生成 (LLM Reasoning)
-使用 Gemini 2.5 Flash Lite 为事件生成自然语言日志
+使用 Gemini 2.5 Flash Lite 为事件生成自然语言日志（也可切换到 OpenAI 兼容接口或模拟后端）
 """
 
 from .prompt_engine import PromptEngine
+from .rate_limiter import RateLimiter
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .llm_cache import LLMResponseCache
+from .llm_telemetry import LLMTelemetry, default_telemetry
+from .llm_backends import (LLMBackend, VertexBackend, OpenAICompatibleBackend, MockBackend, create_backend,
+                           LLMBackendError, LLMTimeoutError)
 from .llm_gateway import LLMGateway
 from .response_validator import ResponseValidator
 from .role_classifier import RoleClassifier
+from .template_narrator import TemplateNarrator
 from .llm_reasoning_pipeline import LLM_Reasoning_Pipeline
 
 __all__ = [
     'PromptEngine',
+    'RateLimiter',
+    'CircuitBreaker',
+    'CircuitOpenError',
+    'LLMResponseCache',
+    'LLMTelemetry',
+    'default_telemetry',
+    'LLMBackend',
+    'VertexBackend',
+    'OpenAICompatibleBackend',
+    'MockBackend',
+    'create_backend',
+    'LLMBackendError',
+    'LLMTimeoutError',
     'LLMGateway',
     'ResponseValidator',
     'RoleClassifier',
+    'TemplateNarrator',
     'LLM_Reasoning_Pipeline',
 ]
 
@@ -0,0 +1,106 @@
+"""
+熔断器 (Circuit Breaker)
+职责：LLM 后端持续失败（超时、限流、5xx）时暂停请求，让调用方直接使用兜底日志，而不是每个事件都等满超时和重试
+
+状态：
+- closed: 正常请求；连续失败 failure_threshold 次后转为 open
+- open: 拒绝所有请求；recovery_timeout 秒后转为 half_open
+- half_open: 只放行一个探测请求，成功则恢复 closed，失败则重新 open
+"""
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，请求未发出"""
+
+
+class CircuitBreaker:
+    """线程安全的熔断器"""
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 60.0):
+        """
+        初始化熔断器
+        
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            recovery_timeout: 熔断后多少秒放行一个探测请求
+        """
+        if failure_threshold < 1:
+            raise ValueError(f"failure_threshold 必须大于 0: {failure_threshold}")
+        
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.stats = {
+            'opened': 0,
+            'rejected': 0
+        }
+    
+    @property
+    def state(self) -> str:
+        """当前状态（open 状态超过 recovery_timeout 后报告为 half_open）"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+    
+    def allow_request(self) -> bool:
+        """
+        判断是否放行本次请求（放行后必须调用 record_success 或 record_failure）
+        
+        Returns:
+            True 表示可以发出请求
+        """
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info("🔌 熔断器半开: 放行一个探测请求")
+                return True
+            
+            self.stats['rejected'] += 1
+            return False
+    
+    def record_success(self):
+        """记录一次成功（后端有正常响应）"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("✅ 熔断器恢复: LLM 后端探测请求成功")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        """记录一次失败（超时或可重试的错误在重试耗尽后仍失败）"""
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED
+                                                 and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.stats['opened'] += 1
+                logger.warning(f"⚠️  熔断器打开: LLM 后端连续失败 {self._failures} 次，"
+                              f"{self.recovery_timeout:g} 秒内直接使用兜底生成")
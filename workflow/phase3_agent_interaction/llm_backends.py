@@ -0,0 +1,549 @@
+"""
+LLM 后端 (LLM Backends)
+职责：把"发送 Prompt、拿回文本"这一步从 LLMGateway 中拆出来，使网关可以切换不同的模型服务
+
+可用后端：
+- vertex: Google Vertex AI (Gemini)，生产环境默认
+- openai: OpenAI 兼容的 HTTP 接口（如本地 llama.cpp / vLLM 服务），可离线运行
+- mock: 确定性的本地模拟后端，可配置延迟分布，用于离线测试和吞吐量压测
+
+重试、限速和响应缓存仍由 LLMGateway 统一处理，后端只负责单次请求。
+后端把响应中的 token 用量记录在当前线程（_set_usage），LLMGateway 在请求结束后用 pop_usage 取出并计入遥测。
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+import urllib.request
+import urllib.error
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+import logging
+
+from .prompt_engine import PromptEngine
+from ..phase2_event_fusion.context_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入 Vertex AI
+try:
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+    VERTEX_AI_AVAILABLE = True
+except ImportError:
+    VERTEX_AI_AVAILABLE = False
+    logger.warning("⚠️  vertexai 未安装，将无法使用 Gemini API")
+
+
+# 默认后端（环境变量 LLM_BACKEND 可覆盖：vertex / openai / mock）
+DEFAULT_BACKEND = os.getenv('LLM_BACKEND', 'vertex')
+
+# 值得重试的 HTTP 状态码（请求超时、限流、服务端临时故障），其余 4xx 重试也不会成功
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class LLMBackendError(RuntimeError):
+    """后端返回了错误响应"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMTimeoutError(TimeoutError):
+    """请求超过截止时间仍未返回"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    判断错误是否值得重试：超时、网络错误和 RETRYABLE_STATUS_CODES 中的状态码
+    （Vertex AI 的 google.api_core 异常通过 code 属性携带 HTTP 状态码）
+    
+    Args:
+        error: 后端抛出的异常
+    
+    Returns:
+        True 表示可以重试
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in RETRYABLE_STATUS_CODES
+    if isinstance(error, (TimeoutError, ConnectionError, urllib.error.URLError)):
+        return True
+    
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(error, 'code', None)
+    return isinstance(status_code, int) and status_code in RETRYABLE_STATUS_CODES
+
+
+class LLMBackend:
+    """LLM 后端基类"""
+    
+    # 后端名称（计入响应缓存键，不同后端的响应互不混用）
+    name = 'base'
+    
+    # 最近一次请求的 token 用量，按线程保存（每个线程同一时间只执行一个请求，并发和对冲请求互不干扰）
+    _usage = threading.local()
+    
+    def pop_usage(self) -> Optional[Tuple[int, int]]:
+        """
+        取出当前线程最近一次请求的 token 用量并清空
+        
+        Returns:
+            (输入 token 数, 输出 token 数)；后端没有返回用量时为 None
+        """
+        usage = getattr(self._usage, 'value', None)
+        self._usage.value = None
+        return usage
+    
+    def _set_usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        """记录当前线程本次请求的 token 用量（在 generate / generate_stream 中调用）"""
+        self._usage.value = (int(prompt_tokens or 0), int(completion_tokens or 0))
+    
+    def generate(self, system_prompt: str, user_prompt: str,
+                 temperature: float, max_output_tokens: int,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        发送一次请求并返回生成的文本
+        
+        Args:
+            system_prompt: System Prompt（可以为空字符串）
+            user_prompt: User Prompt
+            temperature: 温度参数
+            max_output_tokens: 最大输出 token 数
+            response_schema: 要求输出符合该 JSON Schema（OpenAPI 子集）的 JSON，None 表示自由文本；
+                不支持约束解码的后端忽略该参数，由 Prompt 中的格式说明约束输出
+        
+        Returns:
+            生成的文本（响应为空时返回空字符串）
+        """
+        raise NotImplementedError
+    
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        temperature: float, max_output_tokens: int) -> Iterator[str]:
+        """
+        流式生成：边生成边返回文本块（不支持流式的后端一次性返回完整文本）
+        
+        Args:
+            同 generate
+        
+        Yields:
+            文本块（按顺序拼接即为完整响应）
+        """
+        text = self.generate(system_prompt, user_prompt, temperature, max_output_tokens)
+        if text:
+            yield text
+
+
+class VertexBackend(LLMBackend):
+    """Google Vertex AI (Gemini) 后端"""
+    
+    name = 'vertex'
+    
+    def __init__(self,
+                 model_name: str = 'gemini-2.5-flash-lite',
+                 project_id: Optional[str] = None,
+                 location: str = 'us-central1'):
+        """
+        初始化 Vertex AI 后端
+        
+        Args:
+            model_name: Gemini 模型名称
+            project_id: Google Cloud 项目ID（如果为None，从环境变量读取）
+            location: Vertex AI 区域
+        """
+        if not VERTEX_AI_AVAILABLE:
+            logger.error("❌ vertexai 未安装，无法初始化 Vertex AI 后端")
+            raise ImportError("请安装 google-cloud-aiplatform: pip install google-cloud-aiplatform")
+        
+        # 获取项目ID
+        if project_id is None:
+            project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
+            if not project_id:
+                raise ValueError("无法确定项目ID，请设置 GOOGLE_CLOUD_PROJECT 环境变量")
+        
+        self.model_name = model_name
+        self.project_id = project_id
+        self.location = location
+        
+        try:
+            vertexai.init(project=project_id, location=location)
+            self.model = GenerativeModel(model_name)
+        except Exception as e:
+            logger.error(f"❌ Vertex AI 初始化失败: {e}")
+            raise
+    
+    def generate(self, system_prompt: str, user_prompt: str,
+                 temperature: float, max_output_tokens: int,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        # Gemini 接口不区分 System / User，组合成完整的 Prompt
+        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        
+        generation_config = {
+            'temperature': temperature,
+            'max_output_tokens': max_output_tokens,
+        }
+        if response_schema is not None:
+            generation_config['response_mime_type'] = 'application/json'
+            generation_config['response_schema'] = response_schema
+        
+        response = self.model.generate_content(
+            full_prompt,
+            generation_config=generation_config
+        )
+        self._record_usage(response)
+        
+        if hasattr(response, 'text') and response.text:
+            return response.text.strip()
+        return ""
+    
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        temperature: float, max_output_tokens: int) -> Iterator[str]:
+        responses = self.model.generate_content(
+            f"{system_prompt}\n\n{user_prompt}",
+            generation_config={
+                'temperature': temperature,
+                'max_output_tokens': max_output_tokens,
+            },
+            stream=True
+        )
+        
+        last_response = None
+        for response in responses:
+            last_response = response
+            # 最后一个分块可能只有结束原因、没有文本，访问 text 会抛出 ValueError
+            try:
+                text = response.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+        
+        # 最后一个分块的 usage_metadata 为整个响应的用量
+        if last_response is not None:
+            self._record_usage(last_response)
+    
+    def _record_usage(self, response):
+        """记录 Gemini 响应的 usage_metadata"""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            self._set_usage(getattr(usage, 'prompt_token_count', 0),
+                            getattr(usage, 'candidates_token_count', 0))
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """OpenAI 兼容的 Chat Completions 后端（llama.cpp server、vLLM、Ollama 等）"""
+    
+    name = 'openai'
+    
+    def __init__(self,
+                 model_name: str,
+                 base_url: Optional[str] = None,
+                 api_key: Optional[str] = None,
+                 timeout: float = 60.0):
+        """
+        初始化 OpenAI 兼容后端
+        
+        Args:
+            model_name: 模型名称（本地服务通常忽略该字段）
+            base_url: 服务地址（如 http://localhost:8080/v1），None 时读取环境变量 LLM_BASE_URL
+            api_key: API Key，None 时读取环境变量 LLM_API_KEY（本地服务通常不需要）
+            timeout: 单次请求超时（秒）
+        """
+        self.model_name = model_name
+        self.base_url = (base_url or os.getenv('LLM_BASE_URL', 'http://localhost:8080/v1')).rstrip('/')
+        self.api_key = api_key if api_key is not None else os.getenv('LLM_API_KEY')
+        self.timeout = timeout
+    
+    def generate(self, system_prompt: str, user_prompt: str,
+                 temperature: float, max_output_tokens: int,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        request = self._build_request(system_prompt, user_prompt, temperature, max_output_tokens,
+                                      stream=False, response_schema=response_schema)
+        with self._open(request) as response:
+            payload = json.loads(response.read().decode('utf-8'))
+        
+        self._record_usage(payload.get('usage'))
+        choices = payload.get('choices') or []
+        if not choices:
+            return ""
+        content = (choices[0].get('message') or {}).get('content') or ""
+        return content.strip()
+    
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        temperature: float, max_output_tokens: int) -> Iterator[str]:
+        request = self._build_request(system_prompt, user_prompt, temperature, max_output_tokens, stream=True)
+        with self._open(request) as response:
+            # Server-Sent Events：每行 "data: {json}"，以 "data: [DONE]" 结束
+            for line in response:
+                line = line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                
+                chunk = json.loads(data)
+                # stream_options.include_usage：最后一个分块的 choices 为空，usage 为整个响应的用量
+                self._record_usage(chunk.get('usage'))
+                choices = chunk.get('choices') or []
+                if choices:
+                    text = (choices[0].get('delta') or {}).get('content')
+                    if text:
+                        yield text
+    
+    def _build_request(self, system_prompt: str, user_prompt: str, temperature: float,
+                       max_output_tokens: int, stream: bool,
+                       response_schema: Optional[Dict[str, Any]] = None) -> urllib.request.Request:
+        """构建 /chat/completions 请求（指定 response_schema 时使用 json_schema 响应格式）"""
+        messages = []
+        if system_prompt:
+            messages.append({'role': 'system', 'content': system_prompt})
+        messages.append({'role': 'user', 'content': user_prompt})
+        
+        payload = {
+            'model': self.model_name,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_output_tokens,
+            'stream': stream,
+        }
+        if stream:
+            payload['stream_options'] = {'include_usage': True}
+        if response_schema is not None:
+            payload['response_format'] = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'event_log', 'schema': response_schema},
+            }
+        
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        
+        return urllib.request.Request(f"{self.base_url}/chat/completions",
+                                      data=body, headers=headers, method='POST')
+    
+    def _record_usage(self, usage: Optional[Dict[str, Any]]):
+        """记录响应中的 usage 字段（没有该字段时忽略）"""
+        if usage:
+            self._set_usage(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+    
+    def _open(self, request: urllib.request.Request):
+        """发送请求，HTTP 错误转换为带状态码的 LLMBackendError"""
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode('utf-8', errors='replace')[:200]
+            raise LLMBackendError(f"OpenAI 兼容接口返回 HTTP {e.code}: {detail}", status_code=e.code) from e
+
+
+class MockBackend(LLMBackend):
+    """
+    确定性的模拟后端（不访问网络）
+    
+    响应只取决于 Prompt 内容：单事件请求返回一条根据时间线拼出的日志，
+    批量请求返回对应的 JSON 数组；指定 response_schema 时返回结构化 JSON（摘要、人物角色、事件类型、标记）。
+    token 用量按 estimate_tokens 估算后像真实后端一样上报。每次请求按配置的分布休眠，以模拟真实的 API 延迟
+    （流式请求中为首个文本块的延迟）。
+    """
+    
+    name = 'mock'
+    
+    LATENCY_DISTRIBUTIONS = ('constant', 'uniform', 'normal', 'lognormal', 'exponential')
+    
+    def __init__(self,
+                 latency: str = 'constant',
+                 mean_latency: float = 0.0,
+                 latency_stddev: float = 0.0,
+                 seed: Optional[int] = 0,
+                 failure_rate: float = 0.0,
+                 responder: Optional[Callable[[str, str], str]] = None,
+                 stream_chunk_chars: int = 8,
+                 stream_chunk_interval: float = 0.0):
+        """
+        初始化模拟后端
+        
+        Args:
+            latency: 延迟分布（constant / uniform / normal / lognormal / exponential）
+            mean_latency: 平均延迟（秒）
+            latency_stddev: 延迟标准差（秒）；uniform 分布为 [mean - stddev, mean + stddev]
+            seed: 随机种子（延迟采样和失败注入），None 表示不固定
+            failure_rate: 请求失败（抛出 HTTP 503 的 LLMBackendError）的概率，用于测试重试、熔断和兜底逻辑
+            responder: 自定义响应函数 (system_prompt, user_prompt) -> str，None 表示使用内置规则
+            stream_chunk_chars: 流式请求中每个文本块的字符数
+            stream_chunk_interval: 流式请求中相邻文本块的间隔（秒）
+        """
+        if latency not in self.LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布: {latency}，可选: {', '.join(self.LATENCY_DISTRIBUTIONS)}")
+        
+        self.latency = latency
+        self.mean_latency = max(0.0, mean_latency)
+        self.latency_stddev = max(0.0, latency_stddev)
+        self.failure_rate = failure_rate
+        self.responder = responder
+        self.stream_chunk_chars = max(1, stream_chunk_chars)
+        self.stream_chunk_interval = stream_chunk_interval
+        
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.stats = {
+            'requests': 0,
+            'failures': 0,
+            'total_latency': 0.0
+        }
+    
+    def generate(self, system_prompt: str, user_prompt: str,
+                 temperature: float, max_output_tokens: int,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        self._simulate_request()
+        text = self._respond(system_prompt, user_prompt, structured=response_schema is not None)
+        self._set_usage(estimate_tokens(system_prompt) + estimate_tokens(user_prompt), estimate_tokens(text))
+        return text
+    
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        temperature: float, max_output_tokens: int) -> Iterator[str]:
+        self._simulate_request()
+        text = self._respond(system_prompt, user_prompt)
+        for start in range(0, len(text), self.stream_chunk_chars):
+            if start > 0 and self.stream_chunk_interval > 0:
+                time.sleep(self.stream_chunk_interval)
+            yield text[start:start + self.stream_chunk_chars]
+        self._set_usage(estimate_tokens(system_prompt) + estimate_tokens(user_prompt), estimate_tokens(text))
+    
+    def _simulate_request(self):
+        """按延迟分布休眠，按 failure_rate 注入失败"""
+        with self._lock:
+            delay = self._sample_latency()
+            fail = self.failure_rate > 0 and self._rng.random() < self.failure_rate
+            self.stats['requests'] += 1
+            self.stats['total_latency'] += delay
+            if fail:
+                self.stats['failures'] += 1
+        
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise LLMBackendError("模拟 LLM 请求失败", status_code=503)
+    
+    def _respond(self, system_prompt: str, user_prompt: str, structured: bool = False) -> str:
+        """生成响应文本（只取决于 Prompt 内容；structured 为 True 时返回结构化 JSON）"""
+        if self.responder is not None:
+            return self.responder(system_prompt, user_prompt)
+        
+        batch_items = self._parse_batch_items(user_prompt)
+        if batch_items is not None:
+            if structured:
+                return json.dumps([{'id': item.get('id'), **self._structure(item.get('timeline', ''))}
+                                   for item in batch_items], ensure_ascii=False)
+            return json.dumps([{'id': item.get('id'), 'summary': self._summarize(item.get('timeline', ''))}
+                               for item in batch_items], ensure_ascii=False)
+        # 单事件请求只看事件信息部分（生成要求中也会出现"家人"、"陌生人"等字样）
+        timeline = user_prompt.split(PromptEngine.SINGLE_EVENT_INSTRUCTION, 1)[0]
+        if structured:
+            return json.dumps(self._structure(timeline), ensure_ascii=False)
+        return self._summarize(timeline)
+    
+    def _sample_latency(self) -> float:
+        """按配置的分布采样一次延迟（秒，调用方持有锁）"""
+        mean, stddev = self.mean_latency, self.latency_stddev
+        if mean <= 0:
+            return 0.0
+        
+        if self.latency == 'constant':
+            return mean
+        if self.latency == 'uniform':
+            return max(0.0, self._rng.uniform(mean - stddev, mean + stddev))
+        if self.latency == 'normal':
+            return max(0.0, self._rng.gauss(mean, stddev))
+        if self.latency == 'lognormal':
+            # 由目标均值和标准差换算底层正态分布的参数
+            sigma2 = (stddev / mean) ** 2
+            sigma = math.sqrt(math.log1p(sigma2))
+            mu = math.log(mean) - sigma ** 2 / 2
+            return self._rng.lognormvariate(mu, sigma)
+        # exponential
+        return self._rng.expovariate(1.0 / mean)
+    
+    @staticmethod
+    def _parse_batch_items(user_prompt: str) -> Optional[List[Dict[str, Any]]]:
+        """识别批量请求（PromptEngine.build_batch_prompt 生成的 JSON 数组），不是批量请求时返回 None"""
+        start = user_prompt.find('[')
+        if start == -1 or '"timeline"' not in user_prompt:
+            return None
+        try:
+            items, _ = json.JSONDecoder().raw_decode(user_prompt[start:])
+        except ValueError:
+            return None
+        if isinstance(items, list) and all(isinstance(item, dict) and 'id' in item for item in items):
+            return items
+        return None
+    
+    @classmethod
+    def _structure(cls, timeline: str) -> Dict[str, Any]:
+        """根据时间线拼出结构化响应（字段与 PromptEngine.STRUCTURED_OUTPUT_SCHEMA 一致）"""
+        people = [{'person_id': int(person_id), 'role': 'owner'}
+                  for person_id in dict.fromkeys(re.findall(r'家人\(ID:\s*(-?\d+)\)', timeline))]
+        has_stranger = '陌生人' in timeline
+        if has_stranger:
+            people.append({'person_id': -1, 'role': 'unknown'})
+        
+        return {
+            'summary': cls._summarize(timeline),
+            'event_type': 'visitor' if has_stranger else 'normal',
+            'people': people,
+            'flags': {'suspicious': False, 'delivery_evidence': False}
+        }
+    
+    @staticmethod
+    def _summarize(timeline: str) -> str:
+        """根据时间线拼出一条日志（只提及时间线中出现过的人物，不会被幻觉检查拦截）"""
+        time_match = re.search(r'\d{1,2}:\d{2}', timeline)
+        time_str = time_match.group(0) if time_match else "某时刻"
+        
+        people = [f"家人(Person_{person_id})"
+                  for person_id in dict.fromkeys(re.findall(r'家人\(ID:\s*(-?\d+)\)', timeline))]
+        if not people and '家人' in timeline:
+            people.append("家人")
+        if '陌生人' in timeline:
+            people.append("一名陌生人")
+        who = '和'.join(people) if people else "有人"
+        
+        digest = hashlib.sha256(timeline.encode('utf-8')).hexdigest()[:8]
+        return f"{time_str}，{who}出现在监控画面中，短暂停留后离开。（模拟响应 {digest}）"
+
+
+def create_backend(backend: str = DEFAULT_BACKEND,
+                   model_name: str = 'gemini-2.5-flash-lite',
+                   project_id: Optional[str] = None,
+                   location: str = 'us-central1') -> LLMBackend:
+    """
+    按名称创建后端
+    
+    Args:
+        backend: 后端名称（vertex / openai / mock）
+        model_name: 模型名称（openai 后端可用环境变量 LLM_MODEL 覆盖）
+        project_id: Google Cloud 项目ID（仅 vertex 使用）
+        location: Vertex AI 区域（仅 vertex 使用）
+    
+    Returns:
+        LLMBackend 实例
+    """
+    if backend == 'vertex':
+        return VertexBackend(model_name=model_name, project_id=project_id, location=location)
+    if backend == 'openai':
+        return OpenAICompatibleBackend(model_name=os.getenv('LLM_MODEL', model_name))
+    if backend == 'mock':
+        # 环境变量 LLM_MOCK_LATENCY 设置模拟延迟（秒），便于不改代码地压测整个流程
+        mean_latency = float(os.getenv('LLM_MOCK_LATENCY', '0'))
+        return MockBackend(latency='lognormal' if mean_latency > 0 else 'constant',
+                           mean_latency=mean_latency,
+                           latency_stddev=mean_latency / 2)
+    raise ValueError(f"未知的 LLM 后端: {backend}，可选: vertex / openai / mock")
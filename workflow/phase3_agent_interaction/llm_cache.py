@@ -0,0 +1,179 @@
+"""
+LLM 响应缓存 (LLM Response Cache)
+职责：按内容寻址缓存 LLM 响应，对同一段录像重新运行时，相同的 Prompt 不再重复调用 API
+
+缓存键 = SHA-256(模型, 温度, 最大输出 token 数, System Prompt, User Prompt)，保存在 SQLite 文件中，
+Phase 3 / 5 / 6 的 LLMGateway 共享同一个文件。条目超过 ttl_seconds 后失效，
+总数超过 max_entries 时按最近访问时间淘汰最久未用的条目（LRU）。
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 默认缓存文件（环境变量 LLM_CACHE_PATH），未设置时不缓存：
+# 缓存中保存的是家庭监控的事件描述，不应默认写到 /tmp 这类共享目录
+DEFAULT_CACHE_PATH = os.getenv('LLM_CACHE_PATH') or None
+
+
+class LLMResponseCache:
+    """基于 SQLite 的 LLM 响应缓存（线程安全，支持多进程共享同一文件）"""
+    
+    def __init__(self,
+                 path: str,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600,
+                 max_entries: int = 10000):
+        """
+        打开（或创建）缓存文件
+        
+        Args:
+            path: SQLite 文件路径（':memory:' 表示进程内缓存）
+            ttl_seconds: 条目有效期（秒），None 表示永不过期
+            max_entries: 最多保留的条目数，超出时淘汰最久未访问的条目
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        
+        # 统计信息
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'expired': 0,
+            'evicted': 0
+        }
+        
+        self.purge_expired()
+        logger.debug(f"打开 LLM 响应缓存: {path} (ttl={ttl_seconds}, max_entries={self.max_entries})")
+    
+    @staticmethod
+    def make_key(model_name: str, temperature: float, max_output_tokens: int,
+                 system_prompt: str, user_prompt: str) -> str:
+        """
+        计算缓存键
+        
+        Returns:
+            SHA-256 十六进制摘要
+        """
+        payload = json.dumps([model_name, temperature, max_output_tokens, system_prompt, user_prompt],
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存的响应
+        
+        Args:
+            key: make_key 返回的缓存键
+        
+        Returns:
+            缓存的响应文本，未命中或已过期时返回 None
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.stats['hits'] += 1
+            return response
+    
+    def put(self, key: str, response: str):
+        """
+        写入响应，超出条目上限时淘汰最久未访问的条目
+        
+        Args:
+            key: make_key 返回的缓存键
+            response: 响应文本
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self.stats['stores'] += 1
+            
+            overflow = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)", (overflow,)
+                )
+                self.stats['evicted'] += overflow
+    
+    def purge_expired(self) -> int:
+        """
+        删除所有已过期的条目
+        
+        Returns:
+            删除的条目数
+        """
+        if self.ttl_seconds is None:
+            return 0
+        
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?",
+                                        (time.time() - self.ttl_seconds,))
+        
+        if cursor.rowcount > 0:
+            logger.debug(f"清理过期 LLM 缓存: {cursor.rowcount} 条")
+        return cursor.rowcount
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+    
+    def hit_rate(self) -> float:
+        """命中率（0.0-1.0），尚未查询过时为 0"""
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -1,121 +1,553 @@
 """
 模块 3: LLM 客户端网关 (LLM Client Gateway)
-职责：与 Google Gemini API 进行稳定的交互
+职责：与 LLM 后端进行稳定的交互（超时、重试、对冲请求、熔断、限速、响应缓存），默认后端为 Google Gemini (Vertex AI)
+
+尾延迟控制：
+- 每次请求有截止时间（request_timeout），超时的请求不再等待
+- 只重试超时、网络错误和限流/5xx，等待时间为带随机抖动的指数退避
+- 可选对冲请求：请求耗时超过近期延迟的分位数（如 p95）仍未返回时，再发一个相同的请求，取先返回的结果
+- 可选熔断器：后端持续失败时直接抛出 CircuitOpenError，调用方使用兜底生成
+
+generate_stream 提供流式输出（Phase 6 交互式问答），首个文本块生成后即可返回给用户。
+
+每次调用（含缓存命中）的 token 用量、延迟、重试次数计入遥测（LLMTelemetry，默认所有网关共享 default_telemetry），
+按 phase、后端和模型汇总。
 """
 
-import os
+import json
+import time
+import queue
+import random
 import logging
-from typing import Optional, Dict, Any
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any, Union, Iterator, Tuple
+from tenacity import Retrying, stop_after_attempt, wait_random_exponential, retry_if_exception
 
-import logging
+from .rate_limiter import RateLimiter
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .llm_cache import LLMResponseCache, DEFAULT_CACHE_PATH
+from .llm_backends import LLMBackend, LLMTimeoutError, create_backend, is_retryable_error, DEFAULT_BACKEND
+from .llm_telemetry import LLMTelemetry, default_telemetry
+from ..phase2_event_fusion.context_builder import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
-# 尝试导入 Vertex AI
-try:
-    import vertexai
-    from vertexai.generative_models import GenerativeModel
-    VERTEX_AI_AVAILABLE = True
-except ImportError:
-    VERTEX_AI_AVAILABLE = False
-    logger.warning("⚠️  vertexai 未安装，将无法使用 Gemini API")
-
 
 class LLMGateway:
     """LLM 客户端网关"""
     
+    # 对冲请求的延迟统计窗口（最近成功请求数）和开始对冲所需的最少样本数
+    LATENCY_WINDOW = 200
+    HEDGE_MIN_SAMPLES = 20
+    
     def __init__(self, 
                  model_name: str = 'gemini-2.5-flash-lite',
                  temperature: float = 0.2,
                  max_output_tokens: int = 256,
                  project_id: Optional[str] = None,
-                 location: str = 'us-central1'):
+                 location: str = 'us-central1',
+                 rate_limiter: Optional[RateLimiter] = None,
+                 cache: Union[LLMResponseCache, str, None] = DEFAULT_CACHE_PATH,
+                 backend: Union[LLMBackend, str, None] = None,
+                 request_timeout: Optional[float] = 30.0,
+                 max_attempts: int = 3,
+                 retry_max_wait: float = 10.0,
+                 hedge_percentile: Optional[float] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 phase: str = 'default',
+                 telemetry: Optional[LLMTelemetry] = None):
         """
         初始化 LLM 网关
         
         Args:
-            model_name: Gemini 模型名称
+            model_name: 模型名称（vertex 后端为 Gemini 模型名）
             temperature: 温度参数（0.0-1.0），越低越客观
             max_output_tokens: 最大输出 token 数
-            project_id: Google Cloud 项目ID（如果为None，从环境变量读取）
-            location: Vertex AI 区域
+            project_id: Google Cloud 项目ID（如果为None，从环境变量读取；仅 vertex 后端使用）
+            location: Vertex AI 区域（仅 vertex 后端使用）
+            rate_limiter: 请求速率限制器（多线程共享），None 表示不限制；重试的请求同样计入
+            cache: 响应缓存（LLMResponseCache 或 SQLite 文件路径），None 或空字符串表示不缓存；
+                默认读取环境变量 LLM_CACHE_PATH，未设置时不缓存
+            backend: LLM 后端（LLMBackend 实例或名称 vertex / openai / mock），
+                None 表示读取环境变量 LLM_BACKEND（默认 vertex）
+            request_timeout: 单次请求的截止时间（秒），None 表示不限制
+            max_attempts: 最多尝试次数（含首次），只有超时、网络错误和限流/5xx 会重试
+            retry_max_wait: 重试前等待时间的上限（秒），实际等待为 [0, min(2^n, 上限)] 内随机
+            hedge_percentile: 对冲阈值分位数（如 0.95），请求耗时超过近期延迟的该分位数时发出对冲请求；
+                None 表示不对冲。对冲请求同样计入速率限制
+            circuit_breaker: 熔断器（多线程共享），None 表示不熔断
+            phase: 遥测中的阶段标签（如 phase3 / phase5 / phase6）
+            telemetry: 调用遥测收集器，None 表示使用进程内共享的 default_telemetry
         """
         self.model_name = model_name
         self.temperature = temperature
         self.max_output_tokens = max_output_tokens
-        
-        # 获取项目ID
-        if project_id is None:
-            project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
-            if not project_id:
-                raise ValueError("无法确定项目ID，请设置 GOOGLE_CLOUD_PROJECT 环境变量")
-        
+        self.rate_limiter = rate_limiter
         self.project_id = project_id
         self.location = location
         
-        # 初始化 Vertex AI
-        if VERTEX_AI_AVAILABLE:
+        if isinstance(cache, str):
+            cache = LLMResponseCache(cache) if cache else None
+        self.cache = cache
+        
+        if backend is None:
+            backend = DEFAULT_BACKEND
+        if isinstance(backend, str):
+            backend = create_backend(backend, model_name=model_name,
+                                     project_id=project_id, location=location)
+        self.backend = backend
+        
+        self.request_timeout = request_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.retry_max_wait = retry_max_wait
+        self.hedge_percentile = hedge_percentile
+        self.circuit_breaker = circuit_breaker
+        self.phase = phase
+        self.telemetry = telemetry if telemetry is not None else default_telemetry
+        
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self._stats_lock = threading.Lock()
+        
+        # 统计信息（并发模式下由多个线程更新）
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'timeouts': 0,
+            'hedged': 0,
+            'hedge_wins': 0,
+            'circuit_rejected': 0
+        }
+        
+        logger.info(f"✅ LLM 网关初始化成功: {model_name} (后端: {backend.name})")
+    
+    def generate(self, system_prompt: str, user_prompt: str,
+                 max_output_tokens: Optional[int] = None,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        调用 LLM 生成文本（先查响应缓存，命中时不调用 API）
+        
+        Args:
+            system_prompt: System Prompt
+            user_prompt: User Prompt
+            max_output_tokens: 本次请求的最大输出 token 数（如批量请求），None 表示使用初始化时的配置
+            response_schema: 要求后端输出符合该 JSON Schema 的 JSON（结构化输出），None 表示自由文本
+        
+        Returns:
+            生成的文本
+        """
+        if max_output_tokens is None:
+            max_output_tokens = self.max_output_tokens
+        
+        key = self._cache_key(system_prompt, user_prompt, max_output_tokens, response_schema)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self._record_call(cache_hit=True)
+            return cached
+        
+        generated_text = self._generate_uncached(system_prompt, user_prompt, max_output_tokens, response_schema)
+        self._cache_put(key, generated_text)
+        
+        return generated_text
+    
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        """
+        流式调用 LLM：边生成边返回文本块，用于交互式问答（首个文本块即可展示给用户）
+        
+        缓存命中时一次性返回完整文本；完整响应生成后写入缓存。
+        首个文本块返回前失败时按重试策略重试，已返回文本后失败则直接抛出（不能撤回已输出的内容）。
+        request_timeout 限制相邻两个文本块之间的最长等待时间；流式请求不做对冲。
+        
+        Args:
+            system_prompt: System Prompt
+            user_prompt: User Prompt
+            max_output_tokens: 本次请求的最大输出 token 数，None 表示使用初始化时的配置
+        
+        Yields:
+            文本块（按顺序拼接即为完整响应）
+        
+        Raises:
+            CircuitOpenError: 熔断器打开，请求未发出
+        """
+        if max_output_tokens is None:
+            max_output_tokens = self.max_output_tokens
+        
+        key = self._cache_key(system_prompt, user_prompt, max_output_tokens)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self._record_call(cache_hit=True, streamed=True)
+            yield cached
+            return
+        
+        self._check_circuit()
+        logger.debug(f"📤 发送流式请求到 LLM 后端 (后端: {self.backend.name}, 模型: {self.model_name})")
+        
+        start = time.monotonic()
+        chunks = []
+        usage = {}
+        attempt = 0
+        while True:
+            attempt += 1
+            stream = self._stream_backend(system_prompt, user_prompt, max_output_tokens, usage)
             try:
-                vertexai.init(project=project_id, location=location)
-                self.model = GenerativeModel(model_name)
-                logger.info(f"✅ LLM 网关初始化成功: {model_name} (项目: {project_id}, 区域: {location})")
-            except Exception as e:
-                logger.error(f"❌ Vertex AI 初始化失败: {e}")
+                for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+                break
+            except GeneratorExit:
+                # 调用方提前停止读取：后端已经正常响应，照常结算熔断器（否则半开探测永远不会结束），
+                # 不完整的响应不写入缓存
+                stream.close()
+                self._record_outcome(None)
+                self._record_call(system_prompt, user_prompt, ''.join(chunks), usage.get('usage'),
+                                  start=start, retries=attempt - 1, streamed=True)
+                logger.debug(f"📥 流式响应被调用方提前关闭: 已返回 {len(chunks)} 个文本块")
                 raise
-        else:
-            logger.error("❌ vertexai 未安装，无法初始化 LLM 网关")
-            raise ImportError("请安装 google-cloud-aiplatform: pip install google-cloud-aiplatform")
+            except Exception as e:
+                if chunks or attempt >= self.max_attempts or not is_retryable_error(e):
+                    logger.error(f"❌ LLM 流式调用失败: {e}")
+                    self._record_outcome(e)
+                    self._record_call(start=start, retries=attempt - 1, streamed=True, error=e)
+                    raise
+                
+                # 与 wait_random_exponential 相同的 full jitter 退避
+                sleep = random.uniform(0, min(self.retry_max_wait, 2 ** (attempt - 1)))
+                self._count('retries')
+                logger.warning(f"⚠️  LLM 流式请求失败（第 {attempt}/{self.max_attempts} 次）: {e}，"
+                              f"{sleep:.1f} 秒后重试")
+                time.sleep(sleep)
+        
+        self._record_outcome(None)
+        
+        generated_text = ''.join(chunks).strip()
+        logger.debug(f"📥 流式响应完成: {len(generated_text)} 字符, {len(chunks)} 个文本块")
+        self._record_call(system_prompt, user_prompt, generated_text, usage.get('usage'),
+                          start=start, retries=attempt - 1, streamed=True)
+        self._cache_put(key, generated_text)
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((Exception,))
-    )
-    def generate(self, system_prompt: str, user_prompt: str) -> str:
+    def _cache_key(self, system_prompt: str, user_prompt: str, max_output_tokens: int,
+                   response_schema: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """响应缓存键（缓存关闭时返回 None）"""
+        if self.cache is None:
+            return None
+        # 缓存键包含后端名称，模拟后端的响应不会被真实后端读到；结构化输出的 Schema 计入模型标识
+        model_key = f"{self.backend.name}:{self.model_name}"
+        if response_schema is not None:
+            model_key += ":json:" + json.dumps(response_schema, ensure_ascii=False, sort_keys=True)
+        return self.cache.make_key(model_key, self.temperature,
+                                   max_output_tokens, system_prompt, user_prompt)
+    
+    def _cache_get(self, key: Optional[str]) -> Optional[str]:
+        """读取响应缓存，读取失败时视为未命中"""
+        if key is None:
+            return None
+        try:
+            cached = self.cache.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️  读取 LLM 缓存失败: {e}")
+            return None
+        
+        if cached is not None:
+            logger.debug(f"📦 LLM 缓存命中: {len(cached)} 字符")
+        return cached
+    
+    def _cache_put(self, key: Optional[str], generated_text: str):
+        """写入响应缓存（空响应不缓存，下次重新请求）"""
+        if key is None or not generated_text:
+            return
+        try:
+            self.cache.put(key, generated_text)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️  写入 LLM 缓存失败: {e}")
+    
+    def _generate_uncached(self, system_prompt: str, user_prompt: str, max_output_tokens: int,
+                           response_schema: Optional[Dict[str, Any]] = None) -> str:
         """
-        调用 LLM 生成文本
+        调用 LLM 后端生成文本（可重试的错误自动重试，结果计入熔断器）
         
         Args:
             system_prompt: System Prompt
             user_prompt: User Prompt
+            max_output_tokens: 最大输出 token 数
+            response_schema: 结构化输出的 JSON Schema，None 表示自由文本
         
         Returns:
             生成的文本
+        
+        Raises:
+            CircuitOpenError: 熔断器打开，请求未发出
         """
-        if not VERTEX_AI_AVAILABLE:
-            raise ImportError("vertexai 未安装")
+        self._check_circuit()
+        
+        logger.debug(f"📤 发送请求到 LLM 后端 (后端: {self.backend.name}, 模型: {self.model_name})")
+        start = time.monotonic()
+        attempts = 0
+        
+        retrying = Retrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_random_exponential(multiplier=1, max=self.retry_max_wait),
+            retry=retry_if_exception(is_retryable_error),
+            before_sleep=self._log_retry,
+            reraise=True
+        )
         
         try:
-            # 组合完整的 Prompt
-            full_prompt = f"{system_prompt}\n\n{user_prompt}"
-            
-            logger.debug(f"📤 发送请求到 Gemini API (模型: {self.model_name})")
-            logger.debug(f"   Prompt 长度: {len(full_prompt)} 字符")
-            
-            # 调用模型
-            generation_config = {
-                'temperature': self.temperature,
-                'max_output_tokens': self.max_output_tokens,
-            }
-            
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=generation_config
-            )
-            
-            # 提取文本
-            if hasattr(response, 'text') and response.text:
-                generated_text = response.text.strip()
-                logger.debug(f"📥 收到响应: {len(generated_text)} 字符")
-                return generated_text
-            else:
-                logger.warning("⚠️  API 响应为空")
-                return ""
-                
+            for attempt in retrying:
+                with attempt:
+                    attempts += 1
+                    generated_text, usage = self._call_backend(system_prompt, user_prompt, max_output_tokens,
+                                                               response_schema)
         except Exception as e:
             logger.error(f"❌ LLM API 调用失败: {e}")
+            self._record_outcome(e)
+            self._record_call(start=start, retries=attempts - 1, error=e)
             raise
+        
+        self._record_outcome(None)
+        call = self._record_call(system_prompt, user_prompt, generated_text, usage,
+                                 start=start, retries=attempts - 1)
+        
+        if generated_text:
+            logger.debug(f"📥 收到响应: {len(generated_text)} 字符, token 输入 {call['prompt_tokens']} / "
+                        f"输出 {call['completion_tokens']}{'（估算）' if call['estimated'] else ''}, "
+                        f"耗时 {call['latency']:.2f} 秒")
+        else:
+            logger.warning("⚠️  API 响应为空")
+        return generated_text
+    
+    def _check_circuit(self):
+        """熔断器打开时抛出 CircuitOpenError"""
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow_request():
+            self._count('circuit_rejected')
+            raise CircuitOpenError("LLM 后端已熔断，跳过请求")
+    
+    def _record_call(self, system_prompt: str = '', user_prompt: str = '', generated_text: str = '',
+                     usage: Optional[Tuple[int, int]] = None, start: Optional[float] = None,
+                     retries: int = 0, cache_hit: bool = False, streamed: bool = False,
+                     error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """
+        把一次调用计入遥测（后端没有返回用量时按 estimate_tokens 估算；缓存命中和失败的调用不计 token）
+        
+        Returns:
+            记录的调用指标 {'prompt_tokens', 'completion_tokens', 'estimated', 'latency'}
+        """
+        estimated = False
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage
+        elif cache_hit or error is not None:
+            prompt_tokens = completion_tokens = 0
+        else:
+            prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+            completion_tokens = estimate_tokens(generated_text)
+            estimated = True
+        
+        latency = time.monotonic() - start if start is not None else 0.0
+        self.telemetry.record(self.phase, self.backend.name, self.model_name,
+                              prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              latency=latency, retries=retries, cache_hit=cache_hit,
+                              estimated=estimated, streamed=streamed,
+                              error=type(error).__name__ if error is not None else None)
+        
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'estimated': estimated,
+            'latency': latency
+        }
+    
+    def _record_outcome(self, error: Optional[BaseException]):
+        """把请求结果（重试之后）计入熔断器"""
+        if self.circuit_breaker is None:
+            return
+        # 只有说明后端不健康的错误（超时、限流、5xx）计入熔断；4xx 等说明后端仍在正常响应
+        if error is not None and is_retryable_error(error):
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+    
+    def _call_backend(self, system_prompt: str, user_prompt: str, max_output_tokens: int,
+                      response_schema: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[Tuple[int, int]]]:
+        """
+        发出一次请求（一次重试尝试）：超过截止时间抛出 LLMTimeoutError，启用对冲时可能同时发出两个请求
+        
+        Returns:
+            (先成功返回的请求的文本, 该请求的 token 用量或 None)
+        """
+        hedge_delay = self._hedge_delay()
+        
+        # 速率限制的等待不计入截止时间
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        
+        if self.request_timeout is None and hedge_delay is None:
+            return self._timed_generate(system_prompt, user_prompt, max_output_tokens, response_schema)
+        
+        deadline = None if self.request_timeout is None else time.monotonic() + self.request_timeout
+        primary = self._submit(system_prompt, user_prompt, max_output_tokens, response_schema)
+        pending = [primary]
+        
+        if hedge_delay is not None and (self.request_timeout is None or hedge_delay < self.request_timeout):
+            done, _ = wait(pending, timeout=hedge_delay)
+            if not done:
+                logger.debug(f"⏱️  请求超过 {hedge_delay:.2f} 秒未返回，发出对冲请求")
+                self._count('hedged')
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                pending.append(self._submit(system_prompt, user_prompt, max_output_tokens, response_schema))
+        
+        # 取先成功返回的请求；全部失败时抛出最后一个错误
+        error = None
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                self._count('timeouts')
+                raise LLMTimeoutError(f"LLM 请求超过 {self.request_timeout:g} 秒未返回")
+            
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        
+        raise error
+    
+    def _submit(self, system_prompt: str, user_prompt: str, max_output_tokens: int,
+                response_schema: Optional[Dict[str, Any]] = None) -> Future:
+        """
+        在守护线程中发出请求（超时后不再等待该线程，也不会阻塞进程退出）
+        
+        Returns:
+            请求结果的 Future
+        """
+        future = Future()
+        
+        def run():
+            try:
+                future.set_result(self._timed_generate(system_prompt, user_prompt, max_output_tokens,
+                                                       response_schema))
+            except BaseException as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=run, name='llm-request', daemon=True).start()
+        return future
+    
+    def _stream_backend(self, system_prompt: str, user_prompt: str, max_output_tokens: int,
+                        usage: Dict[str, Any]) -> Iterator[str]:
+        """
+        发出一次流式请求：后端在守护线程中生成，相邻文本块间隔超过 request_timeout 时抛出 LLMTimeoutError；
+        调用方关闭生成器（或超时）后守护线程在下一个文本块处停止读取后端
+        
+        Args:
+            usage: 响应完成后写入 usage['usage']（后端上报的 token 用量，没有时为 None）
+        
+        Yields:
+            非空文本块
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        self._count('requests')
+        
+        if self.request_timeout is None:
+            self.backend.pop_usage()
+            for chunk in self.backend.generate_stream(system_prompt, user_prompt,
+                                                      self.temperature, max_output_tokens):
+                if chunk:
+                    yield chunk
+            usage['usage'] = self.backend.pop_usage()
+            return
+        
+        chunks = queue.Queue()
+        finished = object()
+        stop = threading.Event()
+        
+        def run():
+            try:
+                self.backend.pop_usage()
+                backend_stream = self.backend.generate_stream(system_prompt, user_prompt,
+                                                              self.temperature, max_output_tokens)
+                for chunk in backend_stream:
+                    if stop.is_set():
+                        backend_stream.close()
+                        return
+                    chunks.put(chunk)
+                usage['usage'] = self.backend.pop_usage()
+                chunks.put(finished)
+            except BaseException as e:
+                chunks.put(e)
+        
+        threading.Thread(target=run, name='llm-stream', daemon=True).start()
+        
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=self.request_timeout)
+                except queue.Empty:
+                    self._count('timeouts')
+                    raise LLMTimeoutError(f"LLM 流式响应超过 {self.request_timeout:g} 秒没有新内容")
+                
+                if item is finished:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                if item:
+                    yield item
+        finally:
+            stop.set()
+    
+    def _timed_generate(self, system_prompt: str, user_prompt: str, max_output_tokens: int,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[Tuple[int, int]]]:
+        """
+        调用后端，成功时记录延迟
+        
+        Returns:
+            (生成的文本, 后端上报的 token 用量或 None)
+        """
+        self._count('requests')
+        self.backend.pop_usage()
+        start = time.monotonic()
+        if response_schema is None:
+            generated_text = self.backend.generate(system_prompt, user_prompt,
+                                                   self.temperature, max_output_tokens)
+        else:
+            generated_text = self.backend.generate(system_prompt, user_prompt, self.temperature,
+                                                   max_output_tokens, response_schema=response_schema)
+        with self._stats_lock:
+            self._latencies.append(time.monotonic() - start)
+        return generated_text, self.backend.pop_usage()
+    
+    def _hedge_delay(self) -> Optional[float]:
+        """
+        对冲阈值：近期成功请求延迟的 hedge_percentile 分位数
+        
+        Returns:
+            秒数；未启用对冲或样本不足时返回 None
+        """
+        if self.hedge_percentile is None:
+            return None
+        
+        with self._stats_lock:
+            if len(self._latencies) < self.HEDGE_MIN_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile))]
+    
+    def _log_retry(self, retry_state):
+        """tenacity 重试前回调：记录错误和等待时间"""
+        self._count('retries')
+        logger.warning(f"⚠️  LLM 请求失败（第 {retry_state.attempt_number}/{self.max_attempts} 次）: "
+                      f"{retry_state.outcome.exception()}，{retry_state.next_action.sleep:.1f} 秒后重试")
+    
+    def _count(self, key: str):
+        """线程安全地累加统计项"""
+        with self._stats_lock:
+            self.stats[key] += 1
     
     def generate_simple(self, prompt: str) -> str:
         """
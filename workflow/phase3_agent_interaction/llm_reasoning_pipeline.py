@@ -4,12 +4,21 @@
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 from .prompt_engine import PromptEngine
 from .llm_gateway import LLMGateway
 from .response_validator import ResponseValidator
 from .role_classifier import RoleClassifier
+from .rate_limiter import RateLimiter
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .template_narrator import TemplateNarrator
+from .llm_cache import LLMResponseCache, DEFAULT_CACHE_PATH
+from .llm_backends import LLMBackend
+from ..phase2_event_fusion.context_builder import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +31,19 @@ class LLM_Reasoning_Pipeline:
                  temperature: float = 0.2,
                  max_output_tokens: int = 256,
                  project_id: Optional[str] = None,
-                 location: str = 'us-central1'):
+                 location: str = 'us-central1',
+                 max_concurrency: int = 1,
+                 requests_per_minute: Optional[float] = None,
+                 llm_cache: Union[LLMResponseCache, str, None] = DEFAULT_CACHE_PATH,
+                 batch_size: int = 1,
+                 batch_max_tokens: int = 2048,
+                 template_min_confidence: Optional[float] = 0.8,
+                 llm_backend: Union[LLMBackend, str, None] = None,
+                 request_timeout: Optional[float] = 30.0,
+                 hedge_percentile: Optional[float] = None,
+                 circuit_failure_threshold: Optional[int] = 5,
+                 circuit_recovery_timeout: float = 60.0,
+                 structured_output: bool = True):
         """
         初始化 LLM Reasoning Pipeline
         
@@ -32,11 +53,34 @@ class LLM_Reasoning_Pipeline:
             max_output_tokens: 最大输出 token 数
             project_id: Google Cloud 项目ID（如果为None，从环境变量读取）
             location: Vertex AI 区域
+            max_concurrency: 同时在途的 LLM 请求数上限，1 表示逐个顺序调用
+            requests_per_minute: 每分钟最多发出的 LLM 请求数（含重试，用于遵守配额），None 表示不限制
+            llm_cache: LLM 响应缓存（LLMResponseCache 或 SQLite 文件路径），None 表示不缓存；
+                默认读取环境变量 LLM_CACHE_PATH，未设置时不缓存
+            batch_size: 每个批量请求最多包含的事件数，1 表示不批量（每个事件单独请求）
+            batch_max_tokens: 批量请求中事件信息的 token 预算（估算值）；单个事件超过该预算时单独请求
+            template_min_confidence: 常规事件使用模板日志（不调用 LLM）所需的最低置信度，None 表示关闭模板
+            llm_backend: LLM 后端（LLMBackend 实例或名称 vertex / openai / mock），
+                None 表示读取环境变量 LLM_BACKEND（默认 vertex）
+            request_timeout: 单次 LLM 请求的截止时间（秒），None 表示不限制
+            hedge_percentile: 请求耗时超过近期延迟的该分位数（如 0.95）时发出对冲请求，None 表示不对冲
+            circuit_failure_threshold: LLM 后端连续失败多少次后熔断（熔断期间直接使用兜底生成），None 表示不熔断
+            circuit_recovery_timeout: 熔断后多少秒放行一个探测请求
+            structured_output: 是否要求 LLM 输出结构化 JSON（日志、人物角色、事件类型、标记），
+                角色直接取自 JSON 而不是扫描日志文本；响应不是 JSON 时仍按自由文本处理
         """
         logger.info("=" * 60)
         logger.info("初始化 LLM Reasoning Pipeline (第三阶段)")
         logger.info("=" * 60)
         
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.batch_max_tokens = batch_max_tokens
+        self.structured_output = structured_output
+        rate_limiter = None
+        if requests_per_minute:
+            rate_limiter = RateLimiter(requests_per_minute, burst=self.max_concurrency)
+        
         # 初始化各个模块
         self.prompt_engine = PromptEngine()                    # 模块 2
         self.llm_gateway = LLMGateway(                        # 模块 3
@@ -44,13 +88,34 @@ class LLM_Reasoning_Pipeline:
             temperature=temperature,
             max_output_tokens=max_output_tokens,
             project_id=project_id,
-            location=location
+            location=location,
+            rate_limiter=rate_limiter,
+            cache=llm_cache,
+            backend=llm_backend,
+            request_timeout=request_timeout,
+            hedge_percentile=hedge_percentile,
+            circuit_breaker=(CircuitBreaker(circuit_failure_threshold, circuit_recovery_timeout)
+                             if circuit_failure_threshold else None),
+            phase='phase3'
         )
         self.validator = ResponseValidator()                   # 模块 4
         self.role_classifier = RoleClassifier()                # 角色分类器
+        self.template_narrator = (TemplateNarrator(template_min_confidence)  # 模板叙述器
+                                  if template_min_confidence is not None else None)
+        
+        # 批量模式统计（并发模式下由多个线程更新）
+        self.batch_stats = {
+            'batches': 0,
+            'batched_events': 0,
+            'single_retries': 0
+        }
+        self._stats_lock = threading.Lock()
         
         logger.info(f"✅ LLM Reasoning Pipeline 初始化完成 "
-                   f"(模型: {model_name}, 温度: {temperature})")
+                   f"(模型: {model_name}, 后端: {self.llm_gateway.backend.name}, 温度: {temperature}, 并发: {self.max_concurrency}"
+                   f"{f', 限速: {requests_per_minute:g} 次/分钟' if requests_per_minute else ''}"
+                   f"{f', 批量: {self.batch_size}' if self.batch_size > 1 else ''}"
+                   f"{', 结构化输出' if self.structured_output else ''})")
     
     def process_events(self, global_events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -60,7 +125,9 @@ class LLM_Reasoning_Pipeline:
             global_events: Global_Event 列表（来自 Phase 2）
         
         Returns:
-            处理后的 Global_Event 列表，每个事件包含 'summary_text' 字段
+            处理后的 Global_Event 列表，每个事件包含 'summary_text' 字段，
+            以及 'summary_source'（'llm' / 'template' / 'no_people' / 'fallback'）；
+            LLM 返回结构化输出的事件另有 'llm_event_type' 和 'llm_flags'
         """
         logger.info("=" * 60)
         logger.info("开始 LLM 语义生成流程")
@@ -72,98 +139,33 @@ class LLM_Reasoning_Pipeline:
         
         logger.info(f"📋 需要处理 {len(global_events)} 个事件")
         
-        processed_events = []
-        
+        # 常规事件直接使用模板日志，其余事件划分为请求单元：每个单元是单个事件，或批量模式下打包在一起的多个小事件
+        total = len(global_events)
+        template_results = []
+        pending = []
         for idx, event in enumerate(global_events, 1):
-            logger.info(f"\n[{idx}/{len(global_events)}] 处理事件...")
-            
-            # 检查是否有人物出现
-            people = event.get('people', [])
-            people_info = event.get('people_info', {})
-            
-            # 检查是否有陌生人（即使没有 person_id）
-            has_strangers = False
-            if -1 in people_info:
-                has_strangers = people_info[-1].get('has_strangers', False)
-            
-            if (not people or len(people) == 0) and not has_strangers:
-                # 如果没有人出现（包括陌生人），直接返回固定回复，跳过LLM调用
-                logger.info("   检测到无人出现，跳过LLM调用")
-                event['summary_text'] = "该视频中无人出现"
-                event['llm_valid'] = True
-                event['llm_warnings'] = []
-                
-                logger.info(f"✅ 事件 #{idx} 处理完成")
-                logger.info(f"   生成日志: {event['summary_text']}")
-                
-                processed_events.append(event)
-                continue
-            
-            # 如果有陌生人但没有 person_id，记录日志
-            if has_strangers:
-                stranger_count = people_info[-1].get('stranger_count', 0)
-                logger.info(f"   检测到 {stranger_count} 个陌生人（无 person_id），继续处理")
-            
-            try:
-                # 1. 构建 Prompt（模块 2）
-                logger.debug("[模块 2] 构建 Prompt...")
-                prompts = self.prompt_engine.build_full_prompt(event)
-                
-                # 2. 调用 LLM（模块 3）
-                logger.debug("[模块 3] 调用 LLM API...")
-                raw_response = self.llm_gateway.generate(
-                    system_prompt=prompts['system_prompt'],
-                    user_prompt=prompts['user_prompt']
-                )
-                
-                # 记录原始响应（用于调试）
-                logger.debug(f"LLM 原始响应: {raw_response[:200]}...")
-                
-                # 3. 验证和清洗（模块 4）
-                logger.debug("[模块 4] 验证和清洗响应...")
-                validation_result = self.validator.validate_and_clean(raw_response, event)
-                
-                # 4. 根据行为推断角色（新增）
-                logger.debug("[角色分类] 根据行为推断角色...")
-                summary_text = validation_result['summary_text']
-                people_info = event.get('people_info', {})
-                
-                # 提取人物行为并推断角色
-                behaviors = self.role_classifier.extract_person_behaviors(
-                    summary_text, people_info
-                )
-                
-                # 更新人物角色
-                if behaviors:
-                    event = self.role_classifier.update_people_roles(event, behaviors)
-                    logger.info(f"   已根据行为更新 {len(behaviors)} 个人物的角色")
-                
-                # 5. 添加结果到事件
-                event['summary_text'] = summary_text
-                event['llm_valid'] = validation_result['is_valid']
-                event['llm_warnings'] = validation_result['warnings']
-                
-                logger.info(f"✅ 事件 #{idx} 处理完成")
-                logger.info(f"   生成日志: {validation_result['summary_text']}")
-                
-                if validation_result['warnings']:
-                    logger.warning(f"   ⚠️  警告: {validation_result['warnings']}")
-                
-                processed_events.append(event)
-                
-            except Exception as e:
-                logger.error(f"❌ 事件 #{idx} 处理失败: {e}")
-                import traceback
-                traceback.print_exc()
-                
-                # 使用兜底生成
-                logger.warning(f"   使用兜底生成...")
-                fallback_result = self.validator._generate_fallback(event)
-                event['summary_text'] = fallback_result['summary_text']
-                event['llm_valid'] = False
-                event['llm_warnings'] = ['处理失败，使用兜底生成']
-                
-                processed_events.append(event)
+            narration = self._narrate_with_template(event)
+            if narration is not None:
+                template_results.append((idx, self._apply_template(event, narration, idx)))
+            else:
+                pending.append((idx, event))
+        
+        units = self._plan_units(pending)
+        
+        workers = min(self.max_concurrency, len(units))
+        if workers <= 1:
+            unit_results = [self._process_unit(unit, total) for unit in units]
+        else:
+            # 最多 workers 个请求同时在途；Executor.map 按提交顺序返回结果
+            logger.info(f"   并发调用 LLM: 最多 {workers} 个请求同时进行")
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-reasoning') as executor:
+                unit_results = list(executor.map(self._process_unit, units, [total] * len(units)))
+        
+        # 按事件原始顺序组装结果
+        processed_events = [event for _, event in sorted(
+            template_results + [item for results in unit_results for item in results],
+            key=lambda item: item[0]
+        )]
         
         logger.info("\n" + "=" * 60)
         logger.info(f"✅ LLM 语义生成完成: {len(processed_events)} 个事件")
@@ -176,8 +178,339 @@ class LLM_Reasoning_Pipeline:
         logger.info(f"   有效生成: {valid_count}")
         logger.info(f"   兜底生成: {len(processed_events) - valid_count}")
         
+        sources = Counter(e.get('summary_source') for e in processed_events)
+        without_api = sources['no_people'] + sources['template']
+        logger.info(f"   无需调用 LLM: {without_api}/{len(processed_events)} "
+                   f"({without_api / len(processed_events):.0%}，模板 {sources['template']}，无人 {sources['no_people']})")
+        if self.template_narrator is not None and self.template_narrator.stats:
+            logger.info(f"   模板统计（累计）: {dict(self.template_narrator.stats)}")
+        
+        if self.structured_output:
+            llm_events = [e for e in processed_events if e.get('summary_source') == 'llm']
+            structured_count = sum(1 for e in llm_events if 'llm_event_type' in e)
+            logger.info(f"   结构化输出: {structured_count}/{len(llm_events)} "
+                       f"(自由文本回退 {len(llm_events) - structured_count})")
+        
+        if self.batch_size > 1:
+            logger.info(f"   批量请求: {self.batch_stats['batches']} 次, 共 {self.batch_stats['batched_events']} 个事件, "
+                       f"单独重试 {self.batch_stats['single_retries']} 个")
+        
+        cache = self.llm_gateway.cache
+        if cache is not None:
+            logger.info(f"   LLM 缓存: 命中 {cache.stats['hits']}, 未命中 {cache.stats['misses']} "
+                       f"(命中率 {cache.hit_rate():.0%})")
+        
+        gateway_stats = self.llm_gateway.stats
+        if gateway_stats['retries'] or gateway_stats['timeouts'] or gateway_stats['hedged'] \
+                or gateway_stats['circuit_rejected']:
+            logger.info(f"   LLM 请求: {gateway_stats['requests']} 次, 重试 {gateway_stats['retries']}, "
+                       f"超时 {gateway_stats['timeouts']}, 对冲 {gateway_stats['hedged']} "
+                       f"(对冲胜出 {gateway_stats['hedge_wins']}), 熔断跳过 {gateway_stats['circuit_rejected']}")
+        
+        for row in self.llm_gateway.telemetry.summary():
+            if row['phase'] == self.llm_gateway.phase and row['model'] == self.llm_gateway.model_name:
+                logger.info(f"   LLM token（累计）: 输入 {row['prompt_tokens']}, 输出 {row['completion_tokens']}, "
+                           f"调用 {row['calls']} 次, 延迟 p95 {row['latency']['p95']:.2f} 秒")
+        
         return processed_events
     
+    def _narrate_with_template(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """常规事件尝试使用模板日志（关闭模板或无人出现时返回 None）"""
+        if self.template_narrator is None or not self._needs_llm(event):
+            return None
+        return self.template_narrator.narrate(event)
+    
+    def _apply_template(self, event: Dict[str, Any], narration: Dict[str, Any],
+                        idx: int) -> Dict[str, Any]:
+        """
+        把模板日志写入事件
+        
+        Args:
+            event: Global_Event 对象
+            narration: TemplateNarrator.narrate 的返回值
+            idx: 事件序号（用于日志）
+        
+        Returns:
+            处理后的 Global_Event 对象
+        """
+        logger.info(f"   事件 #{idx} 使用模板 {narration['template']} (置信度 {narration['confidence']:.2f})，跳过LLM调用")
+        event['summary_text'] = narration['summary_text']
+        event['llm_valid'] = True
+        event['llm_warnings'] = []
+        event['summary_source'] = 'template'
+        
+        logger.info(f"✅ 事件 #{idx} 处理完成")
+        logger.info(f"   生成日志: {event['summary_text']}")
+        
+        return event
+    
+    def _plan_units(self, numbered_events: List[Tuple[int, Dict[str, Any]]]) -> List[List[Tuple[int, Dict[str, Any]]]]:
+        """
+        把事件划分为请求单元（批量模式下按顺序把小事件打包，直到达到 batch_size 或 token 预算）
+        
+        Args:
+            numbered_events: [(事件序号, Global_Event), ...]
+        
+        Returns:
+            [[(事件序号, Global_Event), ...], ...]，只含一个事件的单元单独请求
+        """
+        if self.batch_size <= 1:
+            return [[item] for item in numbered_events]
+        
+        units = []
+        batch = []
+        batch_tokens = 0
+        
+        for idx, event in numbered_events:
+            # 不需要调用 LLM 的事件和超出预算的大事件单独处理
+            tokens = estimate_tokens(self.prompt_engine.build_event_context(event)) if self._needs_llm(event) else None
+            if tokens is None or tokens > self.batch_max_tokens:
+                units.append([(idx, event)])
+                continue
+            
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > self.batch_max_tokens):
+                units.append(batch)
+                batch, batch_tokens = [], 0
+            
+            batch.append((idx, event))
+            batch_tokens += tokens
+        
+        if batch:
+            units.append(batch)
+        
+        return units
+    
+    def _process_unit(self, unit: List[Tuple[int, Dict[str, Any]]],
+                      total: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        处理一个请求单元
+        
+        Args:
+            unit: [(事件序号, Global_Event), ...]
+            total: 事件总数（用于日志）
+        
+        Returns:
+            [(事件序号, 处理后的 Global_Event), ...]
+        """
+        if len(unit) == 1:
+            idx, event = unit[0]
+            return [(idx, self._process_event(event, idx, total))]
+        return self._process_batch(unit, total)
+    
+    def _process_batch(self, unit: List[Tuple[int, Dict[str, Any]]],
+                       total: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        批量处理多个小事件：一次请求（JSON 数组进、JSON 数组出），缺失或未通过验证的事件改为单独请求
+        
+        Args:
+            unit: [(事件序号, Global_Event), ...]
+            total: 事件总数（用于日志）
+        
+        Returns:
+            [(事件序号, 处理后的 Global_Event), ...]
+        """
+        first_idx, last_idx = unit[0][0], unit[-1][0]
+        logger.info(f"\n[{first_idx}-{last_idx}/{total}] 批量处理 {len(unit)} 个事件...")
+        
+        items = [(f"event_{idx}", event) for idx, event in unit]
+        try:
+            prompts = self.prompt_engine.build_batch_prompt(items, structured=self.structured_output)
+            raw_response = self.llm_gateway.generate(
+                system_prompt=prompts['system_prompt'],
+                user_prompt=prompts['user_prompt'],
+                max_output_tokens=self.llm_gateway.max_output_tokens * len(items),
+                response_schema=PromptEngine.STRUCTURED_BATCH_SCHEMA if self.structured_output else None
+            )
+            summaries = self.validator.parse_batch_response(raw_response, structured=self.structured_output)
+        except CircuitOpenError:
+            logger.warning(f"⚠️  LLM 后端已熔断，{len(unit)} 个事件使用兜底生成")
+            return [(idx, self._apply_fallback(event, 'LLM 后端熔断，使用兜底生成')) for idx, event in unit]
+        except Exception as e:
+            logger.warning(f"⚠️  批量请求失败，改为逐个请求: {e}")
+            summaries = {}
+        
+        results = []
+        retries = 0
+        for (idx, event), (item_id, _) in zip(unit, items):
+            validation_result = None
+            if item_id in summaries and self.structured_output:
+                validation_result = self.validator.validate_structured(summaries[item_id], event,
+                                                                       allow_fallback=False)
+            elif item_id in summaries:
+                validation_result = self.validator.validate_and_clean(summaries[item_id], event,
+                                                                      allow_fallback=False)
+            
+            if validation_result is None:
+                logger.info(f"   事件 #{idx} 批量结果缺失或未通过验证，单独请求")
+                retries += 1
+                results.append((idx, self._process_event(event, idx, total)))
+                continue
+            
+            try:
+                results.append((idx, self._apply_result(event, validation_result, idx)))
+            except Exception as e:
+                logger.warning(f"⚠️  事件 #{idx} 批量结果处理失败，单独请求: {e}")
+                retries += 1
+                results.append((idx, self._process_event(event, idx, total)))
+        
+        with self._stats_lock:
+            self.batch_stats['batches'] += 1
+            self.batch_stats['batched_events'] += len(unit)
+            self.batch_stats['single_retries'] += retries
+        
+        return results
+    
+    @staticmethod
+    def _needs_llm(event: Dict[str, Any]) -> bool:
+        """事件中是否有人物出现（包括没有 person_id 的陌生人），无人出现时不需要调用 LLM"""
+        people_info = event.get('people_info', {})
+        has_strangers = -1 in people_info and people_info[-1].get('has_strangers', False)
+        return bool(event.get('people')) or has_strangers
+    
+    def _process_event(self, event: Dict[str, Any], idx: int, total: int) -> Dict[str, Any]:
+        """
+        处理单个事件：构建 Prompt → 调用 LLM → 验证清洗 → 角色推断（失败时使用兜底生成）
+        
+        并发模式下在工作线程中执行，各事件之间不共享可变状态。
+        
+        Args:
+            event: Global_Event 对象
+            idx: 事件序号（用于日志）
+            total: 事件总数（用于日志）
+        
+        Returns:
+            处理后的 Global_Event 对象
+        """
+        logger.info(f"\n[{idx}/{total}] 处理事件...")
+        
+        # 检查是否有人物出现（包括没有 person_id 的陌生人）
+        people_info = event.get('people_info', {})
+        has_strangers = -1 in people_info and people_info[-1].get('has_strangers', False)
+        
+        if not self._needs_llm(event):
+            # 如果没有人出现（包括陌生人），直接返回固定回复，跳过LLM调用
+            logger.info("   检测到无人出现，跳过LLM调用")
+            event['summary_text'] = "该视频中无人出现"
+            event['llm_valid'] = True
+            event['llm_warnings'] = []
+            event['summary_source'] = 'no_people'
+            
+            logger.info(f"✅ 事件 #{idx} 处理完成")
+            logger.info(f"   生成日志: {event['summary_text']}")
+            
+            return event
+        
+        # 如果有陌生人但没有 person_id，记录日志
+        if has_strangers:
+            stranger_count = people_info[-1].get('stranger_count', 0)
+            logger.info(f"   检测到 {stranger_count} 个陌生人（无 person_id），继续处理")
+        
+        try:
+            # 1. 构建 Prompt（模块 2）
+            logger.debug("[模块 2] 构建 Prompt...")
+            prompts = self.prompt_engine.build_full_prompt(event, structured=self.structured_output)
+            
+            # 2. 调用 LLM（模块 3）
+            logger.debug("[模块 3] 调用 LLM API...")
+            raw_response = self.llm_gateway.generate(
+                system_prompt=prompts['system_prompt'],
+                user_prompt=prompts['user_prompt'],
+                response_schema=PromptEngine.STRUCTURED_OUTPUT_SCHEMA if self.structured_output else None
+            )
+            
+            # 记录原始响应（用于调试）
+            logger.debug(f"LLM 原始响应: {raw_response[:200]}...")
+            
+            # 3. 验证和清洗（模块 4）
+            logger.debug("[模块 4] 验证和清洗响应...")
+            if self.structured_output:
+                validation_result = self.validator.validate_structured_response(raw_response, event)
+            else:
+                validation_result = self.validator.validate_and_clean(raw_response, event)
+            
+            # 4-5. 根据行为推断角色，添加结果到事件
+            return self._apply_result(event, validation_result, idx)
+        
+        except CircuitOpenError:
+            logger.warning(f"⚠️  事件 #{idx}: LLM 后端已熔断，使用兜底生成")
+            return self._apply_fallback(event, 'LLM 后端熔断，使用兜底生成')
+        
+        except Exception as e:
+            logger.error(f"❌ 事件 #{idx} 处理失败: {e}")
+            import traceback
+            traceback.print_exc()
+            
+            # 使用兜底生成
+            logger.warning(f"   使用兜底生成...")
+            return self._apply_fallback(event, '处理失败，使用兜底生成')
+    
+    def _apply_fallback(self, event: Dict[str, Any], warning: str) -> Dict[str, Any]:
+        """
+        使用兜底生成的日志（LLM 调用失败或后端熔断时）
+        
+        Args:
+            event: Global_Event 对象
+            warning: 记录到 llm_warnings 的原因
+        
+        Returns:
+            处理后的 Global_Event 对象
+        """
+        fallback_result = self.validator._generate_fallback(event)
+        event['summary_text'] = fallback_result['summary_text']
+        event['llm_valid'] = False
+        event['llm_warnings'] = [warning]
+        event['summary_source'] = 'fallback'
+        
+        return event
+    
+    def _apply_result(self, event: Dict[str, Any], validation_result: Dict[str, Any],
+                      idx: int) -> Dict[str, Any]:
+        """
+        根据行为推断角色，并把验证后的日志写入事件（单独请求和批量请求共用）
+        
+        Args:
+            event: Global_Event 对象
+            validation_result: ResponseValidator.validate_and_clean / validate_structured 的返回值
+            idx: 事件序号（用于日志）
+        
+        Returns:
+            处理后的 Global_Event 对象
+        """
+        # 4. 根据行为推断角色（新增）
+        logger.debug("[角色分类] 根据行为推断角色...")
+        summary_text = validation_result['summary_text']
+        people_info = event.get('people_info', {})
+        structured = validation_result.get('structured')
+        
+        # 提取人物行为并推断角色（结构化输出直接使用其中的角色，自由文本按关键词推断）
+        if structured is not None:
+            behaviors = self.role_classifier.behaviors_from_structured(structured, summary_text, people_info)
+            event['llm_event_type'] = structured['event_type']
+            event['llm_flags'] = structured['flags']
+        else:
+            behaviors = self.role_classifier.extract_person_behaviors(
+                summary_text, people_info
+            )
+        
+        # 更新人物角色
+        if behaviors:
+            event = self.role_classifier.update_people_roles(event, behaviors)
+            logger.info(f"   已根据行为更新 {len(behaviors)} 个人物的角色")
+        
+        # 5. 添加结果到事件
+        event['summary_text'] = summary_text
+        event['llm_valid'] = validation_result['is_valid']
+        event['llm_warnings'] = validation_result['warnings']
+        event['summary_source'] = 'llm'
+        
+        logger.info(f"✅ 事件 #{idx} 处理完成")
+        logger.info(f"   生成日志: {validation_result['summary_text']}")
+        
+        if validation_result['warnings']:
+            logger.warning(f"   ⚠️  警告: {validation_result['warnings']}")
+        
+        return event
+    
     def process_one_event(self, global_event: Dict[str, Any]) -> Dict[str, Any]:
         """
         处理单个事件（便捷方法）
@@ -0,0 +1,325 @@
+"""
+LLM 调用遥测 (LLM Telemetry)
+职责：记录每次 LLM 调用的 token 用量、延迟、重试和缓存命中，按阶段、后端和模型汇总，导出 JSON / Prometheus 文本
+
+token 数优先使用后端响应中的用量元数据（Vertex AI usage_metadata、OpenAI usage），
+后端未返回用量时用 estimate_tokens 估算并标记为估算值。
+所有 LLMGateway 默认共享 default_telemetry，一次运行结束时可以得到各阶段的完整统计。
+"""
+
+import json
+import time
+import random
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 模型单价（美元 / 百万 token：输入, 输出），用于估算费用；按官方价格表填写，价格调整时需同步更新
+MODEL_PRICES = {
+    'gemini-2.5-flash-lite': (0.10, 0.40),
+    'gemini-2.5-flash': (0.30, 2.50),
+}
+
+
+class LLMTelemetry:
+    """线程安全的 LLM 调用遥测收集器"""
+    
+    # 保留的单次调用记录数（导出 JSON 时可包含），汇总统计不受该上限影响
+    MAX_CALL_RECORDS = 10000
+    
+    # 每组保留的延迟样本数（蓄水池抽样，用于估算分位数）；次数、合计和最大值按全部调用精确统计
+    MAX_LATENCY_SAMPLES = 4096
+    
+    # 导出的延迟分位数
+    LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+    
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        初始化遥测收集器
+        
+        Args:
+            prices: {模型名称: (输入单价, 输出单价)}（美元 / 百万 token），None 表示使用 MODEL_PRICES；
+                不在表中的模型和 mock 后端不计费用
+        """
+        self.prices = MODEL_PRICES if prices is None else prices
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self.reset()
+    
+    def reset(self):
+        """清空所有记录"""
+        with self._lock:
+            self._calls = deque(maxlen=self.MAX_CALL_RECORDS)
+            self._groups = {}
+            self._started_at = time.time()
+    
+    def record(self, phase: str, backend: str, model: str,
+               prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency: float = 0.0, retries: int = 0,
+               cache_hit: bool = False, estimated: bool = False,
+               streamed: bool = False, error: Optional[str] = None):
+        """
+        记录一次 LLM 调用（一次 generate / generate_stream，重试和对冲计入同一次调用）
+        
+        Args:
+            phase: 调用方所在阶段（如 phase3 / phase5 / phase6）
+            backend: 后端名称
+            model: 模型名称
+            prompt_tokens: 输入 token 数（缓存命中时为 0）
+            completion_tokens: 输出 token 数（缓存命中时为 0）
+            latency: 调用耗时（秒，含重试等待）
+            retries: 重试次数
+            cache_hit: 是否命中响应缓存
+            estimated: token 数是否为估算值（后端未返回用量元数据）
+            streamed: 是否为流式调用
+            error: 调用失败时的异常类型名称，成功时为 None
+        """
+        cost = self._cost(backend, model, prompt_tokens, completion_tokens)
+        call = {
+            'time': time.time(),
+            'phase': phase,
+            'backend': backend,
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency': latency,
+            'retries': retries,
+            'cache_hit': cache_hit,
+            'estimated': estimated,
+            'streamed': streamed,
+            'error': error,
+            'cost_usd': cost,
+        }
+        
+        with self._lock:
+            self._calls.append(call)
+            key = (phase, backend, model)
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {
+                    'calls': 0,
+                    'cache_hits': 0,
+                    'errors': 0,
+                    'retries': 0,
+                    'estimated_calls': 0,
+                    'prompt_tokens': 0,
+                    'completion_tokens': 0,
+                    'cost_usd': None,
+                    'latency_count': 0,
+                    'latency_sum': 0.0,
+                    'latency_max': 0.0,
+                    'latencies': [],
+                }
+            
+            group['calls'] += 1
+            group['retries'] += retries
+            group['prompt_tokens'] += prompt_tokens
+            group['completion_tokens'] += completion_tokens
+            if cache_hit:
+                group['cache_hits'] += 1
+            if error is not None:
+                group['errors'] += 1
+            if estimated:
+                group['estimated_calls'] += 1
+            if cost is not None:
+                group['cost_usd'] = (group['cost_usd'] or 0.0) + cost
+            # 延迟分布只统计真正请求了后端的调用
+            if not cache_hit:
+                self._record_latency(group, latency)
+    
+    def _record_latency(self, group: Dict[str, Any], latency: float):
+        """累计延迟并以蓄水池抽样保留有限的样本（调用方持有锁）"""
+        group['latency_count'] += 1
+        group['latency_sum'] += latency
+        group['latency_max'] = max(group['latency_max'], latency)
+        
+        samples = group['latencies']
+        if len(samples) < self.MAX_LATENCY_SAMPLES:
+            samples.append(latency)
+        else:
+            slot = self._rng.randrange(group['latency_count'])
+            if slot < self.MAX_LATENCY_SAMPLES:
+                samples[slot] = latency
+    
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        按阶段、后端和模型汇总
+        
+        Returns:
+            [{'phase', 'model', 'backend', 'calls', 'cache_hits', 'errors', 'retries', 'estimated_calls',
+              'prompt_tokens', 'completion_tokens', 'cost_usd',
+              'latency': {'count', 'sum', 'mean', 'max', 'p50', 'p95', 'p99'}}, ...]，
+            按阶段、后端、模型排序；cost_usd 为 None 表示该模型没有单价；
+            调用数超过 MAX_LATENCY_SAMPLES 时分位数由抽样样本估算
+        """
+        with self._lock:
+            groups = [(key, dict(group, latencies=sorted(group['latencies'])))
+                      for key, group in self._groups.items()]
+        
+        rows = []
+        for (phase, backend, model), group in sorted(groups, key=lambda item: item[0]):
+            latencies = group.pop('latencies')
+            count = group.pop('latency_count')
+            total = group.pop('latency_sum')
+            latency = {
+                'count': count,
+                'sum': total,
+                'mean': total / count if count else 0.0,
+                'max': group.pop('latency_max'),
+            }
+            for quantile in self.LATENCY_QUANTILES:
+                latency[self._quantile_key(quantile)] = self._quantile(latencies, quantile)
+            rows.append({'phase': phase, 'model': model, 'backend': backend, **group, 'latency': latency})
+        
+        return rows
+    
+    def totals(self) -> Dict[str, Any]:
+        """
+        所有阶段的合计
+        
+        Returns:
+            {'calls', 'cache_hits', 'errors', 'retries', 'prompt_tokens', 'completion_tokens', 'cost_usd', 'latency_sum'}
+        """
+        rows = self.summary()
+        totals = {key: sum(row[key] for row in rows)
+                  for key in ('calls', 'cache_hits', 'errors', 'retries', 'prompt_tokens', 'completion_tokens')}
+        costs = [row['cost_usd'] for row in rows if row['cost_usd'] is not None]
+        totals['cost_usd'] = sum(costs) if costs else None
+        totals['latency_sum'] = sum(row['latency']['sum'] for row in rows)
+        return totals
+    
+    def to_json(self, path: Optional[str] = None, include_calls: bool = False) -> str:
+        """
+        导出为 JSON
+        
+        Args:
+            path: 写入的文件路径，None 表示只返回字符串
+            include_calls: 是否包含单次调用记录（最近 MAX_CALL_RECORDS 条）
+        
+        Returns:
+            JSON 字符串
+        """
+        payload = {
+            'started_at': self._started_at,
+            'exported_at': time.time(),
+            'totals': self.totals(),
+            'phases': self.summary(),
+        }
+        if include_calls:
+            with self._lock:
+                payload['calls'] = list(self._calls)
+        
+        text = json.dumps(payload, ensure_ascii=False, indent=2)
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+    
+    def to_prometheus(self, path: Optional[str] = None) -> str:
+        """
+        导出为 Prometheus 文本格式（node_exporter textfile collector 可直接读取）
+        
+        Args:
+            path: 写入的文件路径，None 表示只返回字符串
+        
+        Returns:
+            Prometheus 文本
+        """
+        rows = self.summary()
+        counters = [
+            ('llm_calls_total', 'LLM 调用次数（含缓存命中）', 'calls'),
+            ('llm_cache_hits_total', 'LLM 响应缓存命中次数', 'cache_hits'),
+            ('llm_errors_total', 'LLM 调用失败次数', 'errors'),
+            ('llm_retries_total', 'LLM 请求重试次数', 'retries'),
+            ('llm_prompt_tokens_total', 'LLM 输入 token 数', 'prompt_tokens'),
+            ('llm_completion_tokens_total', 'LLM 输出 token 数', 'completion_tokens'),
+            ('llm_cost_usd_total', 'LLM 调用费用估算（美元）', 'cost_usd'),
+        ]
+        
+        lines = []
+        for name, help_text, key in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for row in rows:
+                if row[key] is not None:
+                    lines.append(f"{name}{{{self._labels(row)}}} {self._format_value(row[key])}")
+        
+        lines.append("# HELP llm_latency_seconds LLM 调用耗时（秒，不含缓存命中）")
+        lines.append("# TYPE llm_latency_seconds summary")
+        for row in rows:
+            labels = self._labels(row)
+            latency = row['latency']
+            for quantile in self.LATENCY_QUANTILES:
+                lines.append(f'llm_latency_seconds{{{labels},quantile="{quantile:g}"}} '
+                             f"{latency[self._quantile_key(quantile)]:.6f}")
+            lines.append(f"llm_latency_seconds_sum{{{labels}}} {latency['sum']:.6f}")
+            lines.append(f"llm_latency_seconds_count{{{labels}}} {latency['count']}")
+        
+        text = "\n".join(lines) + "\n"
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+    
+    def log_report(self):
+        """输出各阶段的 LLM 调用报告"""
+        rows = self.summary()
+        if not rows:
+            logger.info("📊 LLM 调用报告: 没有 LLM 调用")
+            return
+        
+        logger.info("📊 LLM 调用报告:")
+        for row in rows:
+            latency = row['latency']
+            estimated = f" (估算 {row['estimated_calls']} 次)" if row['estimated_calls'] else ""
+            cost = f", 费用约 ${row['cost_usd']:.4f}" if row['cost_usd'] is not None else ""
+            logger.info(f"   [{row['phase']}] {row['model']} ({row['backend']}): "
+                       f"调用 {row['calls']} 次 (缓存命中 {row['cache_hits']}, 失败 {row['errors']}, 重试 {row['retries']}), "
+                       f"token 输入 {row['prompt_tokens']} / 输出 {row['completion_tokens']}{estimated}, "
+                       f"延迟 p50 {latency['p50']:.2f}s / p95 {latency['p95']:.2f}s / 最大 {latency['max']:.2f}s{cost}")
+        
+        totals = self.totals()
+        cost = f", 费用约 ${totals['cost_usd']:.4f}" if totals['cost_usd'] is not None else ""
+        logger.info(f"   合计: 调用 {totals['calls']} 次, token 输入 {totals['prompt_tokens']} / "
+                   f"输出 {totals['completion_tokens']}, LLM 累计耗时 {totals['latency_sum']:.1f}s{cost}")
+    
+    def _cost(self, backend: str, model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        """按单价估算费用（美元），没有单价时返回 None"""
+        price = self.prices.get(model) if backend != 'mock' else None
+        if price is None:
+            return None
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+    
+    @staticmethod
+    def _labels(row: Dict[str, Any]) -> str:
+        """Prometheus 标签（转义反斜杠、双引号和换行）"""
+        def escape(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return f'phase="{escape(row["phase"])}",model="{escape(row["model"])}",backend="{escape(row["backend"])}"'
+    
+    @staticmethod
+    def _format_value(value) -> str:
+        """Prometheus 样本值：整数原样输出，浮点数保留完整精度"""
+        if isinstance(value, int):
+            return str(value)
+        return repr(float(value))
+    
+    @staticmethod
+    def _quantile_key(quantile: float) -> str:
+        """分位数在汇总结果中的键（0.95 → 'p95'）"""
+        return f"p{round(quantile * 100)}"
+    
+    @staticmethod
+    def _quantile(sorted_values: List[float], quantile: float) -> float:
+        """分位数（最近秩法），没有样本时返回 0"""
+        if not sorted_values:
+            return 0.0
+        return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * quantile))]
+
+
+# 进程内共享的遥测收集器（LLMGateway 未指定 telemetry 时使用）
+default_telemetry = LLMTelemetry()
@@ -1,9 +1,13 @@
 """
 模块 2: 提示词工程引擎 (Prompt Template Engine)
 职责：组装 System Prompt 和 User Prompt，控制 LLM 的"人设"和"输出格式"
+
+结构化输出模式下要求 LLM 返回 JSON（日志、人物角色、事件类型、标记），
+并提供对应的 JSON Schema（STRUCTURED_OUTPUT_SCHEMA），支持约束解码的后端据此限制输出。
 """
 
-from typing import Dict, Any, Optional
+import json
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,18 +27,150 @@ class PromptEngine:
         'indoor_bedroom': '卧室',
     }
     
+    # 基础 System Prompt（定义 LLM 的角色和规则）
+    BASE_SYSTEM_PROMPT = """你是一个智能家庭监控系统的日志生成助手。你的任务是根据监控视频的时间线信息，生成一条详细、准确的中文日志。
+
+规则：
+1. 必须使用中文
+2. 时间误差不能超过1分钟
+3. 如果是陌生人，必须描述衣着特征（如果信息可用）
+4. 保持客观、详细，避免主观判断
+5. 关注空间转移（如从"庭院"到"正门"意味着"回家"），详细描述人物的移动路径
+6. 如果多个摄像头同时检测到同一人，合并为一条日志，但要说明在不同位置的出现
+7. 输出格式：时间 + 详细的事件描述（50-200字）
+8. 必须包含以下信息：
+   - 人物的具体行为（出现、移动、停留、做什么等）
+   - 位置变化（从哪个位置到哪个位置）
+   - 时间顺序（先做什么，后做什么）
+   - 如果有多个摄像头，说明在不同位置的活动
+   - 【重要】详细描述人物在做什么（例如：拿着包裹、按门铃、等待、离开等）
+9. 禁止使用"详情见视频"、"详见视频"等通用描述，必须基于时间线信息生成具体描述
+10. 【重要】严格基于提供的时间线信息生成日志，不要推断或添加时间线中未明确提到的人物或事件
+11. 如果时间线中只提到"家人"，不要添加"陌生人"的描述；如果时间线中只提到"陌生人"，不要添加"家人"的描述
+12. 【行为描述要求】必须详细描述人物的具体行为，例如：
+    - 如果看到人物拿着包裹或快递，明确说明"拿着包裹"、"拿着快递"等
+    - 如果看到人物按门铃或敲门，明确说明"按门铃"、"敲门"等
+    - 如果看到人物在等待，明确说明"等待"、"停留"等
+    - 如果看到人物离开，明确说明"离开"、"离去"等
+"""
+    
+    # 根据事件类型追加的注意事项
+    EVENT_TYPE_NOTES = {
+        'family_only': "\n注意：本次事件涉及家人，请使用友好的语气。",
+        'stranger': "\n注意：本次事件涉及陌生人，请详细描述并保持警惕性。",
+        'mixed': "\n注意：本次事件涉及家人和陌生人，请区分描述。",
+    }
+    
+    # 生成要求（单事件）
+    SINGLE_EVENT_INSTRUCTION = "\n\n请根据以上时间线信息，生成一条详细的中文日志，描述事件的完整过程，包括人物的具体行为、位置变化和时间顺序。"
+    
+    # 生成要求（批量）
+    BATCH_INSTRUCTION = "\n\n请分别为每个事件生成一条详细的中文日志，描述事件的完整过程，包括人物的具体行为、位置变化和时间顺序。"
+    
+    # 生成时的注意事项（单事件和批量共用）
+    GENERATION_RULES = (
+        "\n【重要提示】："
+        "\n- 严格基于时间线信息生成，不要推断或添加时间线中未明确提到的人物"
+        "\n- 如果时间线中只提到家人，不要添加陌生人的描述"
+        "\n- 如果时间线中只提到陌生人，不要添加家人的描述"
+        "\n- 不要使用\"详情见视频\"等通用描述，必须基于时间线生成具体描述"
+        "\n- 【行为描述】必须详细描述人物在做什么，例如："
+        "\n  * 如果看到人物拿着物品，明确说明拿着什么（包裹、快递、工具箱等）"
+        "\n  * 如果看到人物在操作，明确说明在做什么（按门铃、敲门、等待、离开等）"
+        "\n  * 如果看到人物有特定动作，明确说明动作内容"
+    )
+    
+    # 批量模式的输入输出格式说明（追加在 System Prompt 之后）
+    BATCH_FORMAT_RULES = """
+批量模式：
+- 输入是一个 JSON 数组，每个元素是一个相互独立的事件：{"id": 事件ID, "note": 该事件的注意事项, "timeline": 时间线和补充信息}
+- 每个事件单独描述，不要把不同事件的人物或行为混在一起
+- 只输出一个 JSON 数组，不要输出其他文字或 Markdown：[{"id": 事件ID, "summary": 该事件的日志}, ...]
+- 每个输入事件都必须有且只有一个对应的输出元素，id 与输入完全一致
+"""
+    
+    # 结构化输出中的人物角色（与 RoleClassifier.classify_from_description 的返回值一致）
+    STRUCTURED_ROLES = ['owner', 'visitor', 'delivery', 'service', 'unknown']
+    
+    # 结构化输出中的事件类型（与 Phase 2 ContextBuilder 的事件分类一致）
+    STRUCTURED_EVENT_TYPES = ['normal', 'visitor', 'delivery', 'service', 'dangerous']
+    
+    # 结构化输出的 JSON Schema（OpenAPI 子集，Vertex AI response_schema 和 OpenAI json_schema 均可使用）
+    STRUCTURED_OUTPUT_SCHEMA = {
+        'type': 'object',
+        'properties': {
+            'summary': {'type': 'string'},
+            'event_type': {'type': 'string', 'enum': STRUCTURED_EVENT_TYPES},
+            'people': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'person_id': {'type': 'integer'},
+                        'role': {'type': 'string', 'enum': STRUCTURED_ROLES},
+                    },
+                    'required': ['person_id', 'role'],
+                },
+            },
+            'flags': {
+                'type': 'object',
+                'properties': {
+                    'suspicious': {'type': 'boolean'},
+                    'delivery_evidence': {'type': 'boolean'},
+                },
+                'required': ['suspicious', 'delivery_evidence'],
+            },
+        },
+        'required': ['summary', 'event_type', 'people', 'flags'],
+    }
+    
+    # 批量结构化输出的 JSON Schema：每个元素是带 id 的单事件结构
+    STRUCTURED_BATCH_SCHEMA = {
+        'type': 'array',
+        'items': {
+            'type': 'object',
+            'properties': {'id': {'type': 'string'}, **STRUCTURED_OUTPUT_SCHEMA['properties']},
+            'required': ['id'] + STRUCTURED_OUTPUT_SCHEMA['required'],
+        },
+    }
+    
+    # 结构化输出的字段说明（追加在 System Prompt 之后）
+    STRUCTURED_FORMAT_RULES = """
+输出格式（结构化）：
+- 只输出一个 JSON 对象，不要输出其他文字或 Markdown：
+  {"summary": 日志, "event_type": 事件类型, "people": [{"person_id": 人物ID, "role": 角色}, ...], "flags": {"suspicious": 是否可疑, "delivery_evidence": 是否明确在送货或提供服务}}
+- summary：按上述规则生成的中文日志
+- event_type：normal（日常活动）/ visitor（访客）/ delivery（快递、外卖等配送）/ service（维修、清洁等服务）/ dangerous（可疑或危险行为）
+- people：日志中涉及的每个人物一项；person_id 使用时间线中的人物ID，没有ID的陌生人使用 -1
+- role：owner（家人）/ visitor（访客）/ delivery（快递员、配送员）/ service（维修、清洁等服务人员）/ unknown（身份不明）
+- flags.suspicious：人物有可疑、入侵等行为时为 true
+- flags.delivery_evidence：明确看到人物递送包裹、快递、外卖，或进行维修、清洁等服务时为 true
+"""
+    
+    # 批量结构化输出的格式说明（替代 BATCH_FORMAT_RULES 中的输出格式）
+    STRUCTURED_BATCH_FORMAT_RULES = """
+批量模式：
+- 输入是一个 JSON 数组，每个元素是一个相互独立的事件：{"id": 事件ID, "note": 该事件的注意事项, "timeline": 时间线和补充信息}
+- 每个事件单独描述，不要把不同事件的人物或行为混在一起
+- 只输出一个 JSON 数组，不要输出其他文字或 Markdown：[{"id": 事件ID, "summary": ..., "event_type": ..., "people": [...], "flags": {...}}, ...]
+- 除 id 外，每个元素的字段与下面的单事件结构化输出相同
+- 每个输入事件都必须有且只有一个对应的输出元素，id 与输入完全一致
+"""
+    
     def __init__(self):
         """初始化提示词引擎"""
         pass
     
     def build_full_prompt(self, global_event: Dict[str, Any], 
-                         prompt_context: Optional[str] = None) -> Dict[str, str]:
+                         prompt_context: Optional[str] = None,
+                         structured: bool = False) -> Dict[str, str]:
         """
         构建完整的 Prompt（System Prompt + User Prompt）
         
         Args:
             global_event: Global_Event 对象
             prompt_context: Prompt 上下文文本（如果提供，优先使用；否则从 global_event 中提取）
+            structured: 是否要求结构化 JSON 输出（配合 STRUCTURED_OUTPUT_SCHEMA 使用）
         
         Returns:
             {
@@ -48,6 +184,8 @@ class PromptEngine:
         
         # 构建 System Prompt
         system_prompt = self._build_system_prompt(global_event)
+        if structured:
+            system_prompt += self.STRUCTURED_FORMAT_RULES
         
         # 构建 User Prompt
         user_prompt = self._build_user_prompt(prompt_context, global_event)
@@ -60,6 +198,46 @@ class PromptEngine:
             'user_prompt': user_prompt
         }
     
+    def build_batch_prompt(self, items: List[Tuple[str, Dict[str, Any]]],
+                           structured: bool = False) -> Dict[str, str]:
+        """
+        把多个事件打包成一个请求的 Prompt（System Prompt 只发送一次）
+        
+        Args:
+            items: [(事件ID, Global_Event), ...]
+            structured: 是否要求结构化 JSON 输出（配合 STRUCTURED_BATCH_SCHEMA 使用）
+        
+        Returns:
+            {
+                'system_prompt': str,
+                'user_prompt': str  # 事件 JSON 数组 + 生成要求
+            }
+        """
+        payload = [
+            {
+                'id': item_id,
+                'note': self.EVENT_TYPE_NOTES.get(self._detect_event_type(event), '').strip(),
+                'timeline': self.build_event_context(event)
+            }
+            for item_id, event in items
+        ]
+        
+        user_prompt = (f"以下是 {len(items)} 个相互独立的事件（JSON 数组）：\n"
+                       + json.dumps(payload, ensure_ascii=False, indent=1)
+                       + self.BATCH_INSTRUCTION + self.GENERATION_RULES)
+        
+        logger.debug(f"✅ 批量 Prompt 构建完成: {len(items)} 个事件, User={len(user_prompt)}字符")
+        
+        if structured:
+            system_prompt = self.BASE_SYSTEM_PROMPT + self.STRUCTURED_BATCH_FORMAT_RULES + self.STRUCTURED_FORMAT_RULES
+        else:
+            system_prompt = self.BASE_SYSTEM_PROMPT + self.BATCH_FORMAT_RULES
+        
+        return {
+            'system_prompt': system_prompt,
+            'user_prompt': user_prompt
+        }
+    
     def _build_system_prompt(self, global_event: Dict[str, Any]) -> str:
         """
         构建 System Prompt（定义 LLM 的角色和规则）
@@ -70,45 +248,9 @@ class PromptEngine:
         Returns:
             System Prompt 字符串
         """
-        # 检测事件类型
+        # 基础 System Prompt + 根据事件类型添加特定规则
         event_type = self._detect_event_type(global_event)
-        
-        # 基础 System Prompt
-        base_prompt = """你是一个智能家庭监控系统的日志生成助手。你的任务是根据监控视频的时间线信息，生成一条详细、准确的中文日志。
-
-规则：
-1. 必须使用中文
-2. 时间误差不能超过1分钟
-3. 如果是陌生人，必须描述衣着特征（如果信息可用）
-4. 保持客观、详细，避免主观判断
-5. 关注空间转移（如从"庭院"到"正门"意味着"回家"），详细描述人物的移动路径
-6. 如果多个摄像头同时检测到同一人，合并为一条日志，但要说明在不同位置的出现
-7. 输出格式：时间 + 详细的事件描述（50-200字）
-8. 必须包含以下信息：
-   - 人物的具体行为（出现、移动、停留、做什么等）
-   - 位置变化（从哪个位置到哪个位置）
-   - 时间顺序（先做什么，后做什么）
-   - 如果有多个摄像头，说明在不同位置的活动
-   - 【重要】详细描述人物在做什么（例如：拿着包裹、按门铃、等待、离开等）
-9. 禁止使用"详情见视频"、"详见视频"等通用描述，必须基于时间线信息生成具体描述
-10. 【重要】严格基于提供的时间线信息生成日志，不要推断或添加时间线中未明确提到的人物或事件
-11. 如果时间线中只提到"家人"，不要添加"陌生人"的描述；如果时间线中只提到"陌生人"，不要添加"家人"的描述
-12. 【行为描述要求】必须详细描述人物的具体行为，例如：
-    - 如果看到人物拿着包裹或快递，明确说明"拿着包裹"、"拿着快递"等
-    - 如果看到人物按门铃或敲门，明确说明"按门铃"、"敲门"等
-    - 如果看到人物在等待，明确说明"等待"、"停留"等
-    - 如果看到人物离开，明确说明"离开"、"离去"等
-"""
-        
-        # 根据事件类型添加特定规则
-        if event_type == 'family_only':
-            base_prompt += "\n注意：本次事件涉及家人，请使用友好的语气。"
-        elif event_type == 'stranger':
-            base_prompt += "\n注意：本次事件涉及陌生人，请详细描述并保持警惕性。"
-        elif event_type == 'mixed':
-            base_prompt += "\n注意：本次事件涉及家人和陌生人，请区分描述。"
-        
-        return base_prompt
+        return self.BASE_SYSTEM_PROMPT + self.EVENT_TYPE_NOTES.get(event_type, '')
     
     def _build_user_prompt(self, prompt_context: str, 
                           global_event: Dict[str, Any]) -> str:
@@ -122,6 +264,25 @@ class PromptEngine:
         Returns:
             User Prompt 字符串
         """
+        # 事件信息 + 生成要求
+        return (self.build_event_context(global_event, prompt_context)
+                + self.SINGLE_EVENT_INSTRUCTION + self.GENERATION_RULES)
+    
+    def build_event_context(self, global_event: Dict[str, Any],
+                            prompt_context: Optional[str] = None) -> str:
+        """
+        构建单个事件的信息部分（时间线 + 补充信息，不含生成要求），单事件和批量 Prompt 共用
+        
+        Args:
+            global_event: Global_Event 对象
+            prompt_context: Prompt 上下文文本（时间线），None 表示使用 global_event['prompt_text']
+        
+        Returns:
+            事件信息字符串
+        """
+        if prompt_context is None:
+            prompt_context = global_event.get('prompt_text', '')
+        
         # 基础 User Prompt
         user_prompt = prompt_context
         
@@ -173,18 +334,6 @@ class PromptEngine:
         if additional_info:
             user_prompt += "\n\n补充信息：\n" + "\n".join(f"- {info}" for info in additional_info)
         
-        # 添加生成要求
-        user_prompt += "\n\n请根据以上时间线信息，生成一条详细的中文日志，描述事件的完整过程，包括人物的具体行为、位置变化和时间顺序。"
-        user_prompt += "\n【重要提示】："
-        user_prompt += "\n- 严格基于时间线信息生成，不要推断或添加时间线中未明确提到的人物"
-        user_prompt += "\n- 如果时间线中只提到家人，不要添加陌生人的描述"
-        user_prompt += "\n- 如果时间线中只提到陌生人，不要添加家人的描述"
-        user_prompt += "\n- 不要使用\"详情见视频\"等通用描述，必须基于时间线生成具体描述"
-        user_prompt += "\n- 【行为描述】必须详细描述人物在做什么，例如："
-        user_prompt += "\n  * 如果看到人物拿着物品，明确说明拿着什么（包裹、快递、工具箱等）"
-        user_prompt += "\n  * 如果看到人物在操作，明确说明在做什么（按门铃、敲门、等待、离开等）"
-        user_prompt += "\n  * 如果看到人物有特定动作，明确说明动作内容"
-        
         return user_prompt
     
     def _detect_event_type(self, global_event: Dict[str, Any]) -> str:
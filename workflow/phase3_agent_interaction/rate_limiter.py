@@ -0,0 +1,63 @@
+"""
+请求速率限制器 (Rate Limiter)
+职责：限制 LLM API 的请求速率，避免并发调用超出配额
+
+令牌桶算法：每秒补充 requests_per_minute / 60 个令牌，桶容量为 burst。
+acquire() 取不到令牌时阻塞等待，线程安全，多个工作线程共享同一个限制器。
+"""
+
+import threading
+import time
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """线程安全的令牌桶速率限制器"""
+    
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        """
+        初始化速率限制器
+        
+        Args:
+            requests_per_minute: 每分钟允许的请求数
+            burst: 允许的突发请求数（桶容量），None 表示 1（请求均匀分布）
+        """
+        if requests_per_minute <= 0:
+            raise ValueError(f"requests_per_minute 必须大于 0: {requests_per_minute}")
+        
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(max(1, burst or 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.total_wait = 0.0
+        
+        logger.debug(f"初始化速率限制器: {requests_per_minute:g} 次/分钟, 突发 {self.capacity:g}")
+    
+    def acquire(self) -> float:
+        """
+        获取一个令牌，不足时阻塞等待
+        
+        Returns:
+            等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            
+            # 先预占令牌（可能为负），再在锁外等待，后到的线程按顺序排在后面
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.total_wait += wait
+        
+        if wait > 0:
+            logger.debug(f"⏳ 速率限制: 等待 {wait:.2f} 秒")
+            time.sleep(wait)
+        
+        return wait
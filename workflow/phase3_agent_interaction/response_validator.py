@@ -1,30 +1,44 @@
 """
 模块 4: 响应清洗与校验器 (Response Parser & Validator)
 职责：确保 LLM 生成的内容符合数据库入库要求
+
+两种响应：
+- 自由文本：清洗 Markdown 后按关键词做幻觉检测
+- 结构化 JSON（PromptEngine.STRUCTURED_OUTPUT_SCHEMA）：做字段和类型检查，
+  幻觉检测直接比较人物角色和标记，不再扫描日志文本；不是 JSON 的响应仍按自由文本处理
 """
 
 import re
-from typing import Dict, Any, Optional
+import json
+from typing import Dict, Any, Optional, List
 import logging
 
+from .prompt_engine import PromptEngine
+
 logger = logging.getLogger(__name__)
 
 
 class ResponseValidator:
     """响应清洗与校验器"""
     
+    # 结构化输出允许的角色和事件类型
+    STRUCTURED_ROLES = frozenset(PromptEngine.STRUCTURED_ROLES)
+    STRUCTURED_EVENT_TYPES = frozenset(PromptEngine.STRUCTURED_EVENT_TYPES)
+    
     def __init__(self):
         """初始化校验器"""
         pass
     
     def validate_and_clean(self, raw_response: str, 
-                          global_event: Dict[str, Any]) -> Dict[str, Any]:
+                          global_event: Dict[str, Any],
+                          allow_fallback: bool = True) -> Optional[Dict[str, Any]]:
         """
         验证和清洗 LLM 响应
         
         Args:
             raw_response: LLM 原始响应文本
             global_event: Global_Event 对象（用于验证）
+            allow_fallback: 验证失败时是否使用兜底生成；为 False 时返回 None（批量模式据此改为单独请求）
         
         Returns:
             {
@@ -34,6 +48,8 @@ class ResponseValidator:
             }
         """
         if not raw_response or not raw_response.strip():
+            if not allow_fallback:
+                return None
             logger.warning("⚠️  LLM 响应为空，使用兜底生成")
             return self._generate_fallback(global_event)
         
@@ -51,6 +67,9 @@ class ResponseValidator:
         
         # 3. 如果检测到严重问题，使用兜底生成
         if not is_valid and len(warnings) > 0:
+            if not allow_fallback:
+                logger.warning(f"⚠️  检测到幻觉: {warnings}")
+                return None
             logger.warning(f"⚠️  检测到幻觉，使用兜底生成。警告: {warnings}")
             return self._generate_fallback(global_event)
         
@@ -63,6 +82,213 @@ class ResponseValidator:
             'warnings': warnings
         }
     
+    def validate_structured_response(self, raw_response: str,
+                                     global_event: Dict[str, Any],
+                                     allow_fallback: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        验证结构化 JSON 响应；不是 JSON 的响应（后端忽略了格式要求）按自由文本验证
+        
+        Args:
+            raw_response: LLM 原始响应文本
+            global_event: Global_Event 对象（用于验证）
+            allow_fallback: 验证失败时是否使用兜底生成；为 False 时返回 None
+        
+        Returns:
+            同 validate_and_clean；结构化响应额外包含 'structured'（parse_structured_response 的返回值）
+        """
+        if not self._looks_like_json(raw_response):
+            logger.debug("响应不是 JSON，按自由文本验证")
+            return self.validate_and_clean(raw_response, global_event, allow_fallback)
+        
+        structured = self.parse_structured_response(raw_response)
+        if structured is None:
+            if not allow_fallback:
+                logger.warning("⚠️  结构化响应不符合 Schema")
+                return None
+            logger.warning("⚠️  结构化响应不符合 Schema，使用兜底生成")
+            return self._generate_fallback(global_event)
+        
+        return self.validate_structured(structured, global_event, allow_fallback)
+    
+    def validate_structured(self, structured: Dict[str, Any],
+                            global_event: Dict[str, Any],
+                            allow_fallback: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        验证已解析的结构化响应（幻觉检测基于人物角色和标记，不扫描日志文本）
+        
+        Args:
+            structured: parse_structured_response 的返回值
+            global_event: Global_Event 对象（用于验证）
+            allow_fallback: 验证失败时是否使用兜底生成；为 False 时返回 None
+        
+        Returns:
+            {
+                'summary_text': str,
+                'is_valid': bool,
+                'warnings': List[str],
+                'structured': Dict  # 事件类型、人物角色、标记
+            }
+        """
+        warnings = self._check_structured_hallucination(structured, global_event)
+        if warnings:
+            if not allow_fallback:
+                logger.warning(f"⚠️  检测到幻觉: {warnings}")
+                return None
+            logger.warning(f"⚠️  检测到幻觉，使用兜底生成。警告: {warnings}")
+            return self._generate_fallback(global_event)
+        
+        return {
+            'summary_text': structured['summary'],
+            'is_valid': True,
+            'warnings': [],
+            'structured': structured
+        }
+    
+    def parse_structured_response(self, raw_response: str) -> Optional[Dict[str, Any]]:
+        """
+        解析结构化响应（JSON 对象，可能带有 ```json 代码块）并检查 Schema
+        
+        Args:
+            raw_response: LLM 原始响应文本
+        
+        Returns:
+            {
+                'summary': str,
+                'event_type': str,
+                'people': {person_id: role},
+                'flags': {'suspicious': bool, 'delivery_evidence': bool}
+            }
+            不是合法 JSON 或不符合 Schema 时返回 None
+        """
+        start = raw_response.find('{')
+        end = raw_response.rfind('}')
+        if start < 0 or end <= start:
+            return None
+        
+        try:
+            data = json.loads(raw_response[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+        
+        return self._normalize_structured(data)
+    
+    def parse_batch_response(self, raw_response: str, structured: bool = False) -> Dict[str, Any]:
+        """
+        解析批量请求的响应（JSON 数组：[{"id": ..., "summary": ...}, ...]）
+        
+        Args:
+            raw_response: LLM 原始响应文本（可能带有 ```json 代码块）
+            structured: 元素是否为结构化输出（PromptEngine.STRUCTURED_BATCH_SCHEMA）
+        
+        Returns:
+            {事件ID: 日志文本}，缺少 id 或 summary 的元素被忽略；
+            structured 为 True 时为 {事件ID: parse_structured_response 格式的字典}，不符合 Schema 的元素被忽略
+        
+        Raises:
+            ValueError: 响应中没有可解析的 JSON 数组
+        """
+        start = raw_response.find('[')
+        end = raw_response.rfind(']')
+        if start < 0 or end <= start:
+            raise ValueError("批量响应中没有 JSON 数组")
+        
+        try:
+            items = json.loads(raw_response[start:end + 1])
+        except json.JSONDecodeError as e:
+            raise ValueError(f"批量响应 JSON 解析失败: {e}")
+        
+        summaries = {}
+        for item in items:
+            if not isinstance(item, dict) or item.get('id') is None:
+                continue
+            if structured:
+                parsed = self._normalize_structured(item)
+                if parsed is not None:
+                    summaries[str(item['id'])] = parsed
+            elif isinstance(item.get('summary'), str):
+                summaries[str(item['id'])] = item['summary']
+        
+        return summaries
+    
+    @staticmethod
+    def _looks_like_json(text: str) -> bool:
+        """响应是否为 JSON（以 { 或 ```json 代码块开头）"""
+        text = text.lstrip() if text else ''
+        return text.startswith('{') or text.startswith('```')
+    
+    def _normalize_structured(self, data: Any) -> Optional[Dict[str, Any]]:
+        """
+        检查结构化响应的字段和类型（STRUCTURED_OUTPUT_SCHEMA），并转换为便于使用的格式
+        
+        Args:
+            data: json.loads 的结果
+        
+        Returns:
+            parse_structured_response 格式的字典，不符合 Schema 时返回 None
+        """
+        if not isinstance(data, dict):
+            return None
+        
+        summary = data.get('summary')
+        flags = data.get('flags')
+        people = data.get('people')
+        if (not isinstance(summary, str) or not summary.strip()
+                or data.get('event_type') not in self.STRUCTURED_EVENT_TYPES
+                or not isinstance(people, list) or not isinstance(flags, dict)):
+            return None
+        
+        suspicious = flags.get('suspicious')
+        delivery_evidence = flags.get('delivery_evidence')
+        if not isinstance(suspicious, bool) or not isinstance(delivery_evidence, bool):
+            return None
+        
+        roles = {}
+        for person in people:
+            if not isinstance(person, dict) or person.get('role') not in self.STRUCTURED_ROLES:
+                return None
+            person_id = person.get('person_id')
+            # 兼容以字符串输出的数字 ID；bool 是 int 的子类，需要排除
+            if isinstance(person_id, str) and person_id.lstrip('-').isdigit():
+                person_id = int(person_id)
+            if not isinstance(person_id, int) or isinstance(person_id, bool):
+                return None
+            roles[person_id] = person['role']
+        
+        return {
+            'summary': summary.strip(),
+            'event_type': data['event_type'],
+            'people': roles,
+            'flags': {'suspicious': suspicious, 'delivery_evidence': delivery_evidence}
+        }
+    
+    def _check_structured_hallucination(self, structured: Dict[str, Any],
+                                        global_event: Dict[str, Any]) -> List[str]:
+        """
+        结构化响应的幻觉检测（规则与 _check_hallucination 相同，但比较的是人物角色和标记）
+        
+        检查规则：
+        1. 时间线中没有"家人"，但输出中有角色为 owner 的人物
+        2. 时间线中没有"陌生人"，但输出中有无 ID 的陌生人（person_id = -1）或标记为可疑
+        
+        Args:
+            structured: parse_structured_response 的返回值
+            global_event: Global_Event 对象
+        
+        Returns:
+            警告信息列表（为空表示通过）
+        """
+        warnings = []
+        prompt_text = global_event.get('prompt_text', '')
+        people = structured['people']
+        
+        if '家人' not in prompt_text and 'owner' in people.values():
+            warnings.append("时间线中没有家人，但输出提到了家人")
+        
+        if '陌生人' not in prompt_text and (-1 in people or structured['flags']['suspicious']):
+            warnings.append("时间线中没有陌生人，但输出提到了陌生人或入侵")
+        
+        return warnings
+    
     def _clean_format(self, text: str) -> str:
         """
         清洗格式（去除 Markdown、多余换行等）
@@ -1,14 +1,152 @@
 """
 角色分类器：根据 LLM 描述的行为推断人物角色
+
+所有关键词模式（角色行为、强快递/服务关键词、陌生人提及）编译成一个组合正则，
+每段描述只扫描一次，得到全部命中及位置，再按各模式原有的 findall 语义计数。
+LLM 返回结构化输出时直接使用其中的人物角色和标记（behaviors_from_structured），不扫描描述。
 """
 
 import re
-from typing import Dict, Any, List, Optional
+from bisect import bisect_right
+from collections import defaultdict
+from operator import itemgetter
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class _KeywordPatternSet:
+    """
+    一组关键词模式的单次扫描匹配器
+    
+    支持两种模式：关键词 'A'，以及同一行内 A 在前、B 在后的 'A.*B'（贪婪匹配，与 re.findall 的计数一致）。
+    所有关键词按长度降序组成一个交替正则 k1|k2|...，从每个命中的下一个字符继续搜索，
+    得到每个起始位置上最长的关键词；同一位置上更短的关键词必然是它的前缀，由预先计算的前缀表补全，
+    因此重叠的命中（如"快递员"和"快递"）不会遗漏。
+    """
+    
+    def __init__(self, groups: Dict[str, List[str]]):
+        """
+        Args:
+            groups: {分组名: [模式, ...]}
+        """
+        self.groups = groups
+        patterns_by_first = defaultdict(list)  # 关键词 A → [(分组名, 模式, A 的长度, 关键词 B 或 None, B 的长度)]
+        keywords = set()
+        
+        for group, patterns in groups.items():
+            for pattern in patterns:
+                parts = pattern.split('.*')
+                if len(parts) > 2 or any(not part or re.escape(part) != part for part in parts):
+                    raise ValueError(f"不支持的关键词模式: {pattern}（只支持 '关键词' 或 '关键词A.*关键词B'）")
+                
+                first = parts[0].lower()
+                second = parts[1].lower() if len(parts) == 2 else None
+                patterns_by_first[first].append((group, pattern, len(first), second,
+                                                 len(second) if second is not None else 0))
+                keywords.update(part.lower() for part in parts)
+        
+        ordered = sorted(keywords, key=len, reverse=True)
+        self._regex = re.compile('|'.join(re.escape(k) for k in ordered), re.IGNORECASE)
+        
+        # 关键词 → 它的所有前缀关键词（含自身），即同一位置上同时命中的关键词
+        self._prefixes = {k: [other for other in ordered if k.startswith(other)] for k in ordered}
+        
+        # 只有首个关键词命中时才需要检查的模式
+        self._patterns_by_first = dict(patterns_by_first)
+    
+    def scan(self, text: str) -> Dict[str, List[Tuple[str, int, int]]]:
+        """
+        扫描文本
+        
+        Args:
+            text: 待匹配文本
+        
+        Returns:
+            {分组名: [(模式, 起始位置, 结束位置), ...]}，只包含有命中的分组，组内按起始位置排序；
+            每个模式的命中与 re.finditer(模式, text, re.IGNORECASE) 的匹配一一对应
+        """
+        occurrences = {}
+        search = self._regex.search
+        match = search(text)
+        while match is not None:
+            start = match.start()
+            for keyword in self._prefixes[match.group().lower()]:
+                starts = occurrences.get(keyword)
+                if starts is None:
+                    occurrences[keyword] = [start]
+                else:
+                    starts.append(start)
+            match = search(text, start + 1)
+        
+        if not occurrences:
+            return {}
+        
+        line_breaks = [i for i, ch in enumerate(text) if ch == '\n'] if '\n' in text else None
+        hits = {}
+        for keyword, starts in occurrences.items():
+            for group, pattern, first_len, second, second_len in self._patterns_by_first.get(keyword, ()):
+                if second is None:
+                    if len(starts) == 1:
+                        spans = ((starts[0], starts[0] + first_len),)
+                    else:
+                        spans = self._literal_spans(starts, first_len)
+                elif second in occurrences:
+                    spans = self._gapped_spans(starts, first_len, occurrences[second], second_len, line_breaks)
+                    if not spans:
+                        continue
+                else:
+                    continue
+                
+                group_hits = hits.get(group)
+                if group_hits is None:
+                    group_hits = hits[group] = []
+                for span_start, span_end in spans:
+                    group_hits.append((pattern, span_start, span_end))
+        
+        for group_hits in hits.values():
+            if len(group_hits) > 1:
+                group_hits.sort(key=itemgetter(1))
+        return hits
+    
+    @staticmethod
+    def _literal_spans(starts: List[int], length: int) -> List[Tuple[int, int]]:
+        """关键词的不重叠命中（从左到右）"""
+        spans = []
+        next_free = 0
+        for start in starts:
+            if start >= next_free:
+                spans.append((start, start + length))
+                next_free = start + length
+        return spans
+    
+    @staticmethod
+    def _gapped_spans(first_starts: List[int], first_len: int, second_starts: List[int], second_len: int,
+                      line_breaks: Optional[List[int]]) -> List[Tuple[int, int]]:
+        """
+        'A.*B' 的命中：'.' 不匹配换行，贪婪匹配使每行最多一个命中，
+        从该行第一个 A 开始，到该行最后一个（在 A 之后的）B 结束
+        """
+        if line_breaks is None:
+            if second_starts[-1] >= first_starts[0] + first_len:
+                return [(first_starts[0], second_starts[-1] + second_len)]
+            return []
+        
+        lines = defaultdict(lambda: ([], []))
+        for start in first_starts:
+            lines[bisect_right(line_breaks, start)][0].append(start)
+        for start in second_starts:
+            lines[bisect_right(line_breaks, start)][1].append(start)
+        
+        spans = []
+        for line in sorted(lines):
+            firsts, seconds = lines[line]
+            if firsts and seconds and seconds[-1] >= firsts[0] + first_len:
+                spans.append((firsts[0], seconds[-1] + second_len))
+        return spans
+
+
 class RoleClassifier:
     """基于行为的角色分类器"""
     
@@ -47,14 +185,53 @@ class RoleClassifier:
         ]
     }
     
+    # 强关键词：明确指向快递/服务的行为（家人角色只在出现这些关键词时才会被覆盖）
+    STRONG_DELIVERY_PATTERNS = [
+        r'拿着.*包裹', r'拿着.*快递', r'拿着.*盒子', r'拿着.*箱子',
+        r'送.*包裹', r'送.*快递', r'送.*外卖',
+        r'快递员', r'配送员', r'送货员',
+        r'投递', r'签收', r'快递单', r'配送单',
+        r'维修', r'清洁', r'工具箱'
+    ]
+    
+    # 描述中提及陌生人的关键词
+    STRANGER_PATTERNS = [
+        r'陌生人', r'陌生', r'未知', r'不明身份', r'人员', r'人物'
+    ]
+    
+    # 描述中提及具体人物的方式：Person_1、人物1、ID:1、家人(Person_1)
+    PERSON_MENTION_PATTERN = re.compile(r'(?:Person_|人物|ID:)(\d+)', re.IGNORECASE)
+    
     def __init__(self):
         """初始化角色分类器"""
-        # 编译正则表达式
-        self.compiled_patterns = {}
-        for role, patterns in self.BEHAVIOR_PATTERNS.items():
-            self.compiled_patterns[role] = [
-                re.compile(pattern, re.IGNORECASE) for pattern in patterns
-            ]
+        # 所有关键词模式编译成一个匹配器，每段描述只扫描一次
+        self.matcher = _KeywordPatternSet({
+            **self.BEHAVIOR_PATTERNS,
+            'strong_delivery': self.STRONG_DELIVERY_PATTERNS,
+            'stranger_mention': self.STRANGER_PATTERNS,
+        })
+        
+        # 最近一次扫描的结果（同一段描述在 extract_person_behaviors 和 update_people_roles 中会被多次使用）
+        self._last_scan = (None, {})
+    
+    def scan(self, description: str) -> Dict[str, List[Tuple[str, int, int]]]:
+        """
+        扫描描述，返回所有关键词命中及位置
+        
+        Args:
+            description: LLM 生成的描述文本
+        
+        Returns:
+            {分组名: [(模式, 起始位置, 结束位置), ...]}，分组名为角色名（BEHAVIOR_PATTERNS 的键）、
+            'strong_delivery' 或 'stranger_mention'，只包含有命中的分组
+        """
+        last_description, last_hits = self._last_scan
+        if description == last_description:
+            return last_hits
+        
+        hits = self.matcher.scan(description)
+        self._last_scan = (description, hits)
+        return hits
     
     def classify_from_description(self, description: str, 
                                   current_role: str = 'unknown') -> str:
@@ -72,16 +249,8 @@ class RoleClassifier:
             return current_role
         
         # 统计每个角色的匹配次数
-        role_scores = {}
-        
-        for role, patterns in self.compiled_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = pattern.findall(description)
-                score += len(matches)
-            
-            if score > 0:
-                role_scores[role] = score
+        hits = self.scan(description)
+        role_scores = {role: len(hits[role]) for role in self.BEHAVIOR_PATTERNS if role in hits}
         
         # 如果找到匹配，选择得分最高的角色
         if role_scores:
@@ -116,6 +285,9 @@ class RoleClassifier:
         # 尝试从描述中提取每个人物的行为
         # 这里使用简单的关键词匹配，未来可以改进为更复杂的 NLP 方法
         
+        # 描述中提及的人物编号（与逐个匹配 Person_{id} 一致：编号按前缀匹配）
+        mentioned_ids = set(self.PERSON_MENTION_PATTERN.findall(description))
+        
         for person_id, info in people_info.items():
             original_role = info.get('role', 'unknown')
             
@@ -123,18 +295,8 @@ class RoleClassifier:
             # 简化处理：如果描述中包含该人物的信息，使用整个描述作为行为
             if person_id != -1:  # 排除陌生人标记
                 # 检查描述中是否提到该人物
-                person_mention_patterns = [
-                    rf'Person_{person_id}',
-                    rf'人物{person_id}',
-                    rf'ID:{person_id}',
-                    rf'家人\(Person_{person_id}\)',
-                ]
-                
-                mentioned = False
-                for pattern in person_mention_patterns:
-                    if re.search(pattern, description, re.IGNORECASE):
-                        mentioned = True
-                        break
+                person_key = str(person_id)
+                mentioned = any(mention.startswith(person_key) for mention in mentioned_ids)
                 
                 if mentioned:
                     # 推断角色
@@ -149,23 +311,10 @@ class RoleClassifier:
         # 处理陌生人（person_id = -1 或 None）
         # 如果 people_info 中有 -1，说明有陌生人
         if -1 in people_info:
-            # 检查描述中是否提到陌生人或相关行为
-            stranger_patterns = [
-                r'陌生人', r'陌生', r'未知', r'不明身份', r'人员', r'人物'
-            ]
-            
-            mentioned = False
-            for pattern in stranger_patterns:
-                if re.search(pattern, description, re.IGNORECASE):
-                    mentioned = True
-                    break
+            hits = self.scan(description)
             
             # 如果描述中提到陌生人，或者描述中包含行为关键词，都进行推断
-            if mentioned or any(
-                re.search(pattern, description, re.IGNORECASE)
-                for role_patterns in self.BEHAVIOR_PATTERNS.values()
-                for pattern in role_patterns
-            ):
+            if 'stranger_mention' in hits or any(role in hits for role in self.BEHAVIOR_PATTERNS):
                 inferred_role = self.classify_from_description(description, 'unknown')
                 
                 behaviors[-1] = {
@@ -176,9 +325,41 @@ class RoleClassifier:
         
         return behaviors
     
+    def behaviors_from_structured(self, structured: Dict[str, Any], description: str,
+                                  people_info: Dict[int, Dict]) -> Dict[int, Dict[str, Any]]:
+        """
+        从结构化输出中获取每个人物的行为信息（与 extract_person_behaviors 的返回格式相同）
+        
+        Args:
+            structured: ResponseValidator.parse_structured_response 的返回值
+            description: 日志文本（记录为行为描述）
+            people_info: 人物信息字典
+        
+        Returns:
+            {person_id: {'behavior', 'inferred_role', 'original_role', 'strong_evidence'}}，
+            只包含 people_info 中存在的人物；strong_evidence 来自 flags.delivery_evidence，
+            update_people_roles 据此判断是否覆盖家人角色
+        """
+        behaviors = {}
+        strong_evidence = structured['flags']['delivery_evidence']
+        
+        for person_id, inferred_role in structured['people'].items():
+            if person_id not in people_info:
+                logger.debug(f"   结构化输出中的人物不在事件中，忽略: {person_id}")
+                continue
+            
+            behaviors[person_id] = {
+                'behavior': description,
+                'inferred_role': inferred_role,
+                'original_role': 'unknown' if person_id == -1 else people_info[person_id].get('role', 'unknown'),
+                'strong_evidence': strong_evidence
+            }
+        
+        return behaviors
+    
     def _has_strong_delivery_keywords(self, description: str) -> bool:
         """
-        检查描述中是否包含明确的快递/服务关键词
+        检查描述中是否包含明确的快递/服务关键词（STRONG_DELIVERY_PATTERNS）
         
         Args:
             description: LLM 生成的描述文本
@@ -186,20 +367,7 @@ class RoleClassifier:
         Returns:
             如果包含明确的快递/服务关键词，返回 True
         """
-        # 强关键词：明确指向快递/服务的行为
-        strong_patterns = [
-            r'拿着.*包裹', r'拿着.*快递', r'拿着.*盒子', r'拿着.*箱子',
-            r'送.*包裹', r'送.*快递', r'送.*外卖',
-            r'快递员', r'配送员', r'送货员',
-            r'投递', r'签收', r'快递单', r'配送单',
-            r'维修', r'清洁', r'工具箱'
-        ]
-        
-        for pattern in strong_patterns:
-            if re.search(pattern, description, re.IGNORECASE):
-                return True
-        
-        return False
+        return 'strong_delivery' in self.scan(description)
     
     def update_people_roles(self, global_event: Dict[str, Any], 
                            behaviors: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
@@ -207,6 +375,7 @@ class RoleClassifier:
         更新 Global_Event 中的人物角色
         
         特殊处理：即使被判定为家人，如果行为明确指向快递/服务，也会更新角色
+        （行为信息带有 strong_evidence 时以它为准，否则检查描述中的强快递/服务关键词）
         
         Args:
             global_event: Global_Event 对象
@@ -236,7 +405,10 @@ class RoleClassifier:
                 if inferred_role != original_role:
                     # 特殊处理：如果原角色是 family，但行为明确指向快递/服务，允许覆盖
                     if original_role == 'family' and inferred_role in ['delivery', 'service']:
-                        if self._has_strong_delivery_keywords(behavior_desc):
+                        strong_evidence = behavior_info.get('strong_evidence')
+                        if strong_evidence is None:
+                            strong_evidence = self._has_strong_delivery_keywords(behavior_desc)
+                        if strong_evidence:
                             people_info[person_id]['role'] = inferred_role
                             people_info[person_id]['role_source'] = 'behavior_override'  # 标记为行为覆盖
                             people_info[person_id]['behavior'] = behavior_desc
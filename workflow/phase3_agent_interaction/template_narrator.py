@@ -0,0 +1,171 @@
+"""
+模板叙述器 (Template Narrator)
+职责：为高频、格式固定的事件直接生成日志，跳过 LLM 调用
+
+覆盖的事件形态：
+- single_family: 一个家人、一个摄像头
+- family_group: 多个家人、一个摄像头
+- family_route: 一个家人依次经过多个摄像头（按 Clip 时间顺序叙述路线）
+- delivery: 陌生人在门口短暂停留（与 Phase 2 ContextBuilder 的快递/配送检测一致）
+
+每个模板给出一个置信度（事件越长、Clip 越多、时间线被压缩时越低），
+置信度达到阈值时直接使用模板日志，否则交给 LLM。
+"""
+
+from collections import Counter
+from typing import Dict, Any, List, Optional
+import logging
+
+from .prompt_engine import PromptEngine
+from ..phase2_event_fusion.context_builder import ContextBuilder
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateNarrator:
+    """基于规则的模板叙述器"""
+    
+    # 各模板的基础置信度
+    BASE_CONFIDENCE = {
+        'single_family': 0.95,
+        'family_group': 0.9,
+        'family_route': 0.85,
+        'delivery': 0.8,
+    }
+    
+    def __init__(self, min_confidence: float = 0.8):
+        """
+        初始化模板叙述器
+        
+        Args:
+            min_confidence: 使用模板日志所需的最低置信度（0.0-1.0），低于该值时交给 LLM
+        """
+        self.min_confidence = min_confidence
+        self.context_builder = ContextBuilder(max_prompt_tokens=None)
+        
+        # 统计信息：各模板命中（置信度达标）次数，以及置信度不足交给 LLM 的次数
+        self.stats = Counter()
+    
+    def narrate(self, global_event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        尝试用模板生成日志
+        
+        Args:
+            global_event: Global_Event 对象（需要调用 LLM 的事件，即有人物出现）
+        
+        Returns:
+            {
+                'summary_text': str,
+                'template': str,      # 模板名称
+                'confidence': float
+            }
+            没有匹配的模板或置信度不足时返回 None
+        """
+        people_info = global_event.get('people_info', {})
+        cameras = global_event.get('cameras', [])
+        if not cameras or not people_info:
+            return None
+        
+        features = self.context_builder.extract_features(global_event)
+        family_ids = sorted(person_id for person_id, info in people_info.items()
+                            if person_id != -1 and info.get('role') == 'family')
+        
+        route = self._camera_route(global_event)
+        
+        template = None
+        if not features['has_stranger'] and family_ids:
+            if len(cameras) == 1:
+                template = 'single_family' if len(family_ids) == 1 else 'family_group'
+            elif len(family_ids) == 1 and 2 <= len(route) <= 3:
+                template = 'family_route'
+        elif (features['has_stranger'] and not family_ids and cameras == ['doorbell']
+              and self.context_builder.classify_event_type(features) == 'delivery'):
+            template = 'delivery'
+        
+        if template is None:
+            return None
+        
+        confidence = self._confidence(template, features, global_event)
+        if confidence < self.min_confidence:
+            self.stats['low_confidence'] += 1
+            logger.debug(f"模板 {template} 置信度不足: {confidence:.2f} < {self.min_confidence}")
+            return None
+        
+        self.stats[template] += 1
+        return {
+            'summary_text': self._render(template, global_event, family_ids, route or cameras),
+            'template': template,
+            'confidence': confidence
+        }
+    
+    def _confidence(self, template: str, features: Dict[str, Any],
+                    global_event: Dict[str, Any]) -> float:
+        """
+        计算模板置信度：事件越复杂（Clip 多、持续时间长、时间线被压缩），模板越难覆盖全部细节
+        
+        Returns:
+            置信度（0.0-1.0）
+        """
+        confidence = self.BASE_CONFIDENCE[template]
+        
+        if features['clip_count'] > 5:
+            confidence -= 0.15
+        if features['duration'] > 300:
+            confidence -= 0.15
+        
+        # 时间线被 Phase 2 压缩过，说明事件很长
+        if global_event.get('timeline_compressed'):
+            confidence -= 0.1
+        
+        return max(0.0, confidence)
+    
+    @staticmethod
+    def _camera_route(global_event: Dict[str, Any]) -> List[str]:
+        """
+        按 Clip 时间顺序排列的摄像头路线（合并连续相同的摄像头）
+        
+        global_event['cameras'] 是无序的摄像头集合，不能用来叙述先后顺序。
+        
+        Returns:
+            摄像头名称列表，如 ['outdoor_high', 'doorbell', 'indoor_living']；没有 Clip 时为空列表
+        """
+        route = []
+        for clip in sorted(global_event.get('clips') or [], key=lambda clip: clip['time']):
+            if not route or route[-1] != clip['cam']:
+                route.append(clip['cam'])
+        return route
+    
+    def _render(self, template: str, global_event: Dict[str, Any],
+                family_ids: List[int], route: List[str]) -> str:
+        """按模板生成日志文本（route 为按时间顺序的摄像头路线）"""
+        start_time = global_event.get('start_time')
+        time_str = start_time.strftime('%H:%M') if start_time else "未知时间"
+        locations = [PromptEngine.CAM_MAP.get(cam, cam) for cam in route]
+        names = '和'.join(f"家人(Person_{person_id})" for person_id in family_ids)
+        duration_str = self._format_duration(global_event.get('duration', 0))
+        
+        if template == 'single_family':
+            text = f"{time_str}，{names}在{locations[0]}出现"
+            return text + (f"，活动持续约{duration_str}。" if duration_str else "。")
+        
+        if template == 'family_group':
+            text = f"{time_str}，{names}一起在{locations[0]}出现"
+            return text + (f"，活动持续约{duration_str}。" if duration_str else "。")
+        
+        if template == 'family_route':
+            text = f"{time_str}，{names}先后出现在{'、'.join(locations)}"
+            return text + (f"，整个过程约{duration_str}。" if duration_str else "。")
+        
+        # delivery
+        text = f"{time_str}，一名陌生人在门口短暂停留"
+        text += f"约{duration_str}" if duration_str else ""
+        return text + "，疑似快递或配送人员。"
+    
+    @staticmethod
+    def _format_duration(duration: float) -> Optional[str]:
+        """格式化持续时间（0 秒时返回 None）"""
+        if duration <= 0:
+            return None
+        if duration < 60:
+            return f"{duration:.0f}秒"
+        return f"{duration / 60:.1f}分钟"
@@ -3,8 +3,13 @@
 测试脚本：验证第三阶段 Pipeline 的功能
 """
 
+import os
 import sys
+import re
+import json
 import logging
+import tempfile
+from unittest import mock
 from pathlib import Path
 from datetime import datetime, timedelta
 
@@ -12,7 +17,11 @@ from datetime import datetime, timedelta
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from workflow.phase3_agent_interaction import LLM_Reasoning_Pipeline
+from workflow.phase3_agent_interaction import (LLM_Reasoning_Pipeline, ResponseValidator, TemplateNarrator,
+                                               LLMTelemetry, LLMGateway, LLMResponseCache, MockBackend,
+                                               CircuitBreaker, CircuitOpenError, RoleClassifier)
+from workflow.phase3_agent_interaction import llm_cache, circuit_breaker
+from workflow.phase3_agent_interaction.role_classifier import _KeywordPatternSet
 
 # 配置日志
 logging.basicConfig(
@@ -118,12 +127,272 @@ def create_mock_global_events():
     return events
 
 
+def test_structured_output():
+    """测试结构化输出的解析和校验（不调用 LLM）：合法 JSON、幻觉拦截、非 JSON 响应回退到自由文本"""
+    logger.info("\n🧪 测试结构化输出解析...")
+    validator = ResponseValidator()
+    family_event, stranger_event = create_mock_global_events()
+    
+    response = json.dumps({
+        'summary': '09:01，一名快递员拿着包裹在门口按门铃，放下包裹后离开。',
+        'event_type': 'delivery',
+        'people': [{'person_id': -1, 'role': 'delivery'}],
+        'flags': {'suspicious': False, 'delivery_evidence': True}
+    }, ensure_ascii=False)
+    
+    result = validator.validate_structured_response(f"```json\n{response}\n```", stranger_event)
+    assert result['structured']['people'] == {-1: 'delivery'}, result
+    assert result['structured']['flags']['delivery_evidence'] is True
+    
+    # 只有家人的时间线中出现无 ID 的陌生人，视为幻觉
+    assert validator.validate_structured_response(response, family_event, allow_fallback=False) is None
+    
+    # 缺少字段的 JSON 不通过校验；不是 JSON 的响应按自由文本处理
+    assert validator.parse_structured_response('{"summary": "09:00，家人回家。"}') is None
+    result = validator.validate_structured_response("09:00，家人(Person_1)回家。", family_event)
+    assert 'structured' not in result and result['is_valid'], result
+    
+    logger.info("✅ 结构化输出解析测试通过")
+
+
+def test_template_route():
+    """测试模板路线：按 Clip 时间顺序叙述（不依赖 cameras 的集合顺序），时间线压缩标记降低置信度"""
+    logger.info("\n🧪 测试模板路线叙述...")
+    narrator = TemplateNarrator(min_confidence=0.8)
+    base_time = datetime(2025, 9, 1, 9, 0, 0)
+    
+    event = {
+        'start_time': base_time,
+        'duration': 40.0,
+        # cameras 来自集合，顺序与实际经过的顺序无关
+        'cameras': ['indoor_living', 'doorbell', 'outdoor_high'],
+        'people_info': {1: {'person_id': 1, 'role': 'family'}},
+        'clips': [
+            {'time': base_time + timedelta(seconds=offset), 'cam': cam}
+            for offset, cam in [(20, 'doorbell'), (0, 'outdoor_high'), (40, 'indoor_living'), (25, 'doorbell')]
+        ]
+    }
+    
+    result = narrator.narrate(event)
+    assert result and result['template'] == 'family_route', result
+    assert '先后出现在庭院/车道、门口、客厅' in result['summary_text'], result['summary_text']
+    
+    # 来回走动超过 3 段路线时交给 LLM
+    event['clips'].append({'time': base_time + timedelta(seconds=50), 'cam': 'outdoor_high'})
+    assert narrator.narrate(event) is None
+    
+    # Phase 2 标记时间线被压缩过时置信度降低（0.85 - 0.1 < 0.8）
+    event['clips'].pop()
+    event['timeline_compressed'] = True
+    assert narrator.narrate(event) is None
+    assert narrator.stats['low_confidence'] == 1, narrator.stats
+    
+    logger.info("✅ 模板路线叙述测试通过")
+
+
+def test_telemetry_export():
+    """测试遥测导出：大计数不丢精度，延迟样本有上限而次数、合计精确"""
+    logger.info("\n🧪 测试 LLM 遥测导出...")
+    telemetry = LLMTelemetry()
+    telemetry.record('phase3', 'vertex', 'gemini-2.5-flash', prompt_tokens=12_345_678,
+                     completion_tokens=1_234_567, latency=0.5)
+    
+    prometheus = telemetry.to_prometheus()
+    assert ('llm_prompt_tokens_total{phase="phase3",model="gemini-2.5-flash",backend="vertex"} 12345678'
+            in prometheus), prometheus
+    cost = telemetry.summary()[0]['cost_usd']
+    assert f"}} {cost!r}\n" in prometheus, prometheus
+    
+    for _ in range(LLMTelemetry.MAX_LATENCY_SAMPLES + 100):
+        telemetry.record('phase5', 'mock', 'mock', latency=1.0)
+    row = telemetry.summary()[-1]
+    assert row['latency']['count'] == LLMTelemetry.MAX_LATENCY_SAMPLES + 100, row
+    assert row['latency']['sum'] == LLMTelemetry.MAX_LATENCY_SAMPLES + 100, row
+    assert len(telemetry._groups[('phase5', 'mock', 'mock')]['latencies']) == LLMTelemetry.MAX_LATENCY_SAMPLES
+    
+    logger.info("✅ LLM 遥测导出测试通过")
+
+
+class FakeClock:
+    """可手动推进的时钟（替换 time 模块，提供 time / monotonic）"""
+    
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+    
+    def time(self) -> float:
+        return self.now
+    
+    monotonic = time
+    
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def test_llm_cache():
+    """测试响应缓存：命中 / 未命中计数、TTL 过期后重新请求、超过条目上限时淘汰最久未访问的条目"""
+    logger.info("\n🧪 测试 LLM 响应缓存...")
+    clock = FakeClock()
+    
+    with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.object(llm_cache, 'time', clock):
+        cache = LLMResponseCache(os.path.join(tmp_dir, 'llm_cache.sqlite3'), ttl_seconds=60, max_entries=2)
+        backend = MockBackend()
+        gateway = LLMGateway(cache=cache, backend=backend, request_timeout=None, telemetry=LLMTelemetry())
+        
+        first = gateway.generate('系统提示', '09:00 家人(Person_1) 在门口出现')
+        second = gateway.generate('系统提示', '09:00 家人(Person_1) 在门口出现')
+        assert first == second and backend.stats['requests'] == 1, backend.stats
+        assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1, cache.stats
+        
+        # 超过 TTL 后条目失效，重新请求后端
+        clock.advance(61)
+        gateway.generate('系统提示', '09:00 家人(Person_1) 在门口出现')
+        assert backend.stats['requests'] == 2 and cache.stats['expired'] == 1, (backend.stats, cache.stats)
+        
+        # LRU：访问过的 a 保留，最久未访问的 b 被淘汰
+        cache.clear()
+        cache.put('a', 'A')
+        clock.advance(1)
+        cache.put('b', 'B')
+        clock.advance(1)
+        assert cache.get('a') == 'A'
+        clock.advance(1)
+        cache.put('c', 'C')
+        assert len(cache) == 2 and cache.stats['evicted'] == 1, cache.stats
+        assert cache.get('b') is None and cache.get('a') == 'A' and cache.get('c') == 'C'
+        cache.close()
+    
+    logger.info("✅ LLM 响应缓存测试通过")
+
+
+def test_circuit_breaker():
+    """测试熔断器状态转换：closed → open → half_open → 探测失败重新 open → 探测成功 closed（含提前关闭的流式探测）"""
+    logger.info("\n🧪 测试熔断器...")
+    clock = FakeClock()
+    
+    with mock.patch.object(circuit_breaker, 'time', clock):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+        backend = MockBackend(failure_rate=1.0)
+        gateway = LLMGateway(cache=None, backend=backend, request_timeout=None, max_attempts=1,
+                             circuit_breaker=breaker, telemetry=LLMTelemetry())
+        
+        def call():
+            try:
+                gateway.generate('系统提示', '09:00 家人(Person_1) 在门口出现')
+                return 'ok'
+            except CircuitOpenError:
+                return 'rejected'
+            except Exception:
+                return 'failed'
+        
+        # 连续失败达到阈值后打开，之后的请求不再发到后端
+        assert [call(), call()] == ['failed', 'failed'] and breaker.state == CircuitBreaker.OPEN
+        assert call() == 'rejected' and backend.stats['requests'] == 2, backend.stats
+        
+        # 恢复时间到达后半开，只放行一个探测请求；探测失败重新打开
+        clock.advance(30)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert call() == 'failed' and breaker.state == CircuitBreaker.OPEN
+        assert call() == 'rejected' and breaker.stats['opened'] == 2, breaker.stats
+        
+        # 半开状态下探测请求在途时，其他请求被拒绝
+        clock.advance(30)
+        assert breaker.allow_request() and not breaker.allow_request()
+        breaker.record_failure()
+        
+        # 后端恢复后探测成功，回到 closed
+        clock.advance(30)
+        backend.failure_rate = 0.0
+        assert call() == 'ok' and breaker.state == CircuitBreaker.CLOSED
+        assert call() == 'ok' and backend.stats['requests'] == 5, backend.stats
+        
+        # 半开探测是流式请求且调用方读到第一个文本块就停止时，同样结算熔断器
+        backend.failure_rate = 1.0
+        assert [call(), call()] == ['failed', 'failed'] and breaker.state == CircuitBreaker.OPEN
+        clock.advance(30)
+        backend.failure_rate = 0.0
+        stream = gateway.generate_stream('系统提示', '09:00 家人(Person_1) 在门口出现')
+        assert next(stream)
+        stream.close()
+        assert breaker.state == CircuitBreaker.CLOSED and call() == 'ok'
+    
+    logger.info("✅ 熔断器测试通过")
+
+
+def test_keyword_pattern_set():
+    """测试关键词单次扫描与逐模式 re.finditer 的语义一致（重叠关键词、跨行、大小写、角色优先级）"""
+    logger.info("\n🧪 测试关键词匹配器...")
+    
+    def reference_scan(groups, text):
+        """逐个模式扫描（单次扫描之前的实现）"""
+        hits = {}
+        for group, patterns in groups.items():
+            for pattern in patterns:
+                for match in re.finditer(pattern, text, re.IGNORECASE):
+                    hits.setdefault(group, []).append((pattern, match.start(), match.end()))
+        return {group: sorted(group_hits) for group, group_hits in hits.items()}
+    
+    def check(groups, texts):
+        matcher = _KeywordPatternSet(groups)
+        for text in texts:
+            hits = {group: sorted(group_hits) for group, group_hits in matcher.scan(text).items()}
+            assert hits == reference_scan(groups, text), (text, hits)
+    
+    # 前缀重叠（ab / abc）、同一关键词的连续命中（aa）、跨行的 A.*B、大小写
+    check({
+        'x': ['ab', 'abc', 'a.*c', 'aa'],
+        'y': ['bc', 'c', 'b.*b'],
+    }, ['', 'abc', 'ABCabc', 'aaaa', 'abcab\nbc', 'a\nc', 'AbC\nabbb', 'xyz'])
+    
+    # 角色分类器的全部模式
+    classifier = RoleClassifier()
+    groups = {
+        **RoleClassifier.BEHAVIOR_PATTERNS,
+        'strong_delivery': RoleClassifier.STRONG_DELIVERY_PATTERNS,
+        'stranger_mention': RoleClassifier.STRANGER_PATTERNS,
+    }
+    texts = [
+        '快递员拿着快递单送包裹',
+        '送货员送货，配送员配送',
+        '维修工拿着维修工具检修',
+        '家人(Person_1)拿着盒子\n送快递',
+        '陌生人员在门口等待，按门铃后进入',
+    ]
+    check(groups, texts)
+    
+    def reference_classify(text):
+        """逐个模式计数，得分相同时按 BEHAVIOR_PATTERNS 的顺序取第一个"""
+        role_scores = {}
+        for role, patterns in RoleClassifier.BEHAVIOR_PATTERNS.items():
+            score = sum(len(re.findall(pattern, text, re.IGNORECASE)) for pattern in patterns)
+            if score:
+                role_scores[role] = score
+        return max(role_scores.items(), key=lambda x: x[1])[0] if role_scores else 'unknown'
+    
+    # 得分相同时的优先级：delivery > service > visitor > owner
+    assert classifier.classify_from_description('维修后收快递') == 'delivery'
+    assert classifier.classify_from_description('家人等待') == 'visitor'
+    assert classifier.classify_from_description('主人在清洁') == 'service'
+    for text in texts + ['维修后收快递', '家人等待', '主人在清洁', '无关描述']:
+        assert classifier.classify_from_description(text) == reference_classify(text), text
+        expected_strong = any(re.search(p, text, re.IGNORECASE) for p in RoleClassifier.STRONG_DELIVERY_PATTERNS)
+        assert classifier._has_strong_delivery_keywords(text) == expected_strong, text
+    
+    logger.info("✅ 关键词匹配器测试通过")
+
+
 def main():
     """主测试函数"""
     logger.info("=" * 60)
     logger.info("第三阶段 Pipeline 测试")
     logger.info("=" * 60)
     
+    test_structured_output()
+    test_template_route()
+    test_telemetry_export()
+    test_llm_cache()
+    test_circuit_breaker()
+    test_keyword_pattern_set()
+    
     # 创建模拟数据
     logger.info("\n📝 创建模拟 Global_Event 数据...")
     mock_events = create_mock_global_events()
@@ -4,12 +4,14 @@
 """
 
 from .quality_selector import QualitySelector
+from .stranger_clusterer import StrangerClusterer
 from .vector_adapter import VectorAdapter
 from .transaction_manager import TransactionManager, EventDAO, AppearanceDAO
 from .persistence_pipeline import Persistence_Pipeline
 
 __all__ = [
     'QualitySelector',
+    'StrangerClusterer',
     'VectorAdapter',
     'TransactionManager',
     'EventDAO',
@@ -7,9 +7,11 @@ import logging
 from typing import List, Dict, Any, Optional
 import uuid
 
-from .quality_selector import QualitySelector
+from .quality_selector import QualitySelector, STRANGER_CLUSTER_PREFIX
+from .stranger_clusterer import StrangerClusterer
 from .vector_adapter import VectorAdapter
 from .transaction_manager import TransactionManager, EventDAO, AppearanceDAO
+from ..db import decode_vector
 
 logger = logging.getLogger(__name__)
 
@@ -17,24 +19,37 @@ logger = logging.getLogger(__name__)
 class Persistence_Pipeline:
     """第四阶段：结构化落库 Pipeline"""
     
-    def __init__(self, db_config: Optional[Dict[str, str]] = None):
+    def __init__(self, db_config: Optional[Dict[str, str]] = None,
+                 stranger_similarity_threshold: float = 0.60,
+                 max_stranger_clusters: int = 512,
+                 stranger_warm_start_days: int = 7):
         """
         初始化 Persistence Pipeline
         
         Args:
             db_config: 数据库配置字典（如果为None，从环境变量读取）
+            stranger_similarity_threshold: 陌生人聚类的相似度阈值
+            max_stranger_clusters: 陌生人聚类索引的最大簇数量
+            stranger_warm_start_days: 第一次保存事件前，从数据库加载最近 N 天出现过的陌生人（0 表示不预热）
         """
         logger.info("=" * 60)
         logger.info("初始化 Persistence Pipeline (第四阶段)")
         logger.info("=" * 60)
         
         # 初始化各个模块
-        self.selector = QualitySelector()                    # 模块 1
+        self.stranger_clusterer = StrangerClusterer(          # 模块 1.5（跨事件共享）
+            similarity_threshold=stranger_similarity_threshold,
+            max_clusters=max_stranger_clusters
+        )
+        self.selector = QualitySelector(self.stranger_clusterer)  # 模块 1
         self.adapter = VectorAdapter()                        # 模块 2
         self.tx_manager = TransactionManager(db_config)      # 模块 3
         self.event_dao = EventDAO(self.tx_manager)            # 模块 4
         self.appearance_dao = AppearanceDAO(self.tx_manager)  # 模块 4
         
+        self.stranger_warm_start_days = stranger_warm_start_days
+        self._stranger_index_ready = stranger_warm_start_days <= 0
+        
         logger.info("✅ Persistence Pipeline 初始化完成")
     
     def save_event(self, global_event: Dict[str, Any]) -> Optional[uuid.UUID]:
@@ -75,6 +90,12 @@ class Persistence_Pipeline:
             logger.warning("⚠️  事件没有 summary_text，使用默认描述")
             summary_text = "该事件已记录"
         
+        if not self._stranger_index_ready:
+            self._warm_start_strangers()
+        
+        # 本事件中新建的陌生人 persons 记录 {cluster_id: person_id}，事务提交后才登记到聚类器
+        new_stranger_bindings: Dict[int, int] = {}
+        
         try:
             # 开启事务
             with self.tx_manager.begin() as cursor:
@@ -104,7 +125,7 @@ class Persistence_Pipeline:
                         detection_list = grouped_detections[person_key]
                         # 为陌生人创建或查找 persons 记录
                         person_id = self._get_or_create_stranger_person(
-                            cursor, person_key, detection_list, global_event
+                            cursor, person_key, detection_list, global_event, new_stranger_bindings
                         )
                         if person_id:
                             stranger_person_ids[person_key] = person_id
@@ -182,12 +203,16 @@ class Persistence_Pipeline:
                             except Exception as e:
                                 logger.warning(f"   ⚠️  更新人物 {person_id} 角色失败: {e}")
                     
+                    # 第一阶段保存的 Keyframe 裁剪图（Phase 6 直接读取，无需重新解码视频）
+                    keyframe = global_event.get('keyframes', {}).get(person_id) or {}
+                    
                     # 添加到列表
                     appearances.append({
                         'event_id': event_id,
                         'person_id': person_id,
                         'match_method': match_method,
-                        'body_embedding_pgvector': body_embedding_pgvector
+                        'body_embedding_pgvector': body_embedding_pgvector,
+                        'keyframe_path': keyframe.get('keyframe_path')
                     })
                 
                 # 批量插入
@@ -197,6 +222,9 @@ class Persistence_Pipeline:
                 else:
                     logger.warning("⚠️  没有有效的人物出场记录需要插入")
             
+            for cluster_id, person_id in new_stranger_bindings.items():
+                self.stranger_clusterer.bind(cluster_id, person_id)
+            
             logger.info("=" * 60)
             logger.info(f"✅ 事件持久化成功: event_id={event_id}")
             logger.info("=" * 60)
@@ -264,11 +292,13 @@ class Persistence_Pipeline:
     
     def _get_or_create_stranger_person(self, cursor, stranger_key: str, 
                                        detection_list: List[Dict[str, Any]], 
-                                       global_event: Dict[str, Any]) -> Optional[int]:
+                                       global_event: Dict[str, Any],
+                                       new_bindings: Optional[Dict[int, int]] = None) -> Optional[int]:
         """
         为陌生人获取或创建 persons 记录
         
         策略：
+        0. 陌生人簇已经落库过（本进程中或预热时加载）：只更新 last_seen，直接复用 person_id
         1. 选择最佳检测（用于获取 body_embedding）
         2. 生成陌生人名称（基于事件时间和标识）
         3. 在 persons 表中创建新记录（role='unknown'）
@@ -276,13 +306,30 @@ class Persistence_Pipeline:
         
         Args:
             cursor: 数据库游标
-            stranger_key: 陌生人唯一标识（如 'stranger_hash_xxx'）
+            stranger_key: 陌生人标识（如 'stranger_cluster_12'）
             detection_list: 该陌生人的检测记录列表
             global_event: Global_Event 对象
+            new_bindings: 新建记录的 {cluster_id: person_id}（由调用方在事务提交后登记到聚类器）
         
         Returns:
             person_id (int) 或 None（如果创建失败）
         """
+        event_time = global_event.get('start_time')
+        
+        cluster_id = None
+        if stranger_key.startswith(STRANGER_CLUSTER_PREFIX):
+            cluster_id = int(stranger_key[len(STRANGER_CLUSTER_PREFIX):])
+            known_person_id = self.stranger_clusterer.person_id(cluster_id)
+            if known_person_id is not None:
+                cursor.execute(
+                    "UPDATE persons SET last_seen = GREATEST(last_seen, %s) WHERE id = %s",
+                    (event_time, known_person_id)
+                )
+                if cursor.rowcount:
+                    logger.debug(f"   陌生人 {stranger_key} 已有 persons 记录 (ID: {known_person_id})")
+                    return known_person_id
+                # 记录已被删除（如清空数据库），重新创建
+        
         # 选择最佳检测（用于获取 body_embedding）
         best_detection = self.selector.select_best(detection_list)
         if not best_detection:
@@ -296,15 +343,17 @@ class Persistence_Pipeline:
             return None
         
         # 生成陌生人名称（基于事件时间和标识）
-        event_time = global_event.get('start_time')
         if event_time:
             timestamp_str = event_time.strftime('%Y%m%d_%H%M%S')
         else:
             timestamp_str = 'unknown'
         
         # 提取标识的后缀（如 'hash_xxx' 或 'unknown_0'）
-        key_suffix = stranger_key.replace('stranger_', '')
-        stranger_name = f"Stranger_{timestamp_str}_{key_suffix[:8]}"
+        if cluster_id is not None:
+            stranger_name = f"Stranger_{timestamp_str}_c{cluster_id}"
+        else:
+            key_suffix = stranger_key.replace('stranger_', '')
+            stranger_name = f"Stranger_{timestamp_str}_{key_suffix[:8]}"
         
         # 转换 body_embedding 格式
         try:
@@ -344,6 +393,9 @@ class Persistence_Pipeline:
             person_id = cursor.fetchone()[0]
             logger.info(f"✅ 为陌生人创建 persons 记录: {stranger_name} (ID: {person_id})")
             
+            if cluster_id is not None and new_bindings is not None:
+                new_bindings[cluster_id] = person_id
+            
             return person_id
             
         except Exception as e:
@@ -352,6 +404,39 @@ class Persistence_Pipeline:
             traceback.print_exc()
             return None
     
+    def _warm_start_strangers(self):
+        """
+        从数据库加载最近出现过的陌生人记录，预热陌生人聚类器（只执行一次，失败时不影响落库）
+        
+        时间窗口相对于最近一个陌生人的 last_seen 计算，回放历史视频时同样有效。
+        """
+        self._stranger_index_ready = True
+        
+        try:
+            with self.tx_manager.pool.cursor() as cur:
+                cur.execute("""
+                    WITH strangers AS (
+                        SELECT id, current_body_embedding, last_seen
+                        FROM persons
+                        WHERE name LIKE 'Stranger\\_%%'
+                          AND current_body_embedding IS NOT NULL
+                          AND last_seen IS NOT NULL
+                    )
+                    SELECT id, current_body_embedding::text, last_seen
+                    FROM strangers
+                    WHERE last_seen >= (SELECT MAX(last_seen) FROM strangers) - %s * INTERVAL '1 day'
+                    ORDER BY last_seen DESC
+                    LIMIT %s
+                """, (self.stranger_warm_start_days, self.stranger_clusterer.max_clusters))
+                rows = cur.fetchall()
+            
+            self.stranger_clusterer.warm_start(
+                (person_id, decode_vector(embedding), last_seen)
+                for person_id, embedding, last_seen in rows
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  陌生人聚类器预热失败（将从空索引开始）: {e}")
+    
     def _map_role_to_db(self, inferred_role: str) -> str:
         """
         将推断的角色映射到数据库支持的角色
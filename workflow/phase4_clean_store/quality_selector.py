@@ -4,17 +4,28 @@
 """
 
 from typing import List, Dict, Any, Optional
+from datetime import datetime
 import logging
 
+from .stranger_clusterer import StrangerClusterer
+
 logger = logging.getLogger(__name__)
 
+# 陌生人簇标识的前缀，如 'stranger_cluster_12'
+STRANGER_CLUSTER_PREFIX = 'stranger_cluster_'
+
 
 class QualitySelector:
     """质量评估与优选器"""
     
-    def __init__(self):
-        """初始化优选器"""
-        pass
+    def __init__(self, stranger_clusterer: Optional[StrangerClusterer] = None):
+        """
+        初始化优选器
+        
+        Args:
+            stranger_clusterer: 陌生人聚类器（如果为None，创建一个新的；跨事件共享时由调用方传入）
+        """
+        self.stranger_clusterer = stranger_clusterer or StrangerClusterer()
     
     def select_best(self, detection_list: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """
@@ -143,7 +154,7 @@ class QualitySelector:
             按人物ID/标识分组的检测字典：
             {
                 person_id (int): [detection1, detection2, ...],  # 已知人物
-                'stranger_hash_xxx' (str): [detection1, ...],    # 陌生人（基于body_embedding）
+                'stranger_cluster_N' (str): [detection1, ...],   # 陌生人（按 body_embedding 聚类）
                 'stranger_unknown_N' (str): [detection1, ...],   # 陌生人（无body_embedding）
                 ...
             }
@@ -154,6 +165,7 @@ class QualitySelector:
         # 遍历所有 Clip
         clips = global_event.get('clips', [])
         for clip in clips:
+            clip_time = clip.get('time')
             # 遍历所有帧
             for frame_people in clip.get('people_detected', []):
                 # 遍历每帧的所有人物
@@ -170,7 +182,7 @@ class QualitySelector:
                     # 处理陌生人（person_id=None）
                     elif role == 'stranger':
                         # 为陌生人生成唯一标识
-                        stranger_key = self._generate_stranger_key(person, stranger_index)
+                        stranger_key = self._generate_stranger_key(person, stranger_index, clip_time)
                         stranger_index += 1
                         
                         if stranger_key not in grouped:
@@ -186,33 +198,29 @@ class QualitySelector:
         
         return grouped
     
-    def _generate_stranger_key(self, person: Dict[str, Any], index: int) -> str:
+    def _generate_stranger_key(self, person: Dict[str, Any], index: int,
+                               timestamp: Optional[datetime] = None) -> str:
         """
-        为陌生人生成唯一标识
+        为陌生人生成标识
         
         策略：
-        1. 如果有 body_embedding，使用哈希值（相同身体特征 = 同一人）
+        1. 如果有 body_embedding，交给陌生人聚类器分配簇ID（相似的身体特征 = 同一人，跨帧 / 跨事件稳定）
         2. 否则，使用 'stranger_unknown_{index}'
         
         Args:
             person: 人物检测记录
             index: 陌生人索引（用于生成唯一标识）
+            timestamp: 检测所在 Clip 的时间
         
         Returns:
-            陌生人唯一标识字符串
+            陌生人标识字符串
         """
         body_embedding = person.get('body_embedding')
         if body_embedding is not None:
             try:
-                import hashlib
-                import numpy as np
-                # 使用 body_embedding 的前20个值生成哈希（更稳定）
-                hash_input = str(body_embedding[:20].tolist())
-                hash_value = hashlib.md5(hash_input.encode()).hexdigest()[:8]
-                return f'stranger_hash_{hash_value}'
+                cluster_id = self.stranger_clusterer.assign(body_embedding, timestamp)
+                if cluster_id is not None:
+                    return f'{STRANGER_CLUSTER_PREFIX}{cluster_id}'
             except Exception as e:
-                logger.warning(f"⚠️  生成陌生人哈希失败: {e}，使用索引标识")
-                return f'stranger_unknown_{index}'
-        else:
-            return f'stranger_unknown_{index}'
-
+                logger.warning(f"⚠️  陌生人聚类失败: {e}，使用索引标识")
+        return f'stranger_unknown_{index}'
@@ -0,0 +1,207 @@
+"""
+模块 1.5: 陌生人在线聚类器 (Stranger Clusterer)
+职责：按身体特征把匿名陌生人（person_id=None）的检测聚成稳定的陌生人簇，跨帧、跨 Clip、跨事件复用同一个簇ID
+
+采用增量式"领导者-跟随者"聚类：每个簇维护一个归一化质心，新检测与所有质心做一次矩阵乘法，
+相似度超过阈值则并入最相似的簇并更新质心，否则新建簇。簇的数量有上限，超出时淘汰最久未出现的簇。
+簇第一次落库后记录对应的 persons.id，之后同一个簇不再创建新的 persons 记录；
+启动时可以从数据库中最近出现的陌生人记录预热（跨天复用）。
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StrangerClusterer:
+    """陌生人在线聚类器"""
+    
+    def __init__(self,
+                 similarity_threshold: float = 0.60,
+                 max_clusters: int = 512):
+        """
+        初始化聚类器
+        
+        Args:
+            similarity_threshold: 并入已有簇的最小余弦相似度（与 Phase 1 的 body_threshold 一致）
+            max_clusters: 索引中最多保留的簇数量，超出时淘汰最久未出现的簇
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_clusters = max(1, max_clusters)
+        
+        # 质心矩阵（按槽位存放，维度在第一个向量到达时确定）
+        self._centroids: Optional[np.ndarray] = None
+        self._slot_cluster = np.full(self.max_clusters, -1, dtype=np.int64)
+        self._free_slots = list(range(self.max_clusters - 1, -1, -1))
+        
+        # {cluster_id: slot}，按最近出现时间排序（最久未出现的在最前面）
+        self._slots: "OrderedDict[int, int]" = OrderedDict()
+        self._counts: Dict[int, int] = {}
+        self._last_seen: Dict[int, Optional[datetime]] = {}
+        # 簇 → persons.id（簇第一次落库后登记）
+        self._person_ids: Dict[int, int] = {}
+        self._next_id = 0
+        
+        # 统计信息
+        self.stats = {
+            'assigned': 0,
+            'created': 0,
+            'evicted': 0,
+            'warm_started': 0
+        }
+        
+        logger.debug(f"初始化陌生人聚类器: similarity_threshold={similarity_threshold}, max_clusters={max_clusters}")
+    
+    def __len__(self) -> int:
+        return len(self._slots)
+    
+    def assign(self, body_embedding: np.ndarray, timestamp: Optional[datetime] = None) -> Optional[int]:
+        """
+        为一次陌生人检测分配簇ID
+        
+        Args:
+            body_embedding: 身体特征向量
+            timestamp: 检测时间（用于记录簇的最近出现时间）
+        
+        Returns:
+            簇ID；向量无效（维度不一致、全零）时返回 None
+        """
+        vec = self._normalize(body_embedding)
+        if vec is None:
+            return None
+        
+        cluster_id, similarity = self._nearest(vec)
+        
+        if cluster_id is not None and similarity >= self.similarity_threshold:
+            # 并入已有簇：质心取所有成员的均值（重新归一化）
+            slot = self._slots[cluster_id]
+            count = self._counts[cluster_id]
+            centroid = self._centroids[slot] * count + vec
+            self._centroids[slot] = centroid / (np.linalg.norm(centroid) + 1e-8)
+            self._counts[cluster_id] = count + 1
+            self._touch(cluster_id, timestamp)
+        else:
+            cluster_id = self._add_cluster(vec, timestamp)
+        
+        self.stats['assigned'] += 1
+        return cluster_id
+    
+    def person_id(self, cluster_id: int) -> Optional[int]:
+        """
+        获取簇对应的 persons.id
+        
+        Args:
+            cluster_id: 簇ID
+        
+        Returns:
+            persons.id，簇尚未落库（或已被淘汰）时返回 None
+        """
+        return self._person_ids.get(cluster_id)
+    
+    def bind(self, cluster_id: int, person_id: int):
+        """
+        登记簇对应的 persons.id（应在创建 persons 记录的事务提交之后调用）
+        
+        Args:
+            cluster_id: 簇ID
+            person_id: persons.id
+        """
+        if cluster_id in self._slots:
+            self._person_ids[cluster_id] = person_id
+    
+    def warm_start(self, records: Iterable[Tuple[int, Optional[np.ndarray], Optional[datetime]]]) -> int:
+        """
+        用数据库中已有的陌生人记录预热索引（每条记录成为一个已落库的簇）
+        
+        Args:
+            records: (person_id, body_embedding, last_seen) 列表，按 last_seen 从新到旧排列
+        
+        Returns:
+            加载的簇数量
+        """
+        loaded = 0
+        known_person_ids = set(self._person_ids.values())
+        # 从旧到新插入，使最近出现的陌生人在淘汰顺序中排在最后
+        for person_id, body_embedding, last_seen in reversed(list(records)[:self.max_clusters]):
+            if person_id in known_person_ids:
+                continue
+            vec = self._normalize(body_embedding)
+            if vec is None:
+                continue
+            cluster_id = self._add_cluster(vec, last_seen)
+            self._person_ids[cluster_id] = person_id
+            known_person_ids.add(person_id)
+            loaded += 1
+        
+        self.stats['warm_started'] += loaded
+        logger.info(f"✅ 陌生人聚类器预热完成: {loaded} 个已知陌生人")
+        return loaded
+    
+    def _normalize(self, body_embedding) -> Optional[np.ndarray]:
+        """转换为归一化的 float32 向量（维度与索引不一致或全零时返回 None）"""
+        if body_embedding is None:
+            return None
+        
+        vec = np.asarray(body_embedding, dtype=np.float32).ravel()
+        if self._centroids is not None and vec.shape[0] != self._centroids.shape[1]:
+            logger.warning(f"⚠️  陌生人特征维度不一致: {vec.shape[0]} != {self._centroids.shape[1]}")
+            return None
+        
+        norm = np.linalg.norm(vec)
+        if norm < 1e-8:
+            return None
+        return vec / norm
+    
+    def _nearest(self, vec: np.ndarray) -> Tuple[Optional[int], float]:
+        """返回最相似的簇及其相似度"""
+        if not self._slots:
+            return None, -1.0
+        
+        similarities = self._centroids @ vec
+        # 空槽位不参与比较
+        similarities[self._slot_cluster < 0] = -np.inf
+        best_slot = int(np.argmax(similarities))
+        return int(self._slot_cluster[best_slot]), float(similarities[best_slot])
+    
+    def _add_cluster(self, vec: np.ndarray, timestamp: Optional[datetime]) -> int:
+        """新建一个簇（索引已满时先淘汰最久未出现的簇）"""
+        if self._centroids is None:
+            self._centroids = np.zeros((self.max_clusters, vec.shape[0]), dtype=np.float32)
+        
+        if not self._free_slots:
+            self._evict_oldest()
+        
+        cluster_id = self._next_id
+        self._next_id += 1
+        
+        slot = self._free_slots.pop()
+        self._centroids[slot] = vec
+        self._slot_cluster[slot] = cluster_id
+        self._slots[cluster_id] = slot
+        self._counts[cluster_id] = 1
+        self._last_seen[cluster_id] = timestamp
+        
+        self.stats['created'] += 1
+        return cluster_id
+    
+    def _touch(self, cluster_id: int, timestamp: Optional[datetime]):
+        """更新簇的最近出现时间，并移到淘汰顺序的末尾"""
+        self._slots.move_to_end(cluster_id)
+        last_seen = self._last_seen.get(cluster_id)
+        if timestamp is not None and (last_seen is None or timestamp > last_seen):
+            self._last_seen[cluster_id] = timestamp
+    
+    def _evict_oldest(self):
+        """淘汰最久未出现的簇"""
+        cluster_id, slot = self._slots.popitem(last=False)
+        self._slot_cluster[slot] = -1
+        self._free_slots.append(slot)
+        self._counts.pop(cluster_id, None)
+        self._last_seen.pop(cluster_id, None)
+        self._person_ids.pop(cluster_id, None)
+        self.stats['evicted'] += 1
+        logger.debug(f"淘汰陌生人簇 #{cluster_id}")
@@ -13,7 +13,7 @@ from datetime import datetime
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from workflow.phase4_clean_store import Persistence_Pipeline
+from workflow.phase4_clean_store import Persistence_Pipeline, QualitySelector
 import numpy as np
 
 # 配置日志
@@ -123,6 +123,46 @@ def create_mock_global_event() -> dict:
     return global_event
 
 
+def test_stranger_clustering():
+    """测试陌生人聚类：同一陌生人的多次检测（跨帧、跨事件）应得到同一个簇标识（无需数据库）"""
+    logger.info("=" * 60)
+    logger.info("陌生人聚类测试")
+    logger.info("=" * 60)
+    
+    rng = np.random.default_rng(0)
+    stranger_bodies = [rng.standard_normal(2048).astype(np.float32) for _ in range(2)]
+    
+    def create_stranger_event(start_time: datetime) -> dict:
+        frames = []
+        for _ in range(10):
+            frames.append([
+                {
+                    'person_id': None,
+                    'role': 'stranger',
+                    'method': 'new',
+                    'confidence': 0.8,
+                    'bbox': (100, 100, 200, 300),
+                    'body_embedding': body + 0.3 * rng.standard_normal(2048).astype(np.float32)
+                }
+                for body in stranger_bodies
+            ])
+        return {'clips': [{'time': start_time, 'cam': 'doorbell', 'people_detected': frames}]}
+    
+    selector = QualitySelector()
+    first = selector.group_by_person(create_stranger_event(datetime(2025, 9, 1, 9, 0, 0)))
+    second = selector.group_by_person(create_stranger_event(datetime(2025, 9, 2, 18, 0, 0)))
+    
+    logger.info(f"   第一个事件: {sorted(first.keys())}")
+    logger.info(f"   第二个事件: {sorted(second.keys())}")
+    
+    if len(first) != 2 or sorted(first.keys()) != sorted(second.keys()):
+        logger.error(f"❌ 陌生人聚类不稳定: 期望两个事件都是 2 个相同的簇")
+        return False
+    
+    logger.info(f"✅ 40 次陌生人检测聚成 {len(selector.stranger_clusterer)} 个簇")
+    return True
+
+
 def test_phase4():
     """测试 Phase 4"""
     logger.info("=" * 60)
@@ -170,6 +210,6 @@ def test_phase4():
 
 
 if __name__ == '__main__':
-    success = test_phase4()
+    success = test_stranger_clustering() and test_phase4()
     sys.exit(0 if success else 1)
 
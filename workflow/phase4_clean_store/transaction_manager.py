@@ -4,7 +4,6 @@
 """
 
 import os
-import psycopg2
 from psycopg2.extras import execute_values
 from psycopg2 import sql
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
@@ -15,22 +14,13 @@ import uuid
 import logging
 from dotenv import load_dotenv
 
+from ..db import get_db_config, get_pool
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
-def get_db_config() -> Dict[str, str]:
-    """从环境变量获取数据库配置"""
-    return {
-        'host': os.getenv('POSTGRES_HOST', 'localhost'),
-        'port': os.getenv('POSTGRES_PORT', '5432'),
-        'database': os.getenv('POSTGRES_DB', 'neweufy'),
-        'user': os.getenv('POSTGRES_USER', 'postgres'),
-        'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
-    }
-
-
 class TransactionManager:
     """事务管理器"""
     
@@ -42,6 +32,7 @@ class TransactionManager:
             db_config: 数据库配置字典（如果为None，从环境变量读取）
         """
         self.db_config = db_config or get_db_config()
+        self.pool = get_pool(self.db_config)
         self.conn = None
     
     @contextmanager
@@ -58,8 +49,7 @@ class TransactionManager:
         conn = None
         cursor = None
         try:
-            conn = psycopg2.connect(**self.db_config)
-            conn.autocommit = False
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             logger.debug("🔵 开启数据库事务")
@@ -77,8 +67,8 @@ class TransactionManager:
             if cursor:
                 cursor.close()
             if conn:
-                conn.close()
-                logger.debug("🔵 数据库连接已关闭")
+                self.pool.putconn(conn)
+                logger.debug("🔵 数据库连接已归还连接池")
 
 
 class EventDAO:
@@ -162,7 +152,8 @@ class AppearanceDAO:
     
     def insert_appearance(self, cursor, event_id: uuid.UUID, 
                          person_id: int, match_method: str,
-                         body_embedding_pgvector: str) -> int:
+                         body_embedding_pgvector: str,
+                         keyframe_path: Optional[str] = None) -> int:
         """
         插入人物出场快照表 (event_appearances)
         
@@ -172,6 +163,7 @@ class AppearanceDAO:
             person_id: 人物 ID
             match_method: 匹配方法 ('face', 'body_reid', 'new')
             body_embedding_pgvector: 身体特征向量（pgvector 格式字符串）
+            keyframe_path: Keyframe 裁剪图路径（第一阶段保存），可选
         
         Returns:
             插入的记录 ID
@@ -181,8 +173,9 @@ class AppearanceDAO:
                 event_id,
                 person_id,
                 match_method,
-                body_embedding
-            ) VALUES (%s, %s, %s, %s::vector)
+                body_embedding,
+                keyframe_path
+            ) VALUES (%s, %s, %s, %s::vector, %s)
             RETURNING id;
         """
         
@@ -190,7 +183,8 @@ class AppearanceDAO:
             event_id,
             person_id,
             match_method,
-            body_embedding_pgvector
+            body_embedding_pgvector,
+            keyframe_path
         ))
         
         appearance_id = cursor.fetchone()[0]
@@ -210,7 +204,8 @@ class AppearanceDAO:
                     'event_id': uuid.UUID,
                     'person_id': int,
                     'match_method': str,
-                    'body_embedding_pgvector': str
+                    'body_embedding_pgvector': str,
+                    'keyframe_path': Optional[str]  # 可选
                 }
         
         Returns:
@@ -226,7 +221,8 @@ class AppearanceDAO:
                 event_id,
                 person_id,
                 match_method,
-                body_embedding
+                body_embedding,
+                keyframe_path
             ) VALUES %s
             RETURNING id;
         """
@@ -241,15 +237,17 @@ class AppearanceDAO:
                     event_id,
                     person_id,
                     match_method,
-                    body_embedding
-                ) VALUES (%s, %s, %s, %s::vector)
+                    body_embedding,
+                    keyframe_path
+                ) VALUES (%s, %s, %s, %s::vector, %s)
                 RETURNING id;
             """
             cursor.execute(single_insert_sql, (
                 app['event_id'],
                 app['person_id'],
                 app['match_method'],
-                app['body_embedding_pgvector']
+                app['body_embedding_pgvector'],
+                app.get('keyframe_path')
             ))
             appearance_ids.append(cursor.fetchone()[0])
         
@@ -7,6 +7,8 @@ import numpy as np
 from typing import Union, List, Optional
 import logging
 
+from ..db import encode_vector
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,30 +40,13 @@ class VectorAdapter:
         Raises:
             ValueError: 如果向量维度不匹配或格式错误
         """
-        # 转换为 NumPy 数组
-        if isinstance(vector, list):
-            vector = np.array(vector, dtype=np.float32)
-        elif isinstance(vector, np.ndarray):
-            vector = vector.astype(np.float32)
-        else:
+        if not isinstance(vector, (list, np.ndarray)):
             raise ValueError(f"不支持的向量类型: {type(vector)}")
         
-        # 展平多维数组
-        if vector.ndim > 1:
-            vector = vector.flatten()
-        
-        # 验证维度
-        actual_dim = len(vector)
-        if expected_dim is not None and actual_dim != expected_dim:
-            raise ValueError(
-                f"向量维度不匹配: 期望 {expected_dim}, 实际 {actual_dim}"
-            )
-        
-        # 转换为列表并格式化为字符串
-        vector_list = vector.tolist()
-        pgvector_str = '[' + ','.join(str(x) for x in vector_list) + ']'
+        # 使用共享的向量编解码器（展平、维度校验、按 float32 精度格式化）
+        pgvector_str = encode_vector(vector, expected_dim=expected_dim)
         
-        logger.debug(f"✅ 向量转换完成: {actual_dim} 维 → pgvector 格式")
+        logger.debug(f"✅ 向量转换完成: {len(pgvector_str)} 字节 → pgvector 格式")
         
         return pgvector_str
     
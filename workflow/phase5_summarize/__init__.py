@@ -3,10 +3,10 @@ Phase 5: Daily Summary (记忆压缩)
 第五阶段：从数据库中查询每日事件，使用LLM生成每日总结
 """
 
-from .query_engine import QueryEngine
+from .query_engine import QueryEngine, AsyncQueryEngine
 from .narrative_aggregator import NarrativeAggregator
 from .insight_engine import InsightEngine
-from .archive_persister import ArchivePersister
+from .archive_persister import ArchivePersister, AsyncArchivePersister
 from .daily_summary_pipeline import Daily_Summary_Pipeline
 
 __all__ = [
@@ -14,6 +14,8 @@ __all__ = [
     'NarrativeAggregator',
     'InsightEngine',
     'ArchivePersister',
+    'AsyncQueryEngine',
+    'AsyncArchivePersister',
     'Daily_Summary_Pipeline'
 ]
 
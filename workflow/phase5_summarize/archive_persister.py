@@ -3,7 +3,6 @@
 职责：将总结写入数据库，支持幂等写入（UPSERT）
 """
 
-import os
 import psycopg2
 from psycopg2.extras import execute_values
 from typing import Dict, Any, Optional
@@ -11,6 +10,8 @@ from datetime import datetime
 import logging
 from dotenv import load_dotenv
 
+from ..db import get_async_pool, get_db_config, get_pool
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -26,16 +27,8 @@ class ArchivePersister:
         Args:
             db_config: 数据库连接配置。如果为None，则从环境变量加载。
         """
-        if db_config is None:
-            self.db_config = {
-                'host': os.getenv('POSTGRES_HOST', 'localhost'),
-                'port': os.getenv('POSTGRES_PORT', '5432'),
-                'database': os.getenv('POSTGRES_DB', 'neweufy'),
-                'user': os.getenv('POSTGRES_USER', 'postgres'),
-                'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
-            }
-        else:
-            self.db_config = db_config
+        self.db_config = db_config or get_db_config()
+        self.pool = get_pool(self.db_config)
         
         logger.debug("✅ ArchivePersister 初始化完成")
     
@@ -53,7 +46,7 @@ class ArchivePersister:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             # 使用 UPSERT (INSERT ... ON CONFLICT DO UPDATE)
@@ -90,7 +83,7 @@ class ArchivePersister:
             raise
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn)
     
     def get_summary(self, summary_date: str) -> Optional[Dict[str, Any]]:
         """
@@ -104,7 +97,7 @@ class ArchivePersister:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             query = """
@@ -133,5 +126,29 @@ class ArchivePersister:
             raise
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn)
+
+
 
+class AsyncArchivePersister:
+    """归档持久化器的 asyncio 包装（在数据库线程池中调用同步实例，与同步版本共享连接池）"""
+    
+    def __init__(self, db_config: Optional[Dict[str, str]] = None,
+                 persister: Optional[ArchivePersister] = None):
+        """
+        初始化异步持久化器
+        
+        Args:
+            db_config: 数据库连接配置。如果为None，则从环境变量加载。
+            persister: 被包装的同步持久化器，None 表示按 db_config 新建
+        """
+        self.persister = persister or ArchivePersister(db_config)
+        self.async_pool = get_async_pool(self.persister.db_config)
+    
+    async def save(self, summary_date: str, summary_text: str, total_events: int) -> int:
+        """保存每日总结（参见 ArchivePersister.save）"""
+        return await self.async_pool.run(self.persister.save, summary_date, summary_text, total_events)
+    
+    async def get_summary(self, summary_date: str) -> Optional[Dict[str, Any]]:
+        """查询指定日期的总结（参见 ArchivePersister.get_summary）"""
+        return await self.async_pool.run(self.persister.get_summary, summary_date)
@@ -3,14 +3,16 @@
 整合所有模块，实现完整的每日总结生成流程
 """
 
+import asyncio
+import functools
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Generator, List, Tuple
 from datetime import datetime
 
-from .query_engine import QueryEngine
+from .query_engine import QueryEngine, AsyncQueryEngine
 from .narrative_aggregator import NarrativeAggregator
 from .insight_engine import InsightEngine
-from .archive_persister import ArchivePersister
+from .archive_persister import ArchivePersister, AsyncArchivePersister
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +46,9 @@ class Daily_Summary_Pipeline:
             max_output_tokens=max_output_tokens
         )
         self.persister = ArchivePersister(db_config)
+        # 异步包装（run_for_date_async 使用），包装上面的同步实例，共享同一个连接池
+        self.async_query_engine = AsyncQueryEngine(query_engine=self.query_engine)
+        self.async_persister = AsyncArchivePersister(persister=self.persister)
         
         logger.info("✅ Daily Summary Pipeline 初始化完成")
     
@@ -58,13 +63,68 @@ class Daily_Summary_Pipeline:
         Returns:
             保存的记录ID（如果成功），否则返回 None
         """
+        ops = {
+            'get_summary': self.persister.get_summary,
+            'fetch_events': self.query_engine.fetch_events,
+            'analyze': self.insight_engine.analyze,
+            'save': self.persister.save,
+        }
+        steps = self._run_steps(target_date, force_update)
+        result = None
+        while True:
+            try:
+                op, args, kwargs = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = ops[op](*args, **kwargs)
+    
+    async def run_for_date_async(self, target_date: str, force_update: bool = False) -> Optional[int]:
+        """
+        处理指定日期的总结（asyncio 版本，数据库访问走异步连接池，LLM 调用在线程中执行）
+        
+        Args:
+            target_date: 目标日期，格式为 'YYYY-MM-DD'
+            force_update: 如果为 True，即使已存在总结也会重新生成
+        
+        Returns:
+            保存的记录ID（如果成功），否则返回 None
+        """
+        ops = {
+            'get_summary': self.async_persister.get_summary,
+            'fetch_events': self.async_query_engine.fetch_events,
+            'analyze': functools.partial(asyncio.to_thread, self.insight_engine.analyze),
+            'save': self.async_persister.save,
+        }
+        steps = self._run_steps(target_date, force_update)
+        result = None
+        while True:
+            try:
+                op, args, kwargs = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = await ops[op](*args, **kwargs)
+    
+    def _run_steps(self, target_date: str, force_update: bool) -> Generator[Tuple[str, tuple, dict], Any, Optional[int]]:
+        """
+        单日总结的处理步骤（run_for_date / run_for_date_async 共用）
+        
+        每个 I/O 步骤 yield (操作名, args, kwargs)，由调用方以同步或异步方式执行后 send 回结果，
+        两条路径因此共享同一套步骤和日志
+        
+        Args:
+            target_date: 目标日期，格式为 'YYYY-MM-DD'
+            force_update: 如果为 True，即使已存在总结也会重新生成
+        
+        Returns:
+            保存的记录ID（如果成功），否则返回 None（通过 StopIteration.value 返回）
+        """
         logger.info("=" * 60)
         logger.info(f"开始处理日期: {target_date}")
         logger.info("=" * 60)
         
         # 检查是否已存在总结
         if not force_update:
-            existing_summary = self.persister.get_summary(target_date)
+            existing_summary = yield 'get_summary', (target_date,), {}
             if existing_summary:
                 logger.info(f"✅ 日期 {target_date} 已有总结，跳过生成（使用 force_update=True 强制更新）")
                 logger.info(f"   现有总结: {existing_summary['summary_text'][:100]}...")
@@ -72,7 +132,7 @@ class Daily_Summary_Pipeline:
         
         # 1. 查询数据（模块 1）
         logger.info("[步骤 1] 查询数据库事件...")
-        events = self.query_engine.fetch_events(target_date)
+        events = yield 'fetch_events', (target_date,), {}
         
         if not events:
             logger.warning(f"⚠️  日期 {target_date} 没有事件记录")
@@ -92,18 +152,18 @@ class Daily_Summary_Pipeline:
         
         # 3. LLM 生成总结（模块 3）
         logger.info("[步骤 3] 调用 LLM 生成总结...")
-        summary_text = self.insight_engine.analyze(timeline_text, target_date)
+        summary_text = yield 'analyze', (timeline_text, target_date), {}
         
         logger.info(f"✅ LLM 总结生成完成: {len(summary_text)} 字符")
         logger.info(f"   总结预览: {summary_text[:150]}...")
         
         # 4. 保存到数据库（模块 4）
         logger.info("[步骤 4] 保存总结到数据库...")
-        record_id = self.persister.save(
-            summary_date=target_date,
-            summary_text=summary_text,
-            total_events=len(events)
-        )
+        record_id = yield 'save', (), {
+            'summary_date': target_date,
+            'summary_text': summary_text,
+            'total_events': len(events),
+        }
         
         logger.info("=" * 60)
         logger.info(f"✅ 日期 {target_date} 处理完成: record_id={record_id}")
@@ -30,7 +30,8 @@ class InsightEngine:
         self.llm_gateway = LLMGateway(
             model_name=model_name,
             temperature=temperature,
-            max_output_tokens=max_output_tokens
+            max_output_tokens=max_output_tokens,
+            phase='phase5'
         )
         
         logger.info(f"✅ InsightEngine 初始化完成: {model_name}")
@@ -7,6 +7,8 @@ from typing import List, Dict, Any
 from datetime import datetime
 import logging
 
+from ..phase2_event_fusion.context_builder import estimate_tokens
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,7 +59,9 @@ class NarrativeAggregator:
     
     def estimate_tokens(self, text: str) -> int:
         """
-        估算文本的 token 数量（简单估算：1 token ≈ 4 字符）
+        估算文本的 token 数量（与 Phase 2 相同：中文字符按 1 个 token，其他字符按 4 个字符 1 个 token）
+        
+        实际用量以 LLM 响应的用量元数据为准，见 LLMGateway 的调用遥测。
         
         Args:
             text: 文本字符串
@@ -65,10 +69,7 @@ class NarrativeAggregator:
         Returns:
             估算的 token 数量
         """
-        # 简单估算：中文字符和英文单词的平均 token 数
-        # 这里使用 1 token ≈ 4 字符的粗略估算
-        estimated_tokens = len(text) // 4
-        return estimated_tokens
+        return estimate_tokens(text)
     
     def check_token_limit(self, text: str, max_tokens: int = 100000) -> bool:
         """
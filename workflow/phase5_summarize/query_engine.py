@@ -3,13 +3,14 @@
 职责：从数据库中精准捞取特定日期的数据
 """
 
-import os
 import psycopg2
 from typing import List, Dict, Any, Optional
 from datetime import datetime, date
 import logging
 from dotenv import load_dotenv
 
+from ..db import get_async_pool, get_db_config, get_pool
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -25,16 +26,8 @@ class QueryEngine:
         Args:
             db_config: 数据库连接配置。如果为None，则从环境变量加载。
         """
-        if db_config is None:
-            self.db_config = {
-                'host': os.getenv('POSTGRES_HOST', 'localhost'),
-                'port': os.getenv('POSTGRES_PORT', '5432'),
-                'database': os.getenv('POSTGRES_DB', 'neweufy'),
-                'user': os.getenv('POSTGRES_USER', 'postgres'),
-                'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
-            }
-        else:
-            self.db_config = db_config
+        self.db_config = db_config or get_db_config()
+        self.pool = get_pool(self.db_config)
         
         logger.debug(f"✅ QueryEngine 初始化完成")
     
@@ -50,7 +43,7 @@ class QueryEngine:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             # 查询指定日期的事件（使用 DATE() 函数提取日期部分）
@@ -86,7 +79,7 @@ class QueryEngine:
             raise
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn)
     
     def get_distinct_dates(self) -> List[str]:
         """
@@ -97,7 +90,7 @@ class QueryEngine:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             query = """
@@ -120,5 +113,29 @@ class QueryEngine:
             raise
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn)
+
+
 
+class AsyncQueryEngine:
+    """时间切片查询器的 asyncio 包装（在数据库线程池中调用同步实例，与同步版本共享连接池）"""
+    
+    def __init__(self, db_config: Optional[Dict[str, str]] = None,
+                 query_engine: Optional[QueryEngine] = None):
+        """
+        初始化异步查询引擎
+        
+        Args:
+            db_config: 数据库连接配置。如果为None，则从环境变量加载。
+            query_engine: 被包装的同步查询引擎，None 表示按 db_config 新建
+        """
+        self.query_engine = query_engine or QueryEngine(db_config)
+        self.async_pool = get_async_pool(self.query_engine.db_config)
+    
+    async def fetch_events(self, target_date: str) -> List[Dict[str, Any]]:
+        """查询指定日期的所有事件（参见 QueryEngine.fetch_events）"""
+        return await self.async_pool.run(self.query_engine.fetch_events, target_date)
+    
+    async def get_distinct_dates(self) -> List[str]:
+        """获取数据库中有事件的所有日期（参见 QueryEngine.get_distinct_dates）"""
+        return await self.async_pool.run(self.query_engine.get_distinct_dates)
@@ -4,8 +4,10 @@ Phase 5 测试脚本
 """
 
 import sys
+import asyncio
 import logging
 from pathlib import Path
+from unittest import mock
 
 # 添加项目根目录到路径
 project_root = Path(__file__).parent.parent.parent
@@ -81,12 +83,65 @@ def test_batch_processing():
         traceback.print_exc()
 
 
+def test_run_for_date_async():
+    """测试异步入口与同步入口走同一套步骤（无需数据库和 LLM）"""
+    logger.info("=" * 60)
+    logger.info("测试 run_for_date_async")
+    logger.info("=" * 60)
+    
+    events = [{'event_id': 1, 'start_time': '2025-09-01 08:00:00', 'event_summary': '快递员送货'}]
+    
+    pipeline = Daily_Summary_Pipeline.__new__(Daily_Summary_Pipeline)
+    pipeline.aggregator = mock.Mock()
+    pipeline.aggregator.format_timeline.return_value = '08:00 快递员送货'
+    pipeline.aggregator.check_token_limit.return_value = True
+    pipeline.insight_engine = mock.Mock()
+    pipeline.insight_engine.analyze.return_value = '今天有一次快递送货。'
+    pipeline.query_engine = mock.Mock()
+    pipeline.query_engine.fetch_events.return_value = events
+    pipeline.persister = mock.Mock()
+    pipeline.persister.get_summary.return_value = None
+    pipeline.persister.save.return_value = 42
+    pipeline.async_query_engine = mock.Mock()
+    pipeline.async_query_engine.fetch_events = mock.AsyncMock(return_value=events)
+    pipeline.async_persister = mock.Mock()
+    pipeline.async_persister.get_summary = mock.AsyncMock(return_value=None)
+    pipeline.async_persister.save = mock.AsyncMock(return_value=42)
+    
+    pipeline_logger = logging.getLogger('workflow.phase5_summarize.daily_summary_pipeline')
+    with mock.patch.object(pipeline_logger, 'info') as sync_log:
+        sync_id = pipeline.run_for_date('2025-09-01')
+    with mock.patch.object(pipeline_logger, 'info') as async_log:
+        async_id = asyncio.run(pipeline.run_for_date_async('2025-09-01'))
+    
+    assert sync_id == async_id == 42
+    assert sync_log.called and sync_log.call_args_list == async_log.call_args_list
+    pipeline.async_persister.save.assert_awaited_once_with(
+        summary_date='2025-09-01', summary_text='今天有一次快递送货。', total_events=1
+    )
+    assert pipeline.insight_engine.analyze.call_count == 2
+    
+    # 已有总结时直接返回现有记录，不再查询事件
+    pipeline.async_persister.get_summary.return_value = {'id': 7, 'summary_text': '已有总结'}
+    assert asyncio.run(pipeline.run_for_date_async('2025-09-01')) == 7
+    assert pipeline.async_query_engine.fetch_events.await_count == 1
+    
+    # 没有事件时返回 None
+    pipeline.async_query_engine.fetch_events.return_value = []
+    assert asyncio.run(pipeline.run_for_date_async('2025-09-02', force_update=True)) is None
+    
+    logger.info("✅ run_for_date_async 测试通过")
+
+
 def main():
     """主函数"""
     logger.info("=" * 60)
     logger.info("Phase 5: Daily Summary 测试")
     logger.info("=" * 60)
     
+    # 异步入口（不依赖数据库）
+    test_run_for_date_async()
+    
     # 测试单个日期
     test_single_date()
     
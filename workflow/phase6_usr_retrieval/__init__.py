@@ -3,8 +3,8 @@ Phase 6: User Retrieval & RAG (用户检索与 RAG)
 第六阶段：从自然语言问题到数据库检索再到自然语言回答
 """
 
-from .query_parser import QueryParser
-from .retrieval_engine import RetrievalEngine
+from .query_parser import QueryParser, AsyncQueryParser
+from .retrieval_engine import RetrievalEngine, AsyncRetrievalEngine
 from .evidence_materializer import EvidenceMaterializer
 from .rag_synthesis_engine import RAGSynthesisEngine
 from .user_retrieval_pipeline import User_Retrieval_Pipeline
@@ -14,6 +14,8 @@ __all__ = [
     'RetrievalEngine',
     'EvidenceMaterializer',
     'RAGSynthesisEngine',
+    'AsyncQueryParser',
+    'AsyncRetrievalEngine',
     'User_Retrieval_Pipeline'
 ]
 
@@ -80,19 +80,22 @@ class EvidenceMaterializer:
             appearance_id = appearance.get('appearance_id')
             person_id = appearance.get('person_id')
             
-            # 尝试提取图片
-            snapshot_path = self._extract_snapshot(
-                video_filename=video_filename,
-                timestamp=start_time,
-                event_id=event_id,
-                appearance_id=appearance_id,
-                person_id=person_id
-            )
+            # 优先使用第一阶段保存的 Keyframe 裁剪图，没有时才从视频中提取
+            snapshot_path = self._existing_keyframe(appearance.get('keyframe_path'))
+            from_keyframe = snapshot_path is not None
+            if not from_keyframe:
+                snapshot_path = self._extract_snapshot(
+                    video_filename=video_filename,
+                    timestamp=start_time,
+                    event_id=event_id,
+                    appearance_id=appearance_id,
+                    person_id=person_id
+                )
             
             appearance_with_image = {
                 **appearance,
                 'snapshot_path': snapshot_path,
-                'snapshot_url': self._generate_url(snapshot_path) if snapshot_path else None
+                'snapshot_url': self._generate_url(snapshot_path, from_keyframe) if snapshot_path else None
             }
             
             materialized_appearances.append(appearance_with_image)
@@ -101,6 +104,22 @@ class EvidenceMaterializer:
         
         return event_record
     
+    def _existing_keyframe(self, keyframe_path: Optional[str]) -> Optional[str]:
+        """
+        检查 Keyframe 裁剪图是否可用
+        
+        Args:
+            keyframe_path: event_appearances.keyframe_path
+        
+        Returns:
+            可用时返回路径，否则返回 None
+        """
+        if keyframe_path and os.path.isfile(keyframe_path):
+            return keyframe_path
+        if keyframe_path:
+            logger.debug(f"⚠️  Keyframe 文件不存在: {keyframe_path}，回退到视频提取")
+        return None
+    
     def _extract_snapshot(self, video_filename: Optional[str], 
                          timestamp: datetime,
                          event_id: str,
@@ -178,12 +197,13 @@ class EvidenceMaterializer:
             logger.error(f"❌ 提取快照失败: {e}")
             return None
     
-    def _generate_url(self, snapshot_path: str) -> str:
+    def _generate_url(self, snapshot_path: str, from_keyframe: bool = False) -> str:
         """
         生成图片 URL（用于前端访问）
         
         Args:
             snapshot_path: 本地文件路径
+            from_keyframe: 是否为 Keyframe 存储中的裁剪图（文件名即内容摘要）
         
         Returns:
             URL 字符串
@@ -191,5 +211,7 @@ class EvidenceMaterializer:
         # 简化实现：返回相对路径
         # 实际应用中可能需要配置静态文件服务器 URL
         filename = Path(snapshot_path).name
+        if from_keyframe:
+            return f"/static/keyframes/{filename[:2]}/{filename}"
         return f"/static/snapshots/{filename}"
 
@@ -4,13 +4,13 @@
 """
 
 import re
-import os
-import psycopg2
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 import logging
 from dotenv import load_dotenv
 
+from ..db import get_async_pool, get_db_config, get_pool
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -26,16 +26,8 @@ class QueryParser:
         Args:
             db_config: 数据库连接配置。如果为None，则从环境变量加载。
         """
-        if db_config is None:
-            self.db_config = {
-                'host': os.getenv('POSTGRES_HOST', 'localhost'),
-                'port': os.getenv('POSTGRES_PORT', '5432'),
-                'database': os.getenv('POSTGRES_DB', 'neweufy'),
-                'user': os.getenv('POSTGRES_USER', 'postgres'),
-                'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
-            }
-        else:
-            self.db_config = db_config
+        self.db_config = db_config or get_db_config()
+        self.pool = get_pool(self.db_config)
         
         # 人物名称映射（中文 -> 可能的数据库名称）
         # 注意：实际数据库中可能存储的是 "Family_1", "Family_2" 等
@@ -181,7 +173,7 @@ class QueryParser:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             # 在 name 或 notes 字段中搜索
@@ -204,13 +196,12 @@ class QueryParser:
                 return result[0]
             
             cursor.close()
-            conn.close()
             
         except Exception as e:
             logger.debug(f"关键词搜索失败: {e}")
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn)
         
         return None
     
@@ -308,7 +299,7 @@ class QueryParser:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             # 查询 persons 表
@@ -325,13 +316,12 @@ class QueryParser:
                 return result[0]
             
             cursor.close()
-            conn.close()
             
         except Exception as e:
             logger.error(f"❌ 查询人物ID失败: {e}")
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn)
         
         return None
     
@@ -347,7 +337,7 @@ class QueryParser:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -359,13 +349,32 @@ class QueryParser:
                 return result[0]
             
             cursor.close()
-            conn.close()
             
         except Exception as e:
             logger.error(f"❌ 查询人物名称失败: {e}")
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn)
         
         return None
 
+
+
+class AsyncQueryParser:
+    """语义查询解析器的 asyncio 包装（在数据库线程池中调用同步实例，与同步版本共享连接池）"""
+    
+    def __init__(self, db_config: Optional[Dict[str, str]] = None,
+                 query_parser: Optional[QueryParser] = None):
+        """
+        初始化异步查询解析器
+        
+        Args:
+            db_config: 数据库连接配置。如果为None，则从环境变量加载。
+            query_parser: 被包装的同步查询解析器，None 表示按 db_config 新建
+        """
+        self.query_parser = query_parser or QueryParser(db_config)
+        self.async_pool = get_async_pool(self.query_parser.db_config)
+    
+    async def parse(self, user_query: str) -> Dict[str, Any]:
+        """解析用户查询（参见 QueryParser.parse）"""
+        return await self.async_pool.run(self.query_parser.parse, user_query)
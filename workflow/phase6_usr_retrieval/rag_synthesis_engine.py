@@ -4,7 +4,7 @@
 """
 
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator
 
 from ..phase3_agent_interaction import LLMGateway
 
@@ -29,7 +29,8 @@ class RAGSynthesisEngine:
         self.llm_gateway = LLMGateway(
             model_name=model_name,
             temperature=temperature,
-            max_output_tokens=max_output_tokens
+            max_output_tokens=max_output_tokens,
+            phase='phase6'
         )
         
         logger.info(f"✅ RAGSynthesisEngine 初始化完成: {model_name}")
@@ -68,29 +69,88 @@ class RAGSynthesisEngine:
                 user_prompt=user_prompt
             )
             
-            # 提取图片信息
-            images = []
-            for evidence in retrieved_evidence:
-                if evidence.get('type') == 'detail':
-                    for appearance in evidence.get('appearances', []):
-                        if appearance.get('snapshot_url'):
-                            images.append(appearance['snapshot_url'])
+            result = self._build_result(answer_text, retrieved_evidence)
             
-            result = {
-                'answer': answer_text.strip(),
-                'evidence_count': len(retrieved_evidence),
-                'has_images': len(images) > 0,
-                'images': images
-            }
-            
-            logger.info(f"✅ RAG 合成完成: {len(answer_text)} 字符, {len(images)} 张图片")
+            logger.info(f"✅ RAG 合成完成: {len(answer_text)} 字符, {len(result['images'])} 张图片")
             
             return result
-            
+        
         except Exception as e:
             logger.error(f"❌ LLM 调用失败: {e}")
             return self._generate_fallback_answer(user_query, retrieved_evidence)
     
+    def synthesize_stream(self, user_query: str,
+                          retrieved_evidence: List[Dict[str, Any]],
+                          query_obj: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        流式合成最终回答：LLM 每生成一段文本就返回一个 chunk，最后返回完整的结构化结果
+        
+        LLM 调用失败时：尚未输出任何文本则把兜底回答作为一个 chunk 输出；
+        已输出部分文本则直接结束。两种情况下 final 中的 answer 均为兜底回答，客户端应以 final 为准。
+        
+        Args:
+            user_query: 用户原始问题
+            retrieved_evidence: 检索到的证据列表
+            query_obj: 查询对象（来自 QueryParser）
+        
+        Yields:
+            {'type': 'chunk', 'text': str}  # 回答文本片段，按顺序拼接即为完整回答
+            {'type': 'final', 'result': Dict}  # 最后一项，格式同 synthesize 的返回值
+        """
+        if not retrieved_evidence:
+            result = self._generate_no_result_answer(user_query)
+            yield {'type': 'chunk', 'text': result['answer']}
+            yield {'type': 'final', 'result': result}
+            return
+        
+        system_prompt = self._build_system_prompt(query_obj)
+        user_prompt = self._build_user_prompt(user_query, retrieved_evidence, query_obj)
+        
+        logger.info(f"🤖 流式调用 LLM 生成回答...")
+        chunks = []
+        try:
+            for chunk in self.llm_gateway.generate_stream(system_prompt=system_prompt,
+                                                          user_prompt=user_prompt):
+                chunks.append(chunk)
+                yield {'type': 'chunk', 'text': chunk}
+        except Exception as e:
+            logger.error(f"❌ LLM 调用失败: {e}")
+            result = self._generate_fallback_answer(user_query, retrieved_evidence)
+            if not chunks:
+                yield {'type': 'chunk', 'text': result['answer']}
+            yield {'type': 'final', 'result': result}
+            return
+        
+        result = self._build_result(''.join(chunks), retrieved_evidence)
+        logger.info(f"✅ RAG 流式合成完成: {len(result['answer'])} 字符, {len(result['images'])} 张图片")
+        yield {'type': 'final', 'result': result}
+    
+    def _build_result(self, answer_text: str,
+                      retrieved_evidence: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        组装回答字典（提取证据中的图片）
+        
+        Args:
+            answer_text: LLM 生成的回答
+            retrieved_evidence: 检索到的证据列表
+        
+        Returns:
+            回答字典（格式同 synthesize 的返回值）
+        """
+        images = []
+        for evidence in retrieved_evidence:
+            if evidence.get('type') == 'detail':
+                for appearance in evidence.get('appearances', []):
+                    if appearance.get('snapshot_url'):
+                        images.append(appearance['snapshot_url'])
+        
+        return {
+            'answer': answer_text.strip(),
+            'evidence_count': len(retrieved_evidence),
+            'has_images': len(images) > 0,
+            'images': images
+        }
+    
     def _build_system_prompt(self, query_obj: Dict[str, Any]) -> str:
         """
         构建 System Prompt
@@ -3,19 +3,47 @@
 职责：执行 SQL 逻辑，联合多张表查找证据
 """
 
-import os
-import psycopg2
 import numpy as np
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 import logging
 from dotenv import load_dotenv
 
+from ..db import PreparedStatement, get_async_pool, get_db_config, get_pool
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
+# 详细事件检索：固定形状的预编译语句，未指定的条件以 NULL / ±infinity 传入
+# 参数: $1 起始日期, $2 结束日期（含）, $3 person_id, $4 关键词 ILIKE 模式
+DETAIL_STMT = PreparedStatement('retrieval_detail', """
+    SELECT DISTINCT
+        el.id as event_id,
+        el.start_time,
+        el.camera_location,
+        el.llm_description,
+        el.video_filename,
+        ea.id as appearance_id,
+        ea.person_id,
+        ea.match_method,
+        ea.body_embedding,
+        p.name as person_name,
+        p.role as person_role,
+        ea.keyframe_path
+    FROM event_logs el
+    JOIN event_appearances ea ON el.id = ea.event_id
+    LEFT JOIN persons p ON ea.person_id = p.id
+    WHERE el.start_time >= $1
+      AND el.start_time < $2 + 1
+      AND ($3::integer IS NULL OR ea.person_id = $3)
+      AND ($4::text IS NULL OR el.llm_description ILIKE $4)
+    ORDER BY el.start_time DESC
+    LIMIT 50
+""", ['date', 'date', 'integer', 'text'])
+
+
 class RetrievalEngine:
     """混合检索引擎"""
     
@@ -26,16 +54,8 @@ class RetrievalEngine:
         Args:
             db_config: 数据库连接配置。如果为None，则从环境变量加载。
         """
-        if db_config is None:
-            self.db_config = {
-                'host': os.getenv('POSTGRES_HOST', 'localhost'),
-                'port': os.getenv('POSTGRES_PORT', '5432'),
-                'database': os.getenv('POSTGRES_DB', 'neweufy'),
-                'user': os.getenv('POSTGRES_USER', 'postgres'),
-                'password': os.getenv('POSTGRES_PASSWORD', 'eufy123')
-            }
-        else:
-            self.db_config = db_config
+        self.db_config = db_config or get_db_config()
+        self.pool = get_pool(self.db_config)
         
         logger.debug("✅ RetrievalEngine 初始化完成")
     
@@ -70,7 +90,7 @@ class RetrievalEngine:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
             date = query_obj.get('date')
@@ -116,15 +136,15 @@ class RetrievalEngine:
             logger.info(f"✅ 检索到 {len(results)} 条总结记录")
             
             cursor.close()
-            conn.close()
             
             return results
             
         except Exception as e:
             logger.error(f"❌ 检索总结失败: {e}")
-            if conn:
-                conn.close()
             return []
+        finally:
+            if conn:
+                self.pool.putconn(conn)
     
     def _retrieve_detail(self, query_obj: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -138,96 +158,36 @@ class RetrievalEngine:
         """
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
+            conn = self.pool.getconn()
             cursor = conn.cursor()
             
-            # 构建 SQL 查询
-            conditions = []
-            params = []
-            
-            # 时间条件
+            # 时间条件（按 start_time 范围过滤，可走 idx_event_time 索引）
             date = query_obj.get('date')
             date_range = query_obj.get('date_range')
             
             if date_range:
                 start_date, end_date = date_range
-                conditions.append("DATE(el.start_time) BETWEEN %s AND %s")
-                params.extend([start_date, end_date])
             elif date:
-                conditions.append("DATE(el.start_time) = %s")
-                params.append(date)
+                start_date, end_date = date, date
+            else:
+                start_date, end_date = '-infinity', 'infinity'
             
             # 人物条件
-            person_id = query_obj.get('person_id')
-            if person_id:
-                conditions.append("ea.person_id = %s")
-                params.append(person_id)
+            person_id = query_obj.get('person_id') or None
             
             # 关键词条件（在 llm_description 中搜索）
             # 注意：如果关键词匹配不到结果，会在后续放宽条件
             keyword = query_obj.get('keyword')
-            keyword_condition = None
-            if keyword:
-                keyword_condition = "el.llm_description ILIKE %s"
-                keyword_param = f'%{keyword}%'
+            keyword_param = f'%{keyword}%' if keyword else None
             
             # 首先尝试带关键词的查询
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-            if keyword_condition:
-                where_clause_with_keyword = f"{where_clause} AND {keyword_condition}"
-                params_with_keyword = params + [keyword_param]
-            else:
-                where_clause_with_keyword = where_clause
-                params_with_keyword = params
-            
-            sql = f"""
-                SELECT DISTINCT
-                    el.id as event_id,
-                    el.start_time,
-                    el.camera_location,
-                    el.llm_description,
-                    el.video_filename,
-                    ea.id as appearance_id,
-                    ea.person_id,
-                    ea.match_method,
-                    ea.body_embedding,
-                    p.name as person_name,
-                    p.role as person_role
-                FROM event_logs el
-                JOIN event_appearances ea ON el.id = ea.event_id
-                LEFT JOIN persons p ON ea.person_id = p.id
-                WHERE {where_clause_with_keyword}
-                ORDER BY el.start_time DESC
-                LIMIT 50
-            """
-            
-            cursor.execute(sql, params_with_keyword)
+            DETAIL_STMT.execute(cursor, (start_date, end_date, person_id, keyword_param))
             rows = cursor.fetchall()
             
             # 如果带关键词的查询结果为空，且有关键词，尝试不带关键词的查询
-            if len(rows) == 0 and keyword_condition:
+            if len(rows) == 0 and keyword_param:
                 logger.info(f"⚠️  关键词 '{keyword}' 未匹配到结果，放宽条件重新查询...")
-                sql = f"""
-                    SELECT DISTINCT
-                        el.id as event_id,
-                        el.start_time,
-                        el.camera_location,
-                        el.llm_description,
-                        el.video_filename,
-                        ea.id as appearance_id,
-                        ea.person_id,
-                        ea.match_method,
-                        ea.body_embedding,
-                        p.name as person_name,
-                        p.role as person_role
-                    FROM event_logs el
-                    JOIN event_appearances ea ON el.id = ea.event_id
-                    LEFT JOIN persons p ON ea.person_id = p.id
-                    WHERE {where_clause}
-                    ORDER BY el.start_time DESC
-                    LIMIT 50
-                """
-                cursor.execute(sql, params)
+                DETAIL_STMT.execute(cursor, (start_date, end_date, person_id, None))
                 rows = cursor.fetchall()
             
             # 按事件分组
@@ -254,7 +214,8 @@ class RetrievalEngine:
                         'match_method': row[7],
                         'body_embedding': row[8],  # pgvector 字符串格式
                         'person_name': row[9],
-                        'person_role': row[10]
+                        'person_role': row[10],
+                        'keyframe_path': row[11]  # 第一阶段保存的裁剪图（可能为 None）
                     }
                     events_dict[event_id]['appearances'].append(appearance)
             
@@ -263,7 +224,6 @@ class RetrievalEngine:
             logger.info(f"✅ 检索到 {len(results)} 个事件，共 {sum(len(e['appearances']) for e in results)} 条出场记录")
             
             cursor.close()
-            conn.close()
             
             return results
             
@@ -271,7 +231,28 @@ class RetrievalEngine:
             logger.error(f"❌ 检索详细事件失败: {e}")
             import traceback
             traceback.print_exc()
-            if conn:
-                conn.close()
             return []
+        finally:
+            if conn:
+                self.pool.putconn(conn)
+
 
+
+class AsyncRetrievalEngine:
+    """混合检索引擎的 asyncio 包装（在数据库线程池中调用同步实例，与同步版本共享连接池）"""
+    
+    def __init__(self, db_config: Optional[Dict[str, str]] = None,
+                 retrieval_engine: Optional[RetrievalEngine] = None):
+        """
+        初始化异步检索引擎
+        
+        Args:
+            db_config: 数据库连接配置。如果为None，则从环境变量加载。
+            retrieval_engine: 被包装的同步检索引擎，None 表示按 db_config 新建
+        """
+        self.retrieval_engine = retrieval_engine or RetrievalEngine(db_config)
+        self.async_pool = get_async_pool(self.retrieval_engine.db_config)
+    
+    async def retrieve(self, query_obj: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """根据查询对象检索数据（参见 RetrievalEngine.retrieve）"""
+        return await self.async_pool.run(self.retrieval_engine.retrieve, query_obj)
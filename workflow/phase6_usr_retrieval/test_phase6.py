@@ -4,7 +4,10 @@ Phase 6 测试脚本
 """
 
 import sys
+import time
+import asyncio
 import logging
+import threading
 from pathlib import Path
 
 # 添加项目根目录到路径
@@ -69,9 +72,123 @@ def test_query_examples():
             traceback.print_exc()
 
 
+def test_concurrent_queries():
+    """测试 asyncio 并发查询（同一进程同时处理多个用户问题）"""
+    logger.info("=" * 60)
+    logger.info("Phase 6: 并发查询测试 (answer_async)")
+    logger.info("=" * 60)
+    
+    pipeline = User_Retrieval_Pipeline(
+        videos_base_dir=str(Path('.') / 'memories_ai_benchmark' / 'videos')
+    )
+    
+    test_queries = [
+        "2025年9月1日有什么活动？",
+        "9月1日有陌生人出现吗？",
+        "今天有什么事件？",
+    ]
+    
+    async def run_all():
+        return await asyncio.gather(*[pipeline.answer_async(query) for query in test_queries])
+    
+    start = time.time()
+    results = asyncio.run(run_all())
+    elapsed = time.time() - start
+    
+    assert len(results) == len(test_queries)
+    for query, result in zip(test_queries, results):
+        assert 'answer' in result, f"{query}: 结果缺少 answer"
+        logger.info(f"✅ {query}: {result['answer'][:80]}")
+    
+    logger.info(f"⏱️  {len(test_queries)} 个查询并发完成，总耗时 {elapsed:.2f}s")
+
+
+def test_stream_query():
+    """测试流式回答（首个文本片段的延迟 vs 完整回答的耗时）"""
+    logger.info("=" * 60)
+    logger.info("Phase 6: 流式回答测试 (answer_stream)")
+    logger.info("=" * 60)
+    
+    pipeline = User_Retrieval_Pipeline(
+        videos_base_dir=str(Path('.') / 'memories_ai_benchmark' / 'videos')
+    )
+    
+    query = "2025年9月1日有什么活动？"
+    start = time.time()
+    first_chunk_at = None
+    chunks = []
+    result = None
+    
+    for event in pipeline.answer_stream(query):
+        if event['type'] == 'chunk':
+            if first_chunk_at is None:
+                first_chunk_at = time.time() - start
+            chunks.append(event['text'])
+        else:
+            result = event['result']
+    
+    elapsed = time.time() - start
+    if result is None:
+        logger.error("❌ 流式回答没有返回 final 结果")
+        return
+    
+    logger.info(f"📝 回答: {result['answer']}")
+    logger.info(f"⏱️  首个片段 {first_chunk_at:.2f}s, 完整回答 {elapsed:.2f}s, 共 {len(chunks)} 个片段")
+    if ''.join(chunks).strip() != result['answer']:
+        logger.warning("⚠️  片段拼接结果与 final 不一致（LLM 调用失败时 final 为兜底回答）")
+
+
+def test_stream_query_async_early_exit():
+    """测试异步流式回答提前退出：读到第一个片段就停止，生产线程随之关闭 LLM 流"""
+    logger.info("=" * 60)
+    logger.info("Phase 6: 异步流式回答提前退出测试 (answer_stream_async)")
+    logger.info("=" * 60)
+    
+    pipeline = User_Retrieval_Pipeline(
+        videos_base_dir=str(Path('.') / 'memories_ai_benchmark' / 'videos')
+    )
+    
+    # 第二项等调用方停止读取之后才产生；提前退出时 LLM 流应被关闭，而不是读到结尾
+    consumer_stopped = threading.Event()
+    stream_completed = threading.Event()
+    stream_closed = threading.Event()
+    synthesize_stream = pipeline.rag_synthesis_engine.synthesize_stream
+    
+    def tracked_stream(**kwargs):
+        try:
+            for index, event in enumerate(synthesize_stream(**kwargs)):
+                if index == 1:
+                    consumer_stopped.wait(timeout=30)
+                yield event
+            stream_completed.set()
+        finally:
+            stream_closed.set()
+    
+    pipeline.rag_synthesis_engine.synthesize_stream = tracked_stream
+    
+    async def read_first_chunk():
+        stream = pipeline.answer_stream_async("2025年9月1日有什么活动？")
+        first = None
+        async for event in stream:
+            first = event
+            break
+        await stream.aclose()
+        consumer_stopped.set()
+        return first
+    
+    first = asyncio.run(read_first_chunk())
+    assert first is not None, "异步流式回答没有返回任何内容"
+    assert stream_closed.wait(timeout=30), "调用方停止读取后 LLM 流没有被关闭"
+    assert not stream_completed.is_set(), "调用方停止读取后 LLM 流仍被读到结尾"
+    logger.info(f"✅ 提前退出后 LLM 流已关闭 (第一项: {first['type']})")
+
+
 def main():
     """主函数"""
     test_query_examples()
+    test_concurrent_queries()
+    test_stream_query()
+    test_stream_query_async_early_exit()
 
 
 if __name__ == '__main__':
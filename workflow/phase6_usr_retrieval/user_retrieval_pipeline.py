@@ -3,11 +3,14 @@
 整合所有模块，实现完整的用户检索与 RAG 流程
 """
 
+import time
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator
 
-from .query_parser import QueryParser
-from .retrieval_engine import RetrievalEngine
+from .query_parser import QueryParser, AsyncQueryParser
+from .retrieval_engine import RetrievalEngine, AsyncRetrievalEngine
 from .evidence_materializer import EvidenceMaterializer
 from .rag_synthesis_engine import RAGSynthesisEngine
 
@@ -41,6 +44,9 @@ class User_Retrieval_Pipeline:
         
         self.query_parser = QueryParser(db_config)
         self.retrieval_engine = RetrievalEngine(db_config)
+        # 异步包装（answer_async 使用），包装上面的同步实例，共享同一个连接池
+        self.async_query_parser = AsyncQueryParser(query_parser=self.query_parser)
+        self.async_retrieval_engine = AsyncRetrievalEngine(retrieval_engine=self.retrieval_engine)
         self.evidence_materializer = EvidenceMaterializer(
             videos_base_dir=videos_base_dir,
             snapshots_dir=snapshots_dir
@@ -116,4 +122,196 @@ class User_Retrieval_Pipeline:
             'query_obj': query_obj,
             'retrieved_records': materialized_records
         }
-
+    
+    async def answer_async(self, user_query: str) -> Dict[str, Any]:
+        """
+        回答用户问题（asyncio 版本）
+        
+        数据库访问走异步连接池，图片提取和 LLM 调用在线程中执行，
+        同一个事件循环可以并发处理多个用户查询。
+        
+        Args:
+            user_query: 用户的自然语言问题
+        
+        Returns:
+            回答字典（格式同 answer）
+        """
+        logger.info(f"处理用户查询 (async): {user_query}")
+        
+        # 1. 解析查询（模块 1）
+        query_obj = await self.async_query_parser.parse(user_query)
+        logger.info(f"✅ 查询解析完成: {query_obj}")
+        
+        # 2. 检索数据（模块 2）
+        retrieved_records = await self.async_retrieval_engine.retrieve(query_obj)
+        logger.info(f"✅ 检索完成: 找到 {len(retrieved_records)} 条记录")
+        
+        if not retrieved_records:
+            logger.warning("⚠️  未找到相关记录")
+            answer_result = self.rag_synthesis_engine._generate_no_result_answer(user_query)
+            return {
+                **answer_result,
+                'query_obj': query_obj,
+                'retrieved_records': []
+            }
+        
+        # 3. 实物化证据（模块 3）
+        materialized_records = await asyncio.to_thread(
+            self.evidence_materializer.materialize, retrieved_records
+        )
+        
+        # 4. RAG 合成回答（模块 4）
+        answer_result = await asyncio.to_thread(
+            self.rag_synthesis_engine.synthesize,
+            user_query=user_query,
+            retrieved_evidence=materialized_records,
+            query_obj=query_obj
+        )
+        logger.info(f"✅ 回答生成完成: {len(answer_result['answer'])} 字符")
+        
+        return {
+            **answer_result,
+            'query_obj': query_obj,
+            'retrieved_records': materialized_records
+        }
+    
+    def answer_stream(self, user_query: str) -> Iterator[Dict[str, Any]]:
+        """
+        流式回答用户问题：检索完成后，LLM 生成的文本边生成边返回，用户无需等待完整回答
+        
+        Args:
+            user_query: 用户的自然语言问题
+        
+        Yields:
+            {'type': 'chunk', 'text': str}  # 回答文本片段
+            {'type': 'final', 'result': Dict}  # 最后一项，格式同 answer 的返回值
+        """
+        logger.info(f"处理用户查询 (stream): {user_query}")
+        start = time.monotonic()
+        
+        # 1. 解析查询（模块 1）
+        query_obj = self.query_parser.parse(user_query)
+        logger.info(f"✅ 查询解析完成: {query_obj}")
+        
+        # 2. 检索数据（模块 2）
+        retrieved_records = self.retrieval_engine.retrieve(query_obj)
+        logger.info(f"✅ 检索完成: 找到 {len(retrieved_records)} 条记录")
+        
+        # 3. 实物化证据（模块 3）
+        materialized_records = (self.evidence_materializer.materialize(retrieved_records)
+                                if retrieved_records else [])
+        
+        # 4. RAG 流式合成回答（模块 4）
+        yield from self._stream_answer(
+            self.rag_synthesis_engine.synthesize_stream(
+                user_query=user_query,
+                retrieved_evidence=materialized_records,
+                query_obj=query_obj
+            ),
+            query_obj, materialized_records, start
+        )
+    
+    async def answer_stream_async(self, user_query: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式回答用户问题（asyncio 版本）
+        
+        数据库访问走异步连接池，图片提取和 LLM 流式调用在线程中执行，
+        文本片段通过队列交回事件循环，不阻塞其他查询。
+        调用方提前停止迭代或被取消时，生产线程在下一个片段处关闭 LLM 流并退出。
+        
+        Args:
+            user_query: 用户的自然语言问题
+        
+        Yields:
+            同 answer_stream
+        """
+        logger.info(f"处理用户查询 (async stream): {user_query}")
+        start = time.monotonic()
+        
+        # 1. 解析查询（模块 1）
+        query_obj = await self.async_query_parser.parse(user_query)
+        logger.info(f"✅ 查询解析完成: {query_obj}")
+        
+        # 2. 检索数据（模块 2）
+        retrieved_records = await self.async_retrieval_engine.retrieve(query_obj)
+        logger.info(f"✅ 检索完成: 找到 {len(retrieved_records)} 条记录")
+        
+        # 3. 实物化证据（模块 3）
+        materialized_records = []
+        if retrieved_records:
+            materialized_records = await asyncio.to_thread(
+                self.evidence_materializer.materialize, retrieved_records
+            )
+        
+        # 4. RAG 流式合成回答（模块 4），在线程中迭代同步生成器
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        finished = object()
+        stop = threading.Event()
+        
+        def produce():
+            stream = self._stream_answer(
+                self.rag_synthesis_engine.synthesize_stream(
+                    user_query=user_query,
+                    retrieved_evidence=materialized_records,
+                    query_obj=query_obj
+                ),
+                query_obj, materialized_records, start
+            )
+            try:
+                for item in stream:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+            finally:
+                stream.close()
+                # 调用方已经停止读取时没有人等待结束标记（事件循环也可能已经关闭）
+                if not stop.is_set():
+                    loop.call_soon_threadsafe(items.put_nowait, finished)
+        
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await items.get()
+                if item is finished:
+                    break
+                yield item
+        finally:
+            stop.set()
+        
+        # 生产线程中的异常在这里抛出
+        await producer
+    
+    def _stream_answer(self, events: Iterator[Dict[str, Any]], query_obj: Dict[str, Any],
+                       retrieved_records: List[Dict[str, Any]], start: float) -> Iterator[Dict[str, Any]]:
+        """
+        转发 synthesize_stream 的输出：记录首个文本片段的延迟，并在 final 结果中补充查询对象和检索记录
+        
+        Args:
+            events: synthesize_stream 返回的生成器
+            query_obj: 解析后的查询对象
+            retrieved_records: 检索到的记录（已实物化）
+            start: 开始处理查询的时间（time.monotonic()）
+        
+        Yields:
+            同 answer_stream
+        """
+        first_chunk = True
+        for event in events:
+            if event['type'] == 'chunk':
+                if first_chunk:
+                    logger.info(f"⚡ 首个回答片段: {(time.monotonic() - start) * 1000:.0f} ms")
+                    first_chunk = False
+                yield event
+            else:
+                result = event['result']
+                logger.info(f"✅ 流式回答完成: {len(result['answer'])} 字符, "
+                           f"总耗时 {(time.monotonic() - start) * 1000:.0f} ms")
+                yield {
+                    'type': 'final',
+                    'result': {
+                        **result,
+                        'query_obj': query_obj,
+                        'retrieved_records': retrieved_records
+                    }
+                }